@@ -8,6 +8,7 @@ from datetime import UTC, datetime
 from sqlmodel import Session
 
 from agente.v2.infrastructure.channels.crm_channel_adapter import CRMOutboundChannelAdapter
+from app.db import DbSession, run_db
 from app.models import CRMMensaje
 from app.models.enums import TipoMensaje
 
@@ -73,7 +74,7 @@ class TurnDeliveryService:
     async def deliver_result(
         self,
         *,
-        session: Session,
+        session: DbSession,
         message: CRMMensaje,
         result: dict,
     ) -> SendResult:
@@ -85,18 +86,21 @@ class TurnDeliveryService:
         if not message.oportunidad_id:
             return SendResult(sent=False, status="missing_oportunidad")
 
-        return await self._channel_adapter.send_text(
-            session,
-            SendTextCommand(
-                contenido=reply_text,
-                contacto_id=message.contacto_id,
-                oportunidad_id=message.oportunidad_id,
-                responsable_id=message.responsable_id
-                or (message.oportunidad.responsable_id if message.oportunidad else None),
-                contacto_referencia=message.contacto_referencia,
-                canal=message.canal,
-                metadata={"source_message_id": message.id},
-            ),
+        # La relacion oportunidad puede requerir lazy load: se resuelve via run_db
+        command = await run_db(session, self._build_command, message, reply_text)
+        return await self._channel_adapter.send_text(session, command)
+
+    @staticmethod
+    def _build_command(session: Session, message: CRMMensaje, reply_text: str) -> SendTextCommand:
+        return SendTextCommand(
+            contenido=reply_text,
+            contacto_id=message.contacto_id,
+            oportunidad_id=message.oportunidad_id,
+            responsable_id=message.responsable_id
+            or (message.oportunidad.responsable_id if message.oportunidad else None),
+            contacto_referencia=message.contacto_referencia,
+            canal=message.canal,
+            metadata={"source_message_id": message.id},
         )
 
     @staticmethod
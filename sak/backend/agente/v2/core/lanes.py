@@ -0,0 +1,158 @@
+"""
+Carriles (lanes) de ejecucion de turnos por conversacion.
+
+Cada `oportunidad_id` se asigna por hash estable (crc32) a uno de N carriles. Un
+carril ejecuta sus turnos de a uno y en orden de llegada, asi los turnos de una
+misma conversacion quedan serializados sin mantener un `SELECT ... FOR UPDATE`
+abierto durante la llamada al LLM; conversaciones de carriles distintos corren en
+paralelo. El hash no depende del proceso, de modo que el mismo reparto sirve para
+rutear entre nodos.
+
+Cada carril tiene una cola acotada: si esta llena, `run` levanta
+`TurnLaneFullError` (el webhook lo reintenta con backoff; los endpoints manuales
+responden 503). El carril no tiene worker permanente: se drena con una task que
+termina cuando la cola queda vacia.
+
+Configuracion (variables de entorno):
+    AGENT_TURN_LANES          "0" desactiva los carriles y vuelve al FOR UPDATE (default "1").
+    AGENT_TURN_LANE_COUNT     cantidad de carriles por proceso (default 16).
+    AGENT_TURN_LANE_CAPACITY  turnos en espera por carril (default 50).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, TypeVar
+
+AGENT_TURN_LANES = os.getenv("AGENT_TURN_LANES", "1") == "1"
+AGENT_TURN_LANE_COUNT = max(1, int(os.getenv("AGENT_TURN_LANE_COUNT", "16")))
+AGENT_TURN_LANE_CAPACITY = max(1, int(os.getenv("AGENT_TURN_LANE_CAPACITY", "50")))
+
+T = TypeVar("T")
+
+
+class TurnLaneFullError(RuntimeError):
+    """El carril de la conversacion alcanzo su capacidad de turnos en espera."""
+
+
+@dataclass
+class _PendingTurn:
+    fn: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    context: contextvars.Context
+    enqueued_at: float
+
+
+@dataclass
+class _Lane:
+    index: int
+    pending: deque = field(default_factory=deque)
+    task: asyncio.Task | None = None
+    running: bool = False
+    processed: int = 0
+    failed: int = 0
+    rejected: int = 0
+    max_depth: int = 0
+    wait_seconds_total: float = 0.0
+
+    @property
+    def depth(self) -> int:
+        return len(self.pending) + (1 if self.running else 0)
+
+
+class TurnLaneScheduler:
+    """Serializa turnos por conversacion repartiendolos en carriles acotados."""
+
+    def __init__(self, lanes: int = AGENT_TURN_LANE_COUNT, capacity: int = AGENT_TURN_LANE_CAPACITY) -> None:
+        self.capacity = capacity
+        self._lanes = [_Lane(index) for index in range(lanes)]
+
+    def lane_for(self, oportunidad_id: int) -> int:
+        return zlib.crc32(str(oportunidad_id).encode()) % len(self._lanes)
+
+    async def run(self, oportunidad_id: int, fn: Callable[[], Awaitable[T]]) -> T:
+        """Encola `fn` en el carril de la oportunidad y espera su resultado."""
+        loop = asyncio.get_running_loop()
+        lane = self._lanes[self.lane_for(oportunidad_id)]
+        if lane.task is not None and lane.task.get_loop() is not loop:
+            # Loop anterior ya cerrado (tests / recarga): sus turnos no pueden completarse
+            lane.pending.clear()
+            lane.task = None
+            lane.running = False
+        if len(lane.pending) >= self.capacity:
+            lane.rejected += 1
+            raise TurnLaneFullError(
+                f"Carril {lane.index} lleno ({self.capacity} turnos en espera) para oportunidad {oportunidad_id}"
+            )
+
+        future = loop.create_future()
+        lane.pending.append(_PendingTurn(fn, future, contextvars.copy_context(), time.monotonic()))
+        lane.max_depth = max(lane.max_depth, lane.depth)
+        if lane.task is None or lane.task.done():
+            lane.task = loop.create_task(self._drain(lane), name=f"agent-turn-lane-{lane.index}")
+        return await future
+
+    async def _drain(self, lane: _Lane) -> None:
+        loop = asyncio.get_running_loop()
+        while lane.pending:
+            turn = lane.pending.popleft()
+            if turn.future.cancelled():
+                continue
+            lane.wait_seconds_total += time.monotonic() - turn.enqueued_at
+            lane.running = True
+            try:
+                # Corre con los contextvars del caller (logging, request id, etc.)
+                result = await loop.create_task(turn.fn(), context=turn.context)
+            except asyncio.CancelledError:
+                if not turn.future.done():
+                    turn.future.cancel()
+                raise
+            except Exception as exc:
+                lane.failed += 1
+                if not turn.future.done():
+                    turn.future.set_exception(exc)
+            else:
+                if not turn.future.done():
+                    turn.future.set_result(result)
+            finally:
+                lane.running = False
+                lane.processed += 1
+
+    def stats(self) -> dict[str, Any]:
+        """Profundidad y contadores por carril (para /metrics/agent-lanes)."""
+        lanes = [
+            {
+                "lane": lane.index,
+                "depth": lane.depth,
+                "max_depth": lane.max_depth,
+                "processed": lane.processed,
+                "failed": lane.failed,
+                "rejected": lane.rejected,
+                "avg_wait_ms": round(lane.wait_seconds_total * 1000 / lane.processed, 1) if lane.processed else 0.0,
+            }
+            for lane in self._lanes
+        ]
+        return {
+            "enabled": AGENT_TURN_LANES,
+            "lanes": len(self._lanes),
+            "capacity": self.capacity,
+            "depth": sum(item["depth"] for item in lanes),
+            "busy_lanes": sum(1 for lane in self._lanes if lane.depth),
+            "processed": sum(item["processed"] for item in lanes),
+            "rejected": sum(item["rejected"] for item in lanes),
+            "per_lane": lanes,
+        }
+
+    def reset_stats(self) -> None:
+        for lane in self._lanes:
+            lane.processed = lane.failed = lane.rejected = lane.max_depth = 0
+            lane.wait_seconds_total = 0.0
+
+
+turn_scheduler = TurnLaneScheduler()
@@ -5,6 +5,7 @@ Flujo de un turno:
 
     process_turn(session, message_id, trigger)
         │
+        ├─ 0. Encola el turno en el carril de la oportunidad (lanes.py)
         ├─ 1. Valida mensaje y oportunidad asociada
         ├─ 2. Deduplicacion: si ya fue procesado devuelve el resultado cacheado
         ├─ 3. Carga estado conversacional + construye TurnContext
@@ -14,13 +15,17 @@ Flujo de un turno:
         │       └─ NO → registra "sin proceso" y retorna
         │
         └─ SÍ
-                ├─ 5. Ejecuta el proceso (LLM, operaciones, etc.)
+                ├─ 5. Ejecuta el proceso (LLM, operaciones, etc.) en un thread
                 ├─ 6. Persiste estado conversacional actualizado
                 └─ 7. Marca el mensaje como procesado y retorna payload
+
+Los pasos 1-4 y 6-7 corren via `run_db`; entre ambos la transaccion queda
+cerrada, asi la llamada al LLM no bloquea el event loop ni retiene conexion.
 """
 
 from __future__ import annotations
 
+import asyncio
 from datetime import UTC, datetime
 from typing import Any
 
@@ -28,9 +33,11 @@ from fastapi import HTTPException
 from sqlalchemy import func
 from sqlmodel import Session, select
 
+from agente.v2.core import lanes
 from agente.v2.core.context import MessageInfo, TurnContext
-from agente.v2.core.process import AgentProcess, ProcessRegistry
+from agente.v2.core.process import AgentProcess, ProcessRegistry, TurnResult
 from agente.v2.core.state import ConversationState, JsonConversationStateStore
+from app.db import DbSession, run_db
 from app.models import CRMContacto, CRMMensaje, CRMOportunidad, Proyecto
 from app.models.base import serialize_datetime
 from app.models.crm.catalogos import CRMTipoOperacion
@@ -45,10 +52,12 @@ class AgentTurnOrchestrator:
         processes: list[AgentProcess],
         state_store: JsonConversationStateStore,
         history_limit: int = 6,
+        scheduler: lanes.TurnLaneScheduler | None = None,
     ) -> None:
         self._registry = ProcessRegistry(processes)
         self._state_store = state_store
         self._history_limit = history_limit
+        self._scheduler = scheduler
 
     @property
     def state_store(self) -> JsonConversationStateStore:
@@ -64,7 +73,7 @@ class AgentTurnOrchestrator:
 
     async def process_turn(
         self,
-        session: Session,
+        session: DbSession,
         message_id: int,
         trigger: str,
     ) -> dict[str, Any]:
@@ -74,7 +83,55 @@ class AgentTurnOrchestrator:
         Si el mensaje ya fue procesado anteriormente devuelve el resultado
         cacheado sin llamar al LLM. Cualquier excepcion no controlada
         se propaga hacia el caller para ser logueada y devuelta como 500.
+
+        Acepta Session o AsyncSession: las fases de base de datos corren via
+        `run_db` y `process.handle` en un thread, sin transaccion abierta.
+        Como el estado se carga sin FOR UPDATE, el guardado usa control
+        optimista (`save_if_unchanged`) y un turno concurrente que gano la
+        carrera hace levantar `ConversationStateConflict`.
+
+        Con carriles activos el turno espera su lugar en el carril de la
+        oportunidad; si el carril esta lleno se propaga `TurnLaneFullError`.
         """
+        scheduler = self._scheduler or (lanes.turn_scheduler if lanes.AGENT_TURN_LANES else None)
+        if scheduler is None:
+            return await self._run_turn(session, message_id, trigger)
+
+        oportunidad_id = await run_db(session, self._oportunidad_id_of, message_id)
+        return await scheduler.run(
+            oportunidad_id,
+            lambda: self._run_turn(session, message_id, trigger),
+        )
+
+    @staticmethod
+    def _oportunidad_id_of(session: Session, message_id: int) -> int:
+        message = session.get(CRMMensaje, message_id)
+        if not message:
+            raise ValueError("Mensaje no encontrado")
+        if not message.oportunidad_id:
+            raise ValueError("Mensaje sin oportunidad asociada")
+        return message.oportunidad_id
+
+    async def _run_turn(self, session: DbSession, message_id: int, trigger: str) -> dict[str, Any]:
+        prepared = await run_db(session, self._prepare_turn, message_id, trigger)
+        if isinstance(prepared, dict):
+            return prepared  # resultado cacheado o turno sin proceso
+        process, ctx = prepared
+
+        try:
+            turn_result = await asyncio.to_thread(process.handle, ctx)
+        except BaseException:
+            self._end_process_turn(process, ctx, persist=False)
+            raise
+        return await run_db(session, self._finish_turn, process, ctx, turn_result, trigger)
+
+    def _prepare_turn(
+        self,
+        session: Session,
+        message_id: int,
+        trigger: str,
+    ) -> dict[str, Any] | tuple[AgentProcess, TurnContext]:
+        """Fase 1: valida, deduplica, carga estado y resuelve el proceso; cierra la transaccion."""
         message = session.get(CRMMensaje, message_id)
         if not message:
             raise ValueError("Mensaje no encontrado")
@@ -86,37 +143,64 @@ class AgentTurnOrchestrator:
         if isinstance(cached, dict):
             return {**cached, "message_id": message_id, "cached": True}
 
-        # load_for_update serializa turnos concurrentes del mismo contacto (SELECT FOR UPDATE)
-        if hasattr(self._state_store, "load_for_update"):
-            state = self._state_store.load_for_update(message.oportunidad_id)
-        else:
-            state = self._state_store.load(message.oportunidad_id)
+        state = self._state_store.load(message.oportunidad_id)
         ctx = self.build_context(session, message_id, trigger=trigger, state=state)
 
         process = self._registry.resolve(ctx)
         if not process:
             result: dict[str, Any] = {"type": "no_process", "skipped": True, "reason": "No hay procesos disponibles"}
             state.last_message_id = message.id
-            self._state_store.save(state)
+            self._save_state(state)
             self._mark_done(session, message, result=result, process_name=None, trigger=trigger)
             return {**result, "message_id": message_id, "cached": False}
 
-        turn_result = process.handle(ctx)
+        begin_turn = getattr(process, "begin_turn", None)
+        if begin_turn is not None:
+            begin_turn(ctx)
+        # Sin transaccion abierta durante el LLM; persiste lo que `resolve` haya refrescado
+        session.commit()
+        return process, ctx
+
+    def _finish_turn(
+        self,
+        session: Session,
+        process: AgentProcess,
+        ctx: TurnContext,
+        turn_result: TurnResult,
+        trigger: str,
+    ) -> dict[str, Any]:
+        """Fase 3: persiste lo que dejo el proceso y marca el mensaje como procesado."""
+        message = session.get(CRMMensaje, ctx.message.id)
+        self._end_process_turn(process, ctx, persist=True)
 
+        state = ctx.conversation_state
         state.active_process = process.name if turn_result.keep_active else None
         state.process_state = turn_result.process_state if turn_result.keep_active else {}
         state.last_message_id = message.id
-        self._state_store.save(state)
+        self._save_state(state)
 
         self._mark_done(session, message, result=turn_result.payload, process_name=process.name, trigger=trigger)
 
         return {
             **turn_result.payload,
-            "message_id": message_id,
+            "message_id": message.id,
             "cached": False,
             "process_name": process.name,
         }
 
+    def _save_state(self, state: ConversationState) -> None:
+        save_if_unchanged = getattr(self._state_store, "save_if_unchanged", None)
+        if save_if_unchanged is not None:
+            save_if_unchanged(state)
+        else:
+            self._state_store.save(state)
+
+    @staticmethod
+    def _end_process_turn(process: AgentProcess, ctx: TurnContext, *, persist: bool) -> None:
+        end_turn = getattr(process, "end_turn", None)
+        if end_turn is not None:
+            end_turn(ctx, persist=persist)
+
     # ------------------------------------------------------------------
     # Construccion de contexto
     # ------------------------------------------------------------------
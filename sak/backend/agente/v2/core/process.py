@@ -18,7 +18,15 @@ class TurnResult:
 
 
 class AgentProcess(Protocol):
-    """Contrato minimo que un proceso debe implementar."""
+    """
+    Contrato minimo que un proceso debe implementar.
+
+    `handle` corre en un thread, sin transaccion abierta. Un proceso que
+    persiste en la sesion del turno puede definir ademas `begin_turn(ctx)`
+    (antes de `handle`, con la sesion) y `end_turn(ctx, *, persist)` (despues:
+    con `persist=True` dentro de la transaccion que cierra el turno; con
+    `persist=False` si `handle` fallo, sin tocar la sesion).
+    """
 
     name: str
 
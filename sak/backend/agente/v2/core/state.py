@@ -39,7 +39,7 @@ class ConversationState:
     process_state: dict[str, Any] = field(default_factory=dict)
     last_message_id: int | None = None
     last_outbound_message_id: int | None = None
-    version: int = 1
+    version: int = 1                    # 0 = el store todavia no lo persistio
 
     @classmethod
     def empty(cls, oportunidad_id: int) -> "ConversationState":
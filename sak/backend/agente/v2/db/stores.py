@@ -5,7 +5,8 @@ from __future__ import annotations
 from datetime import UTC, datetime
 from typing import Any
 
-from sqlalchemy import select
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlmodel import Session
 
 from agente.v2.core.state import ConversationState
@@ -17,6 +18,10 @@ def _utc_now_iso() -> str:
     return datetime.now(UTC).isoformat()
 
 
+class ConversationStateConflict(RuntimeError):
+    """Otro turno guardo el estado de la conversacion despues de que este lo cargara."""
+
+
 # ---------------------------------------------------------------------------
 # DbConversationStateStore
 # ---------------------------------------------------------------------------
@@ -34,7 +39,7 @@ class DbConversationStateStore:
     def load(self, oportunidad_id: int) -> ConversationState:
         row = self._session.get(AgentConversationState, oportunidad_id)
         if row is None:
-            return ConversationState.empty(oportunidad_id)
+            return self._unsaved(oportunidad_id)
         return ConversationState(
             oportunidad_id=row.oportunidad_id,
             active_process=row.active_process,
@@ -53,7 +58,7 @@ class DbConversationStateStore:
         )
         row = self._session.execute(stmt).scalar_one_or_none()
         if row is None:
-            return ConversationState.empty(oportunidad_id)
+            return self._unsaved(oportunidad_id)
         return ConversationState(
             oportunidad_id=row.oportunidad_id,
             active_process=row.active_process,
@@ -63,6 +68,13 @@ class DbConversationStateStore:
             version=row.version,
         )
 
+    @staticmethod
+    def _unsaved(oportunidad_id: int) -> ConversationState:
+        # version 0 = todavia sin fila: el primer guardado es un INSERT
+        state = ConversationState.empty(oportunidad_id)
+        state.version = 0
+        return state
+
     def save(self, state: ConversationState) -> ConversationState:
         row = self._session.get(AgentConversationState, state.oportunidad_id)
         now = datetime.now(UTC)
@@ -89,6 +101,51 @@ class DbConversationStateStore:
         # No hace commit — el caller (orchestrator) lo hace al final del turno
         return state
 
+    def save_if_unchanged(self, state: ConversationState) -> ConversationState:
+        """
+        Guarda solo si nadie guardo desde el `load` (control optimista por version).
+
+        Lo usa el orquestador con carriles de turnos, que carga sin FOR UPDATE: dentro
+        de un proceso el carril ya serializa la conversacion; entre procesos el
+        `UPDATE ... WHERE version = :esperada` (o el INSERT ... ON CONFLICT DO NOTHING
+        del primer turno) es atomico y el que pierde levanta ConversationStateConflict.
+        """
+        oportunidad_id = state.oportunidad_id
+        values = {
+            "active_process": state.active_process,
+            "process_state": dict(state.process_state),
+            "last_message_id": state.last_message_id,
+            "last_outbound_message_id": state.last_outbound_message_id,
+            "updated_at": datetime.now(UTC),
+        }
+        if state.version == 0:
+            expected = None
+            insert = postgresql.insert if self._session.get_bind().dialect.name == "postgresql" else sqlite.insert
+            result = self._session.execute(
+                insert(AgentConversationState)
+                .values(oportunidad_id=oportunidad_id, version=1, **values)
+                .on_conflict_do_nothing(index_elements=["oportunidad_id"])
+            )
+            new_version = 1
+        else:
+            expected = state.version
+            result = self._session.execute(
+                update(AgentConversationState)
+                .where(AgentConversationState.oportunidad_id == oportunidad_id)
+                .where(AgentConversationState.version == expected)
+                .values(version=AgentConversationState.version + 1, **values)
+                .execution_options(synchronize_session="fetch")
+            )
+            new_version = expected + 1
+
+        if result.rowcount == 0:
+            raise ConversationStateConflict(
+                f"Estado de oportunidad {oportunidad_id} modificado por otro turno (version esperada {expected})"
+            )
+        state.version = new_version
+        # No hace commit — el caller (orchestrator) lo hace al final del turno
+        return state
+
 
 # ---------------------------------------------------------------------------
 # DbProcessRequestStore
@@ -104,6 +161,39 @@ class DbProcessRequestStore:
 
     def __init__(self, session: Session) -> None:
         self._session = session
+        # Solicitudes precargadas por `stage`: mientras el turno corre fuera del
+        # event loop, load/save trabajan en memoria y `flush_staged` las escribe
+        self._staged: dict[int, MaterialRequestState | None] = {}
+        self._staged_dirty: set[int] = set()
+
+    def stage(self, oportunidad_id: int) -> None:
+        self._staged[oportunidad_id] = self.load(oportunidad_id)
+        self._staged_dirty.discard(oportunidad_id)
+
+    def discard_staged(self, oportunidad_id: int) -> None:
+        self._staged.pop(oportunidad_id, None)
+        self._staged_dirty.discard(oportunidad_id)
+
+    def flush_staged(self, oportunidad_id: int) -> None:
+        request_state = self._staged.pop(oportunidad_id, None)
+        if oportunidad_id not in self._staged_dirty or request_state is None:
+            return
+        self._staged_dirty.discard(oportunidad_id)
+
+        row = self._get_row(oportunidad_id)
+        if row is None:
+            row = AgentProcessRequest(
+                oportunidad_id=oportunidad_id,
+                proceso=self.PROCESO,
+                created_at=datetime.fromisoformat(request_state.created_at),
+            )
+        row.activa = request_state.activa
+        row.estado = request_state.estado_solicitud
+        row.payload = self._state_to_payload(request_state)
+        row.version = request_state.version
+        row.ultimo_mensaje_id = request_state.ultimo_mensaje_id
+        row.updated_at = datetime.fromisoformat(request_state.updated_at)
+        self._session.add(row)
 
     def _get_row(self, oportunidad_id: int) -> AgentProcessRequest | None:
         stmt = (
@@ -116,6 +206,9 @@ class DbProcessRequestStore:
         return self._session.execute(stmt).scalar_one_or_none()
 
     def load(self, oportunidad_id: int) -> MaterialRequestState | None:
+        if oportunidad_id in self._staged:
+            staged = self._staged[oportunidad_id]
+            return self._copy(staged) if staged is not None else None
         row = self._get_row(oportunidad_id)
         if row is None:
             return None
@@ -128,6 +221,8 @@ class DbProcessRequestStore:
         return state
 
     def save(self, request_state: MaterialRequestState, ultimo_mensaje_id: int | None) -> MaterialRequestState:
+        if request_state.oportunidad_id in self._staged:
+            return self._save_staged(request_state, ultimo_mensaje_id)
         row = self._get_row(request_state.oportunidad_id)
         now = datetime.now(UTC)
         payload = self._state_to_payload(request_state)
@@ -163,6 +258,22 @@ class DbProcessRequestStore:
         # No hace commit — el caller lo hace
         return request_state
 
+    def _save_staged(self, request_state: MaterialRequestState, ultimo_mensaje_id: int | None) -> MaterialRequestState:
+        oportunidad_id = request_state.oportunidad_id
+        previous = self._staged[oportunidad_id]
+        now = _utc_now_iso()
+        request_state.version = previous.version + 1 if previous else 1
+        request_state.created_at = previous.created_at if previous else now
+        request_state.updated_at = now
+        request_state.ultimo_mensaje_id = ultimo_mensaje_id
+        self._staged[oportunidad_id] = self._copy(request_state)
+        self._staged_dirty.add(oportunidad_id)
+        return request_state
+
+    @staticmethod
+    def _copy(state: MaterialRequestState) -> MaterialRequestState:
+        return MaterialRequestState.from_state_dict(state.to_state_dict(), state.oportunidad_id)
+
     @staticmethod
     def _state_to_payload(state: MaterialRequestState) -> dict[str, Any]:
         d = state.to_state_dict()
@@ -171,6 +171,19 @@ class ConversationAgentV2:
             process_state=old_result.updated_process_state or {},
         )
 
+    def begin_turn(self, ctx: TurnContext) -> None:
+        """Con store en DB precarga la solicitud: `handle` no toca la sesion desde su thread."""
+        if hasattr(self._request_store, "stage"):
+            self._request_store.stage(ctx.oportunidad_id)
+
+    def end_turn(self, ctx: TurnContext, *, persist: bool) -> None:
+        if not hasattr(self._request_store, "stage"):
+            return
+        if persist:
+            self._request_store.flush_staged(ctx.oportunidad_id)
+        else:
+            self._request_store.discard_staged(ctx.oportunidad_id)
+
     # ------------------------------------------------------------------
     # Helpers
     # ------------------------------------------------------------------
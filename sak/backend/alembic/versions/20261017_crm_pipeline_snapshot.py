@@ -0,0 +1,182 @@
+"""add crm pipeline snapshot tables
+
+Revision ID: 20261017_crm_pipeline_snapshot
+Revises: 20261017_search_trgm_indexes
+Create Date: 2026-10-17
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_crm_pipeline_snapshot"
+down_revision: Union[str, Sequence[str], None] = "20261017_search_trgm_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Reglas congeladas a la fecha de la migración (ver app/services/crm_pipeline_snapshot.py)
+PROSPECT = "0-prospect"
+CLOSED_STATES = ("5-ganada", "6-perdida")
+BATCH_SIZE = 1000
+
+oportunidades = sa.table(
+    "crm_oportunidades",
+    sa.column("id", sa.Integer),
+    sa.column("created_at", sa.DateTime),
+    sa.column("estado", sa.String),
+)
+logs_estado = sa.table(
+    "crm_oportunidad_log_estado",
+    sa.column("id", sa.Integer),
+    sa.column("oportunidad_id", sa.Integer),
+    sa.column("fecha_registro", sa.DateTime),
+    sa.column("estado_anterior", sa.String),
+    sa.column("estado_nuevo", sa.String),
+)
+snapshots = sa.table(
+    "crm_pipeline_snapshots",
+    sa.column("oportunidad_id", sa.Integer),
+    sa.column("fecha_creacion", sa.Date),
+    sa.column("fecha_ingreso_pipeline", sa.Date),
+    sa.column("fecha_cierre", sa.Date),
+    sa.column("estado_cierre", sa.String),
+    sa.column("actualizado_at", sa.DateTime(timezone=True)),
+)
+intervalos = sa.table(
+    "crm_pipeline_estado_intervalos",
+    sa.column("oportunidad_id", sa.Integer),
+    sa.column("estado", sa.String),
+    sa.column("desde", sa.Date),
+    sa.column("hasta", sa.Date),
+)
+
+
+def _pipeline_rows(oportunidad_id, created_at, estado, logs, now):
+    """Fila de snapshot e intervalos de estado de una oportunidad (logs: fecha, anterior, nuevo)."""
+    ordered = sorted(logs, key=lambda log: log[0] or datetime.min)
+    fecha_cierre = estado_cierre = None
+    for fecha, _, nuevo in ordered:
+        if nuevo in CLOSED_STATES:
+            fecha_cierre = fecha.date() if fecha else None
+            estado_cierre = nuevo
+            break
+
+    fecha_ingreso = None
+    for fecha, _, nuevo in ordered:
+        if nuevo != PROSPECT and fecha:
+            fecha_ingreso = fecha.date()
+            break
+    if fecha_ingreso is None and estado != PROSPECT:
+        fecha_ingreso = created_at.date()
+
+    rows = []
+    running, hasta = estado, None
+    for fecha, anterior, _ in sorted(logs, key=lambda log: log[0] or datetime.min, reverse=True):
+        if fecha is None:
+            break
+        desde = fecha.date()
+        if hasta is None or desde < hasta:
+            rows.append({"oportunidad_id": oportunidad_id, "estado": running or "", "desde": desde, "hasta": hasta})
+        hasta = desde
+        running = anterior or running
+    rows.append({"oportunidad_id": oportunidad_id, "estado": running or "", "desde": None, "hasta": hasta})
+
+    snapshot = {
+        "oportunidad_id": oportunidad_id,
+        "fecha_creacion": created_at.date(),
+        "fecha_ingreso_pipeline": fecha_ingreso,
+        "fecha_cierre": fecha_cierre,
+        "estado_cierre": estado_cierre,
+        "actualizado_at": now,
+    }
+    return snapshot, rows
+
+
+def _backfill(connection) -> None:
+    logs_by_opp = {}
+    for oportunidad_id, fecha, anterior, nuevo in connection.execute(
+        sa.select(
+            logs_estado.c.oportunidad_id,
+            logs_estado.c.fecha_registro,
+            logs_estado.c.estado_anterior,
+            logs_estado.c.estado_nuevo,
+        ).order_by(logs_estado.c.oportunidad_id, logs_estado.c.id)
+    ):
+        logs_by_opp.setdefault(oportunidad_id, []).append((fecha, anterior, nuevo))
+
+    now = datetime.now(timezone.utc)
+    snapshot_rows, interval_rows = [], []
+    for oportunidad_id, created_at, estado in connection.execute(
+        sa.select(oportunidades.c.id, oportunidades.c.created_at, oportunidades.c.estado).order_by(oportunidades.c.id)
+    ):
+        if created_at is None:
+            continue
+        snapshot, rows = _pipeline_rows(oportunidad_id, created_at, estado, logs_by_opp.get(oportunidad_id, []), now)
+        snapshot_rows.append(snapshot)
+        interval_rows.extend(rows)
+
+    for start in range(0, len(snapshot_rows), BATCH_SIZE):
+        connection.execute(snapshots.insert(), snapshot_rows[start:start + BATCH_SIZE])
+    for start in range(0, len(interval_rows), BATCH_SIZE):
+        connection.execute(intervalos.insert(), interval_rows[start:start + BATCH_SIZE])
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "crm_pipeline_snapshots",
+        sa.Column(
+            "oportunidad_id",
+            sa.Integer(),
+            sa.ForeignKey("crm_oportunidades.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("fecha_creacion", sa.Date(), nullable=False),
+        sa.Column("fecha_ingreso_pipeline", sa.Date(), nullable=True),
+        sa.Column("fecha_cierre", sa.Date(), nullable=True),
+        sa.Column("estado_cierre", sa.String(length=20), nullable=True),
+        sa.Column("actualizado_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_crm_pipeline_snapshots_fecha_creacion", "crm_pipeline_snapshots", ["fecha_creacion"])
+    op.create_index(
+        "ix_crm_pipeline_snapshots_fecha_ingreso_pipeline", "crm_pipeline_snapshots", ["fecha_ingreso_pipeline"]
+    )
+    op.create_index("ix_crm_pipeline_snapshots_fecha_cierre", "crm_pipeline_snapshots", ["fecha_cierre"])
+
+    op.create_table(
+        "crm_pipeline_estado_intervalos",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "oportunidad_id",
+            sa.Integer(),
+            sa.ForeignKey("crm_oportunidades.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("estado", sa.String(length=20), nullable=False),
+        sa.Column("desde", sa.Date(), nullable=True),
+        sa.Column("hasta", sa.Date(), nullable=True),
+    )
+    op.create_index("ix_crm_pipeline_estado_intervalos_estado", "crm_pipeline_estado_intervalos", ["estado"])
+    op.create_index(
+        "ix_crm_pipeline_estado_intervalos_rango",
+        "crm_pipeline_estado_intervalos",
+        ["oportunidad_id", "desde", "hasta"],
+    )
+
+    # Backfill desde los logs de estado existentes
+    _backfill(op.get_bind())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_crm_pipeline_estado_intervalos_rango", table_name="crm_pipeline_estado_intervalos")
+    op.drop_index("ix_crm_pipeline_estado_intervalos_estado", table_name="crm_pipeline_estado_intervalos")
+    op.drop_table("crm_pipeline_estado_intervalos")
+    op.drop_index("ix_crm_pipeline_snapshots_fecha_cierre", table_name="crm_pipeline_snapshots")
+    op.drop_index("ix_crm_pipeline_snapshots_fecha_ingreso_pipeline", table_name="crm_pipeline_snapshots")
+    op.drop_index("ix_crm_pipeline_snapshots_fecha_creacion", table_name="crm_pipeline_snapshots")
+    op.drop_table("crm_pipeline_snapshots")
@@ -0,0 +1,169 @@
+"""add propiedades_vacancia_intervalos
+
+Revision ID: 20261017_propiedades_vacancia_intervalos
+Revises: 20261017_crm_pipeline_snapshot
+Create Date: 2026-10-17
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_propiedades_vacancia_intervalos"
+down_revision: Union[str, Sequence[str], None] = "20261017_crm_pipeline_snapshot"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Reglas congeladas a la fecha de la migración (ver app/services/propiedad_vacancia_service.py)
+VACANT_ORDERS = frozenset({1, 2, 3})
+TERMINAL_ORDERS = frozenset({4, 5})
+SIN_ORDEN = 999
+BATCH_SIZE = 1000
+
+propiedades = sa.table(
+    "propiedades",
+    sa.column("id", sa.Integer),
+    sa.column("propiedad_status_id", sa.Integer),
+    sa.column("vacancia_fecha", sa.Date),
+)
+propiedades_status = sa.table(
+    "propiedades_status",
+    sa.column("id", sa.Integer),
+    sa.column("orden", sa.Integer),
+)
+propiedades_log_status = sa.table(
+    "propiedades_log_status",
+    sa.column("id", sa.Integer),
+    sa.column("propiedad_id", sa.Integer),
+    sa.column("estado_nuevo_id", sa.Integer),
+    sa.column("fecha_cambio", sa.DateTime),
+)
+vacancia_intervalos = sa.table(
+    "propiedades_vacancia_intervalos",
+    sa.column("propiedad_id", sa.Integer),
+    sa.column("estado_orden", sa.Integer),
+    sa.column("desde", sa.Date),
+    sa.column("hasta", sa.Date),
+    sa.column("es_inicio_ciclo", sa.Boolean),
+    sa.column("es_fin_ciclo", sa.Boolean),
+)
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _vacancia_rows(propiedad_id, current_order, vacancia_fecha, logs):
+    """Sub-intervalos de vacancia a partir de los logs (fecha, orden_nuevo) ordenados por fecha."""
+    rows = []
+    state = {"start": None, "orden": None, "inicio": False}
+
+    def _append(hasta, es_fin_ciclo):
+        rows.append(
+            {
+                "propiedad_id": propiedad_id,
+                "estado_orden": state["orden"],
+                "desde": state["start"],
+                "hasta": hasta,
+                "es_inicio_ciclo": state["inicio"],
+                "es_fin_ciclo": es_fin_ciclo,
+            }
+        )
+
+    for fecha, new_order in logs:
+        if new_order in VACANT_ORDERS:
+            if state["start"] is not None:
+                _append(fecha, False)
+                state["inicio"] = False
+            else:
+                state["inicio"] = True
+            state["start"], state["orden"] = fecha, new_order
+        elif new_order in TERMINAL_ORDERS and state["start"] is not None:
+            _append(fecha, True)
+            state.update(start=None, orden=None, inicio=False)
+
+    if state["start"] is not None:
+        _append(None, False)
+    elif current_order in VACANT_ORDERS and vacancia_fecha:
+        # Vacante sin log de entrada: el ciclo arranca en vacancia_fecha
+        state.update(start=vacancia_fecha, orden=current_order, inicio=True)
+        _append(None, False)
+    return rows
+
+
+def _backfill(connection) -> None:
+    order_by_status = dict(connection.execute(sa.select(propiedades_status.c.id, propiedades_status.c.orden)).all())
+    logs_by_prop = {}
+    for propiedad_id, fecha_cambio, estado_nuevo_id in connection.execute(
+        sa.select(
+            propiedades_log_status.c.propiedad_id,
+            propiedades_log_status.c.fecha_cambio,
+            propiedades_log_status.c.estado_nuevo_id,
+        ).order_by(
+            propiedades_log_status.c.propiedad_id,
+            propiedades_log_status.c.fecha_cambio,
+            propiedades_log_status.c.id,
+        )
+    ):
+        logs_by_prop.setdefault(propiedad_id, []).append(
+            (_as_date(fecha_cambio), order_by_status.get(estado_nuevo_id, SIN_ORDEN))
+        )
+
+    rows = []
+    for propiedad_id, status_id, vacancia_fecha in connection.execute(
+        sa.select(propiedades.c.id, propiedades.c.propiedad_status_id, propiedades.c.vacancia_fecha)
+        .order_by(propiedades.c.id)
+    ):
+        rows.extend(
+            _vacancia_rows(
+                propiedad_id,
+                order_by_status.get(status_id, SIN_ORDEN),
+                _as_date(vacancia_fecha),
+                logs_by_prop.get(propiedad_id, []),
+            )
+        )
+    for start in range(0, len(rows), BATCH_SIZE):
+        connection.execute(vacancia_intervalos.insert(), rows[start:start + BATCH_SIZE])
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "propiedades_vacancia_intervalos",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "propiedad_id",
+            sa.Integer(),
+            sa.ForeignKey("propiedades.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("estado_orden", sa.Integer(), nullable=False),
+        sa.Column("desde", sa.Date(), nullable=False),
+        sa.Column("hasta", sa.Date(), nullable=True),
+        sa.Column("es_inicio_ciclo", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("es_fin_ciclo", sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+    op.create_index(
+        "ix_propiedades_vacancia_intervalos_propiedad_id",
+        "propiedades_vacancia_intervalos",
+        ["propiedad_id"],
+    )
+    op.create_index(
+        "ix_propiedades_vacancia_intervalos_rango",
+        "propiedades_vacancia_intervalos",
+        ["desde", "hasta"],
+    )
+
+    # Backfill desde el historial de PropiedadesLogStatus
+    _backfill(op.get_bind())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_propiedades_vacancia_intervalos_rango", table_name="propiedades_vacancia_intervalos")
+    op.drop_index("ix_propiedades_vacancia_intervalos_propiedad_id", table_name="propiedades_vacancia_intervalos")
+    op.drop_table("propiedades_vacancia_intervalos")
@@ -0,0 +1,47 @@
+"""add pg_trgm search indexes for generic q filter
+
+Revision ID: 20261017_search_trgm_indexes
+Revises: 20260502_add_descripcion_proy_presupuesto
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_search_trgm_indexes"
+down_revision: Union[str, Sequence[str], None] = "20260502_add_descripcion_proy_presupuesto"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Tablas con búsqueda `q` frecuente y sus columnas de texto buscables a la fecha de
+# esta migración (congeladas: no dependen de los __searchable_fields__ actuales)
+SEARCH_INDEXES = {
+    "crm_contactos": ["nombre_completo", "email"],
+    "crm_mensajes": ["asunto", "contenido"],
+    "po_orders": ["titulo", "comentario"],
+    "articulos": ["nombre", "sku", "marca"],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, columns in SEARCH_INDEXES.items():
+        for column in columns:
+            op.execute(
+                f'CREATE INDEX IF NOT EXISTS "ix_{table}_{column}_trgm" ON "{table}" USING gin ("{column}" gin_trgm_ops)'
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for table, columns in SEARCH_INDEXES.items():
+        for column in columns:
+            op.execute(f'DROP INDEX IF EXISTS "ix_{table}_{column}_trgm"')
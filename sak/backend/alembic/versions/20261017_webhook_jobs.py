@@ -0,0 +1,48 @@
+"""add webhook_jobs queue table
+
+Revision ID: 20261017_webhook_jobs
+Revises: 20261017_propiedades_vacancia_intervalos
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_webhook_jobs"
+down_revision: Union[str, Sequence[str], None] = "20261017_propiedades_vacancia_intervalos"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "webhook_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(), nullable=True),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("evento", sa.String(length=100), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("origen_externo_id", sa.String(length=255), nullable=True),
+        sa.Column("estado", sa.String(length=20), nullable=False),
+        sa.Column("intentos", sa.Integer(), nullable=False),
+        sa.Column("disponible_en", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("bloqueado_en", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("worker_id", sa.String(length=100), nullable=True),
+        sa.Column("ultimo_error", sa.Text(), nullable=True),
+    )
+    op.create_index("ix_webhook_jobs_estado_disponible", "webhook_jobs", ["estado", "disponible_en"])
+    op.create_index("ix_webhook_jobs_origen_externo_id", "webhook_jobs", ["origen_externo_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_webhook_jobs_origen_externo_id", table_name="webhook_jobs")
+    op.drop_index("ix_webhook_jobs_estado_disponible", table_name="webhook_jobs")
+    op.drop_table("webhook_jobs")
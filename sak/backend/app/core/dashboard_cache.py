@@ -0,0 +1,453 @@
+"""
+Cache de respuestas de los dashboards (`/api/dashboard/*`).
+
+Los bundles de dashboard se recalculan completos en cada cambio de tab aunque los
+datos no hayan cambiado. Este middleware guarda la respuesta JSON de cada GET con
+clave = path + parámetros normalizados (y el usuario en dashboards por usuario), y la
+invalida cuando se commitea una escritura sobre las tablas de las que depende el
+dashboard (listeners `after_flush` / `after_commit` de Session; los update()/delete()
+en bloque y los `text()` de escritura se registran con `do_orm_execute`).
+
+Cada respuesta lleva un ETag; si el cliente manda `If-None-Match` con el mismo valor
+se responde 304 sin body. `Cache-Control: no-cache` en el request fuerza el recálculo;
+una respuesta con `Cache-Control: no-store` (ej. un bundle parcial) no se guarda.
+Con réplica de lectura configurada solo se guardan respuestas calculadas contra el
+primario (requests sticky, ver app/core/db_routing.py); las de la réplica se sirven
+pero no se guardan.
+
+Backends:
+    - En proceso (default): LRU con TTL por entrada.
+    - Redis (o compatible) si `DASHBOARD_CACHE_URL` está definida y el paquete
+      `redis` está instalado. La invalidación usa contadores de generación por
+      namespace, así se comparte entre procesos.
+
+Métricas (hits, misses, 304, invalidaciones) por namespace en `/metrics/dashboard-cache`.
+
+Configuración (variables de entorno):
+    DASHBOARD_CACHE_ENABLED       "0" desactiva el cache (default "1").
+    DASHBOARD_CACHE_TTL_SECONDS   vida máxima de una entrada (default 60).
+    DASHBOARD_CACHE_MAX_ENTRIES   tamaño del LRU en proceso (default 512).
+    DASHBOARD_CACHE_URL           URL de Redis; sin ella se usa el LRU en proceso.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Protocol, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+from app import db
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis es opcional
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED: bool = os.getenv("DASHBOARD_CACHE_ENABLED", "1") == "1"
+CACHE_TTL_SECONDS: float = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES: int = int(os.getenv("DASHBOARD_CACHE_MAX_ENTRIES", "512"))
+CACHE_URL: str = os.getenv("DASHBOARD_CACHE_URL", "")
+
+# Prefijo de ruta -> (namespace, por_usuario)
+DASHBOARD_ROUTES: Dict[str, Tuple[str, bool]] = {
+    "/api/dashboard/crm": ("crm", False),
+    "/api/dashboard/po": ("po", False),
+    "/api/dashboard/propiedades": ("propiedades", False),
+    "/api/dashboard/proyectos": ("proyectos", False),
+    "/api/dashboard/home": ("home", True),
+}
+
+# Tablas de las que depende cada dashboard: un commit que las escribe invalida el namespace
+DASHBOARD_DEPENDENCIES: Dict[str, frozenset] = {
+    "crm": frozenset({
+        "crm_oportunidades", "crm_oportunidad_log_estado", "crm_mensajes", "crm_eventos",
+        "crm_contactos", "crm_tipos_operacion", "propiedades", "propiedades_status", "users",
+    }),
+    "po": frozenset({"po_orders", "po_order_details", "po_order_status", "po_order_status_log", "users"}),
+    "propiedades": frozenset({
+        "propiedades", "propiedades_log_status", "propiedades_status", "contratos", "settings",
+        "crm_tipos_operacion",
+    }),
+    "proyectos": frozenset({
+        "proyectos", "proyecto_avance", "proy_presupuestos", "proy_fases", "po_orders",
+        "po_order_details", "po_order_status", "tipos_solicitud", "crm_eventos", "crm_mensajes",
+    }),
+    "home": frozenset({
+        "po_orders", "po_order_status", "crm_oportunidades", "crm_eventos", "crm_mensajes",
+        "contratos", "propiedades", "propiedades_status", "settings", "users",
+    }),
+}
+
+# Parámetros que son conjuntos de ids/valores: el orden no cambia el resultado
+_SET_PARAMS = frozenset({"tipoOperacion", "tipoPropiedad", "responsable", "emprendimiento"})
+_WRITTEN_TABLES_KEY = "dashboard_cache_written_tables"
+# Tabla escrita por un `text()` de escritura (UPDATE / INSERT INTO / DELETE FROM)
+_TEXT_WRITE_TABLE = re.compile(r'^\s*(?:update|insert\s+into|delete\s+from)\s+"?(\w+)', re.IGNORECASE)
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Optional[bytes]: ...
+
+    def set(self, key: str, value: bytes, ttl: float) -> None: ...
+
+    def generation(self, namespace: str) -> int: ...
+
+    def bump(self, namespace: str) -> int: ...
+
+    def clear(self) -> None: ...
+
+
+class InMemoryLRUBackend:
+    """LRU en proceso con TTL por entrada; las generaciones por namespace no expiran."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generation(self, namespace: str) -> int:
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def bump(self, namespace: str) -> int:
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            return self._generations[namespace]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    """Backend compartido entre procesos; las entradas expiran con el TTL de Redis."""
+
+    def __init__(self, url: str, prefix: str = "dashcache:"):
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def generation(self, namespace: str) -> int:
+        return int(self.client.get(f"{self.prefix}gen:{namespace}") or 0)
+
+    def bump(self, namespace: str) -> int:
+        return int(self.client.incr(f"{self.prefix}gen:{namespace}"))
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=f"{self.prefix}*"):
+            self.client.delete(key)
+
+
+def _create_backend() -> CacheBackend:
+    if CACHE_URL:
+        if redis is None:
+            logger.warning("DASHBOARD_CACHE_URL definida pero el paquete redis no está instalado; uso LRU en proceso")
+        else:
+            return RedisBackend(CACHE_URL)
+    return InMemoryLRUBackend()
+
+
+class DashboardCacheMetrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Counter] = {}
+
+    def incr(self, namespace: str, name: str) -> None:
+        with self._lock:
+            self._counters.setdefault(namespace, Counter())[name] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            result = {}
+            for namespace, counter in self._counters.items():
+                lookups = counter["hits"] + counter["misses"]
+                result[namespace] = {
+                    "hits": counter["hits"],
+                    "misses": counter["misses"],
+                    "not_modified": counter["not_modified"],
+                    "stores": counter["stores"],
+                    "invalidations": counter["invalidations"],
+                    "hit_rate": round(counter["hits"] / lookups, 3) if lookups else 0.0,
+                }
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+_backend: CacheBackend = _create_backend()
+metrics = DashboardCacheMetrics()
+
+
+def set_backend(backend: CacheBackend) -> None:
+    """Reemplaza el backend (tests o un stand-in de Redis local)."""
+    global _backend
+    _backend = backend
+
+
+def get_backend() -> CacheBackend:
+    return _backend
+
+
+def normalize_params(query_string: str) -> str:
+    """Query string canónica: sin vacíos, ordenada, y con los filtros-conjunto ordenados."""
+    params: List[Tuple[str, str]] = []
+    for name, value in parse_qsl(query_string, keep_blank_values=False):
+        value = ",".join(part.strip() for part in value.split(",") if part.strip())
+        if not value:
+            continue
+        if name in _SET_PARAMS:
+            value = ",".join(sorted(set(value.split(","))))
+        params.append((name, value))
+    return urlencode(sorted(params))
+
+
+def _route_for(path: str) -> Optional[Tuple[str, bool]]:
+    for prefix, route in DASHBOARD_ROUTES.items():
+        if path == prefix or path.startswith(prefix + "/"):
+            return route
+    return None
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope.get("headers") or []:
+        if key == name:
+            return value
+    return None
+
+
+def build_cache_key(namespace: str, path: str, query_string: str, user_key: Optional[str] = None) -> str:
+    generation = _backend.generation(namespace)
+    parts = [namespace, str(generation), path, normalize_params(query_string)]
+    if user_key:
+        parts.append(user_key)
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def make_etag(body: bytes) -> str:
+    return f'W/"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+
+def _pack(etag: str, content_type: bytes, body: bytes) -> bytes:
+    return etag.encode() + b"\n" + content_type + b"\n" + body
+
+
+def _unpack(value: bytes) -> Tuple[str, bytes, bytes]:
+    etag, content_type, body = value.split(b"\n", 2)
+    return etag.decode(), content_type, body
+
+
+def _etag_matches(if_none_match: Optional[bytes], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip() for candidate in if_none_match.decode("latin-1").split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def invalidate(namespaces: Iterable[str]) -> None:
+    for namespace in set(namespaces):
+        _backend.bump(namespace)
+        metrics.incr(namespace, "invalidations")
+
+
+def invalidate_tables(tables: Iterable[str]) -> None:
+    """Invalida los dashboards que dependen de alguna de las tablas escritas."""
+    written = set(tables)
+    invalidate(ns for ns, deps in DASHBOARD_DEPENDENCIES.items() if deps & written)
+
+
+def clear_dashboard_cache() -> None:
+    _backend.clear()
+    for namespace in DASHBOARD_DEPENDENCIES:
+        _backend.bump(namespace)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_written_tables(session: Session, flush_context) -> None:
+    tables = {
+        obj.__table__.name
+        for obj in chain(session.new, session.dirty, session.deleted)
+        if getattr(obj, "__table__", None) is not None
+    }
+    if tables:
+        session.info.setdefault(_WRITTEN_TABLES_KEY, set()).update(tables)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_statement_writes(orm_execute_state) -> None:
+    # update()/delete()/insert() en bloque y SQL crudo no pasan por el flush
+    statement = orm_execute_state.statement
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        table = getattr(statement, "table", None)
+        mapper = orm_execute_state.bind_mapper
+        if getattr(table, "name", None) is None and mapper is not None:
+            table = mapper.local_table
+        name = getattr(table, "name", None)
+    elif isinstance(statement, TextClause):
+        match = _TEXT_WRITE_TABLE.match(statement.text)
+        name = match.group(1).lower() if match else None
+    else:
+        return
+    if name:
+        orm_execute_state.session.info.setdefault(_WRITTEN_TABLES_KEY, set()).add(name)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    tables = session.info.pop(_WRITTEN_TABLES_KEY, None)
+    if tables:
+        invalidate_tables(tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written_tables(session: Session) -> None:
+    session.info.pop(_WRITTEN_TABLES_KEY, None)
+
+
+def _computed_on_primary() -> bool:
+    # Un body leído de la réplica puede ser anterior a la escritura que subió la
+    # generación: guardarlo serviría datos viejos incluso a clientes sticky (read-after-write)
+    return db.replica_engine is None or db.use_primary_for_reads.get()
+
+
+def _is_no_store(headers) -> bool:
+    return any(k.lower() == b"cache-control" and b"no-store" in v.lower() for k, v in headers)
+
+
+class DashboardCacheMiddleware:
+    """Middleware ASGI: sirve GET de dashboards desde cache, con ETag / 304."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") != "GET" or not CACHE_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        route = _route_for(scope.get("path", ""))
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        namespace, per_user = route
+        user_key = None
+        if per_user:
+            authorization = _header(scope, b"authorization")
+            if not authorization:
+                await self.app(scope, receive, send)
+                return
+            user_key = hashlib.sha1(authorization).hexdigest()
+
+        query_string = scope.get("query_string", b"").decode("latin-1")
+        key = build_cache_key(namespace, scope["path"], query_string, user_key)
+        if_none_match = _header(scope, b"if-none-match")
+        bypass = b"no-cache" in (_header(scope, b"cache-control") or b"")
+
+        cached = None if bypass else _backend.get(key)
+        if cached is not None:
+            metrics.incr(namespace, "hits")
+            etag, content_type, body = _unpack(cached)
+            await self._send_cached(send, etag, content_type, body, _etag_matches(if_none_match, etag), namespace)
+            return
+        metrics.incr(namespace, "misses")
+
+        start_message = None
+        passthrough = False
+        chunks: List[bytes] = []
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                # Errores y respuestas marcadas no cacheables (ej. bundle con secciones stale) pasan sin guardarse
+                passthrough = message["status"] != 200 or _is_no_store(message.get("headers", []))
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or start_message is None or passthrough:
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body"):
+                return
+
+            body = b"".join(chunks)
+            etag = make_etag(body)
+            headers = [(k, v) for k, v in start_message.get("headers", []) if k.lower() != b"etag"]
+            content_type = next((v for k, v in headers if k.lower() == b"content-type"), b"application/json")
+            if _computed_on_primary():
+                _backend.set(key, _pack(etag, content_type, body), CACHE_TTL_SECONDS)
+                metrics.incr(namespace, "stores")
+
+            if _etag_matches(if_none_match, etag):
+                metrics.incr(namespace, "not_modified")
+                await send({"type": "http.response.start", "status": 304, "headers": self._cache_headers(etag, b"MISS")})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+            headers += [(b"content-length", str(len(body)).encode())] + self._cache_headers(etag, b"MISS")
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _cache_headers(etag: str, status: bytes) -> List[Tuple[bytes, bytes]]:
+        return [
+            (b"etag", etag.encode()),
+            (b"cache-control", b"private, no-cache"),
+            (b"x-dashboard-cache", status),
+        ]
+
+    async def _send_cached(self, send, etag: str, content_type: bytes, body: bytes, not_modified: bool, namespace: str):
+        if not_modified:
+            metrics.incr(namespace, "not_modified")
+            await send({"type": "http.response.start", "status": 304, "headers": self._cache_headers(etag, b"HIT")})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers = [
+            (b"content-type", content_type),
+            (b"content-length", str(len(body)).encode()),
+            *self._cache_headers(etag, b"HIT"),
+        ]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,95 @@
+"""
+Ruteo de lecturas a la réplica con "stickiness" después de escrituras.
+
+`get_read_session` (app/db.py) usa la réplica (`DATABASE_REPLICA_URL`) salvo que el
+request actual esté marcado para leer del primario. Este middleware hace la marca:
+cuando un cliente completa una escritura (POST/PUT/PATCH/DELETE con status < 400),
+sus GET de los próximos `DB_REPLICA_STICKY_SECONDS` van al primario, así no ve datos
+viejos por el lag de replicación (read-after-write).
+
+El cliente se identifica por el header Authorization (hasheado) o, si no hay, por la
+IP. El registro es en memoria por proceso: con varios workers la stickiness es
+best-effort y conviene un lag de réplica menor a la ventana.
+
+Configuración (variables de entorno):
+    DATABASE_REPLICA_URL        URL de la réplica; sin ella todo va al primario.
+    DB_REPLICA_STICKY_SECONDS   ventana de lecturas al primario tras escribir (default 5).
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from app import db
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+STICKY_SECONDS: float = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+_MAX_TRACKED_CLIENTS = 10_000
+
+_last_writes: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def _client_key(scope) -> str:
+    for name, value in scope.get("headers") or []:
+        if name == b"authorization" and value:
+            return hashlib.sha1(value).hexdigest()
+    client = scope.get("client")
+    return client[0] if client else "anonymous"
+
+
+def mark_write(key: str, now: Optional[float] = None) -> None:
+    now = time.monotonic() if now is None else now
+    with _lock:
+        _last_writes[key] = now + STICKY_SECONDS
+        if len(_last_writes) > _MAX_TRACKED_CLIENTS:
+            for stale in [k for k, until in _last_writes.items() if until <= now]:
+                del _last_writes[stale]
+
+
+def is_sticky(key: str, now: Optional[float] = None) -> bool:
+    now = time.monotonic() if now is None else now
+    with _lock:
+        until = _last_writes.get(key)
+    return until is not None and until > now
+
+
+def reset_stickiness() -> None:
+    with _lock:
+        _last_writes.clear()
+
+
+class ReadReplicaRoutingMiddleware:
+    """Middleware ASGI: marca escrituras por cliente y decide primario/réplica para lecturas."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or db.replica_engine is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = _client_key(scope)
+        if scope.get("method") in SAFE_METHODS:
+            token = db.use_primary_for_reads.set(is_sticky(key))
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                db.use_primary_for_reads.reset(token)
+            return
+
+        async def send_wrapper(message):
+            # Marcar antes de que el cliente reciba la respuesta: su próximo GET ya es sticky
+            if message["type"] == "http.response.start" and message.get("status", 500) < 400:
+                mark_write(key)
+            await send(message)
+
+        token = db.use_primary_for_reads.set(True)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            db.use_primary_for_reads.reset(token)
@@ -1,14 +1,26 @@
 ﻿from __future__ import annotations
+import base64
 import json
 import inspect
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from enum import Enum
 from importlib import import_module
 from typing import Any, Dict, Generic, Optional, Sequence, Type, TypeVar, Union, Tuple, List, get_args, get_origin
 from datetime import UTC, datetime, date
 from decimal import Decimal
 from sqlmodel import SQLModel, Session, select, func, and_, or_
+from sqlalchemy import text, tuple_
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import selectinload, joinedload
 from sqlalchemy.inspection import inspect as sqlalchemy_inspect
-from app.models.base import campos_editables
+from app.models.base import campos_editables, get_serializer
+from app.core.search import RELEVANCE_SORT, TextSearchMatch, TextSearchRank
+
+logger = logging.getLogger(__name__)
 
 M = TypeVar("M", bound=SQLModel)
 
@@ -33,6 +45,292 @@ class FilterOperator:
     STARTSWITH = "startswith"  # empieza con (case insensitive)
 
 
+class CountMode:
+    """Modos de conteo del total en listados"""
+    EXACT = "exact"        # SELECT count(*) sobre la query filtrada
+    ESTIMATE = "estimate"  # estimación del planner / pg_class.reltuples (Postgres)
+    NONE = "none"          # sin conteo: se pide limit+1 para saber si hay más
+
+
+# Por debajo de este valor estimado se hace el conteo exacto
+ESTIMATE_EXACT_THRESHOLD = 1000
+
+
+@dataclass(frozen=True)
+class LoaderPlan:
+    """Opciones de carga (selectinload) precalculadas para un modelo + include."""
+    model: Type[SQLModel]
+    relations: Tuple[str, ...]
+    options: Tuple[Any, ...]
+
+
+_LOADER_PLANS: Dict[Tuple[Type[SQLModel], Tuple[str, ...], bool], LoaderPlan] = {}
+_LOADER_PLANS_LOCK = threading.Lock()
+
+
+def _normalize_include(include: Optional[str]) -> Tuple[str, ...]:
+    if not include:
+        return ()
+    paths: List[str] = []
+    for rel in include.split(","):
+        rel = rel.strip()
+        if rel and rel not in paths:
+            paths.append(rel)
+    return tuple(paths)
+
+
+def describe_loader_plans() -> Dict[str, Dict[str, List[str]]]:
+    """
+    Relaciones que carga cada modelo según los planes ya calculados:
+    {"PoOrder": {"": ["proveedor", ...], "detalles.articulo": [...]}}
+    """
+    described: Dict[str, Dict[str, List[str]]] = {}
+    for (model, include_paths, auto), plan in list(_LOADER_PLANS.items()):
+        key = ",".join(include_paths) if auto else f"noauto:{','.join(include_paths)}"
+        described.setdefault(model.__name__, {})[key] = list(plan.relations)
+    return described
+
+
+def clear_loader_plans() -> None:
+    """Descarta los planes cacheados (p. ej. tras cambiar metadata de modelos en tests)."""
+    with _LOADER_PLANS_LOCK:
+        _LOADER_PLANS.clear()
+    with _AGG_NEEDS_LOCK:
+        _AGG_NEEDS.clear()
+
+
+@dataclass(frozen=True)
+class FieldProjection:
+    """Campos pedidos con `fields=`: columnas SQL, relaciones y claves de salida."""
+    columns: Tuple[str, ...]
+    relations: Tuple[str, ...]
+    keys: Tuple[str, ...]
+    entities: bool  # True si hace falta cargar entidades (relaciones o calculados)
+
+
+def _resolve_model_ref(model_ref: Any):
+    if isinstance(model_ref, str):
+        module = import_module("app.models")
+        resolved = getattr(module, model_ref, None)
+        if resolved is None:
+            raise ValueError(f"Model '{model_ref}' not found in app.models")
+        return resolved
+    return model_ref
+
+
+@dataclass(frozen=True)
+class AggNeed:
+    """Un campo de `__agg_calculated__` ya resuelto (op + columna origen)."""
+    model: Type[SQLModel]
+    target_field: str
+    op: str
+    source_model: Type[SQLModel]
+    fk_field: str
+    src_field: str
+
+    @property
+    def label(self) -> str:
+        return f"{self.model.__name__}__{self.target_field}"
+
+    @property
+    def default(self) -> Any:
+        return Decimal("0") if self.op == "sum" else 0 if self.op == "count" else None
+
+
+_AGG_NEEDS: Dict[Type[SQLModel], Tuple[AggNeed, ...]] = {}
+_AGG_NEEDS_LOCK = threading.Lock()
+
+
+def agg_needs(model: Type[SQLModel]) -> Tuple[AggNeed, ...]:
+    """Needs de `__agg_calculated__` de un modelo, resueltos una vez y cacheados."""
+    needs = _AGG_NEEDS.get(model)
+    if needs is not None:
+        return needs
+    resolved: List[AggNeed] = []
+    for target_field, cfg in (getattr(model, "__agg_calculated__", None) or {}).items():
+        if not isinstance(cfg, dict):
+            continue
+        op_name = str(cfg.get("op", "sum")).lower()
+        source_ref, fk_field, src_field = cfg.get("source"), cfg.get("fk"), cfg.get("field")
+        if op_name not in AGG_FUNCS or not source_ref or not fk_field or not src_field:
+            continue
+        try:
+            source_model = _resolve_model_ref(source_ref)
+        except Exception as e:
+            logger.warning("Could not resolve model for calculated field %s: %s", target_field, e)
+            continue
+        if getattr(source_model, fk_field, None) is None or getattr(source_model, src_field, None) is None:
+            continue
+        resolved.append(AggNeed(model, target_field, op_name, source_model, fk_field, src_field))
+    needs = tuple(resolved)
+    with _AGG_NEEDS_LOCK:
+        _AGG_NEEDS[model] = needs
+    return needs
+
+
+def agg_subquery(need: AggNeed, outer_model: Type[SQLModel]):
+    """Agregado como subquery escalar correlacionada con `outer_model.id` (modo SQL)."""
+    source_model = need.source_model
+    stmt = select(AGG_FUNCS[need.op](getattr(source_model, need.src_field))).where(
+        getattr(source_model, need.fk_field) == outer_model.id
+    )
+    if hasattr(source_model, "deleted_at"):
+        stmt = stmt.where(getattr(source_model, "deleted_at").is_(None))
+    expr = stmt.correlate(outer_model).scalar_subquery()
+    if need.op in ("sum", "count"):
+        expr = func.coalesce(expr, 0)
+    return expr
+
+
+def _collect_response_graph(objs: Sequence[SQLModel]) -> Dict[Type[SQLModel], List[SQLModel]]:
+    """Agrupa por modelo las raíces y los items ya cargados de sus `__expanded_list_relations__`."""
+    by_model: Dict[Type[SQLModel], List[SQLModel]] = {}
+    seen: set[int] = set()
+    pending = list(objs)
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or not hasattr(obj, "model_fields"):
+            continue
+        seen.add(id(obj))
+        by_model.setdefault(type(obj), []).append(obj)
+        for rel_name in getattr(type(obj), "__expanded_list_relations__", None) or ():
+            rel_value = obj.__dict__.get(rel_name)
+            if isinstance(rel_value, list):
+                pending.extend(rel_value)
+    return by_model
+
+
+def populate_agg_calculated(
+    session: Session,
+    objs: Sequence[SQLModel],
+    *,
+    expand: bool = True,
+    skip: Tuple[Type[SQLModel], ...] = (),
+) -> int:
+    """
+    Calcula los `__agg_calculated__` de todo el grafo de respuesta.
+
+    Junta los needs de las raíces y (con `expand`) de sus relaciones expandidas y los
+    agrupa por (modelo origen, fk): cada grupo es una sola query GROUP BY con todos los
+    agregados como columnas. Los modelos en `skip` ya traen sus valores de la query
+    principal (modo SQL). Devuelve la cantidad de queries emitidas.
+    """
+    by_model = _collect_response_graph(objs) if expand else {type(objs[0]): list(objs)} if objs else {}
+
+    # (source_model, fk) -> needs y objetos que los reciben
+    groups: Dict[Tuple[Type[SQLModel], str], Dict[str, Any]] = {}
+    for model, items in by_model.items():
+        needs = agg_needs(model) if model not in skip else ()
+        if not needs:
+            continue
+        ids = {obj.id for obj in items if getattr(obj, "id", None) is not None}
+        if not ids:
+            continue
+        for need in needs:
+            group = groups.setdefault(
+                (need.source_model, need.fk_field), {"needs": {}, "ids": set(), "targets": []}
+            )
+            group["needs"].setdefault(need.label, need)
+            group["ids"] |= ids
+            group["targets"].append((need, items))
+
+    for (source_model, fk_field), group in groups.items():
+        fk_col = getattr(source_model, fk_field)
+        columns = []
+        for label, need in group["needs"].items():
+            agg_expr = AGG_FUNCS[need.op](getattr(source_model, need.src_field))
+            if need.op in ("sum", "count"):
+                agg_expr = func.coalesce(agg_expr, 0)
+            columns.append(agg_expr.label(label))
+
+        stmt = select(fk_col.label("fk"), *columns).where(fk_col.in_(group["ids"]))
+        if hasattr(source_model, "deleted_at"):
+            stmt = stmt.where(getattr(source_model, "deleted_at").is_(None))
+        stmt = stmt.group_by(fk_col)
+        rows = {row["fk"]: row for row in session.execute(stmt).mappings()}
+
+        for need, items in group["targets"]:
+            for obj in items:
+                row = rows.get(getattr(obj, "id", None))
+                value = row[need.label] if row is not None else need.default
+                try:
+                    setattr(obj, need.target_field, value)
+                except Exception:
+                    object.__setattr__(obj, need.target_field, value)
+    return len(groups)
+
+
+class BulkStatus:
+    """Estados por item de las operaciones bulk"""
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    ERROR = "error"
+    ROLLED_BACK = "rolled_back"  # el item era válido pero el lote se revirtió
+
+
+# Tamaño máximo de lote aceptado por las operaciones bulk
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "1000"))
+
+
+@dataclass
+class BulkItemResult:
+    """Resultado de un item dentro de una operación bulk."""
+    index: int
+    id: Any = None
+    status: str = BulkStatus.ERROR
+    obj: Any = None
+    error: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class BulkResult:
+    """Resultado de una operación bulk: items en el orden recibido y si se confirmó."""
+    items: List[BulkItemResult]
+    committed: bool
+    error: Optional[Dict[str, Any]] = None  # error del lote sin item asignable (p. ej. constraint al flush)
+
+    @property
+    def failed(self) -> List[BulkItemResult]:
+        return [item for item in self.items if item.status == BulkStatus.ERROR]
+
+
+def _bulk_error(code: str, message: str, details: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {"code": code, "message": message, "details": details or {}}
+
+
+def _is_unique_violation(exc: DBAPIError) -> bool:
+    orig = exc.orig
+    sqlstate = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    return sqlstate == "23505" or "UNIQUE constraint failed" in str(orig)
+
+
+def _error_from_db_exception(exc: DBAPIError) -> Dict[str, Any]:
+    """Error estructurado de un rechazo de la DB; unique → CONFLICT (409 en el router)."""
+    code = "CONFLICT" if _is_unique_violation(exc) else "VALIDATION_ERROR"
+    return _bulk_error(code, str(exc.orig).strip(), {"db_error": type(exc.orig).__name__})
+
+
+def _error_from_exception(exc: Exception) -> Dict[str, Any]:
+    """Normaliza excepciones (incluidas HTTPException del lock optimista) al formato de error."""
+    if isinstance(exc, DBAPIError):
+        return _error_from_db_exception(exc)
+    detail = getattr(exc, "detail", None)
+    if isinstance(detail, dict):
+        detail = detail.get("error", detail)
+        if "code" in detail:
+            return _bulk_error(detail["code"], str(detail.get("message", "")), detail.get("details"))
+    return _bulk_error("VALIDATION_ERROR", str(detail or exc))
+
+
+def _call_supported(method, *args, **kwargs):
+    """Llama a un override pasando solo los kwargs que su firma acepta."""
+    params = inspect.signature(method).parameters
+    if not any(p.kind is inspect.Parameter.VAR_KEYWORD for p in params.values()):
+        kwargs = {k: v for k, v in kwargs.items() if k in params}
+    return method(*args, **kwargs)
+
+
 class GenericCRUD(Generic[M]):
     def __init__(self, model: Type[M]):
         self.model: Type[M] = model
@@ -185,92 +483,58 @@ class GenericCRUD(Generic[M]):
         return cleaned
 
     def _resolve_model(self, model_ref: Any):
-        if isinstance(model_ref, str):
-            module = import_module("app.models")
-            resolved = getattr(module, model_ref, None)
-            if resolved is None:
-                raise ValueError(f"Model '{model_ref}' not found in app.models")
-            return resolved
-        return model_ref
+        return _resolve_model_ref(model_ref)
 
     def _populate_calculated(self, session: Session, objs: Sequence[M]) -> None:
-        agg_config = getattr(self.model, "__agg_calculated__", None)
-        if not agg_config or not objs:
-            return
-
-        ids = [getattr(obj, "id", None) for obj in objs]
-        ids = [obj_id for obj_id in ids if obj_id is not None]
-        if not ids:
-            return
-
-        for target_field, cfg in agg_config.items():
-            if not isinstance(cfg, dict):
-                continue
-
-            op_name = str(cfg.get("op", "sum")).lower()
-            agg_fn = AGG_FUNCS.get(op_name)
-            if not agg_fn:
-                continue
+        """Agregados `__agg_calculated__` solo de los objetos dados (sin relaciones)."""
+        if objs:
+            populate_agg_calculated(session, objs, expand=False)
 
-            source_ref = cfg.get("source")
-            fk_field = cfg.get("fk")
-            src_field = cfg.get("field")
-            if not source_ref or not fk_field or not src_field:
-                continue
-
-            try:
-                source_model = self._resolve_model(source_ref)
-            except Exception as e:
-                print(f"WARNING: Could not resolve model for calculated field {target_field}: {e}")
-                continue
-
-            fk_col = getattr(source_model, fk_field, None)
-            src_col = getattr(source_model, src_field, None)
-            if fk_col is None or src_col is None:
-                continue
-
-            agg_expr = agg_fn(src_col)
-            if op_name in ("sum", "count"):
-                agg_expr = func.coalesce(agg_expr, 0)
-
-            stmt = select(fk_col, agg_expr).where(fk_col.in_(ids))
-            if hasattr(source_model, "deleted_at"):
-                stmt = stmt.where(getattr(source_model, "deleted_at").is_(None))
-            stmt = stmt.group_by(fk_col)
-
-            totals = dict(session.exec(stmt).all())
-            default_value = Decimal("0") if op_name == "sum" else 0 if op_name == "count" else None
-
-            for obj in objs:
-                obj_id = getattr(obj, "id", None)
-                value = totals.get(obj_id, default_value)
+    def _populate_calculated_relations(self, session: Session, objs: Sequence[M]) -> None:
+        """Agregados de los items de las relaciones expandidas, en un solo pase."""
+        related = [
+            item
+            for obj in objs
+            for rel_name in getattr(type(obj), "__expanded_list_relations__", None) or ()
+            if isinstance(obj.__dict__.get(rel_name), list)
+            for item in obj.__dict__[rel_name]
+        ]
+        if related:
+            populate_agg_calculated(session, related)
+
+    def _populate_calculated_graph(self, session: Session, objs: Sequence[M], *, sql_aggs: bool = False) -> None:
+        """Raíces + relaciones expandidas: a lo sumo una query por (tabla origen, fk)."""
+        if objs:
+            populate_agg_calculated(session, objs, skip=(self.model,) if sql_aggs else ())
+
+    def _agg_sql_columns(self) -> Dict[str, Any]:
+        """
+        Con `__agg_calculated_sql__ = True` en el modelo, los `__agg_calculated__` se
+        resuelven como subqueries escalares dentro del SELECT principal, de modo que
+        se pueden usar en `sort_by` y en filtros (`campo__gte`, `campo__lt`, ...).
+        """
+        if not getattr(self.model, "__agg_calculated_sql__", False):
+            return {}
+        return {need.target_field: agg_subquery(need, self.model) for need in agg_needs(self.model)}
+
+    def _exec_entities(self, session: Session, stmt) -> Tuple[List[M], bool]:
+        """Ejecuta un select de entidades agregando las columnas de agregados en modo SQL."""
+        agg_columns = self._agg_sql_columns()
+        if not agg_columns:
+            return list(session.exec(stmt).all()), False
+        stmt = stmt.add_columns(*(expr.label(name) for name, expr in agg_columns.items()))
+        items: List[M] = []
+        # session.execute: el SelectOfScalar de SQLModel devolvería solo la entidad
+        for row in session.execute(stmt).all():
+            obj = row[0]
+            for name in agg_columns:
+                value = row._mapping[name]
                 try:
-                    setattr(obj, target_field, value)
+                    setattr(obj, name, value)
                 except Exception:
-                    object.__setattr__(obj, target_field, value)
-
-    def _collect_related_list_items(self, objs: Sequence[M]) -> Dict[Type[SQLModel], List[SQLModel]]:
-        related: Dict[Type[SQLModel], List[SQLModel]] = {}
-        for obj in objs:
-            rel_names = getattr(type(obj), "__expanded_list_relations__", set())
-            if not rel_names:
-                continue
-            for rel_name in rel_names:
-                if rel_name not in obj.__dict__:
-                    continue
-                rel_value = obj.__dict__[rel_name]
-                if not isinstance(rel_value, list) or not rel_value:
-                    continue
-                first = rel_value[0]
-                if not hasattr(first, "model_fields"):
-                    continue
-                related.setdefault(type(first), []).extend(rel_value)
-        return related
-
-    def _populate_calculated_relations(self, session: Session, objs: Sequence[M]) -> None:
-        related = self._collect_related_list_items(objs)
-        for model_cls, items in related.items():
-            GenericCRUD(model_cls)._populate_calculated(session, items)
+                    object.__setattr__(obj, name, value)
+            items.append(obj)
+        return items, True
 
     def _extract_update(self, data: Dict[str, Any]) -> Dict[str, Any]:
         allowed = campos_editables(self.model)
@@ -284,6 +548,7 @@ class GenericCRUD(Generic[M]):
 
     def _apply_filters(self, stmt, filters: Dict[str, Any]):
         """Aplica filtros al statement SQL"""
+        agg_columns = self._agg_sql_columns()
         for field_name, filter_value in filters.items():
             if field_name == "q":
                 # BÃºsqueda de texto en campos searchable
@@ -302,11 +567,13 @@ class GenericCRUD(Generic[M]):
                 actual_field_name = parts[0]
                 operator_suffix = parts[1].lower() if len(parts) > 1 else None
 
-            # Verificar que el campo exista en el modelo
-            if not hasattr(self.model, actual_field_name):
+            # Verificar que el campo exista en el modelo (o sea un agregado en modo SQL)
+            if actual_field_name in agg_columns:
+                column = agg_columns[actual_field_name]
+            elif hasattr(self.model, actual_field_name):
+                column = getattr(self.model, actual_field_name)
+            else:
                 continue
-                
-            column = getattr(self.model, actual_field_name)
 
             if operator_suffix:
                 coerced_value = (
@@ -352,29 +619,29 @@ class GenericCRUD(Generic[M]):
             parts = field_path.split('.')
             current_model = self.model
             
-            print(f"DEBUG: Aplicando filtro anidado {field_path} = {filter_value}")
-            print(f"DEBUG: Partes: {parts}")
-            print(f"DEBUG: Modelo inicial: {current_model.__name__}")
+            logger.debug("Aplicando filtro anidado %s = %s", field_path, filter_value)
+            logger.debug("Partes: %s", parts)
+            logger.debug("Modelo inicial: %s", current_model.__name__)
             
             # Navegar a travÃ©s de todas las relaciones excepto la Ãºltima parte
             for i, relation_name in enumerate(parts[:-1]):
-                print(f"DEBUG: Procesando relaciÃ³n {i+1}/{len(parts)-1}: {relation_name}")
+                logger.debug("Procesando relaciÃ³n %s/%s: %s", i+1, len(parts)-1, relation_name)
                 if hasattr(current_model, relation_name):
                     relation = getattr(current_model, relation_name)
                     related_model = relation.property.mapper.class_
-                    print(f"DEBUG: Join {current_model.__name__} -> {related_model.__name__}")
+                    logger.debug("Join %s -> %s", current_model.__name__, related_model.__name__)
                     
                     # Realizar el join
                     stmt = stmt.join(related_model)
                     # Actualizar el modelo actual
                     current_model = related_model
                 else:
-                    print(f"ERROR: RelaciÃ³n {relation_name} no encontrada en {current_model.__name__}")
+                    logger.error("RelaciÃ³n %s no encontrada en %s", relation_name, current_model.__name__)
                     return stmt
             
             # Aplicar filtro en el campo final
             field_name = parts[-1]
-            print(f"DEBUG: Aplicando filtro final en campo {field_name} del modelo {current_model.__name__}")
+            logger.debug("Aplicando filtro final en campo %s del modelo %s", field_name, current_model.__name__)
             
             if hasattr(current_model, field_name):
                 final_column = getattr(current_model, field_name)
@@ -382,38 +649,34 @@ class GenericCRUD(Generic[M]):
                     for operator, value in filter_value.items():
                         coerced_value = self._coerce_operator_value(final_column, value)
                         stmt = self._apply_operator_filter(stmt, final_column, operator, coerced_value)
-                        print(f"DEBUG: Filtro operador aplicado: {field_name} {operator} {coerced_value}")
+                        logger.debug("Filtro operador aplicado: %s %s %s", field_name, operator, coerced_value)
                 elif isinstance(filter_value, list):
                     coerced = [self._coerce_column_value(final_column, value) for value in filter_value]
                     stmt = stmt.where(final_column.in_(coerced))
-                    print(f"DEBUG: Filtro IN aplicado: {field_name} IN {coerced}")
+                    logger.debug("Filtro IN aplicado: %s IN %s", field_name, coerced)
                 else:
                     coerced_value = self._coerce_column_value(final_column, filter_value)
                     stmt = stmt.where(final_column == coerced_value)
-                    print(f"DEBUG: Filtro igualdad aplicado: {field_name} = {coerced_value}")
+                    logger.debug("Filtro igualdad aplicado: %s = %s", field_name, coerced_value)
             else:
-                print(f"ERROR: Campo {field_name} no encontrado en {current_model.__name__}")
+                logger.error("Campo %s no encontrado en %s", field_name, current_model.__name__)
                 
         except Exception as e:
-            print(f"ERROR: No se pudo aplicar filtro anidado {field_path}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("No se pudo aplicar filtro anidado %s: %s", field_path, e)
         return stmt
 
     def _apply_text_search(self, stmt, search_text: str):
-        """Aplica bÃºsqueda de texto en campos searchable"""
-        conditions = []
-        for field_name in self.searchable_fields:
-            if hasattr(self.model, field_name):
-                column = getattr(self.model, field_name)
-                try:
-                    conditions.append(column.ilike(f"%{search_text}%"))
-                except:
-                    conditions.append(column.like(f"%{search_text}%"))
-        
-        if conditions:
-            stmt = stmt.where(or_(*conditions))
-        return stmt
+        """Búsqueda de texto en campos searchable (backend según dialecto, ver app.core.search)"""
+        if not self.searchable_fields or search_text in (None, ""):
+            return stmt
+        return stmt.where(TextSearchMatch(self.model, str(search_text)))
+
+    def _apply_relevance_order(self, stmt, search_text: Optional[str], sort_dir: str = "desc"):
+        """`sort=relevance`: ordena por ranking de búsqueda (o por id si no hay `q`)."""
+        if search_text and self.searchable_fields:
+            rank = TextSearchRank(self.model, str(search_text))
+            stmt = stmt.order_by(rank.asc() if sort_dir.lower() == "asc" else rank.desc())
+        return stmt.order_by(self.model.id.asc())
 
     def _apply_operator_filter(self, stmt, column, operator: str, value):
         """Aplica un operador especÃ­fico a una columna"""
@@ -509,21 +772,16 @@ class GenericCRUD(Generic[M]):
         include: Optional[str] = None,
     ) -> Optional[M]:
         """Get by ID con soporte para soft delete"""
-        print(f"DEBUG: GenericCRUD.get called for {self.model.__name__} with id {obj_id}")
+        logger.debug("GenericCRUD.get called for %s with id %s", self.model.__name__, obj_id)
         stmt = select(self.model).where(self.model.id == obj_id)
         stmt = self._apply_soft_delete_filter(stmt, deleted)
         
-        # Apply auto-includes (including nested relationships)
-        stmt = self._apply_auto_includes(stmt)
+        # Auto-includes + includes del query param (plan de carga cacheado)
+        stmt = self._apply_loader_plan(stmt, include)
 
-        # Apply includes from query param (supports nested relations)
-        if include:
-            stmt = self._apply_include(stmt, include)
-        
         obj = session.exec(stmt).first()
         if obj:
-            self._populate_calculated(session, [obj])
-            self._populate_calculated_relations(session, [obj])
+            self._populate_calculated_graph(session, [obj])
         return obj
 
     def list(
@@ -538,59 +796,298 @@ class GenericCRUD(Generic[M]):
         deleted: str = "exclude",
         fields: Optional[str] = None,
         include: Optional[str] = None,
-    ) -> Tuple[Sequence[M], int]:
+        count: str = CountMode.EXACT,
+    ) -> Tuple[Sequence[M], Optional[int]]:
         """
-        List con paginaciÃ³n y filtros
+        List con paginación y filtros
         Returns: (items, total_count)
+
+        Según `count` (ver CountMode) el total es exacto, estimado o, en modo
+        "none", una cota inferior: offset + items (+1 si hay más páginas).
         """
         try:
-            # Base query
-            stmt = select(self.model)
-            
-            # Apply auto-includes (including nested relationships)
-            stmt = self._apply_auto_includes(stmt)
-            
-            # Aplicar joins para relaciones incluidas (soporta anidado)
-            if include:
-                stmt = self._apply_include(stmt, include)
-            
-            # Aplicar filtros
-            if filters:
-                stmt = self._apply_filters(stmt, filters)
-            
-            # Aplicar soft delete
-            stmt = self._apply_soft_delete_filter(stmt, deleted)
-            
-            # Contar total (antes de paginaciÃ³n)
-            count_stmt = select(func.count()).select_from(stmt.subquery())
-            print(f"DEBUG: Executing count query for {self.model.__name__}")
-            print(f"DEBUG: Count statement: {count_stmt}")
-            total = session.exec(count_stmt).one()
-            print(f"DEBUG: Count result: {total}")
-            
+            has_filters = bool(filters)
+            projection = self.parse_fields(fields)
+            if projection is not None and not projection.entities:
+                # Proyección pura: solo las columnas pedidas, sin hidratar objetos ORM
+                stmt = self._build_list_query(filters=filters, deleted=deleted, columns=projection.columns)
+            elif projection is not None:
+                # Se pidió una relación o un calculado: cargar entidades solo con esas relaciones
+                relations = ",".join(projection.relations + _normalize_include(include))
+                stmt = self._build_list_query(filters=filters, deleted=deleted, include=relations, auto=False)
+            else:
+                stmt = self._build_list_query(filters=filters, deleted=deleted, include=include)
+
+            # Contar total (antes de paginación)
+            total: Optional[int] = None
+            if count != CountMode.NONE:
+                total = self._count_total(session, stmt, count, has_filters=has_filters, deleted=deleted)
+
             # Aplicar ordenamiento
-            if hasattr(self.model, sort_by):
-                order_column = getattr(self.model, sort_by)
-                if sort_dir.lower() == "desc":
-                    stmt = stmt.order_by(order_column.desc())
-                else:
-                    stmt = stmt.order_by(order_column.asc())
-            
-            # Aplicar paginaciÃ³n
+            if sort_by == RELEVANCE_SORT:
+                stmt = self._apply_relevance_order(stmt, (filters or {}).get("q"), sort_dir)
+            else:
+                stmt = self._apply_list_order(stmt, sort_by, sort_dir)
+
+            # Aplicar paginación (en modo "none" se pide una fila extra para saber si hay más)
             offset = (page - 1) * per_page
-            stmt = stmt.offset(offset).limit(per_page)
-            
-            items = session.exec(stmt).all()
-            if items:
-                self._populate_calculated(session, list(items))
-                self._populate_calculated_relations(session, list(items))
+            limit = per_page + 1 if count == CountMode.NONE else per_page
+            stmt = stmt.offset(offset).limit(limit)
+
+            sql_aggs = False
+            if projection is not None and not projection.entities:
+                items = [dict(row) for row in session.execute(stmt).mappings().all()]
+            else:
+                items, sql_aggs = self._exec_entities(session, stmt)
+            if count == CountMode.NONE:
+                has_more = len(items) > per_page
+                items = items[:per_page]
+                total = offset + len(items) + (1 if has_more else 0)
+            if items and (projection is None or projection.entities):
+                self._populate_calculated_graph(session, list(items), sql_aggs=sql_aggs)
             return items, total
         except Exception as e:
-            print(f"ERROR in list() for {self.model.__name__}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error in list() for %s: %s", self.model.__name__, e)
             raise
 
+    def _apply_list_order(self, stmt, sort_by: str, sort_dir: str):
+        """Ordenamiento del listado paginado; los CRUD específicos pueden extenderlo."""
+        agg_columns = self._agg_sql_columns()
+        if sort_by in agg_columns or hasattr(self.model, sort_by):
+            order_column = agg_columns.get(sort_by)
+            if order_column is None:
+                order_column = getattr(self.model, sort_by)
+            if sort_dir.lower() == "desc":
+                stmt = stmt.order_by(order_column.desc())
+            else:
+                stmt = stmt.order_by(order_column.asc())
+        return stmt
+
+    # --- conteo ---
+    def _count_total(self, session: Session, stmt, count: str, *, has_filters: bool, deleted: str) -> int:
+        if count == CountMode.ESTIMATE:
+            estimate = self._estimate_total(session, stmt, has_filters=has_filters, deleted=deleted)
+            # Por debajo del umbral el conteo exacto es barato y más preciso
+            if estimate is not None and estimate >= ESTIMATE_EXACT_THRESHOLD:
+                return estimate
+        count_stmt = select(func.count()).select_from(stmt.subquery())
+        return session.exec(count_stmt).one()
+
+    def _estimate_total(self, session: Session, stmt, *, has_filters: bool, deleted: str) -> Optional[int]:
+        """
+        Estimación de filas en Postgres: pg_class.reltuples si no hay filtros,
+        o las filas estimadas por el planner (EXPLAIN) para la query filtrada.
+        Devuelve None si no es Postgres o no hay estadísticas.
+        """
+        bind = session.get_bind()
+        if bind.dialect.name != "postgresql":
+            return None
+        try:
+            # Savepoint: si la estimación falla en Postgres, la transacción del request
+            # no queda abortada (se revierte solo el savepoint)
+            with session.begin_nested():
+                if not has_filters and deleted != "only":
+                    table_name = sqlalchemy_inspect(self.model).local_table.name
+                    reltuples = session.execute(
+                        text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:name)"),
+                        {"name": table_name},
+                    ).scalar()
+                else:
+                    compiled = stmt.compile(dialect=bind.dialect, compile_kwargs={"render_postcompile": True})
+                    plan = session.connection().exec_driver_sql(
+                        f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+                    ).scalar()
+            if not has_filters and deleted != "only":
+                # reltuples = -1 en tablas nunca analizadas
+                return int(reltuples) if reltuples is not None and reltuples >= 0 else None
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+        except Exception as e:
+            logger.warning("Could not estimate count for %s: %s", self.model.__name__, e)
+            return None
+
+    def _build_list_query(
+        self,
+        *,
+        filters: Optional[Dict[str, Any]] = None,
+        deleted: str = "exclude",
+        include: Optional[str] = None,
+        auto: bool = True,
+        columns: Optional[Sequence[str]] = None,
+    ):
+        """
+        Query base de listados: auto-includes, includes, filtros y soft delete.
+        Con `columns` selecciona solo esas columnas (sin entidades ni relaciones).
+        """
+        if columns:
+            stmt = select(*[getattr(self.model, name).label(name) for name in columns])
+        else:
+            stmt = select(self.model)
+            # Auto-includes + includes dinámicos (plan de carga cacheado, soporta anidado)
+            options = self.loader_plan(include, auto=auto).options
+            if options:
+                stmt = stmt.options(*options)
+
+        # Aplicar filtros
+        if filters:
+            stmt = self._apply_filters(stmt, filters)
+
+        # Aplicar soft delete
+        return self._apply_soft_delete_filter(stmt, deleted)
+
+    # --- proyección de campos (fields=) ---
+    def parse_fields(self, fields: Optional[str]) -> Optional[FieldProjection]:
+        """
+        Interpreta `fields` (CSV). Las columnas visibles en la respuesta se
+        seleccionan directo en SQL; si se pide una relación o un campo calculado
+        se carga la entidad (con solo esas relaciones) y luego se recortan las claves.
+        Devuelve None si no hay campos válidos (listado completo).
+        """
+        requested = _normalize_include(fields)
+        if not requested:
+            return None
+        mapper = sqlalchemy_inspect(self.model)
+        visible = get_serializer(self.model).visible_fields
+        calculated = set(getattr(self.model, "__calculated_fields__", None) or ())
+
+        columns: List[str] = ["id"] if "id" in mapper.columns else []
+        relations: List[str] = []
+        extra: List[str] = []
+        for name in requested:
+            if name in mapper.relationships:
+                relations.append(name)
+            elif name in calculated:
+                extra.append(name)
+            elif name in visible and name in mapper.columns and name not in columns:
+                columns.append(name)
+        if len(columns) <= 1 and not relations and not extra:
+            return None
+        return FieldProjection(
+            columns=tuple(columns),
+            relations=tuple(relations),
+            keys=tuple(columns + relations + extra),
+            entities=bool(relations or extra),
+        )
+
+    # --- keyset (seek) pagination ---
+    def _keyset_sort_column(self, sort_by: str):
+        """Devuelve la columna de orden permitida para keyset (solo columnas del modelo)."""
+        if sort_by not in getattr(self.model, "model_fields", {}):
+            raise ValueError(f"Campo de orden '{sort_by}' no soportado para cursor en {self.model.__name__}")
+        mapper = sqlalchemy_inspect(self.model)
+        if sort_by not in mapper.columns:
+            raise ValueError(f"Campo de orden '{sort_by}' no soportado para cursor en {self.model.__name__}")
+        return getattr(self.model, sort_by), mapper.columns[sort_by]
+
+    @staticmethod
+    def _encode_cursor_value(value: Any) -> Any:
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        if isinstance(value, Enum):
+            return value.value
+        return value
+
+    def encode_cursor(self, sort_by: str, sort_dir: str, obj: M) -> str:
+        """Cursor opaco (base64url) construido desde (columna de orden, id)."""
+        payload = {
+            "s": sort_by,
+            "d": sort_dir,
+            "v": self._encode_cursor_value(getattr(obj, sort_by, None)),
+            "id": getattr(obj, "id", None),
+        }
+        raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    def decode_cursor(self, cursor: str, sort_by: str, sort_dir: str) -> Tuple[Any, Any]:
+        """Decodifica un cursor y valida que corresponda al mismo orden solicitado."""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+            cursor_sort, cursor_dir = payload["s"], payload["d"]
+            value, last_id = payload["v"], payload["id"]
+        except Exception:
+            raise ValueError("Cursor inválido")
+        if cursor_sort != sort_by or cursor_dir != sort_dir:
+            raise ValueError("El cursor no corresponde al orden solicitado")
+        return value, last_id
+
+    def _apply_keyset_predicate(self, stmt, sort_by: str, sort_dir: str, value: Any, last_id: Any):
+        """
+        Agrega el predicado WHERE (col, id) > (v, id) (o < en desc).
+        Para columnas nullable los NULL van siempre al final, igual que en el ORDER BY.
+        """
+        order_attr, column = self._keyset_sort_column(sort_by)
+        id_col = self.model.id
+        desc = sort_dir == "desc"
+        last_id = self._coerce_column_value(sqlalchemy_inspect(self.model).columns["id"], last_id)
+
+        if sort_by == "id":
+            return stmt.where(id_col < last_id if desc else id_col > last_id)
+
+        if not column.nullable:
+            value = self._coerce_column_value(column, value)
+            row = tuple_(order_attr, id_col)
+            return stmt.where(row < (value, last_id) if desc else row > (value, last_id))
+
+        if value is None:
+            return stmt.where(and_(order_attr.is_(None), id_col < last_id if desc else id_col > last_id))
+
+        value = self._coerce_column_value(column, value)
+        if desc:
+            after = or_(order_attr < value, and_(order_attr == value, id_col < last_id))
+        else:
+            after = or_(order_attr > value, and_(order_attr == value, id_col > last_id))
+        return stmt.where(or_(after, order_attr.is_(None)))
+
+    def _apply_keyset_order(self, stmt, sort_by: str, sort_dir: str):
+        order_attr, column = self._keyset_sort_column(sort_by)
+        id_col = self.model.id
+        desc = sort_dir == "desc"
+        order_by = []
+        if sort_by != "id":
+            if column.nullable:
+                order_by.append(order_attr.is_(None).asc())
+            order_by.append(order_attr.desc() if desc else order_attr.asc())
+        order_by.append(id_col.desc() if desc else id_col.asc())
+        return stmt.order_by(*order_by)
+
+    def list_keyset(
+        self,
+        session: Session,
+        *,
+        limit: int = 25,
+        sort_by: str = "id",
+        sort_dir: str = "asc",
+        cursor: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        deleted: str = "exclude",
+        include: Optional[str] = None,
+    ) -> Tuple[Sequence[M], Optional[str], bool]:
+        """
+        Listado con paginación por cursor (keyset/seek) sobre (sort_by, id).
+        Returns: (items, next_cursor, has_more)
+        """
+        sort_dir = "desc" if str(sort_dir).lower() == "desc" else "asc"
+        self._keyset_sort_column(sort_by)
+
+        stmt = self._build_list_query(filters=filters, deleted=deleted, include=include)
+        if cursor:
+            value, last_id = self.decode_cursor(cursor, sort_by, sort_dir)
+            stmt = self._apply_keyset_predicate(stmt, sort_by, sort_dir, value, last_id)
+        stmt = self._apply_keyset_order(stmt, sort_by, sort_dir).limit(limit + 1)
+
+        rows, sql_aggs = self._exec_entities(session, stmt)
+        has_more = len(rows) > limit
+        items = rows[:limit]
+        next_cursor = self.encode_cursor(sort_by, sort_dir, items[-1]) if has_more and items else None
+
+        if items:
+            self._populate_calculated_graph(session, items, sql_aggs=sql_aggs)
+        return items, next_cursor, has_more
+
     def _discover_relations(self, model_class: Type[SQLModel], max_depth: int = 2, current_depth: int = 0) -> Dict[str, Any]:
         """
         Auto-descubre relaciones SQLAlchemy en un modelo
@@ -649,26 +1146,23 @@ class GenericCRUD(Generic[M]):
                                 pass
                         
                 except Exception as e:
-                    print(f"WARNING: Could not process relationship '{relationship_name}' in {model_class.__name__}: {e}")
+                    logger.warning("Could not process relationship '%s' in %s: %s", relationship_name, model_class.__name__, e)
                     continue
                     
         except Exception as e:
-            print(f"ERROR: Could not discover relations for {model_class.__name__}: {e}")
+            logger.error("Could not discover relations for %s: %s", model_class.__name__, e)
             
         return relations
 
-    def _get_auto_include_options(self) -> List[Any]:
+    def _build_auto_include_entries(self) -> List[Tuple[str, Any]]:
         """
-        Obtiene automáticamente las opciones de include para el modelo actual
+        Construye las opciones de auto-include del modelo como pares (ruta, loader).
         Soporta relaciones anidadas usando notación de punto: "oportunidad.contacto"
-        
-        Returns:
-            Lista de selectinload options para usar en la query
         """
         manual_relations = getattr(self.model, "__auto_include_relations__", None)
         if manual_relations is not None:
             # Si existe __auto_include_relations__, usarlo (incluso si está vacío)
-            options = []
+            entries: List[Tuple[str, Any]] = []
             for relation_name in manual_relations:
                 # Soportar relaciones anidadas con notación de punto
                 if '.' in relation_name:
@@ -685,8 +1179,7 @@ class GenericCRUD(Generic[M]):
                                 loader = loader.selectinload(relation_attr)
                             # Obtener el modelo relacionado para el siguiente nivel
                             try:
-                                from sqlalchemy import inspect
-                                mapper = inspect(current_model)
+                                mapper = sqlalchemy_inspect(current_model)
                                 relationship = mapper.relationships.get(part)
                                 if relationship:
                                     current_model = relationship.mapper.class_
@@ -696,24 +1189,24 @@ class GenericCRUD(Generic[M]):
                             break
                     
                     if loader:
-                        options.append(loader)
+                        entries.append((relation_name, loader))
                 elif hasattr(self.model, relation_name):
                     relation_attr = getattr(self.model, relation_name)
-                    options.append(selectinload(relation_attr))
-            print(
-                f"DEBUG: Using manual auto-includes for {self.model.__name__}: {manual_relations}"
-            )
-            return options
+                    entries.append((relation_name, selectinload(relation_attr)))
+            return entries
 
         # Solo hacer auto-discovery si NO existe __auto_include_relations__
         relations = self._discover_relations(self.model, max_depth=2)
-        options = []
-        
-        for relation_name, loader in relations.items():
-            options.append(loader)
-            
-        print(f"DEBUG: Auto-discovered {len(options)} relations for {self.model.__name__}: {list(relations.keys())}")
-        return options
+        return list(relations.items())
+
+    def _get_auto_include_options(self) -> List[Any]:
+        """
+        Obtiene las opciones de include automáticas del modelo actual (desde el plan cacheado)
+
+        Returns:
+            Lista de selectinload options para usar en la query
+        """
+        return list(self.loader_plan().options)
 
     def _build_include_option(self, relation_path: str):
         """Construye un selectinload para una relación (soporta notación anidada)."""
@@ -744,20 +1237,50 @@ class GenericCRUD(Generic[M]):
 
         return None
 
-    def _apply_include(self, stmt, include: str):
-        """Aplica includes dinámicos al statement (soporta notación anidada)."""
-        include_list = [rel.strip() for rel in include.split(",") if rel.strip()]
-        for relation in include_list:
+    # --- plan de carga de relaciones (cacheado por modelo + include) ---
+    def loader_plan(self, include: Optional[str] = None, *, auto: bool = True) -> LoaderPlan:
+        """
+        Devuelve el plan de carga (selectinload) para el modelo y el include pedido.
+        Se calcula una sola vez por (modelo, include, auto) y se reutiliza.
+        """
+        key = (self.model, _normalize_include(include), auto)
+        plan = _LOADER_PLANS.get(key)
+        if plan is None:
+            plan = self._build_loader_plan(key[1], auto)
+            with _LOADER_PLANS_LOCK:
+                plan = _LOADER_PLANS.setdefault(key, plan)
+        return plan
+
+    def _build_loader_plan(self, include_paths: Tuple[str, ...], auto: bool) -> LoaderPlan:
+        entries: List[Tuple[str, Any]] = []
+        if auto and getattr(self.model, "__auto_include_enabled__", True):
+            try:
+                entries.extend(self._build_auto_include_entries())
+            except Exception as e:
+                logger.error("Could not build auto-includes for %s: %s", self.model.__name__, e)
+        for relation in include_paths:
             try:
                 option = self._build_include_option(relation)
-                if option is not None:
-                    stmt = stmt.options(option)
             except Exception as e:
-                print(
-                    f"Warning: Could not load relationship {relation} for {self.model.__name__}: {e}"
-                )
+                logger.warning("Could not load relationship %s for %s: %s", relation, self.model.__name__, e)
                 continue
-        return stmt
+            if option is not None:
+                entries.append((relation, option))
+        return LoaderPlan(
+            model=self.model,
+            relations=tuple(path for path, _ in entries),
+            options=tuple(option for _, option in entries),
+        )
+
+    def _apply_loader_plan(self, stmt, include: Optional[str] = None):
+        """Aplica auto-includes e includes dinámicos en un solo paso usando el plan cacheado."""
+        options = self.loader_plan(include).options
+        return stmt.options(*options) if options else stmt
+
+    def _apply_include(self, stmt, include: str):
+        """Aplica includes dinámicos al statement (soporta notación anidada)."""
+        options = self.loader_plan(include, auto=False).options
+        return stmt.options(*options) if options else stmt
 
     def _get_auto_include(self) -> List[str]:
         """
@@ -768,42 +1291,12 @@ class GenericCRUD(Generic[M]):
         return list(relations.keys())
 
     def _apply_auto_includes(self, stmt):
-        auto_enabled = getattr(self.model, "__auto_include_enabled__", True)
-        print(f"DEBUG: _apply_auto_includes for {self.model.__name__}, __auto_include_enabled__={auto_enabled}")
-        if not auto_enabled:
-            print(f"DEBUG: Auto-includes DISABLED for {self.model.__name__}")
-            return stmt
-
         """
         Aplica automáticamente las relaciones descubiertas al statement SQL
-        
-        Args:
-            stmt: SQLAlchemy statement
-            
-        Returns:
-            Statement con las opciones de include aplicadas
+        (respeta __auto_include_enabled__ y __auto_include_relations__)
         """
-        try:
-            print(f"DEBUG: Auto-discovering includes for model: {self.model.__name__}")
-            
-            # Obtener opciones (respeta __auto_include_relations__ si existe)
-            include_options = self._get_auto_include_options()
-            
-            if include_options:
-                print(f"DEBUG: Applying {len(include_options)} auto-discovered includes")
-                stmt = stmt.options(*include_options)
-            else:
-                print(f"DEBUG: No auto-includes found for {self.model.__name__}")
-                
-            return stmt  # Â¡IMPORTANTE! Agregamos el return que faltaba
-                
-        except Exception as e:
-            print(f"ERROR: Could not apply auto-includes for {self.model.__name__}: {e}")
-            import traceback
-            traceback.print_exc()
-            return stmt  # Retornar stmt original en caso de error
-            
-        return stmt
+        options = self.loader_plan().options
+        return stmt.options(*options) if options else stmt
 
     def update(
         self, 
@@ -885,4 +1378,286 @@ class GenericCRUD(Generic[M]):
         session.commit()
         return True
 
+    # --- Bulk ---
+    def _uses_default(self, method_name: str) -> bool:
+        """True si la subclase no sobrescribe el método (se puede usar el camino batch)."""
+        return getattr(type(self), method_name) is getattr(GenericCRUD, method_name)
 
+    @contextmanager
+    def _bulk_session(self, session: Session):
+        """
+        Sesión para lotes que pasan por overrides con commit propio.
+
+        Se abre una transacción sobre una conexión dedicada y la sesión se une con
+        `create_savepoint`: cada `commit()`/`rollback()` del override solo libera o
+        revierte su SAVEPOINT, y el lote completo se confirma (o no) al final.
+        """
+        connection = session.get_bind().connect()
+        transaction = connection.begin()
+        bulk_session = Session(
+            bind=connection,
+            join_transaction_mode="create_savepoint",
+            expire_on_commit=False,
+        )
+        try:
+            yield bulk_session, transaction
+        finally:
+            bulk_session.close()
+            if transaction.is_active:
+                transaction.rollback()
+            connection.close()
+
+    def _finish_bulk(self, session: Session, results: List[BulkItemResult], success: str) -> BulkResult:
+        """Commit si no hubo errores; si los hubo, rollback y marca el resto como revertido."""
+        if any(item.status == BulkStatus.ERROR for item in results):
+            session.rollback()
+            for item in results:
+                if item.status == success:
+                    item.status = BulkStatus.ROLLED_BACK
+                    item.obj = None
+            return BulkResult(results, committed=False)
+        session.commit()
+        return BulkResult(results, committed=True)
+
+    def _flush_bulk(self, session: Session, results: List[BulkItemResult], success: str) -> Optional[BulkResult]:
+        """
+        Flush del lote. Si la DB lo rechaza (unique, FK, check...) no se puede saber qué
+        fila falló en el executemany: rollback, todos los items quedan revertidos y el
+        error va a nivel lote.
+        """
+        try:
+            session.flush()
+        except DBAPIError as exc:
+            session.rollback()
+            for item in results:
+                if item.status == success:
+                    item.status = BulkStatus.ROLLED_BACK
+                    item.obj = None
+            return BulkResult(results, committed=False, error=_error_from_db_exception(exc))
+        return None
+
+    def _reload_bulk(self, session: Session, results: List[BulkItemResult]) -> None:
+        """Recarga en una sola query los objetos confirmados (evita un refresh por fila)."""
+        ids = [item.id for item in results if item.id is not None]
+        if not ids:
+            return
+        stmt = select(self.model).where(self.model.id.in_(ids))
+        stmt = self._apply_loader_plan(stmt).execution_options(populate_existing=True)
+        by_id = {obj.id: obj for obj in session.exec(stmt).all()}
+        for item in results:
+            item.obj = by_id.get(item.id)
+
+    def _load_bulk_targets(self, session: Session, ids: Sequence[Any]) -> Dict[Any, M]:
+        stmt = select(self.model).where(self.model.id.in_(list(ids)))
+        stmt = self._apply_soft_delete_filter(stmt, "exclude")
+        return {obj.id: obj for obj in session.exec(stmt).all()}
+
+    def _bulk_id(self, value: Any) -> Any:
+        return self._coerce_field_value("id", value)
+
+    def bulk_create(self, session: Session, items: Sequence[Dict[str, Any]]) -> BulkResult:
+        """
+        Crea un lote en una sola transacción.
+
+        Sin override de `create`, los objetos se agregan juntos y un único flush emite
+        INSERT ... VALUES (...), (...) RETURNING id (insertmanyvalues de SQLAlchemy).
+        Con override, cada fila pasa por `create` dentro de la misma transacción.
+        """
+        if not self._uses_default("create"):
+            return self._bulk_create_each(session, items)
+
+        results: List[BulkItemResult] = []
+        objs: List[Tuple[BulkItemResult, M]] = []
+        for index, data in enumerate(items):
+            result = BulkItemResult(index=index)
+            results.append(result)
+            try:
+                obj = self.model(**self._clean_create(data))
+            except Exception as exc:
+                result.error = _error_from_exception(exc)
+                continue
+            result.status = BulkStatus.CREATED
+            objs.append((result, obj))
+
+        if any(item.status == BulkStatus.ERROR for item in results):
+            return self._finish_bulk(session, results, BulkStatus.CREATED)
+
+        session.add_all([obj for _, obj in objs])
+        rejected = self._flush_bulk(session, results, BulkStatus.CREATED)
+        if rejected is not None:
+            return rejected
+        for result, obj in objs:
+            result.id = obj.id
+        bulk = self._finish_bulk(session, results, BulkStatus.CREATED)
+        if bulk.committed:
+            self._reload_bulk(session, results)
+        return bulk
+
+    def _bulk_create_each(self, session: Session, items: Sequence[Dict[str, Any]]) -> BulkResult:
+        results: List[BulkItemResult] = []
+        with self._bulk_session(session) as (bulk_session, transaction):
+            for index, data in enumerate(items):
+                result = BulkItemResult(index=index)
+                results.append(result)
+                try:
+                    obj = self.create(bulk_session, data)
+                    result.id = obj.id
+                    result.status = BulkStatus.CREATED
+                except Exception as exc:
+                    bulk_session.rollback()
+                    result.error = _error_from_exception(exc)
+            bulk = self._finish_bulk_transaction(transaction, results, BulkStatus.CREATED)
+        if bulk.committed:
+            self._reload_bulk(session, results)
+        return bulk
+
+    def bulk_update(
+        self,
+        session: Session,
+        items: Sequence[Dict[str, Any]],
+        check_version: bool = True,
+    ) -> BulkResult:
+        """
+        Actualiza un lote en una sola transacción con lock optimista por fila.
+
+        Cada item debe traer `id`; si trae `version` y no coincide, el item falla con
+        CONFLICT y el lote entero se revierte. Sin override de `update`, los objetos
+        se cargan en una query y los UPDATE salen en un único flush (executemany).
+        """
+        if not self._uses_default("update"):
+            return self._bulk_update_each(session, items, check_version)
+
+        results: List[BulkItemResult] = []
+        pending: List[Tuple[BulkItemResult, Dict[str, Any]]] = []
+        for index, data in enumerate(items):
+            result = BulkItemResult(index=index, id=self._bulk_id(data.get("id")))
+            results.append(result)
+            if result.id is None:
+                result.error = _bulk_error("VALIDATION_ERROR", "Falta el id del item")
+                continue
+            pending.append((result, data))
+
+        targets = self._load_bulk_targets(session, [result.id for result, _ in pending])
+        now = datetime.now(UTC)
+        for result, data in pending:
+            obj = targets.get(result.id)
+            if obj is None:
+                result.error = _bulk_error(
+                    "NOT_FOUND", f"{self.model.__name__} no encontrado", {"id": result.id}
+                )
+                continue
+            if check_version and "version" in data and hasattr(obj, "version") and obj.version != data["version"]:
+                result.error = _bulk_error(
+                    "CONFLICT",
+                    "La versión del recurso ha cambiado",
+                    {"current_version": obj.version, "provided_version": data["version"]},
+                )
+                continue
+            try:
+                for k, v in self._extract_update(data).items():
+                    setattr(obj, k, self._coerce_field_value(k, v))
+            except Exception as exc:
+                result.error = _error_from_exception(exc)
+                continue
+            if hasattr(obj, "updated_at"):
+                setattr(obj, "updated_at", now)
+            if hasattr(obj, "version"):
+                setattr(obj, "version", obj.version + 1)
+            result.status = BulkStatus.UPDATED
+
+        if not any(item.status == BulkStatus.ERROR for item in results):
+            rejected = self._flush_bulk(session, results, BulkStatus.UPDATED)
+            if rejected is not None:
+                return rejected
+        bulk = self._finish_bulk(session, results, BulkStatus.UPDATED)
+        if bulk.committed:
+            self._reload_bulk(session, results)
+        return bulk
+
+    def _bulk_update_each(
+        self,
+        session: Session,
+        items: Sequence[Dict[str, Any]],
+        check_version: bool,
+    ) -> BulkResult:
+        results: List[BulkItemResult] = []
+        with self._bulk_session(session) as (bulk_session, transaction):
+            for index, data in enumerate(items):
+                result = BulkItemResult(index=index, id=self._bulk_id(data.get("id")))
+                results.append(result)
+                try:
+                    obj = _call_supported(
+                        self.update, bulk_session, result.id, data, check_version=check_version
+                    )
+                    if obj is None:
+                        result.error = _bulk_error(
+                            "NOT_FOUND", f"{self.model.__name__} no encontrado", {"id": result.id}
+                        )
+                        continue
+                    result.status = BulkStatus.UPDATED
+                except Exception as exc:
+                    bulk_session.rollback()
+                    result.error = _error_from_exception(exc)
+            bulk = self._finish_bulk_transaction(transaction, results, BulkStatus.UPDATED)
+        if bulk.committed:
+            self._reload_bulk(session, results)
+        return bulk
+
+    def bulk_delete(self, session: Session, ids: Sequence[Any], hard: bool = False) -> BulkResult:
+        """
+        Elimina (lógica o físicamente) un lote en una sola transacción.
+
+        Sin override de `delete`, los objetos se cargan en una query y se resuelven
+        en un único flush; con override, cada id pasa por `delete`.
+        """
+        results = [BulkItemResult(index=index, id=self._bulk_id(obj_id)) for index, obj_id in enumerate(ids)]
+        if not self._uses_default("delete"):
+            with self._bulk_session(session) as (bulk_session, transaction):
+                for result in results:
+                    try:
+                        ok = _call_supported(self.delete, bulk_session, result.id, hard=hard)
+                    except Exception as exc:
+                        bulk_session.rollback()
+                        result.error = _error_from_exception(exc)
+                        continue
+                    if ok:
+                        result.status = BulkStatus.DELETED
+                    else:
+                        result.error = _bulk_error(
+                            "NOT_FOUND", f"{self.model.__name__} no encontrado", {"id": result.id}
+                        )
+                return self._finish_bulk_transaction(transaction, results, BulkStatus.DELETED)
+
+        targets = self._load_bulk_targets(session, [result.id for result in results])
+        now = datetime.now(UTC)
+        for result in results:
+            obj = targets.get(result.id)
+            if obj is None:
+                result.error = _bulk_error(
+                    "NOT_FOUND", f"{self.model.__name__} no encontrado", {"id": result.id}
+                )
+                continue
+            if hard or not hasattr(obj, "deleted_at"):
+                session.delete(obj)
+            else:
+                setattr(obj, "deleted_at", now)
+                if hasattr(obj, "updated_at"):
+                    setattr(obj, "updated_at", now)
+            result.status = BulkStatus.DELETED
+
+        if not any(item.status == BulkStatus.ERROR for item in results):
+            rejected = self._flush_bulk(session, results, BulkStatus.DELETED)
+            if rejected is not None:
+                return rejected
+        return self._finish_bulk(session, results, BulkStatus.DELETED)
+
+    def _finish_bulk_transaction(self, transaction, results: List[BulkItemResult], success: str) -> BulkResult:
+        """Igual que `_finish_bulk` pero sobre la transacción externa de `_bulk_session`."""
+        if any(item.status == BulkStatus.ERROR for item in results):
+            transaction.rollback()
+            for item in results:
+                if item.status == success:
+                    item.status = BulkStatus.ROLLED_BACK
+            return BulkResult(results, committed=False)
+        transaction.commit()
+        return BulkResult(results, committed=True)
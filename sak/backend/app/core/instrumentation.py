@@ -0,0 +1,329 @@
+"""
+Instrumentación de queries por request.
+
+Engancha `before/after_cursor_execute` de SQLAlchemy y acumula, para los requests
+muestreados, cantidad de queries, tiempo total en DB, filas y repeticiones del
+mismo statement (detección de N+1). Los agregados por endpoint se exponen en
+`/metrics/db` y, en dev, como headers `X-DB-Queries` / `X-DB-Time`.
+
+También mide los pools de conexiones (checkouts, espera por conexión, uso de
+overflow, invalidaciones) vía `InstrumentedQueuePool`; se exponen en `/metrics/pool`.
+
+Configuración (variables de entorno):
+    DB_METRICS_SAMPLE_RATE      fracción de requests instrumentados (0..1).
+                                Default: 1 en dev, 0 en otros entornos.
+    DB_METRICS_HEADERS          "1" para devolver headers X-DB-*. Default: solo dev.
+    DB_N_PLUS_ONE_THRESHOLD     repeticiones del mismo statement para marcar N+1 (default 10).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+_ENV = os.getenv("ENV", "dev")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+SAMPLE_RATE: float = min(1.0, max(0.0, _env_float("DB_METRICS_SAMPLE_RATE", 1.0 if _ENV == "dev" else 0.0)))
+EXPOSE_HEADERS: bool = os.getenv("DB_METRICS_HEADERS", "1" if _ENV == "dev" else "0") == "1"
+N_PLUS_ONE_THRESHOLD: int = int(_env_float("DB_N_PLUS_ONE_THRESHOLD", 10))
+
+
+@dataclass
+class RequestQueryStats:
+    """Métricas de DB de un request muestreado."""
+    queries: int = 0
+    db_time: float = 0.0
+    rows: int = 0
+    statements: Counter = field(default_factory=Counter)
+
+    def suspected_n_plus_one(self) -> Optional[tuple[str, int]]:
+        if not self.statements:
+            return None
+        statement, repeats = self.statements.most_common(1)[0]
+        if repeats >= N_PLUS_ONE_THRESHOLD:
+            return statement, repeats
+        return None
+
+
+@dataclass
+class EndpointQueryMetrics:
+    """Agregado por endpoint (método + ruta) de los requests muestreados."""
+    requests: int = 0
+    queries: int = 0
+    max_queries: int = 0
+    db_time: float = 0.0
+    max_db_time: float = 0.0
+    rows: int = 0
+    n_plus_one: int = 0
+    last_n_plus_one: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        requests = self.requests or 1
+        return {
+            "requests": self.requests,
+            "queries": self.queries,
+            "avg_queries": round(self.queries / requests, 2),
+            "max_queries": self.max_queries,
+            "db_time_ms": round(self.db_time * 1000, 2),
+            "avg_db_time_ms": round(self.db_time * 1000 / requests, 2),
+            "max_db_time_ms": round(self.max_db_time * 1000, 2),
+            "rows": self.rows,
+            "n_plus_one": self.n_plus_one,
+            "last_n_plus_one": self.last_n_plus_one,
+        }
+
+
+_current_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("db_query_stats", default=None)
+_endpoint_metrics: Dict[str, EndpointQueryMetrics] = {}
+_metrics_lock = threading.Lock()
+_installed = False
+
+
+def current_stats() -> Optional[RequestQueryStats]:
+    return _current_stats.get()
+
+
+# --- listeners SQLAlchemy ---
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is None:
+        return
+    conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    starts = conn.info.get("_query_start")
+    if not starts:
+        return
+    stats.db_time += time.perf_counter() - starts.pop()
+    stats.queries += 1
+    stats.statements[statement] += 1
+    rowcount = getattr(cursor, "rowcount", -1)
+    if isinstance(rowcount, int) and rowcount > 0:
+        stats.rows += rowcount
+
+
+def install_query_instrumentation() -> None:
+    """Registra los listeners sobre todos los Engine (idempotente)."""
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _installed = True
+
+
+def _record(endpoint: str, stats: RequestQueryStats) -> None:
+    suspected = stats.suspected_n_plus_one()
+    with _metrics_lock:
+        metrics = _endpoint_metrics.setdefault(endpoint, EndpointQueryMetrics())
+        metrics.requests += 1
+        metrics.queries += stats.queries
+        metrics.max_queries = max(metrics.max_queries, stats.queries)
+        metrics.db_time += stats.db_time
+        metrics.max_db_time = max(metrics.max_db_time, stats.db_time)
+        metrics.rows += stats.rows
+        if suspected:
+            metrics.n_plus_one += 1
+            metrics.last_n_plus_one = suspected[0][:500]
+    if suspected:
+        logger.warning(
+            "Posible N+1 en %s: statement repetido %s veces (%s queries en total)",
+            endpoint,
+            suspected[1],
+            stats.queries,
+        )
+
+
+def snapshot_metrics() -> Dict[str, Any]:
+    with _metrics_lock:
+        endpoints = {name: metrics.as_dict() for name, metrics in sorted(_endpoint_metrics.items())}
+    return {
+        "sample_rate": SAMPLE_RATE,
+        "n_plus_one_threshold": N_PLUS_ONE_THRESHOLD,
+        "endpoints": endpoints,
+    }
+
+
+def reset_metrics() -> None:
+    with _metrics_lock:
+        _endpoint_metrics.clear()
+
+
+def _endpoint_name(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path", "")
+    return f"{scope.get('method', '')} {path}"
+
+
+class QueryInstrumentationMiddleware:
+    """Middleware ASGI que activa las métricas de DB para una fracción de los requests."""
+
+    def __init__(self, app, sample_rate: Optional[float] = None, expose_headers: Optional[bool] = None):
+        self.app = app
+        self.sample_rate = SAMPLE_RATE if sample_rate is None else sample_rate
+        self.expose_headers = EXPOSE_HEADERS if expose_headers is None else expose_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.sample_rate <= 0 or (
+            self.sample_rate < 1 and random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = _current_stats.set(stats)
+
+        async def send_wrapper(message):
+            if self.expose_headers and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(stats.queries).encode()))
+                headers.append((b"x-db-time", f"{stats.db_time * 1000:.2f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_stats.reset(token)
+            _record(_endpoint_name(scope), stats)
+
+
+# --- métricas de pool ---
+@dataclass
+class PoolMetrics:
+    """Contadores acumulados de un pool (todas las conexiones, no solo muestreadas)."""
+    checkouts: int = 0
+    connects: int = 0
+    invalidations: int = 0
+    timeouts: int = 0
+    overflow_checkouts: int = 0
+    max_overflow_used: int = 0
+    wait_time: float = 0.0
+    max_wait_time: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        checkouts = self.checkouts or 1
+        return {
+            "checkouts": self.checkouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "timeouts": self.timeouts,
+            "overflow_checkouts": self.overflow_checkouts,
+            "max_overflow_used": self.max_overflow_used,
+            "wait_time_ms": round(self.wait_time * 1000, 2),
+            "avg_wait_time_ms": round(self.wait_time * 1000 / checkouts, 3),
+            "max_wait_time_ms": round(self.max_wait_time * 1000, 2),
+        }
+
+
+_pool_metrics: Dict[str, PoolMetrics] = {}
+_pools: Dict[str, Any] = {}
+
+
+class _PoolWaitMixin:
+    """Mide el tiempo que un checkout espera por una conexión libre del pool."""
+    metrics_name = "default"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with _metrics_lock:
+                _pool_metrics.setdefault(self.metrics_name, PoolMetrics()).timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with _metrics_lock:
+                metrics = _pool_metrics.setdefault(self.metrics_name, PoolMetrics())
+                metrics.wait_time += waited
+                metrics.max_wait_time = max(metrics.max_wait_time, waited)
+
+
+class InstrumentedQueuePool(_PoolWaitMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_PoolWaitMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_pool(engine, name: str) -> None:
+    """Registra listeners de pool para `engine` bajo el nombre `name` (primary, replica, async)."""
+    pool = engine.pool
+    if isinstance(pool, _PoolWaitMixin):
+        pool.metrics_name = name
+    _pools[name] = pool
+    with _metrics_lock:
+        _pool_metrics.setdefault(name, PoolMetrics())
+
+    def _metrics() -> PoolMetrics:
+        return _pool_metrics.setdefault(name, PoolMetrics())
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        overflow = pool.overflow() if hasattr(pool, "overflow") else 0
+        with _metrics_lock:
+            metrics = _metrics()
+            metrics.checkouts += 1
+            if overflow > 0:
+                metrics.overflow_checkouts += 1
+                metrics.max_overflow_used = max(metrics.max_overflow_used, overflow)
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_conn, record):
+        with _metrics_lock:
+            _metrics().connects += 1
+
+    @event.listens_for(pool, "invalidate")
+    def _on_invalidate(dbapi_conn, record, exc):
+        with _metrics_lock:
+            _metrics().invalidations += 1
+
+
+def snapshot_pool_metrics() -> Dict[str, Any]:
+    pools: Dict[str, Any] = {}
+    with _metrics_lock:
+        counters = {name: metrics.as_dict() for name, metrics in sorted(_pool_metrics.items())}
+    for name, data in counters.items():
+        pool = _pools.get(name)
+        status: Dict[str, Any] = {"pool_class": type(pool).__name__ if pool is not None else None}
+        if pool is not None and hasattr(pool, "checkedout"):
+            status.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow_in_use=max(0, pool.overflow()),
+            )
+        pools[name] = {**status, **data}
+    return {"pools": pools}
+
+
+def reset_pool_metrics() -> None:
+    with _metrics_lock:
+        for name in list(_pool_metrics):
+            _pool_metrics[name] = PoolMetrics()
@@ -0,0 +1,210 @@
+"""
+Cache en proceso (TTL + LRU) de resoluciones estables del webhook de WhatsApp.
+
+Cada mensaje entrante resuelve celular por meta id, contacto por teléfono, oportunidad
+activa del contacto, usuario default y tipo de contacto "Inmobiliaria"; son mapeos
+que casi nunca cambian. Cada `LookupCache` guarda un snapshot de las columnas de la
+fila (no la instancia, que está ligada a una Session) y la devuelve ligada a la
+Session del caller con `session.merge(..., load=False)`, sin query. Para filas que
+cambian seguido (ej. la oportunidad activa) se cachea solo la PK (`put_id` /
+`get_id`) y el caller relee la fila con `session.get` y revalida su estado.
+
+Invalidación por clave cuando se commitea una escritura ORM del modelo (listeners
+`after_flush` / `after_commit`, igual que app/core/dashboard_cache.py); un UPDATE o
+DELETE en bloque del modelo vacía su cache entero. Las escrituras por SQL crudo o de
+otros procesos no invalidan: el TTL acota esa ventana.
+
+Métricas (hits, misses, invalidaciones) en `/metrics/lookup-cache`.
+
+Configuración (variables de entorno):
+    LOOKUP_CACHE_ENABLED       "0" desactiva el cache (default "1").
+    LOOKUP_CACHE_TTL_SECONDS   vida máxima de una entrada (default 300).
+    LOOKUP_CACHE_MAX_ENTRIES   tamaño del LRU de cada cache (default 4096).
+"""
+from __future__ import annotations
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple, Type
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+LOOKUP_CACHE_ENABLED: bool = os.getenv("LOOKUP_CACHE_ENABLED", "1") == "1"
+LOOKUP_CACHE_TTL_SECONDS: float = float(os.getenv("LOOKUP_CACHE_TTL_SECONDS", "300"))
+LOOKUP_CACHE_MAX_ENTRIES: int = int(os.getenv("LOOKUP_CACHE_MAX_ENTRIES", "4096"))
+
+_PENDING_KEY = "lookup_cache_pending"
+
+# Función que, para una fila escrita, devuelve las claves de cache que quedan inválidas
+KeysFor = Callable[[Any], Iterable[Hashable]]
+
+_registry: List["LookupCache"] = []
+
+
+def attribute_values(obj: Any, attr: str) -> List[Any]:
+    """Valor actual y valores previos (historial del flush) de un atributo."""
+    history = inspect(obj).attrs[attr].history
+    return [value for value in chain(history.unchanged, history.added, history.deleted) if value is not None]
+
+
+class LookupCache:
+    """LRU con TTL de filas de `model` por clave, invalidado por escrituras ORM del modelo."""
+
+    def __init__(
+        self,
+        name: str,
+        model: Type[Any],
+        keys_for: KeysFor,
+        ttl: float = LOOKUP_CACHE_TTL_SECONDS,
+        max_entries: int = LOOKUP_CACHE_MAX_ENTRIES,
+    ) -> None:
+        self.name = name
+        self.model = model
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._keys_for = keys_for
+        self._entries: "OrderedDict[Hashable, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.invalidations = 0
+        _registry.append(self)
+
+    def get(self, session: Session, key: Hashable) -> Optional[Any]:
+        """Instancia ligada a `session` para `key`, o None si no está (o venció)."""
+        values = self._lookup(key)
+        if values is None:
+            return None
+        instance = inspect(self.model).class_manager.new_instance()
+        for attr, value in values.items():
+            set_committed_value(instance, attr, value)
+        make_transient_to_detached(instance)
+        return session.merge(instance, load=False)
+
+    def get_id(self, key: Hashable) -> Optional[Any]:
+        """Solo la PK cacheada para `key` (el caller relee la fila con `session.get`)."""
+        values = self._lookup(key)
+        return None if values is None else values["id"]
+
+    def put(self, key: Hashable, obj: Any) -> None:
+        if obj is None:
+            return
+        self._store(key, {attr.key: getattr(obj, attr.key) for attr in inspect(self.model).column_attrs})
+
+    def put_id(self, key: Hashable, obj_id: Any) -> None:
+        if obj_id is None:
+            return
+        self._store(key, {"id": obj_id})
+
+    def _lookup(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        if not LOOKUP_CACHE_ENABLED:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def _store(self, key: Hashable, values: Dict[str, Any]) -> None:
+        if not LOOKUP_CACHE_ENABLED:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(values))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys: Iterable[Hashable]) -> None:
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def keys_for(self, obj: Any) -> Set[Hashable]:
+        return set(self._keys_for(obj))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def reset_stats(self) -> None:
+        self.hits = self.misses = self.invalidations = 0
+
+
+def snapshot_lookup_caches() -> Dict[str, Any]:
+    return {"enabled": LOOKUP_CACHE_ENABLED, "caches": {cache.name: cache.stats() for cache in _registry}}
+
+
+def clear_lookup_caches() -> None:
+    for cache in _registry:
+        cache.clear()
+        cache.reset_stats()
+
+
+def _pending(session: Session) -> Dict[LookupCache, Optional[Set[Hashable]]]:
+    # cache -> claves a invalidar; None = vaciar el cache completo
+    return session.info.setdefault(_PENDING_KEY, {})
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_written_keys(session: Session, flush_context) -> None:
+    if not _registry:
+        return
+    for obj in chain(session.new, session.dirty, session.deleted):
+        for cache in _registry:
+            if isinstance(obj, cache.model):
+                pending = _pending(session)
+                if cache in pending and pending[cache] is None:
+                    continue
+                pending.setdefault(cache, set()).update(cache.keys_for(obj))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_writes(orm_execute_state) -> None:
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    for cache in _registry:
+        if issubclass(mapper.class_, cache.model):
+            _pending(orm_execute_state.session)[cache] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    for cache, keys in pending.items():
+        if keys is None:
+            cache.clear()
+        else:
+            cache.invalidate(keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written_keys(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
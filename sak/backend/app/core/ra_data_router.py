@@ -5,7 +5,7 @@ from fastapi import APIRouter, Response, Query, Depends, HTTPException
 from sqlmodel import Session
 from typing import Dict, List, Any
 from app.db import get_session
-from app.core.generic_crud import GenericCRUD
+from app.core.generic_crud import CountMode, GenericCRUD
 from app.core.router import create_generic_router
 from app.models.base import filtrar_respuesta
 
@@ -36,6 +36,7 @@ def create_ra_data_router(
         # Parámetros genéricos adicionales
         filter: str = Query(None, description="JSON filters"),
         deleted: str = Query("exclude", regex="^(include|only|exclude)$"),
+        count: str = Query(CountMode.EXACT, regex="^(exact|estimate|none)$"),
     ):
         """Listar con formato ra-data-json-server"""
         try:
@@ -61,6 +62,7 @@ def create_ra_data_router(
                 sort_dir=_order.lower(),
                 filters=filters,
                 deleted=deleted,
+                count=count,
             )
             
             # Aplicar filtrado automático
@@ -68,7 +70,8 @@ def create_ra_data_router(
             
             # Configurar headers ra-data-json-server
             response.headers["X-Total-Count"] = str(total)
-            response.headers["Access-Control-Expose-Headers"] = "X-Total-Count"
+            response.headers["X-Count-Mode"] = count
+            response.headers["Access-Control-Expose-Headers"] = "X-Total-Count, X-Count-Mode"
             
             # Devolver array directo (formato ra-data)
             return items_filtered
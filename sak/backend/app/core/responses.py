@@ -1,6 +1,21 @@
+import json
+from datetime import date, time
+from decimal import Decimal
+from enum import Enum
 from typing import Any, Dict, Generic, List, Optional, TypeVar
+from uuid import UUID
+
+from fastapi.encoders import decimal_encoder
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+    ORJSON_AVAILABLE = False
+
 T = TypeVar('T')
 
 class DataResponse(BaseModel, Generic[T]):
@@ -33,3 +48,36 @@ class ErrorCodes:
     CONFLICT = "CONFLICT"
     PAYLOAD_TOO_LARGE = "PAYLOAD_TOO_LARGE"
     UNSUPPORTED_MEDIA_TYPE = "UNSUPPORTED_MEDIA_TYPE"
+
+
+def _json_default(value: Any) -> Any:
+    """Tipos no nativos de JSON, codificados igual que jsonable_encoder de FastAPI."""
+    if isinstance(value, Decimal):
+        return decimal_encoder(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Respuesta JSON para payloads ya filtrados (dicts de filtrar_respuesta).
+    Serializa directo a bytes (orjson si está instalado) sin pasar por jsonable_encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if ORJSON_AVAILABLE:
+            return orjson.dumps(content, default=_json_default)
+        return json.dumps(
+            content,
+            default=_json_default,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
@@ -2,10 +2,10 @@ import json
 from typing import Dict, List, Type, Optional, Any
 from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, Request
 from sqlmodel import SQLModel, Session
-from app.db import get_session
-from app.core.generic_crud import FilterOperator, GenericCRUD
-from app.core.responses import DataResponse, ListResponse, DeleteResponse, ErrorResponse, ErrorCodes
-from app.models.base import filtrar_respuesta
+from app.db import get_read_session, get_session
+from app.core.generic_crud import BULK_MAX_ITEMS, BulkResult, CountMode, FilterOperator, GenericCRUD
+from app.core.responses import DataResponse, ListResponse, DeleteResponse, ErrorResponse, ErrorCodes, FastJSONResponse
+from app.models.base import filtrar_respuesta, normalize_payload_datetimes
 
 FILTER_OPERATOR_KEYS = {
     FilterOperator.EQ,
@@ -54,6 +54,77 @@ def flatten_nested_filters(nested_dict: Dict[str, Any], prefix: str = "") -> Dic
     
     return flat_dict
 
+
+def _bulk_items(payload: Any, key: str) -> List[Any]:
+    """Acepta una lista directa o un objeto {key: [...]} y valida el tamaño del lote."""
+    items = payload.get(key) if isinstance(payload, dict) else payload
+    if not isinstance(items, list):
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": {
+                    "code": ErrorCodes.VALIDATION_ERROR,
+                    "message": f"Se esperaba una lista o un objeto con '{key}'",
+                    "details": {},
+                }
+            },
+        )
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail={
+                "error": {
+                    "code": ErrorCodes.PAYLOAD_TOO_LARGE,
+                    "message": f"El lote supera el máximo de {BULK_MAX_ITEMS} items",
+                    "details": {"items": len(items), "max_items": BULK_MAX_ITEMS},
+                }
+            },
+        )
+    return items
+
+
+def _bulk_response(result: BulkResult, filter_responses: bool) -> Dict[str, Any]:
+    """Resultado por item; si el lote se revirtió, error con el detalle de cada item."""
+    items = []
+    for item in result.items:
+        entry: Dict[str, Any] = {"index": item.index, "id": item.id, "status": item.status}
+        if item.obj is not None:
+            entry["data"] = filtrar_respuesta(item.obj) if filter_responses else item.obj
+        if item.error:
+            entry["error"] = item.error
+        items.append(entry)
+
+    if result.committed:
+        return {"data": items, "committed": True}
+
+    codes = {item.error["code"] for item in result.failed}
+    if result.error:
+        codes.add(result.error["code"])
+    if ErrorCodes.CONFLICT in codes:
+        status_code, code = 409, ErrorCodes.CONFLICT
+    elif codes == {ErrorCodes.NOT_FOUND}:
+        status_code, code = 404, ErrorCodes.NOT_FOUND
+    else:
+        status_code, code = 400, ErrorCodes.VALIDATION_ERROR
+    details: Dict[str, Any] = {"items": items}
+    if result.error:
+        # Rechazo de la DB al flush: no hay item puntual, el error es del lote
+        details["error"] = result.error
+        message = f"Lote revertido: {result.error['message']}"
+    else:
+        message = f"Lote revertido: {len(result.failed)} de {len(items)} items con error"
+    raise HTTPException(
+        status_code=status_code,
+        detail={
+            "error": {
+                "code": code,
+                "message": message,
+                "details": details,
+            }
+        },
+    )
+
+
 def create_generic_router(
     model: Type[SQLModel],
     crud: GenericCRUD,
@@ -90,7 +161,7 @@ def create_generic_router(
     def list_objects(
         request: Request,
         response: Response,  # Agregamos Response para headers
-        session: Session = Depends(get_session),
+        session: Session = Depends(get_read_session),
         # Parámetros ra-data-simple-rest (nuevos)
         sort: Optional[str] = Query(None, description="Sort array ra-data-simple-rest: [field,order]"),
         range: Optional[str] = Query(None, description="Range array ra-data-simple-rest: [start,end]"),
@@ -110,6 +181,13 @@ def create_generic_router(
         fields: Optional[str] = Query(None, description="Campos a incluir (CSV)"),
         include: Optional[str] = Query(None, description="Relaciones a incluir (CSV)"),
         deleted: str = Query("exclude", pattern="^(include|only|exclude)$", description="Manejo de elementos eliminados"),
+        # Paginación por cursor (keyset): "" o "*" pide la primera página
+        cursor: Optional[str] = Query(None, description="Cursor opaco para paginación keyset"),
+        count: str = Query(
+            CountMode.EXACT,
+            pattern="^(exact|estimate|none)$",
+            description="Conteo del total: exact, estimate (Postgres) o none (solo indica si hay más)",
+        ),
     ):
         """Listar recursos con paginación y filtros - Soporte ra-data-simple-rest y json-server"""
         try:
@@ -163,7 +241,8 @@ def create_generic_router(
             reserved_params = {
                 'sort', 'range', 'filter',  # ra-data-simple-rest
                 '_start', '_end', '_sort', '_order',  # ra-data-json-server legacy
-                'q', 'page', 'perPage', 'sortBy', 'sortDir', 'fields', 'include', 'deleted'
+                'q', 'page', 'perPage', 'sortBy', 'sortDir', 'fields', 'include', 'deleted',
+                'cursor', 'count',
             }
             
             # Agregar cualquier parámetro como filtro (excepto los reservados)
@@ -196,6 +275,35 @@ def create_generic_router(
                         }
                     )
             
+            if cursor is not None:
+                # Modo keyset: evita OFFSET en páginas profundas
+                try:
+                    items, next_cursor, has_more = crud.list_keyset(
+                        session,
+                        limit=per_page,
+                        sort_by=sort_by,
+                        sort_dir=sort_dir,
+                        cursor=cursor if cursor not in ("", "*") else None,
+                        filters=filters,
+                        deleted=deleted,
+                        include=include,
+                    )
+                except ValueError as e:
+                    raise HTTPException(
+                        status_code=400,
+                        detail={
+                            "error": {
+                                "code": ErrorCodes.VALIDATION_ERROR,
+                                "message": str(e),
+                                "details": {"cursor": cursor, "sort": sort_by}
+                            }
+                        }
+                    )
+                payload = {"next_cursor": next_cursor, "has_more": has_more}
+                if filter_responses:
+                    return FastJSONResponse({"data": [filtrar_respuesta(item) for item in items], **payload})
+                return {"data": items, **payload}
+
             items, total = crud.list(
                 session,
                 page=page,
@@ -206,11 +314,22 @@ def create_generic_router(
                 deleted=deleted,
                 fields=fields,
                 include=include,
+                count=count,
             )
             
             # Filtrar respuestas si está habilitado
-            if filter_responses:
+            projection = crud.parse_fields(fields)
+            if projection is not None and not projection.entities:
+                # Filas proyectadas (dicts) sin hidratar objetos ORM
+                filtered_items = [normalize_payload_datetimes(item) for item in items]
+            elif filter_responses:
                 filtered_items = [filtrar_respuesta(item) for item in items]
+                if projection is not None:
+                    keep = set(projection.keys) | {rel.strip() for rel in (include or "").split(",")}
+                    filtered_items = [
+                        {key: value for key, value in item.items() if key in keep}
+                        for item in filtered_items
+                    ]
             else:
                 filtered_items = items
             
@@ -224,10 +343,21 @@ def create_generic_router(
             
             content_range = f"items {start}-{end}/{total}"
             response.headers["Content-Range"] = content_range
+            response.headers["X-Count-Mode"] = count
+            if count == CountMode.NONE:
+                # total es una cota inferior: offset + items (+1 si hay otra página)
+                response.headers["X-Has-More"] = "true" if total > start + len(items) else "false"
+            else:
+                response.headers["X-Total-Count"] = str(total)
             
             # Devolver array directo (formato ra-data-json-server)
+            if filter_responses or (projection is not None and not projection.entities):
+                # Dicts ya filtrados: serializar directo a bytes, sin jsonable_encoder
+                return FastJSONResponse(filtered_items, headers=dict(response.headers))
             return filtered_items
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=500,
@@ -240,6 +370,86 @@ def create_generic_router(
                 }
             )
 
+    @router.post("/bulk")
+    def bulk_create(
+        payload: Any = Body(...),
+        session: Session = Depends(get_session),
+    ):
+        """Crear varios recursos en una sola transacción"""
+        items = _bulk_items(payload, "items")
+        try:
+            result = crud.bulk_create(session, items)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": {
+                        "code": ErrorCodes.VALIDATION_ERROR,
+                        "message": str(e),
+                        "details": {}
+                    }
+                }
+            )
+        return _bulk_response(result, filter_responses)
+
+    @router.patch("/bulk")
+    def bulk_update(
+        payload: Any = Body(...),
+        session: Session = Depends(get_session),
+    ):
+        """
+        Actualizar varios recursos en una sola transacción.
+        Acepta [{id, version?, ...}] o {"ids": [...], "data": {...}} (updateMany de react-admin).
+        """
+        if isinstance(payload, dict) and "ids" in payload:
+            data = payload.get("data") or {}
+            items = [{**data, "id": obj_id} for obj_id in _bulk_items(payload, "ids")]
+        else:
+            items = _bulk_items(payload, "items")
+        try:
+            result = crud.bulk_update(session, items, check_version=True)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": {
+                        "code": ErrorCodes.VALIDATION_ERROR,
+                        "message": str(e),
+                        "details": {}
+                    }
+                }
+            )
+        return _bulk_response(result, filter_responses)
+
+    @router.delete("/bulk")
+    def bulk_delete(
+        payload: Any = Body(...),
+        session: Session = Depends(get_session),
+        hard: bool = Query(False, description="Eliminación física (true) o lógica (false)"),
+    ):
+        """Eliminar varios recursos en una sola transacción. Acepta {"ids": [...]} o [...]"""
+        ids = _bulk_items(payload, "ids")
+        try:
+            result = crud.bulk_delete(session, ids, hard=hard)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": {
+                        "code": ErrorCodes.VALIDATION_ERROR,
+                        "message": str(e),
+                        "details": {}
+                    }
+                }
+            )
+        return _bulk_response(result, filter_responses)
+
     @router.get("/{obj_id:int}")
     def get_one(
         obj_id: int, 
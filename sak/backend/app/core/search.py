@@ -0,0 +1,216 @@
+"""
+Backends de búsqueda de texto para el filtro genérico `q`.
+
+El match y el ranking son construcciones SQLAlchemy que se compilan según el
+dialecto, así GenericCRUD no necesita conocer la sesión al armar la query:
+
+    - SQLite (tests) y otros: ILIKE '%term%' OR-eado sobre `__searchable_fields__`
+      (comportamiento histórico); ranking = cantidad de campos que matchean.
+    - Postgres + SEARCH_BACKEND=trgm (default): el mismo ILIKE, que con índices GIN
+      `gin_trgm_ops` deja de ser un seq scan; ranking = similarity() de pg_trgm.
+    - Postgres + SEARCH_BACKEND=fts: `to_tsvector(cfg, campos) @@ websearch_to_tsquery`
+      sobre un índice GIN de expresión; ranking = ts_rank.
+
+Configuración (variables de entorno):
+    SEARCH_BACKEND      trgm | fts | like (default trgm; fuera de Postgres siempre like)
+    SEARCH_TS_CONFIG    configuración de text search para fts (default es_unaccent,
+                        creada por `create_search_indexes`: spanish + unaccent)
+
+Los índices se crean desde Alembic con `create_search_indexes(op, modelos)`.
+"""
+from __future__ import annotations
+
+import os
+import re
+from typing import Any, List, Sequence, Type
+
+from sqlalchemy import String, bindparam, case, literal, or_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+from sqlalchemy.types import Boolean, Float
+from sqlmodel import SQLModel
+
+SEARCH_BACKEND: str = os.getenv("SEARCH_BACKEND", "trgm").lower()
+SEARCH_TS_CONFIG: str = os.getenv("SEARCH_TS_CONFIG", "es_unaccent")
+
+# Valor de sort que ordena por relevancia cuando hay `q`
+RELEVANCE_SORT = "relevance"
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _is_text(column) -> bool:
+    # AutoString de SQLModel es un TypeDecorator: mirar el tipo base
+    column_type = getattr(column.type, "impl", column.type)
+    return isinstance(column_type, String)
+
+
+def searchable_columns(model: Type[SQLModel], text_only: bool = False) -> List[Any]:
+    """Columnas de `__searchable_fields__` que existen en el modelo (solo texto si `text_only`)."""
+    columns = []
+    for field_name in getattr(model, "__searchable_fields__", None) or []:
+        column = getattr(model, field_name, None)
+        if column is None or not hasattr(column, "type"):
+            continue
+        if text_only and not _is_text(column):
+            continue
+        columns.append(column)
+    return columns
+
+
+class _SearchElement(ColumnElement):
+    # Cache key = columnas + bindparams: el término viaja como parámetro, así el SQL
+    # compilado se reusa entre búsquedas sobre el mismo modelo
+    _traverse_internals = [
+        ("all_columns", InternalTraversal.dp_clauseelement_list),
+        ("text_columns", InternalTraversal.dp_clauseelement_list),
+        ("pattern", InternalTraversal.dp_clauseelement),
+        ("term_param", InternalTraversal.dp_clauseelement),
+    ]
+    inherit_cache = True
+
+    def __init__(self, model: Type[SQLModel], term: str):
+        self.model = model
+        self.term = term
+        self.all_columns = [column.__clause_element__() for column in searchable_columns(model)]
+        self.text_columns = [column.__clause_element__() for column in searchable_columns(model, text_only=True)]
+        self.pattern = bindparam("search_pattern", f"%{term}%", unique=True)
+        self.term_param = bindparam("search_term", term, unique=True)
+
+
+class TextSearchMatch(_SearchElement):
+    """Condición booleana de búsqueda sobre los campos searchable del modelo."""
+    type = Boolean()
+    inherit_cache = True
+
+
+class TextSearchRank(_SearchElement):
+    """Relevancia (mayor = mejor) del registro para el término buscado."""
+    type = Float()
+    inherit_cache = True
+
+
+def _pg_backend() -> str:
+    return SEARCH_BACKEND if SEARCH_BACKEND in ("trgm", "fts") else "like"
+
+
+def _ts_config_sql() -> str:
+    if not _IDENTIFIER.match(SEARCH_TS_CONFIG):
+        raise ValueError(f"SEARCH_TS_CONFIG inválido: {SEARCH_TS_CONFIG!r}")
+    return f"'{SEARCH_TS_CONFIG}'"
+
+
+def _tsvector_sql(column_sql: Sequence[str]) -> str:
+    """Expresión tsvector; debe coincidir exactamente con la del índice."""
+    document = " || ' ' || ".join(f"coalesce({sql}, '')" for sql in column_sql)
+    return f"to_tsvector({_ts_config_sql()}, {document})"
+
+
+def _like_match(element: _SearchElement):
+    return or_(*[column.ilike(element.pattern) for column in element.all_columns])
+
+
+@compiles(TextSearchMatch)
+def _compile_match_default(element, compiler, **kw):
+    if not element.all_columns:
+        return compiler.process(literal(True), **kw)
+    return f"({compiler.process(_like_match(element), **kw)})"
+
+
+@compiles(TextSearchMatch, "postgresql")
+def _compile_match_pg(element, compiler, **kw):
+    if _pg_backend() == "fts" and element.text_columns:
+        document = _tsvector_sql([compiler.process(col, **kw) for col in element.text_columns])
+        query = f"websearch_to_tsquery({_ts_config_sql()}, {compiler.process(element.term_param, **kw)})"
+        return f"({document} @@ {query})"
+    return _compile_match_default(element, compiler, **kw)
+
+
+@compiles(TextSearchRank)
+def _compile_rank_default(element, compiler, **kw):
+    if not element.all_columns:
+        return compiler.process(literal(0), **kw)
+    hits = [case((column.ilike(element.pattern), 1), else_=0) for column in element.all_columns]
+    total = hits[0]
+    for hit in hits[1:]:
+        total = total + hit
+    return f"({compiler.process(total, **kw)})"
+
+
+@compiles(TextSearchRank, "postgresql")
+def _compile_rank_pg(element, compiler, **kw):
+    backend = _pg_backend()
+    if backend == "fts" and element.text_columns:
+        document = _tsvector_sql([compiler.process(col, **kw) for col in element.text_columns])
+        query = f"websearch_to_tsquery({_ts_config_sql()}, {compiler.process(element.term_param, **kw)})"
+        return f"ts_rank({document}, {query})"
+    if backend == "trgm" and element.text_columns:
+        term = compiler.process(element.term_param, **kw)
+        scores = ", ".join(
+            f"similarity(coalesce({compiler.process(col, **kw)}, ''), {term})" for col in element.text_columns
+        )
+        return f"greatest({scores})" if len(element.text_columns) > 1 else scores
+    return _compile_rank_default(element, compiler, **kw)
+
+
+# --- helpers de Alembic ---
+def search_index_ddl(model: Type[SQLModel], backend: str = "trgm") -> List[str]:
+    """DDL (Postgres) de los índices de búsqueda del modelo para el backend dado."""
+    table = model.__tablename__
+    columns = [column.key for column in searchable_columns(model, text_only=True)]
+    if not columns:
+        return []
+    if backend == "fts":
+        document = _tsvector_sql([f'"{name}"' for name in columns])
+        return [f'CREATE INDEX IF NOT EXISTS "ix_{table}_search_fts" ON "{table}" USING gin ({document})']
+    return [
+        f'CREATE INDEX IF NOT EXISTS "ix_{table}_{name}_trgm" ON "{table}" USING gin ("{name}" gin_trgm_ops)'
+        for name in columns
+    ]
+
+
+def search_index_names(model: Type[SQLModel], backend: str = "trgm") -> List[str]:
+    table = model.__tablename__
+    if backend == "fts":
+        return [f"ix_{table}_search_fts"] if searchable_columns(model, text_only=True) else []
+    return [f"ix_{table}_{column.key}_trgm" for column in searchable_columns(model, text_only=True)]
+
+
+_TS_CONFIG_DDL = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{name}') THEN
+        CREATE TEXT SEARCH CONFIGURATION {name} (COPY = spanish);
+        ALTER TEXT SEARCH CONFIGURATION {name}
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+    END IF;
+END
+$$;
+"""
+
+
+def create_search_indexes(op, models: Sequence[Type[SQLModel]], backend: str = "trgm") -> None:
+    """
+    Crea extensiones e índices de búsqueda para `models` (no-op fuera de Postgres).
+    Para scripts / entornos de dev; las migraciones congelan su DDL (ver
+    alembic/versions/20261017_search_trgm_indexes.py) en vez de importar modelos.
+    """
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    if backend == "fts":
+        op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        op.execute(_TS_CONFIG_DDL.format(name=SEARCH_TS_CONFIG))
+    else:
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for model in models:
+        for ddl in search_index_ddl(model, backend):
+            op.execute(ddl)
+
+
+def drop_search_indexes(op, models: Sequence[Type[SQLModel]], backend: str = "trgm") -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for model in models:
+        for name in search_index_names(model, backend):
+            op.execute(f'DROP INDEX IF EXISTS "{name}"')
@@ -7,6 +7,8 @@ from app.core.generic_crud import GenericCRUD
 from app.models import Propiedad
 from app.models.propiedad import PropiedadesLogStatus, PropiedadesStatus
 from app.models.propietario import Propietario
+# Registra el listener que mantiene propiedades_vacancia_intervalos en cada flush
+from app.services import propiedad_vacancia_service  # noqa: F401
 
 
 class PropiedadCRUD(GenericCRUD[Propiedad]):
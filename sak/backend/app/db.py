@@ -1,9 +1,17 @@
 # app/db.py
+import asyncio
 import os
-from typing import Generator, Iterator, Optional
+import sys
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Generator, Iterator, Optional, TypeVar, Union
 from dotenv import load_dotenv
 
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.instrumentation import InstrumentedAsyncQueuePool, InstrumentedQueuePool, instrument_pool
 
 # Cargar variables de entorno desde .env
 load_dotenv()
@@ -24,26 +32,144 @@ ECHO = os.getenv("SQLALCHEMY_ECHO", "0") == "1"
 
 # 3) Pooling & SSL (Neon suele requerir SSL)
 #    Para psycopg3 podés pasar sslmode por connect_args o en la URL (?sslmode=require)
-connect_args = {}
-if "neon.tech" in DATABASE_URL and "sslmode=" not in DATABASE_URL:
-    connect_args["sslmode"] = "require"
-
-engine = create_engine(
-    DATABASE_URL,
-    echo=ECHO,
-    pool_pre_ping=True,      # detecta conexiones muertas
-    pool_size=5,             # ajustá según tu carga
-    max_overflow=5,          # burst controlado
-    pool_recycle=1800,       # recicla conexiones (seg)
-    connect_args=connect_args,
-    # future=True  # si quisieras forzar el estilo 2.x (opcional)
-)
+#    Tamaños del pool por entorno vía env (ver /metrics/pool para dimensionar):
+#      DB_POOL_SIZE (5), DB_MAX_OVERFLOW (5), DB_POOL_TIMEOUT (30 s),
+#      DB_POOL_RECYCLE (1800 s), DB_POOL_PRE_PING (1; con recycle corto en Neon
+#      se puede apagar y ahorrar un round-trip por checkout).
+#    DB_PGBOUNCER=1: detrás de PgBouncer en modo transaction se usa NullPool (el
+#    pooling lo hace PgBouncer) y se desactivan los prepared statements de psycopg.
+PGBOUNCER_MODE = os.getenv("DB_PGBOUNCER", "0") == "1"
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+
+def _connect_args(url: str) -> dict:
+    args: dict = {}
+    if "neon.tech" in url and "sslmode=" not in url:
+        args["sslmode"] = "require"
+    if PGBOUNCER_MODE and url.startswith("postgres"):
+        args["prepare_threshold"] = None
+    return args
+
+
+def _engine_kwargs(url: str, async_engine: bool = False) -> dict:
+    kwargs: dict = {
+        "echo": ECHO,
+        "pool_pre_ping": POOL_PRE_PING,
+        "connect_args": _connect_args(url),
+    }
+    if PGBOUNCER_MODE:
+        kwargs["poolclass"] = NullPool
+        return kwargs
+    kwargs.update(
+        poolclass=InstrumentedAsyncQueuePool if async_engine else InstrumentedQueuePool,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+    )
+    return kwargs
+
+
+engine = create_engine(DATABASE_URL, **_engine_kwargs(DATABASE_URL))
+instrument_pool(engine, "primary")
 
 def get_session() -> Iterator[Session]:
     """Dependency para FastAPI."""
     with Session(engine) as session:
         yield session
 
+
+# 4) Engine async (psycopg async) para endpoints `async def`: la IO de DB se espera
+#    sin bloquear el event loop. ASYNC_DATABASE_URL permite apuntarlo a otra URL.
+#    psycopg async no funciona con el ProactorEventLoop (default en Windows): la
+#    policy cubre scripts y workers con asyncio.run; uvicorn arma su propio loop, así
+#    que en Windows se lanza con `--loop asyncio:SelectorEventLoop` (start_server.bat).
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+
+def _async_url(url: str) -> str:
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    if url.startswith("postgresql://"):
+        return "postgresql+psycopg://" + url[len("postgresql://"):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_kwargs(ASYNC_DATABASE_URL, async_engine=True))
+instrument_pool(async_engine.sync_engine, "async")
+
+# expire_on_commit=False: tras un commit los atributos siguen accesibles fuera de
+# run_sync (un refresh implícito fuera del greenlet fallaría con MissingGreenlet)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    """Dependency para FastAPI (endpoints async)."""
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+DbSession = Union[Session, AsyncSession]
+T = TypeVar("T")
+
+
+def sync_session_of(session: DbSession) -> Session:
+    """Session sync subyacente (la de una AsyncSession solo es usable dentro de `run_db`)."""
+    return session.sync_session if isinstance(session, AsyncSession) else session
+
+
+async def run_db(session: DbSession, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Ejecuta `fn(session_sync, *args, **kwargs)` con código ORM sync.
+
+    Con AsyncSession corre vía `run_sync`: las queries van por el driver async y el
+    event loop sigue atendiendo otros requests mientras esperan. Con Session (tests,
+    scripts, routers sync) llama a `fn` directamente.
+    """
+    if isinstance(session, AsyncSession):
+        return await session.run_sync(fn, *args, **kwargs)
+    return fn(session, *args, **kwargs)
+
+
+# 5) Réplica de lectura opcional (DATABASE_REPLICA_URL). Dashboards, listados
+#    genéricos y feeds por cursor leen de ella; escrituras y lecturas que siguen a
+#    una escritura van al primario (ver app/core/db_routing.py para la stickiness).
+DATABASE_REPLICA_URL: Optional[str] = os.getenv("DATABASE_REPLICA_URL") or None
+
+replica_engine = (
+    create_engine(DATABASE_REPLICA_URL, **_engine_kwargs(DATABASE_REPLICA_URL))
+    if DATABASE_REPLICA_URL
+    else None
+)
+if replica_engine is not None:
+    instrument_pool(replica_engine, "replica")
+
+# True cuando el request en curso debe leer del primario (lo setea el middleware)
+use_primary_for_reads: ContextVar[bool] = ContextVar("use_primary_for_reads", default=False)
+
+
+def read_engine():
+    """Engine para lecturas: la réplica si está configurada y el request no es sticky."""
+    if replica_engine is None or use_primary_for_reads.get():
+        return engine
+    return replica_engine
+
+
+def get_read_session() -> Iterator[Session]:
+    """Dependency para endpoints de solo lectura (dashboards, listados, feeds)."""
+    with Session(read_engine()) as session:
+        yield session
+
+
 def init_db() -> None:
     """
     Crea tablas solo en DEV cuando apuntás a una DB vacía.
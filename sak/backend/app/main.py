@@ -99,6 +99,12 @@ from app.api.factura_processing import router as factura_processing_router
 from app.api.auth import router as auth_router
 from app.routers.file_proxy import router as file_proxy_router
 from app.routers.emprendimiento_router import emprendimiento_router
+from app.routers.metrics_router import router as metrics_router
+from app.core.instrumentation import QueryInstrumentationMiddleware, install_query_instrumentation
+from app.core.db_routing import ReadReplicaRoutingMiddleware
+from app.core.dashboard_cache import DashboardCacheMiddleware
+from app.services import webhook_queue
+from app.services.metaw_client import metaw_client
 
 app = FastAPI(title="API genérica con FastAPI + SQLModel")
 
@@ -121,6 +127,9 @@ else:
     ]
     logger.info(f"CORS configurado para desarrollo: {allowed_origins}")
 
+# Cache de respuestas de /api/dashboard/* (innermost: los HIT pasan igual por CORS)
+app.add_middleware(DashboardCacheMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
@@ -128,10 +137,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Range"],  # Para ra-data-simple-rest
+    expose_headers=["Content-Range", "X-Total-Count", "X-Count-Mode", "X-Has-More", "X-DB-Queries", "X-DB-Time", "ETag", "X-Dashboard-Cache"],  # Para ra-data-simple-rest
     max_age=60,  # Cachear preflight solo 60 segundos (evita problemas con actualizaciones)
 )
 
+# Métricas de DB por request (muestreadas, ver app/core/instrumentation.py)
+install_query_instrumentation()
+app.add_middleware(QueryInstrumentationMiddleware)
+
+# Lecturas a la réplica (si DATABASE_REPLICA_URL) con stickiness tras escrituras
+app.add_middleware(ReadReplicaRoutingMiddleware)
+
 # Global exception handler para asegurar headers CORS en errores 500
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -236,6 +252,7 @@ app.include_router(proy_fase_router)
 app.include_router(proy_presupuesto_router)
 app.include_router(nomina_router)
 app.include_router(parte_diario_router)
+app.include_router(metrics_router)
 
 # Servir archivos estáticos (uploads)
 uploads_dir = "uploads"
@@ -255,10 +272,34 @@ app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 def on_startup():
     init_db()
 
+
+# Workers de la cola de webhooks de meta-w (ver app/services/webhook_queue.py)
+@app.on_event("startup")
+async def start_webhook_workers():
+    # También con META_WEBHOOK_QUEUE=0: consumen los turnos del agente de la ingesta en lote
+    webhook_queue.webhook_worker.start()
+
+
+@app.on_event("shutdown")
+async def stop_webhook_workers():
+    await webhook_queue.webhook_worker.stop()
+
+
+# Cliente HTTP compartido hacia meta-w (keep-alive entre envíos)
+@app.on_event("startup")
+async def start_metaw_client():
+    await metaw_client.start()
+
+
+@app.on_event("shutdown")
+async def close_metaw_client():
+    await metaw_client.aclose()
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True)
+    # SelectorEventLoop: psycopg async no soporta el ProactorEventLoop de Windows
+    uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True, loop="asyncio:SelectorEventLoop")
@@ -29,12 +29,15 @@ from .crm import (
     CRMEvento,
     CRMMensaje,
     CRMCelular,
+    CRMPipelineSnapshot,
+    CRMPipelineEstadoIntervalo,
 )
 from .adm import (
     AdmConcepto,
 )
 from .cotizacion_moneda import CotizacionMoneda
 from .webhook_log import WebhookLog
+from .webhook_job import WebhookJob
 from .emprendimiento import Emprendimiento
 from .articulo import Articulo
 from .tipo_articulo import TipoArticulo
@@ -114,7 +117,10 @@ __all__ = [
     "CRMEvento",
     "CRMMensaje",
     "CRMCelular",
+    "CRMPipelineSnapshot",
+    "CRMPipelineEstadoIntervalo",
     "WebhookLog",
+    "WebhookJob",
     "Emprendimiento",
     "Articulo",
     "TipoArticulo", 
@@ -46,6 +46,129 @@ def campos_respuesta(model_cls: type[SQLModel], include_id: bool = True) -> set[
         campos.add('id')
     return campos
 
+# Campos auxiliares que reemplazan a su par persistido cuando existen en el objeto
+_CALCULATED_OVERRIDES = (
+    ("dias_totales", "dias_totales_calculado"),
+    ("dias_reparacion", "dias_reparacion_calculado"),
+    ("dias_disponible", "dias_disponible_calculado"),
+)
+
+
+def _normalize_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return serialize_datetime(value)
+    if isinstance(value, (dict, list)):
+        return normalize_payload_datetimes(value)
+    return value
+
+
+class ResponseSerializer:
+    """
+    Serializador de respuesta precompilado para un modelo y contexto.
+
+    Calcula una sola vez los campos visibles, las relaciones expandidas y los
+    campos calculados, y arma el dict de salida en una sola pasada por objeto.
+    La salida es la misma que la de la implementación recursiva original.
+    """
+
+    def __init__(self, model_cls: type[SQLModel], context: str = "display"):
+        self.model_cls = model_cls
+        self.context = context
+        model_fields = getattr(model_cls, "model_fields", {})
+        self.model_field_names = frozenset(model_fields.keys())
+        if context == "edit":
+            campos_validos = campos_editables(model_cls)
+        else:
+            campos_validos = campos_respuesta(model_cls, include_id=True)
+        self.fields = tuple(
+            name
+            for name in model_fields.keys()
+            if name in campos_validos
+            or (not name.startswith('_') and (name not in STAMP_FIELDS or name in VISIBLE_STAMP_FIELDS))
+        )
+        self.visible_fields = frozenset(self.fields)
+        self.expanded_relations = frozenset(getattr(model_cls, "__expanded_list_relations__", set()) or ())
+
+        calculated_fields = getattr(model_cls, "__calculated_fields__", None)
+        if isinstance(calculated_fields, dict):
+            self.calculated = tuple(calculated_fields.items())
+        elif isinstance(calculated_fields, (list, tuple, set)):
+            self.calculated = tuple((name, name) for name in calculated_fields)
+        else:
+            self.calculated = ()
+
+        self.overrides = tuple(
+            (field_name, calculated_attr, hasattr(model_cls, calculated_attr))
+            for field_name, calculated_attr in _CALCULATED_OVERRIDES
+        )
+
+    def serialize(self, obj: SQLModel, _visited: set) -> Dict[str, Any]:
+        obj_key = (type(obj).__name__, getattr(obj, 'id', id(obj)))
+        if obj_key in _visited:
+            return {"id": obj.id} if hasattr(obj, 'id') else {}
+        _visited.add(obj_key)
+
+        data = obj.__dict__
+        result: Dict[str, Any] = {}
+        # Mismo orden que model_dump() (orden de carga en __dict__)
+        visible_fields = self.visible_fields
+        for name, value in data.items():
+            if name in visible_fields:
+                result[name] = _normalize_value(value)
+        if len(result) < len(self.fields):
+            # Atributos expirados: se recargan como lo haría el acceso normal
+            for name in self.fields:
+                if name not in result:
+                    result[name] = _normalize_value(getattr(obj, name, None))
+
+        # Relaciones cargadas (mismo orden que dir(obj)); nunca dispara lazy loads
+        relation_names = sorted(
+            name for name in data if not name.startswith('_') and name not in self.model_field_names
+        )
+        for attr_name in relation_names:
+            attr_value = data[attr_name]
+            if hasattr(attr_value, 'model_fields') and attr_name not in STAMP_FIELDS:
+                result[attr_name] = get_serializer(type(attr_value), self.context).serialize(attr_value, _visited)
+            elif isinstance(attr_value, list) and len(attr_value) > 0 and hasattr(attr_value[0], 'model_fields'):
+                if attr_name in self.expanded_relations:
+                    result[attr_name] = [
+                        get_serializer(type(item), self.context).serialize(item, _visited.copy())
+                        for item in attr_value
+                    ]
+                else:
+                    # Para listas, solo incluir IDs para evitar sobrecarga
+                    result[attr_name] = [{"id": item.id} if hasattr(item, 'id') else {} for item in attr_value]
+
+        # Inyectar campos calculados si fueron agregados al objeto
+        for output_field, attr_name in self.calculated:
+            if hasattr(obj, attr_name):
+                result[output_field] = _normalize_value(getattr(obj, attr_name))
+
+        # Inyectar campos calculados cuando existan propiedades auxiliares
+        for field_name, calculated_attr, on_class in self.overrides:
+            if not (on_class or calculated_attr in data):
+                continue
+            if field_name in result and result[field_name] is not None:
+                continue
+            calculated_value = getattr(obj, calculated_attr)
+            if calculated_value is not None:
+                result[field_name] = _normalize_value(calculated_value)
+
+        return result
+
+
+_SERIALIZERS: Dict[tuple, ResponseSerializer] = {}
+
+
+def get_serializer(model_cls: type[SQLModel], context: str = "display") -> ResponseSerializer:
+    """Serializador cacheado por (modelo, contexto)."""
+    key = (model_cls, context)
+    serializer = _SERIALIZERS.get(key)
+    if serializer is None:
+        serializer = _SERIALIZERS.setdefault(key, ResponseSerializer(model_cls, context))
+    return serializer
+
+
 def filtrar_respuesta(obj: SQLModel, context: str = "display", _depth: int = 0, _visited: set = None) -> Dict[str, Any]:
     """
     Filtra un objeto para respuesta al frontend
@@ -56,87 +179,6 @@ def filtrar_respuesta(obj: SQLModel, context: str = "display", _depth: int = 0,
         _depth: Profundidad actual de recursión (interno)
         _visited: Set de objetos ya visitados para evitar ciclos (interno)
     """
-    # Inicializar visited en el primer nivel
     if _visited is None:
         _visited = set()
-    
-    # Evitar ciclos: si ya visitamos este objeto, solo devolver su id
-    obj_key = (type(obj).__name__, getattr(obj, 'id', id(obj)))
-    if obj_key in _visited:
-        return {"id": obj.id} if hasattr(obj, 'id') else {}
-    
-    _visited.add(obj_key)
-    
-    if context == "edit":
-        # Solo campos editables (para formularios)
-        campos_validos = campos_editables(type(obj))
-    else:
-        # Campos editables + id (para visualización)
-        campos_validos = campos_respuesta(type(obj), include_id=True)
-    
-    obj_dict = obj.model_dump()
-    
-    # Incluir relaciones cargadas aprovechando _visited para evitar ciclos
-    for attr_name in dir(obj):
-        if attr_name.startswith('_'):
-            continue
-        if attr_name in obj.model_fields:
-            continue
-        if attr_name not in obj.__dict__:
-            # Si la relación no está cargada, evitar accesos que disparen queries
-            continue
-
-        attr_value = obj.__dict__[attr_name]
-        # Si es una relación cargada (tiene model_fields y no es un campo regular)
-        if hasattr(attr_value, 'model_fields') and attr_name not in STAMP_FIELDS:
-            obj_dict[attr_name] = filtrar_respuesta(attr_value, context, _depth + 1, _visited)
-        # Si es una lista de relaciones (one-to-many)
-        elif isinstance(attr_value, list) and len(attr_value) > 0 and hasattr(attr_value[0], 'model_fields'):
-            expanded_relations = getattr(type(obj), "__expanded_list_relations__", set())
-            if attr_name in expanded_relations:
-                obj_dict[attr_name] = [
-                    filtrar_respuesta(item, context, _depth + 1, _visited.copy())
-                    for item in attr_value
-                ]
-            else:
-                # Para listas, solo incluir IDs para evitar sobrecarga
-                obj_dict[attr_name] = [{"id": item.id} if hasattr(item, 'id') else {} for item in attr_value]
-    
-    # Filtrar campos válidos más las relaciones
-    result = {}
-    for k, v in obj_dict.items():
-        if k in campos_validos or (not k.startswith('_') and (k not in STAMP_FIELDS or k in VISIBLE_STAMP_FIELDS)):
-            result[k] = v
-
-    # Inyectar campos calculados si fueron agregados al objeto
-    calculated_fields = getattr(type(obj), "__calculated_fields__", None)
-    if isinstance(calculated_fields, dict):
-        for output_field, attr_name in calculated_fields.items():
-            if hasattr(obj, attr_name):
-                result[output_field] = getattr(obj, attr_name)
-    elif isinstance(calculated_fields, (list, tuple, set)):
-        for field_name in calculated_fields:
-            if hasattr(obj, field_name):
-                result[field_name] = getattr(obj, field_name)
-
-    # Inyectar campos calculados cuando existan propiedades auxiliares
-    _calculated_overrides = [
-        ("dias_totales", "dias_totales_calculado"),
-        ("dias_reparacion", "dias_reparacion_calculado"),
-        ("dias_disponible", "dias_disponible_calculado"),
-    ]
-    for field_name, calculated_attr in _calculated_overrides:
-        if field_name in result:
-            if result[field_name] is None and hasattr(obj, calculated_attr):
-                calculated_value = getattr(obj, calculated_attr)
-                if calculated_value is not None:
-                    result[field_name] = calculated_value
-        else:
-            if hasattr(obj, calculated_attr):
-                calculated_value = getattr(obj, calculated_attr)
-                if calculated_value is not None:
-                    result[field_name] = calculated_value
-    
-    return normalize_payload_datetimes(result)
-
-
+    return get_serializer(type(obj), context).serialize(obj, _visited)
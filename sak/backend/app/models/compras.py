@@ -175,6 +175,8 @@ class PoOrderDetail(Base, table=True):
             "field": "cantidad",
         }
     }
+    # Agregados como subquery en el SELECT: permite ordenar/filtrar por cantidad_facturada_calc
+    __agg_calculated_sql__ = True
 
     order_id: int = Field(
         foreign_key="po_orders.id",
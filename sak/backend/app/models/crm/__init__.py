@@ -20,6 +20,7 @@ from .evento import CRMEvento
 from .mensaje import CRMMensaje
 from .celular import CRMCelular
 from .log_estado import CRMOportunidadLogEstado
+from .pipeline_snapshot import CRMPipelineEstadoIntervalo, CRMPipelineSnapshot
 
 __all__ = [
     # Catalog models
@@ -38,4 +39,7 @@ __all__ = [
     "CRMMensaje",
     "CRMCelular",
     "CRMOportunidadLogEstado",
+    # Derived models
+    "CRMPipelineSnapshot",
+    "CRMPipelineEstadoIntervalo",
 ]
\ No newline at end of file
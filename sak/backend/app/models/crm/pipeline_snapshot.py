@@ -0,0 +1,47 @@
+from datetime import UTC, date, datetime
+from typing import Optional
+
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+
+class CRMPipelineSnapshot(SQLModel, table=True):
+    """
+    Datos derivados de una oportunidad para el dashboard CRM (una fila por oportunidad).
+
+    Se mantiene desde los flushes que tocan la oportunidad o sus logs de estado
+    (ver app/services/crm_pipeline_snapshot.py); no se edita a mano.
+    """
+
+    __tablename__ = "crm_pipeline_snapshots"
+
+    oportunidad_id: int = Field(
+        primary_key=True,
+        foreign_key="crm_oportunidades.id",
+        ondelete="CASCADE",
+    )
+    fecha_creacion: date = Field(index=True)
+    fecha_ingreso_pipeline: Optional[date] = Field(default=None, index=True)
+    fecha_cierre: Optional[date] = Field(default=None, index=True)
+    estado_cierre: Optional[str] = Field(default=None, max_length=20)
+    actualizado_at: datetime = Field(default_factory=lambda: datetime.now(UTC), nullable=False)
+
+
+class CRMPipelineEstadoIntervalo(SQLModel, table=True):
+    """
+    Estado de una oportunidad en el rango de fechas [desde, hasta).
+
+    `desde` NULL = desde siempre, `hasta` NULL = vigente. Los intervalos de una
+    oportunidad no se solapan: el estado al corte es el del intervalo que lo contiene.
+    """
+
+    __tablename__ = "crm_pipeline_estado_intervalos"
+    __table_args__ = (
+        Index("ix_crm_pipeline_estado_intervalos_rango", "oportunidad_id", "desde", "hasta"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    oportunidad_id: int = Field(foreign_key="crm_oportunidades.id", ondelete="CASCADE")
+    estado: str = Field(max_length=20, index=True)
+    desde: Optional[date] = Field(default=None)
+    hasta: Optional[date] = Field(default=None)
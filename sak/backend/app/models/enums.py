@@ -103,3 +103,11 @@ class TipoCompra(str, Enum):
     """Tipos de compra disponibles"""
     DIRECTA = "directa"
     NORMAL = "normal"
+
+
+class EstadoWebhookJob(str, Enum):
+    """Estados de un job de la cola de webhooks entrantes"""
+    PENDIENTE = "pendiente"
+    PROCESANDO = "procesando"
+    COMPLETADO = "completado"
+    FALLIDO = "fallido"
@@ -2,9 +2,9 @@ from typing import Optional, List, TYPE_CHECKING, ClassVar
 from datetime import date, datetime, UTC
 from decimal import Decimal
 
-from sqlmodel import Field, Relationship
+from sqlmodel import Field, Relationship, SQLModel
 from pydantic import field_validator
-from sqlalchemy import Column, DECIMAL
+from sqlalchemy import Column, DECIMAL, Index
 
 from .base import Base
 
@@ -122,6 +122,29 @@ class PropiedadesLogStatus(Base, table=True):
     usuario: Optional["User"] = Relationship()
 
 
+class PropiedadVacanciaIntervalo(SQLModel, table=True):
+    """
+    Sub-intervalo de vacancia de una propiedad en un estado vacante, [desde, hasta).
+
+    Derivado del historial de PropiedadesLogStatus (ver
+    app/services/propiedad_vacancia_service.py); no se edita a mano.
+    `hasta` NULL = vacancia vigente.
+    """
+
+    __tablename__ = "propiedades_vacancia_intervalos"
+    __table_args__ = (
+        Index("ix_propiedades_vacancia_intervalos_rango", "desde", "hasta"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    propiedad_id: int = Field(foreign_key="propiedades.id", ondelete="CASCADE", index=True)
+    estado_orden: int = Field(description="Orden del estado vacante (1=Recibida, 2=En reparación, 3=Disponible)")
+    desde: date
+    hasta: Optional[date] = Field(default=None)
+    es_inicio_ciclo: bool = Field(default=False, description="Abre un ciclo de vacancia (venía de un estado no vacante)")
+    es_fin_ciclo: bool = Field(default=False, description="El ciclo terminó al pasar a Realizada/Retirada")
+
+
 class Propiedad(Base, table=True):
     """Catálogo de propiedades sobre las que se pueden imputar facturas."""
 
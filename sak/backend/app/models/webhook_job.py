@@ -0,0 +1,43 @@
+"""
+Cola durable de webhooks entrantes: el endpoint persiste el payload y los workers lo procesan
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import JSON, Column, DateTime, Index, Text
+from sqlmodel import Field
+
+from app.models.base import Base, current_utc_time
+from app.models.enums import EstadoWebhookJob
+
+
+class WebhookJob(Base, table=True):
+    __tablename__ = "webhook_jobs"
+    __table_args__ = (
+        Index("ix_webhook_jobs_estado_disponible", "estado", "disponible_en"),
+    )
+
+    evento: str = Field(max_length=100, nullable=False)
+    payload: dict = Field(
+        sa_column=Column(JSON, nullable=False),
+        description="Payload crudo recibido de meta-w",
+    )
+    origen_externo_id: Optional[str] = Field(
+        default=None,
+        max_length=255,
+        index=True,
+        description="meta_message_id del mensaje (trazabilidad / deduplicación)",
+    )
+    estado: str = Field(default=EstadoWebhookJob.PENDIENTE.value, max_length=20, nullable=False)
+    intentos: int = Field(default=0, nullable=False)
+    disponible_en: datetime = Field(
+        default_factory=current_utc_time,
+        sa_column=Column(DateTime(timezone=True), nullable=False),
+        description="No se toma antes de esta fecha (backoff entre reintentos)",
+    )
+    bloqueado_en: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(DateTime(timezone=True), nullable=True),
+    )
+    worker_id: Optional[str] = Field(default=None, max_length=100)
+    ultimo_error: Optional[str] = Field(default=None, sa_column=Column(Text))
@@ -5,14 +5,16 @@ from datetime import date
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import Session
 
-from app.db import get_session
+from app.db import get_read_session
 from app.models.base import filtrar_respuesta
 from app.models.crm import CRMOportunidad
 from app.models.enums import EstadoOportunidad
+from app.services import crm_dashboard
 from app.services.crm_dashboard import (
     build_dashboard_detail_entry_from_oportunidad,
     build_crm_dashboard_bundle,
     check_oportunidad_alert,
+    check_oportunidades_alerts,
     fetch_current_oportunidades_for_dashboard,
     fetch_current_oportunidades_for_detail,
     fetch_selector_summary_fast,
@@ -21,6 +23,8 @@ from app.services.crm_dashboard import (
 
 router = APIRouter(prefix="/api/dashboard/crm", tags=["dashboard-crm"])
 
+MAX_ALERT_ITEMS = 200
+
 
 def _parse_int_list(value: Optional[str]) -> Optional[List[int]]:
     if not value:
@@ -61,7 +65,7 @@ def get_crm_dashboard_alert_detail(
     orderDir: str = Query("asc", pattern="^(asc|desc)$"),
     page: int = Query(1, ge=1),
     perPage: int = Query(25, ge=1, le=200),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     oportunidades = fetch_current_oportunidades_for_dashboard(
         session=session,
@@ -133,16 +137,15 @@ def get_crm_dashboard_detalle(
     orderDir: str = Query("asc", pattern="^(asc|desc)$"),
     page: int = Query(1, ge=1),
     perPage: int = Query(25, ge=1, le=200),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     tipo_operacion_ids = (
         None if kpiKey == "prospect" else _parse_int_list(tipoOperacion)
     )
 
-    # When secondary filters (stage/bucket) or alertKey are active we must load
-    # all matching rows to post-filter, then page in Python.  In the common case
-    # (no secondary filters) we push everything to SQL.
-    if alertKey or stage or bucket:
+    # Sin snapshot del pipeline los filtros secundarios (stage/bucket/alertKey) se
+    # resuelven en Python sobre todas las oportunidades vigentes del periodo.
+    if (alertKey or stage or bucket) and not crm_dashboard.CRM_DASHBOARD_SNAPSHOT:
         oportunidades = fetch_current_oportunidades_for_dashboard(
             session=session,
             start_date=startDate,
@@ -209,7 +212,7 @@ def get_crm_dashboard_detalle(
         data = [{**item, "oportunidad": filtrar_respuesta(item["oportunidad"])} for item in paged]
         return {"data": data, "total": total_count, "page": page, "perPage": perPage}
 
-    # Fast path: all filtering and pagination done in SQL
+    # Filtros, orden y paginación en SQL (con filtros secundarios, sobre el snapshot)
     oportunidades_paged, total_count = fetch_current_oportunidades_for_detail(
         session=session,
         kpi_key=kpiKey,
@@ -224,10 +227,13 @@ def get_crm_dashboard_detalle(
         order_dir=orderDir,
         page=page,
         per_page=perPage,
+        alert_key=alertKey,
+        stage=stage,
+        bucket=bucket,
     )
     data = [
         {
-            **build_dashboard_detail_entry_from_oportunidad(op, kpiKey),
+            **build_dashboard_detail_entry_from_oportunidad(op, alertKey or kpiKey),
             "oportunidad": filtrar_respuesta(op),
         }
         for op in oportunidades_paged
@@ -244,7 +250,7 @@ def get_crm_dashboard_selectors(
     responsable: Optional[str] = Query(None),
     emprendimiento: Optional[str] = Query(None),
     propietario: Optional[str] = Query(None),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     """Conteo rápido por estado sin cargar logs ni relaciones."""
     try:
@@ -277,7 +283,7 @@ def get_crm_dashboard_bundle(
     periodType: str = Query("trimestre"),
     trendSteps: str = Query("-3,-2,-1,0", description="Pasos de trend separados por coma"),
     previousStep: int = Query(-1, description="Paso para el periodo anterior"),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     """Devuelve current + previous + trend en un solo request."""
     def _parse_steps(raw: str) -> List[int]:
@@ -326,7 +332,7 @@ def get_crm_dashboard_alerta_item(
         ...,
         pattern="^(mensajesSinLeer|prospectSinResolver|tareasVencidas|enProcesoSinMovimiento)$",
     ),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     """Indica si una oportunidad concreta sigue teniendo activa la alerta indicada."""
     try:
@@ -338,3 +344,17 @@ def get_crm_dashboard_alerta_item(
         return {"id": id, "alertKey": alertKey, "hasAlert": tiene_alerta}
     except Exception as exc:  # pragma: no cover
         raise HTTPException(status_code=500, detail="Error inesperado") from exc
+
+
+@router.get("/alerta-items")
+def get_crm_dashboard_alerta_items(
+    ids: str = Query(..., description="IDs de oportunidades separados por coma"),
+    alertKeys: str = Query(..., pattern="^(mensajesSinLeer|prospectSinResolver|tareasVencidas|enProcesoSinMovimiento)(,(mensajesSinLeer|prospectSinResolver|tareasVencidas|enProcesoSinMovimiento))*$"),
+    session: Session = Depends(get_read_session),
+):
+    """Flags de varias oportunidades y alertas en un request (una consulta agrupada por alerta)."""
+    oportunidad_ids = _parse_int_list(ids) or []
+    if len(oportunidad_ids) > MAX_ALERT_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_ALERT_ITEMS} ids por request")
+    flags = check_oportunidades_alerts(oportunidad_ids, _parse_str_list(alertKeys) or [], session)
+    return {"data": [{"id": oportunidad_id, "alerts": alerts} for oportunidad_id, alerts in flags.items()]}
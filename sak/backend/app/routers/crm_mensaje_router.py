@@ -6,17 +6,20 @@ from typing import Any
 from fastapi import APIRouter, Body, Depends, HTTPException, Request
 from sqlalchemy import and_, func, or_, update
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 import httpx
 
+from agente.v2.core.lanes import TurnLaneFullError
 from agente.v2.core.orchestrator import AgentTurnOrchestrator
 from agente.v2.core.runtime import resolve_chat_agent_mode
+from agente.v2.db.stores import ConversationStateConflict
 from agente.v2.processes.solicitud_materiales.models import MaterialRequestState
 from agente.v2.processes.solicitud_materiales.family_catalog import get_familia_material, save_familia_material
 from agente.v2.processes.solicitud_materiales.handler import ConversationAgentV2, build_request_reply_text, build_v2_dependencies
 from app.core.router import create_generic_router, flatten_nested_filters
 from app.models.base import filtrar_respuesta, serialize_datetime
 from app.crud.crm_mensaje_crud import crm_mensaje_crud
-from app.db import get_session
+from app.db import get_async_session, get_read_session, get_session, run_db
 from app.models import CRMMensaje, CRMCelular, CRMContacto, CRMOportunidad, CRMTipoOperacion, Proyecto
 from app.models.enums import TipoMensaje, CanalMensaje, EstadoMensaje
 from app.services.crm_mensaje_service import crm_mensaje_service
@@ -331,10 +334,10 @@ def sugerir_mensaje_llm(
 @router.post("/acciones/chat/{oportunidad_id}/ia-respuesta")
 async def sugerir_respuesta_chat_ia(
     oportunidad_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     try:
-        message_id = AgentTurnOrchestrator.resolve_latest_message_id(session, oportunidad_id)
+        message_id = await run_db(session, AgentTurnOrchestrator.resolve_latest_message_id, oportunidad_id)
         orchestrator = _build_v2_orchestrator()
         return await orchestrator.process_turn(
             session,
@@ -343,7 +346,10 @@ async def sugerir_respuesta_chat_ia(
         )
     except HTTPException:
         raise
-    except ValueError as e:
+    except ConversationStateConflict as e:
+        # Otro turno de la misma conversacion guardo antes: el cliente puede reintentar
+        raise HTTPException(status_code=409, detail=str(e))
+    except (ValueError, TurnLaneFullError) as e:
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error("Error generando sugerencia IA para chat", exc_info=True)
@@ -354,11 +360,11 @@ async def sugerir_respuesta_chat_ia(
 async def sugerir_respuesta_chat_ia_v2(
     oportunidad_id: int,
     payload: dict = Body(default={}),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     try:
         requested_message_id = payload.get("message_id") if isinstance(payload, dict) else None
-        message_id = int(requested_message_id) if requested_message_id else AgentTurnOrchestrator.resolve_latest_message_id(session, oportunidad_id)
+        message_id = int(requested_message_id) if requested_message_id else await run_db(session, AgentTurnOrchestrator.resolve_latest_message_id, oportunidad_id)
         orchestrator = _build_v2_orchestrator()
         return await orchestrator.process_turn(
             session,
@@ -367,7 +373,10 @@ async def sugerir_respuesta_chat_ia_v2(
         )
     except HTTPException:
         raise
-    except ValueError as e:
+    except ConversationStateConflict as e:
+        # Otro turno de la misma conversacion guardo antes: el cliente puede reintentar
+        raise HTTPException(status_code=409, detail=str(e))
+    except (ValueError, TurnLaneFullError) as e:
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error("Error generando sugerencia IA v2 para chat", exc_info=True)
@@ -448,7 +457,7 @@ def crear_oportunidad_desde_mensaje(
 async def responder_mensaje_whatsapp(
     mensaje_id: int,
     request: ResponderMensajeRequest,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """
     Responde a un mensaje de WhatsApp a través de meta-w.
@@ -467,31 +476,115 @@ async def responder_mensaje_whatsapp(
     Returns:
         ResponderMensajeResponse con ID del mensaje creado y estado
     """
+    preparado = await run_db(session, _preparar_respuesta_whatsapp, mensaje_id, request)
+    mensaje_salida = preparado["mensaje_salida"]
+    celular = preparado["celular"]
+    oportunidad_creada = preparado["oportunidad_creada"]
+
+    # 7. Enviar a través de meta-w
+    try:
+        # meta-w requiere empresa_id y celular_id como UUIDs
+        # Por ahora usamos meta_celular_id del celular (UUID)
+        if not celular.meta_celular_id:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Celular {celular.id} no tiene meta_celular_id configurado"
+            )
+        
+        # Necesitamos empresa_id - por ahora hardcodeado (TODO: obtener de configuración)
+        EMPRESA_ID = "692d787d-06c4-432e-a94e-cf0686e593eb"
+        
+        # Limpiar teléfono (remover + si existe)
+        telefono_limpio = preparado["contacto_referencia"].replace("+", "")
+        
+        resultado_metaw = await metaw_client.enviar_mensaje(
+            empresa_id=EMPRESA_ID,
+            celular_id=celular.meta_celular_id,
+            telefono_destino=telefono_limpio,
+            texto=request.texto,
+            nombre_contacto=preparado["nombre_contacto"],
+            template_fallback_name=request.template_fallback_name,
+            template_fallback_language=request.template_fallback_language
+        )
+        
+        # 8. Actualizar mensaje con respuesta de meta-w
+        await run_db(session, _registrar_respuesta_enviada, mensaje_salida, resultado_metaw)
+        
+        logger.info(
+            f"Respuesta enviada: mensaje {mensaje_salida.id}, "
+            f"oportunidad_creada={oportunidad_creada}, "
+            f"meta_id={mensaje_salida.origen_externo_id}"
+        )
+        
+        return ResponderMensajeResponse(
+            mensaje_id=mensaje_salida.id,
+            status=mensaje_salida.estado_meta,
+            meta_message_id=mensaje_salida.origen_externo_id
+        )
+        
+    except httpx.HTTPStatusError as e:
+        # Error de meta-w
+        error_msg = f"Error meta-w: {e.response.status_code} - {e.response.text}"
+        logger.error(error_msg)
+        
+        await run_db(
+            session,
+            _registrar_respuesta_fallida,
+            mensaje_salida,
+            {"error": error_msg, "error_code": e.response.status_code},
+        )
+        
+        return ResponderMensajeResponse(
+            mensaje_id=mensaje_salida.id,
+            status="failed",
+            error_message=error_msg
+        )
+        
+    except Exception as e:
+        # Error general
+        error_msg = f"Error al enviar mensaje: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        
+        await run_db(session, _registrar_respuesta_fallida, mensaje_salida, {"error": error_msg})
+        
+        return ResponderMensajeResponse(
+            mensaje_id=mensaje_salida.id,
+            status="failed",
+            error_message=error_msg
+        )
+
+
+def _preparar_respuesta_whatsapp(
+    session: Session,
+    mensaje_id: int,
+    request: ResponderMensajeRequest,
+) -> dict[str, Any]:
+    """Pasos 1-6 de la respuesta (sync, vía run_db): valida, crea oportunidad y el mensaje de salida."""
     # 1. Buscar mensaje original
     mensaje_original = session.get(CRMMensaje, mensaje_id)
     if not mensaje_original:
         raise HTTPException(status_code=404, detail="Mensaje no encontrado")
-    
+
     # 2. Validar que tenga contacto y referencia (teléfono)
     if not mensaje_original.contacto_referencia:
         raise HTTPException(
             status_code=400,
             detail="Mensaje no tiene contacto_referencia (teléfono)"
         )
-    
+
     # 3. Crear oportunidad si no existe
     oportunidad_creada = False
     if not mensaje_original.oportunidad_id and mensaje_original.contacto_id:
         from app.models import CRMOportunidad
         from app.crud.crm_oportunidad_crud import crm_oportunidad_crud
-        
+    
         # Obtener responsable del contacto o del mensaje
         responsable_id = None
         if mensaje_original.contacto:
             responsable_id = mensaje_original.contacto.responsable_id
         if not responsable_id:
             responsable_id = mensaje_original.responsable_id
-        
+    
         if responsable_id:
             oportunidad_payload = {
                 "contacto_id": mensaje_original.contacto_id,
@@ -509,35 +602,35 @@ async def responder_mensaje_whatsapp(
             mensaje_original.oportunidad_id = oportunidad.id
             oportunidad_creada = True
             logger.info(f"Oportunidad {oportunidad.id} creada para mensaje {mensaje_id}")
-    
+
     # 4. Actualizar estado del mensaje original a 'recibido'
     if mensaje_original.estado in [EstadoMensaje.NUEVO.value, "descartado"]:
         mensaje_original.estado = EstadoMensaje.RECIBIDO.value
         logger.info(f"Mensaje {mensaje_id} actualizado a estado 'recibido'")
-    
+
     session.commit()
     session.refresh(mensaje_original)
-    
+
     # 5. Obtener celular para respuesta (priorizar el del mensaje original)
     celular = None
-    
+
     # Intentar usar el mismo celular del mensaje original
     if mensaje_original.celular_id:
         celular = session.get(CRMCelular, mensaje_original.celular_id)
         if celular and not celular.activo:
             celular = None  # Fallback si el celular original está inactivo
-    
+
     # Si no hay celular del mensaje original, buscar uno activo
     if not celular:
         stmt = select(CRMCelular).where(CRMCelular.activo == True).limit(1)
         celular = session.exec(stmt).first()
-    
+
     if not celular:
         raise HTTPException(
             status_code=404,
             detail="No hay celular (canal WhatsApp) activo configurado"
         )
-    
+
     fecha_salida = datetime.now(UTC)
     fecha_origen = mensaje_original.fecha_mensaje
     if fecha_origen is not None and fecha_origen.tzinfo is None:
@@ -562,99 +655,41 @@ async def responder_mensaje_whatsapp(
     session.add(mensaje_salida)
     session.commit()
     session.refresh(mensaje_salida)
-    
+
     # Actualizar ultimo_mensaje en oportunidad
     from app.services.crm_mensaje_service import CRMMensajeService
     CRMMensajeService.actualizar_ultimo_mensaje_oportunidad(session, mensaje_salida)
-    
-    # 7. Enviar a través de meta-w
-    try:
-        # meta-w requiere empresa_id y celular_id como UUIDs
-        # Por ahora usamos meta_celular_id del celular (UUID)
-        if not celular.meta_celular_id:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Celular {celular.id} no tiene meta_celular_id configurado"
-            )
-        
-        # Necesitamos empresa_id - por ahora hardcodeado (TODO: obtener de configuración)
-        EMPRESA_ID = "692d787d-06c4-432e-a94e-cf0686e593eb"
-        
-        # Limpiar teléfono (remover + si existe)
-        telefono_limpio = mensaje_original.contacto_referencia.replace("+", "")
-        
-        # Obtener nombre del contacto si existe
-        nombre_contacto = None
-        if mensaje_original.contacto:
-            nombre_contacto = mensaje_original.contacto.nombre_completo
-        
-        resultado_metaw = await metaw_client.enviar_mensaje(
-            empresa_id=EMPRESA_ID,
-            celular_id=celular.meta_celular_id,
-            telefono_destino=telefono_limpio,
-            texto=request.texto,
-            nombre_contacto=nombre_contacto,
-            template_fallback_name=request.template_fallback_name,
-            template_fallback_language=request.template_fallback_language
-        )
-        
-        # 8. Actualizar mensaje con respuesta de meta-w
-        mensaje_salida.estado_meta = resultado_metaw.get("status", "sent")
-        mensaje_salida.origen_externo_id = resultado_metaw.get("meta_message_id")
-        mensaje_salida.estado = EstadoMensaje.ENVIADO.value
-        session.commit()
-        session.refresh(mensaje_salida)
-        
-        logger.info(
-            f"Respuesta enviada: mensaje {mensaje_salida.id}, "
-            f"oportunidad_creada={oportunidad_creada}, "
-            f"meta_id={mensaje_salida.origen_externo_id}"
-        )
-        
-        return ResponderMensajeResponse(
-            mensaje_id=mensaje_salida.id,
-            status=mensaje_salida.estado_meta,
-            meta_message_id=mensaje_salida.origen_externo_id
-        )
-        
-    except httpx.HTTPStatusError as e:
-        # Error de meta-w
-        error_msg = f"Error meta-w: {e.response.status_code} - {e.response.text}"
-        logger.error(error_msg)
-        
-        mensaje_salida.estado = EstadoMensaje.ERROR_ENVIO.value
-        mensaje_salida.estado_meta = "failed"
-        mensaje_salida.metadata_json = {
-            **(mensaje_salida.metadata_json or {}),
-            "error": error_msg,
-            "error_code": e.response.status_code,
-        }
-        session.commit()
-        
-        return ResponderMensajeResponse(
-            mensaje_id=mensaje_salida.id,
-            status="failed",
-            error_message=error_msg
-        )
-        
-    except Exception as e:
-        # Error general
-        error_msg = f"Error al enviar mensaje: {str(e)}"
-        logger.error(error_msg, exc_info=True)
-        
-        mensaje_salida.estado = EstadoMensaje.ERROR_ENVIO.value
-        mensaje_salida.estado_meta = "failed"
-        mensaje_salida.metadata_json = {
-            **(mensaje_salida.metadata_json or {}),
-            "error": error_msg,
-        }
-        session.commit()
-        
-        return ResponderMensajeResponse(
-            mensaje_id=mensaje_salida.id,
-            status="failed",
-            error_message=error_msg
-        )
+
+    # Obtener nombre del contacto si existe
+    nombre_contacto = None
+    if mensaje_original.contacto:
+        nombre_contacto = mensaje_original.contacto.nombre_completo
+
+    return {
+        "mensaje_salida": mensaje_salida,
+        "celular": celular,
+        "oportunidad_creada": oportunidad_creada,
+        "contacto_referencia": mensaje_original.contacto_referencia,
+        "nombre_contacto": nombre_contacto,
+    }
+
+
+def _registrar_respuesta_enviada(session: Session, mensaje_salida: CRMMensaje, resultado_metaw: dict) -> None:
+    mensaje_salida.estado_meta = resultado_metaw.get("status", "sent")
+    mensaje_salida.origen_externo_id = resultado_metaw.get("meta_message_id")
+    mensaje_salida.estado = EstadoMensaje.ENVIADO.value
+    session.commit()
+    session.refresh(mensaje_salida)
+
+
+def _registrar_respuesta_fallida(session: Session, mensaje_salida: CRMMensaje, error: dict) -> None:
+    mensaje_salida.estado = EstadoMensaje.ERROR_ENVIO.value
+    mensaje_salida.estado_meta = "failed"
+    mensaje_salida.metadata_json = {
+        **(mensaje_salida.metadata_json or {}),
+        **error,
+    }
+    session.commit()
 
 
 @router.post("/{mensaje_id}/responder-legacy")
@@ -709,7 +744,7 @@ def agendar_evento_mensaje(
 @router.post("/acciones/enviar")
 async def enviar_mensaje_desde_panel(
     payload: dict = Body(...),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     try:
         return await crm_mensaje_service.enviar_mensaje(session, payload)
@@ -868,7 +903,7 @@ def obtener_actividades_alias(
 
 @router.get("/acciones/cursor")
 def mensajes_cursor(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     contacto_id: int | None = None,
     oportunidad_id: int | None = None,
     contacto_referencia: str | None = None,
@@ -965,7 +1000,7 @@ def marcar_mensajes_leidos(
 
 @router.get("/acciones/conversaciones")
 def conversaciones_cursor(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     canal: str | None = None,
     responsable_id: int | None = None,
     estado_oportunidad: str | None = None,
@@ -1,8 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlmodel import Session
 
 from app.api.auth import get_current_user
-from app.db import get_session
+from app.db import get_read_session
 from app.models.user import User
 from app.services.home_dashboard import (
     build_home_dashboard_bundle,
@@ -16,15 +16,20 @@ router = APIRouter(prefix="/api/dashboard/home", tags=["dashboard-home"])
 
 @router.get("/bundle")
 def get_home_dashboard_bundle(
-    session: Session = Depends(get_session),
+    response: Response,
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(get_current_user),
 ):
     try:
-        return build_home_dashboard_bundle(session=session, current_user=current_user)
+        bundle = build_home_dashboard_bundle(session=session, current_user=current_user)
     except HTTPException:
         raise
     except Exception as exc:  # pragma: no cover
         raise HTTPException(status_code=500, detail="Error inesperado") from exc
+    if bundle.get("staleSections"):
+        # Bundle parcial: que no lo guarde el cache de dashboards ni el navegador
+        response.headers["Cache-Control"] = "no-store"
+    return bundle
 
 
 @router.get("/context")
@@ -60,7 +65,7 @@ def _get_home_dashboard_domain(
 
 @router.get("/personal")
 def get_home_dashboard_personal(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(get_current_user),
 ):
     return _get_home_dashboard_domain("personal", session, current_user)
@@ -68,7 +73,7 @@ def get_home_dashboard_personal(
 
 @router.get("/poorders")
 def get_home_dashboard_poorders(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(get_current_user),
 ):
     return _get_home_dashboard_domain("poorders", session, current_user)
@@ -76,7 +81,7 @@ def get_home_dashboard_poorders(
 
 @router.get("/oportunidades")
 def get_home_dashboard_oportunidades(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(get_current_user),
 ):
     return _get_home_dashboard_domain("oportunidades", session, current_user)
@@ -84,7 +89,7 @@ def get_home_dashboard_oportunidades(
 
 @router.get("/contratos")
 def get_home_dashboard_contratos(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(get_current_user),
 ):
     return _get_home_dashboard_domain("contratos", session, current_user)
@@ -92,7 +97,7 @@ def get_home_dashboard_contratos(
 
 @router.get("/propiedades")
 def get_home_dashboard_propiedades(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(get_current_user),
 ):
     return _get_home_dashboard_domain("propiedades", session, current_user)
@@ -101,7 +106,7 @@ def get_home_dashboard_propiedades(
 @router.get("/partial")
 def get_home_dashboard_partial(
     keys: str = Query(..., description="Bloques a refrescar separados por coma"),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     current_user: User = Depends(get_current_user),
 ):
     try:
@@ -2,18 +2,25 @@
 Router para recibir webhooks de Meta WhatsApp
 """
 import logging
-from typing import Dict, Any
+import os
+from typing import Dict, Any, List
 from fastapi import APIRouter, Depends, HTTPException, Request, Query
-from sqlmodel import Session
+from pydantic import ValidationError
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.db import get_session
+from app.db import get_async_session, run_db
 from app.schemas.meta_webhook import WebhookEventPayload, WebhookResponse
+from app.schemas.metaw_webhook import MetaWWebhookPayload
+from app.services import webhook_queue
 from app.services.meta_webhook_service import MetaWebhookService
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/webhooks/meta-whatsapp", tags=["webhooks"])
 
+# Máximo de eventos por request en /batch
+META_WEBHOOK_BATCH_MAX = int(os.getenv("META_WEBHOOK_BATCH_MAX", "500"))
+
 
 @router.get("/", response_model=Dict[str, Any])
 async def verify_webhook(
@@ -45,7 +52,7 @@ async def verify_webhook(
 @router.post("/", response_model=WebhookResponse)
 async def receive_webhook(
     payload: Dict[str, Any],
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     """
     Endpoint para recibir notificaciones de meta-w.
@@ -67,9 +74,27 @@ async def receive_webhook(
     Eventos soportados:
     - message.received: Mensaje entrante de un contacto
     - message.status: Cambio de estado de un mensaje enviado
+
+    Con META_WEBHOOK_QUEUE (default) solo valida y encola el payload; el procesamiento
+    lo hacen los workers de app/services/webhook_queue.py.
     """
     logger.info(f"Webhook recibido: {payload}")
-    
+
+    if webhook_queue.META_WEBHOOK_QUEUE:
+        try:
+            metaw_payload = MetaWWebhookPayload(**payload)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Payload de webhook inválido: {e.errors()}")
+        job = await run_db(
+            session,
+            webhook_queue.enqueue_webhook_job,
+            payload,
+            metaw_payload.event_type,
+            metaw_payload.mensaje.meta_message_id,
+        )
+        webhook_queue.webhook_worker.notify()
+        return WebhookResponse(status="ok", message=f"Webhook encolado (job {job.id})")
+
     try:
         service = MetaWebhookService(session)
         result = await service.process_webhook(payload)
@@ -80,3 +105,31 @@ async def receive_webhook(
     except Exception as e:
         logger.error(f"Error procesando webhook: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error procesando webhook: {str(e)}")
+
+
+@router.post("/batch", response_model=Dict[str, Any])
+async def receive_webhook_batch(
+    payloads: List[Dict[str, Any]],
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Ingesta en lote de eventos de meta-w (replay del backlog tras una caída).
+
+    Recibe un array de payloads con el mismo formato que `POST /`. Se procesa inline
+    en una sola transacción: duplicados (mismo meta_message_id) se ignoran y los
+    eventos inválidos se informan en `invalidos` sin frenar al resto. Los turnos del
+    agente se encolan (`turnos_encolados`) y no se esperan.
+    """
+    if len(payloads) > META_WEBHOOK_BATCH_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"El lote supera el máximo de {META_WEBHOOK_BATCH_MAX} eventos",
+        )
+    logger.info("Lote de webhooks recibido: %s eventos", len(payloads))
+    try:
+        return await MetaWebhookService(session).process_webhook_batch(payloads)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error procesando lote de webhooks: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error procesando lote de webhooks: {str(e)}")
@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Depends
+from sqlmodel import Session
+
+from agente.v2.core.lanes import turn_scheduler
+from app.core import dashboard_cache
+from app.core.generic_crud import describe_loader_plans
+from app.core.instrumentation import reset_metrics, reset_pool_metrics, snapshot_metrics, snapshot_pool_metrics
+from app.core.lookup_cache import clear_lookup_caches, snapshot_lookup_caches
+from app.db import get_session
+from app.services.webhook_queue import webhook_queue_stats
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/db")
+def get_db_metrics():
+    """Queries, tiempo de DB, filas y sospechas de N+1 agregados por endpoint."""
+    return snapshot_metrics()
+
+
+@router.delete("/db")
+def reset_db_metrics():
+    reset_metrics()
+    return {"ok": True}
+
+
+@router.get("/pool")
+def get_pool_metrics():
+    """Estado y contadores de los pools de conexiones (checkouts, espera, overflow, invalidaciones)."""
+    return snapshot_pool_metrics()
+
+
+@router.delete("/pool")
+def reset_db_pool_metrics():
+    reset_pool_metrics()
+    return {"ok": True}
+
+
+@router.get("/dashboard-cache")
+def get_dashboard_cache_metrics():
+    """Hits, misses, 304 e invalidaciones del cache de dashboards por namespace."""
+    return {"enabled": dashboard_cache.CACHE_ENABLED, "namespaces": dashboard_cache.metrics.snapshot()}
+
+
+@router.delete("/dashboard-cache")
+def reset_dashboard_cache_metrics():
+    dashboard_cache.metrics.reset()
+    return {"ok": True}
+
+
+@router.get("/webhook-queue")
+def get_webhook_queue_metrics(session: Session = Depends(get_session)):
+    """Jobs de la cola de webhooks por estado y antigüedad del pendiente más viejo."""
+    return webhook_queue_stats(session)
+
+
+@router.get("/lookup-cache")
+def get_lookup_cache_metrics():
+    """Entradas, hits, misses e invalidaciones de los caches de resolución del webhook."""
+    return snapshot_lookup_caches()
+
+
+@router.delete("/lookup-cache")
+def reset_lookup_cache():
+    clear_lookup_caches()
+    return {"ok": True}
+
+
+@router.get("/agent-lanes")
+def get_agent_lane_metrics():
+    """Profundidad de cada carril de turnos del agente y contadores de procesados/rechazados."""
+    return turn_scheduler.stats()
+
+
+@router.delete("/agent-lanes")
+def reset_agent_lane_metrics():
+    turn_scheduler.reset_stats()
+    return {"ok": True}
+
+
+@router.get("/loader-plans")
+def get_loader_plans():
+    """Relaciones que carga cada modelo según los planes de GenericCRUD ya calculados."""
+    return describe_loader_plans()
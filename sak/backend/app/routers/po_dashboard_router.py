@@ -7,11 +7,12 @@ from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import Session
 
-from app.db import get_session
+from app.db import get_read_session
 from app.models.base import filtrar_respuesta
 from app.services.po_dashboard import (
     build_po_dashboard_bundle,
     check_po_alert,
+    check_po_alerts,
     fetch_po_orders_for_dashboard,
     fetch_po_selector_summary_fast,
     filter_po_dashboard_items_by_alert,
@@ -20,6 +21,8 @@ from app.services.po_dashboard import (
 
 router = APIRouter(prefix="/api/dashboard/po", tags=["dashboard-po"])
 
+MAX_ALERT_ITEMS = 200
+
 
 def _parse_int_list(value: Optional[str]) -> Optional[List[int]]:
     if not value:
@@ -76,7 +79,7 @@ def get_po_dashboard_detalle_alerta(
     orderDir: str = Query("desc", pattern="^(asc|desc)$"),
     page: int = Query(1, ge=1),
     perPage: int = Query(25, ge=1, le=200),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     items = fetch_po_orders_for_dashboard(
         session=session,
@@ -136,7 +139,7 @@ def get_po_dashboard_detalle(
     orderDir: str = Query("desc", pattern="^(asc|desc)$"),
     page: int = Query(1, ge=1),
     perPage: int = Query(25, ge=1, le=200),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     items = fetch_po_orders_for_dashboard(
         session=session,
@@ -190,7 +193,7 @@ def get_po_dashboard_selectors(
     tipoSolicitud: Optional[str] = Query(None),
     departamento: Optional[str] = Query(None),
     tipoCompra: Optional[str] = Query(None),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     """Conteo rápido por estado sin cargar relaciones."""
     try:
@@ -223,7 +226,7 @@ def get_po_dashboard_bundle(
     periodType: str = Query("mes"),
     trendSteps: str = Query("-3,-2,-1,0", description="Pasos de trend separados por coma"),
     previousStep: int = Query(-1, description="Paso para el periodo anterior"),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     """Devuelve current + previous + trend en un solo request."""
     def _parse_steps(raw: str) -> List[int]:
@@ -278,7 +281,7 @@ def get_po_dashboard_alerta_item(
     tipoSolicitud: Optional[str] = Query(None),
     departamento: Optional[str] = Query(None),
     tipoCompra: Optional[str] = Query(None),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     """Indica si una orden concreta sigue teniendo activa la alerta indicada."""
     try:
@@ -297,3 +300,38 @@ def get_po_dashboard_alerta_item(
         return {"id": id, "alertKey": alertKey, "hasAlert": tiene_alerta}
     except Exception as exc:  # pragma: no cover
         raise HTTPException(status_code=500, detail="Error inesperado") from exc
+
+
+@router.get("/alerta-items")
+def get_po_dashboard_alerta_items(
+    ids: str = Query(..., description="IDs de órdenes separados por coma"),
+    alertKeys: str = Query(..., pattern="^(rechazadas|solicitudes_vencidas|emitidas_vencidas)(,(rechazadas|solicitudes_vencidas|emitidas_vencidas))*$"),
+    startDate: str = Query(..., description="Fecha inicio YYYY-MM-DD"),
+    endDate: str = Query(..., description="Fecha fin YYYY-MM-DD"),
+    solicitante: Optional[str] = Query(None),
+    proveedor: Optional[str] = Query(None),
+    tipoSolicitud: Optional[str] = Query(None),
+    departamento: Optional[str] = Query(None),
+    tipoCompra: Optional[str] = Query(None),
+    session: Session = Depends(get_read_session),
+):
+    """Flags de varias órdenes y alertas en un request (una sola consulta)."""
+    order_ids = _parse_int_list(ids) or []
+    if len(order_ids) > MAX_ALERT_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_ALERT_ITEMS} ids por request")
+    try:
+        flags = check_po_alerts(
+            order_ids,
+            _parse_str_list(alertKeys) or [],
+            start_date=startDate,
+            end_date=endDate,
+            session=session,
+            solicitante_ids=_parse_int_list(solicitante),
+            proveedor_ids=_parse_int_list(proveedor),
+            tipo_solicitud_ids=_parse_int_list(tipoSolicitud),
+            departamento_ids=_parse_int_list(departamento),
+            tipo_compra_values=_parse_str_list(tipoCompra),
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {"data": [{"id": order_id, "alerts": alerts} for order_id, alerts in flags.items()]}
@@ -58,7 +58,7 @@ from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import Session
 
-from app.db import get_session
+from app.db import get_read_session
 from app.services.propiedades_dashboard import (
     build_prop_dashboard_bundle,
     build_prop_detalle,
@@ -94,7 +94,7 @@ def get_bundle(
     periodType: str = Query("trimestre", description="mes|trimestre|cuatrimestre|semestre|anio"),
     trendSteps: str = Query("-3,-2,-1,0", description="Pasos para evolución temporal"),
     previousStep: str = Query("-1", description="Paso para período anterior"),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     """
     Retorna el bundle completo del dashboard de propiedades para un período dado.
@@ -145,7 +145,7 @@ def get_selectors(
     tipoOperacionId: Optional[str] = Query(None, description="ID o 'todos'"),
     emprendimientoId: Optional[str] = Query(None, description="ID o 'todos'"),
     pivotDate: Optional[str] = Query(None, description="Fecha pivot YYYY-MM-DD"),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     """
     Retorna el snapshot de conteos por estado actual del portfolio.
@@ -190,7 +190,7 @@ def get_detalle(
     endDate: Optional[str] = Query(None),
     tipoOperacionId: Optional[str] = Query(None),
     emprendimientoId: Optional[str] = Query(None),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     """
     Retorna el listado paginado de propiedades para un estado (selector) dado.
@@ -237,7 +237,7 @@ def get_detalle_alerta(
     tipoOperacionId: Optional[str] = Query(None),
     emprendimientoId: Optional[str] = Query(None),
     pivotDate: Optional[str] = Query(None, description="Fecha pivot YYYY-MM-DD"),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     """
     Retorna el listado paginado de propiedades con alertas de vencimiento próximas
@@ -288,7 +288,7 @@ def get_detalle_alerta(
 def get_dashboard(
     pivotDate: Optional[str] = Query(None, description="Fecha pivot YYYY-MM-DD"),
     tipoOperacionId: Optional[int] = Query(None, description="ID tipo de operacion"),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     """
     [LEGACY] Dashboard general de propiedades (snapshot).
@@ -311,7 +311,7 @@ def get_dashboard(
 def get_realizada_vencimientos(
     pivotDate: Optional[str] = Query(None, description="Fecha pivot YYYY-MM-DD"),
     tipoOperacionId: Optional[int] = Query(None, description="ID tipo de operacion"),
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
 ):
     """
     [LEGACY] Listado de propiedades Realizadas con vencimientos próximos.
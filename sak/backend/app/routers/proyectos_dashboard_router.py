@@ -4,13 +4,14 @@ from datetime import date, datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import Session
 
-from app.db import get_session
+from app.db import get_read_session, get_session
 from app.models.base import filtrar_respuesta
 from app.services.proyectos_dashboard import (
     CalculatedProyecto,  # 🚀 Tipo para nuevas funciones optimizadas
     build_dashboard_detail_entry_from_calculated_proyecto,  # 🚀 Nueva función optimizada
     build_proyectos_dashboard_payload,
     check_proyecto_alert,
+    check_proyectos_alerts,
     fetch_current_proyectos_for_dashboard,
     fetch_proyectos_for_dashboard_optimized,  # 🚀 Función optimizada con single query
     fetch_selector_summary_fast,
@@ -19,6 +20,8 @@ from app.services.proyectos_dashboard import (
 
 router = APIRouter(prefix="/api/dashboard/proyectos", tags=["dashboard-proyectos"])
 
+MAX_ALERT_ITEMS = 200
+
 
 def _parse_int_list(value: Optional[str]) -> Optional[List[int]]:
     """Parsea lista de enteros separados por coma"""
@@ -466,3 +469,17 @@ def get_proyectos_alertas(
         raise HTTPException(status_code=400, detail=str(exc)) from exc
     except Exception as exc:  # pragma: no cover
         raise HTTPException(status_code=500, detail="Error inesperado") from exc
+
+
+@router.get("/alerta-items")
+def get_proyectos_dashboard_alerta_items(
+    ids: str = Query(..., description="IDs de proyectos separados por coma"),
+    alertKeys: str = Query(..., pattern="^(mensajes|eventos|ordenes_rechazadas)(,(mensajes|eventos|ordenes_rechazadas))*$"),
+    session: Session = Depends(get_read_session),
+):
+    """Flags de varios proyectos y alertas en un request (una consulta agrupada por alerta)."""
+    proyecto_ids = _parse_int_list(ids) or []
+    if len(proyecto_ids) > MAX_ALERT_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_ALERT_ITEMS} ids por request")
+    flags = check_proyectos_alerts(proyecto_ids, _parse_str_list(alertKeys) or [], session)
+    return {"data": [{"id": proyecto_id, "alerts": alerts} for proyecto_id, alerts in flags.items()]}
@@ -1,25 +1,46 @@
 from __future__ import annotations
 
 import calendar
-from dataclasses import dataclass
+import os
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass, field
 from datetime import UTC, date, datetime, timedelta
 from decimal import Decimal
+from itertools import groupby
 from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
-from sqlalchemy import func
-from sqlalchemy.orm import selectinload
+from sqlalchemy import and_, case, false, func, or_
+from sqlalchemy.orm import aliased, selectinload
 from sqlmodel import Session, select
 
-from app.models.crm import CRMEvento, CRMMensaje, CRMOportunidad
+from app.models.crm import (
+    CRMEvento,
+    CRMMensaje,
+    CRMOportunidad,
+    CRMOportunidadLogEstado,
+    CRMPipelineEstadoIntervalo,
+    CRMPipelineSnapshot,
+    CRMTipoOperacion,
+)
 from app.models.enums import EstadoEvento, EstadoMensaje, EstadoOportunidad, TipoMensaje
 from app.models.propiedad import Propiedad, PropiedadesStatus
 
+# "1": KPIs, funnel y evolución del bundle salen del snapshot materializado (SQL);
+# "0": cálculo en Python sobre oportunidades + logs (camino original).
+CRM_DASHBOARD_SNAPSHOT = os.getenv("CRM_DASHBOARD_SNAPSHOT", "1") == "1"
+
 OPEN_PIPELINE_STATES = (
     EstadoOportunidad.ABIERTA.value,
     EstadoOportunidad.VISITA.value,
     EstadoOportunidad.COTIZA.value,
     EstadoOportunidad.RESERVA.value,
 )
+_PROCESO_STATES = OPEN_PIPELINE_STATES[:-1]
+_PROSPECT = EstadoOportunidad.PROSPECT.value
+_RESERVA = EstadoOportunidad.RESERVA.value
+_GANADA = EstadoOportunidad.GANADA.value
+_PERDIDA = EstadoOportunidad.PERDIDA.value
 
 
 @dataclass
@@ -56,6 +77,7 @@ class CalculatedOportunidad:
     bucket_estado: str
     bucket_cierre: Optional[str]
     dias_pipeline: int
+    estado_timeline: Optional["_EstadoTimeline"] = field(default=None, repr=False, compare=False)
 
 
 def _to_date(value: str | date | datetime | None) -> date:
@@ -178,6 +200,8 @@ def _is_open_pipeline_at(item: CalculatedOportunidad, cut: date) -> bool:
         return False
     if item.fecha_cierre and item.fecha_cierre <= cut:
         return False
+    if item.estado_timeline is not None:
+        return _is_open_pipeline_state(item.estado_timeline.at(cut.toordinal()))
     return _is_open_pipeline_state(_estado_al_corte(item.oportunidad, cut))
 
 
@@ -383,19 +407,22 @@ def build_current_funnel(
     reserva = [item for item in items if item.es_reserva]
     cerrada = [item for item in items if item.es_cerrada_periodo]
 
-    ordered = [
-        ("prospect", "Prospect", prospect),
-        ("proceso", "Proceso", proceso),
-        ("reserva", "Reserva", reserva),
-        ("cerrada", "Cierre", cerrada),
-    ]
-    total_items = max(sum(len(grp) for _, _, grp in ordered), 1)
+    return _funnel_from_groups(
+        [
+            ("prospect", "Prospect", len(prospect), _sum_amount(item.monto_estimado for item in prospect)),
+            ("proceso", "Proceso", len(proceso), _sum_amount(item.monto_estimado for item in proceso)),
+            ("reserva", "Reserva", len(reserva), _sum_amount(item.monto_estimado for item in reserva)),
+            ("cerrada", "Cierre", len(cerrada), _sum_amount(item.monto_estimado for item in cerrada)),
+        ]
+    )
+
+
+def _funnel_from_groups(ordered: Sequence[Tuple[str, str, int, Decimal]]) -> List[dict]:
+    total_items = max(sum(count for _, _, count, _ in ordered), 1)
     previous_count: Optional[int] = None
     funnel: List[dict] = []
 
-    for key, label, grp in ordered:
-        count = len(grp)
-        amount = _sum_amount(item.monto_estimado for item in grp)
+    for key, label, count, amount in ordered:
         conversion = _conversion(count, total_items)
         previous_conversion = _conversion(previous_count, total_items) if previous_count is not None else 0.0
         funnel.append(
@@ -553,62 +580,82 @@ def filter_current_oportunidades_by_alert(
     return list(oportunidades)
 
 
-def check_oportunidad_alert(
-    oportunidad_id: int,
-    alert_key: str,
-    session: Session,
-) -> bool:
-    """Devuelve True si la oportunidad sigue teniendo la alerta indicada."""
-    from sqlmodel import select as _select
+CRM_ALERT_KEYS = ("mensajesSinLeer", "prospectSinResolver", "tareasVencidas", "enProcesoSinMovimiento")
 
-    oportunidad = session.get(CRMOportunidad, oportunidad_id)
-    if oportunidad is None or oportunidad.deleted_at is not None:
-        return False
 
-    if alert_key == "prospectSinResolver":
-        return (
-            oportunidad.estado == EstadoOportunidad.PROSPECT.value
-            and bool(oportunidad.activo)
-        )
+def check_oportunidades_alerts(
+    oportunidad_ids: Sequence[int],
+    alert_keys: Sequence[str],
+    session: Session,
+) -> Dict[int, Dict[str, bool]]:
+    """
+    Flags de alerta para varias oportunidades: {id: {alert_key: bool}}.
 
-    if alert_key == "enProcesoSinMovimiento":
-        stale_cutoff = datetime.now(UTC) - timedelta(days=30)
-        return (
-            bool(oportunidad.activo)
-            and oportunidad.estado
-            in (
-                EstadoOportunidad.ABIERTA.value,
-                EstadoOportunidad.VISITA.value,
-                EstadoOportunidad.COTIZA.value,
-                EstadoOportunidad.RESERVA.value,
-            )
-            and oportunidad.fecha_estado is not None
-            and oportunidad.fecha_estado.replace(tzinfo=UTC) < stale_cutoff
-        )
+    Una consulta para las alertas sobre la propia oportunidad y una agrupada por
+    oportunidad_id para mensajes y otra para eventos (solo si se piden).
+    """
+    ids = sorted({int(oportunidad_id) for oportunidad_id in oportunidad_ids})
+    keys = [key for key in CRM_ALERT_KEYS if key in set(alert_keys)]
+    result: Dict[int, Dict[str, bool]] = {oportunidad_id: dict.fromkeys(keys, False) for oportunidad_id in ids}
+    if not ids or not keys:
+        return result
+
+    vivas = select(CRMOportunidad.id).where(CRMOportunidad.id.in_(ids)).where(CRMOportunidad.deleted_at.is_(None))
+
+    estado_keys = [key for key in keys if key in ("prospectSinResolver", "enProcesoSinMovimiento")]
+    if estado_keys:
+        rows = session.execute(
+            select(
+                CRMOportunidad.id,
+                and_(CRMOportunidad.estado == EstadoOportunidad.PROSPECT.value, CRMOportunidad.activo.is_(True)),
+                and_(
+                    CRMOportunidad.activo.is_(True),
+                    CRMOportunidad.estado.in_(OPEN_PIPELINE_STATES),
+                    CRMOportunidad.fecha_estado < datetime.now(UTC) - timedelta(days=30),
+                ),
+            ).where(CRMOportunidad.id.in_(vivas))
+        ).all()
+        for oportunidad_id, prospect, sin_movimiento in rows:
+            flags = {"prospectSinResolver": bool(prospect), "enProcesoSinMovimiento": bool(sin_movimiento)}
+            for key in estado_keys:
+                result[oportunidad_id][key] = flags[key]
 
-    if alert_key == "mensajesSinLeer":
-        count = session.exec(
-            _select(func.count(CRMMensaje.id))
+    if "mensajesSinLeer" in keys:
+        query = (
+            select(CRMMensaje.oportunidad_id)
             .where(CRMMensaje.deleted_at.is_(None))
-            .where(CRMMensaje.oportunidad_id == oportunidad_id)
+            .where(CRMMensaje.oportunidad_id.in_(vivas))
             .where(CRMMensaje.tipo == TipoMensaje.ENTRADA.value)
             .where(CRMMensaje.estado == EstadoMensaje.NUEVO.value)
-        ).one()
-        return int(count or 0) > 0
+            .group_by(CRMMensaje.oportunidad_id)
+        )
+        for oportunidad_id in session.exec(query).all():
+            result[oportunidad_id]["mensajesSinLeer"] = True
 
-    if alert_key == "tareasVencidas":
-        today = datetime.now(UTC).date()
-        count = session.exec(
-            _select(func.count(CRMEvento.id))
+    if "tareasVencidas" in keys:
+        query = (
+            select(CRMEvento.oportunidad_id)
             .where(CRMEvento.deleted_at.is_(None))
-            .where(CRMEvento.oportunidad_id == oportunidad_id)
+            .where(CRMEvento.oportunidad_id.in_(vivas))
             .where(CRMEvento.estado_evento == EstadoEvento.PENDIENTE.value)
             .where(CRMEvento.fecha_evento.is_not(None))
-            .where(func.date(CRMEvento.fecha_evento) < today)
-        ).one()
-        return int(count or 0) > 0
+            .where(func.date(CRMEvento.fecha_evento) < datetime.now(UTC).date())
+            .group_by(CRMEvento.oportunidad_id)
+        )
+        for oportunidad_id in session.exec(query).all():
+            result[oportunidad_id]["tareasVencidas"] = True
+
+    return result
+
 
-    return False
+def check_oportunidad_alert(
+    oportunidad_id: int,
+    alert_key: str,
+    session: Session,
+) -> bool:
+    """Devuelve True si la oportunidad sigue teniendo la alerta indicada."""
+    flags = check_oportunidades_alerts([oportunidad_id], [alert_key], session)
+    return flags[oportunidad_id].get(alert_key, False)
 
 
 def build_dashboard_detail_entry_from_oportunidad(
@@ -735,6 +782,17 @@ def fetch_selector_summary_fast(
     return result
 
 
+def _dashboard_load_options() -> tuple:
+    return (
+        selectinload(CRMOportunidad.propiedad),
+        selectinload(CRMOportunidad.tipo_operacion),
+        selectinload(CRMOportunidad.contacto),
+        selectinload(CRMOportunidad.responsable),
+        selectinload(CRMOportunidad.moneda),
+        selectinload(CRMOportunidad.logs_estado),
+    )
+
+
 def _query_raw_oportunidades_for_dashboard(
     session: Session,
     tipo_operacion_ids: Optional[Sequence[int]] = None,
@@ -747,14 +805,7 @@ def _query_raw_oportunidades_for_dashboard(
     query = (
         select(CRMOportunidad)
         .where(CRMOportunidad.deleted_at.is_(None))
-        .options(
-            selectinload(CRMOportunidad.propiedad),
-            selectinload(CRMOportunidad.tipo_operacion),
-            selectinload(CRMOportunidad.contacto),
-            selectinload(CRMOportunidad.responsable),
-            selectinload(CRMOportunidad.moneda),
-            selectinload(CRMOportunidad.logs_estado),
-        )
+        .options(*_dashboard_load_options())
     )
     join_propiedad = bool(tipo_propiedad or propietario or emprendimiento_ids)
     if join_propiedad:
@@ -773,107 +824,232 @@ def _query_raw_oportunidades_for_dashboard(
     return list(session.exec(query).all())
 
 
-def _calculate_oportunidades_for_period(
-    raw: List[CRMOportunidad],
-    start_date: str,
-    end_date: str,
-) -> List[CalculatedOportunidad]:
-    """Pure Python calculation for a given period — no DB access."""
-    start = _to_date(start_date)
-    end = _to_date(end_date)
-    trailing_30_start = end - timedelta(days=29)
+# ---------------------------------------------------------------------------
+# Motor columnar del camino Python (CRM_DASHBOARD_SNAPSHOT=0)
+# ---------------------------------------------------------------------------
 
-    calculated: List[CalculatedOportunidad] = []
-    for oportunidad in raw:
-        if not oportunidad.created_at:
-            continue
-        fecha_creacion = oportunidad.created_at.date()
-        if fecha_creacion > end:
-            continue
+# Fecha ausente (ingreso/cierre) como ordinal: queda después de cualquier corte
+_NUNCA = date.max.toordinal() + 1
 
-        fecha_cierre, estado_cierre = _fecha_cierre(oportunidad)
-        if fecha_cierre and fecha_cierre < min(start, trailing_30_start):
-            continue
 
-        fecha_estado = _parse_date(oportunidad.fecha_estado) or fecha_creacion
-        fecha_ingreso_pipeline = _fecha_ingreso_pipeline(oportunidad)
+def _log_sort_key(log: CRMOportunidadLogEstado) -> datetime:
+    return log.fecha_registro or datetime.min
 
-        estado_al_corte = _estado_al_corte(oportunidad, end)
-        estado_inicio = _estado_al_corte(oportunidad, start - timedelta(days=1))
-        monto_estimado, monto_propiedad = _monto_estimado(oportunidad)
 
-        include_closed = fecha_cierre is not None and start <= fecha_cierre <= end
-        include_open = (fecha_cierre is None or fecha_cierre > end) and fecha_creacion <= end
-        if not (include_closed or include_open):
-            continue
+class _EstadoTimeline:
+    """`_estado_al_corte` precalculado: los logs se ordenan una vez y cada corte es un bisect."""
 
-        es_pendiente = fecha_cierre is None or fecha_cierre > end
-        es_pendiente_inicio = (
-            fecha_ingreso_pipeline is not None
-            and fecha_ingreso_pipeline < start
-            and (fecha_cierre is None or fecha_cierre >= start)
-            and _is_open_pipeline_state(estado_inicio)
-        )
-        es_prospect = es_pendiente and estado_al_corte == EstadoOportunidad.PROSPECT.value
-        es_proceso = es_pendiente and estado_al_corte in OPEN_PIPELINE_STATES[:-1]
-        es_reserva = es_pendiente and estado_al_corte == EstadoOportunidad.RESERVA.value
-        es_ganada_periodo = (
-            estado_cierre == EstadoOportunidad.GANADA.value
-            and fecha_cierre is not None
-            and start <= fecha_cierre <= end
-        )
-        es_perdida_periodo = (
-            estado_cierre == EstadoOportunidad.PERDIDA.value
-            and fecha_cierre is not None
-            and start <= fecha_cierre <= end
-        )
-        es_cerrada_periodo = es_ganada_periodo or es_perdida_periodo
-        es_cerrada_30d = (
-            estado_cierre in (EstadoOportunidad.GANADA.value, EstadoOportunidad.PERDIDA.value)
-            and fecha_cierre is not None
-            and trailing_30_start <= fecha_cierre <= end
-        )
-        es_nueva_periodo = (
-            fecha_ingreso_pipeline is not None
-            and start <= fecha_ingreso_pipeline <= end
+    __slots__ = ("cortes", "estados", "actual")
+
+    def __init__(self, oportunidad: CRMOportunidad, logs_desc: Optional[Sequence[CRMOportunidadLogEstado]] = None):
+        self.actual = oportunidad.estado
+        if logs_desc is None:
+            # Mismo orden (sort estable, descendente) que `_estado_al_corte`
+            logs_desc = sorted(oportunidad.logs_estado or [], key=_log_sort_key, reverse=True)
+        cortes: List[int] = []
+        estados: List[str] = []
+        running = oportunidad.estado
+        for log in logs_desc:
+            if not log.fecha_registro:
+                break
+            running = log.estado_anterior or running
+            cortes.append(log.fecha_registro.date().toordinal())
+            estados.append(running)
+        # estados[i] rige para cortes anteriores a cortes[i] (y posteriores a cortes[i - 1])
+        cortes.reverse()
+        estados.reverse()
+        self.cortes = cortes
+        self.estados = estados
+
+    def at(self, corte: int) -> str:
+        index = bisect_right(self.cortes, corte)
+        return self.estados[index] if index < len(self.estados) else self.actual
+
+
+class _DashboardColumns:
+    """
+    Oportunidades de un bundle en formato columnar.
+
+    Lo que no depende del periodo (fechas derivadas de los logs, montos, buckets y la
+    línea de tiempo de estados) se calcula una sola vez; evaluar uno o varios periodos
+    es después una sola pasada de comparaciones de ordinales sobre las columnas.
+    """
+
+    def __init__(self, raw: Sequence[CRMOportunidad]):
+        self.oportunidades: List[CRMOportunidad] = []
+        self.creacion = array("l")
+        self.ingreso = array("l")
+        self.cierre = array("l")
+        self.estado_cierre: List[Optional[str]] = []
+        self.timelines: List[_EstadoTimeline] = []
+        # Valores de salida por fila (fechas originales, montos y buckets) para materializar items
+        self._fechas: List[Tuple[date, date, Optional[date], Optional[date]]] = []
+        self._montos: List[Tuple[Optional[Decimal], Optional[Decimal]]] = []
+        self._buckets: List[Tuple[str, Optional[str], str, Optional[str]]] = []
+
+        for oportunidad in raw:
+            if not oportunidad.created_at:
+                continue
+            fecha_creacion = oportunidad.created_at.date()
+            # Un solo sort de logs por oportunidad para cierre, ingreso y línea de tiempo
+            logs = sorted(oportunidad.logs_estado or [], key=_log_sort_key)
+            fecha_cierre, estado_cierre = None, None
+            for log in logs:
+                if log.estado_nuevo in (_GANADA, _PERDIDA):
+                    fecha_cierre, estado_cierre = _parse_date(log.fecha_registro), log.estado_nuevo
+                    break
+            fecha_ingreso = next(
+                (log.fecha_registro.date() for log in logs if log.estado_nuevo != _PROSPECT and log.fecha_registro),
+                None,
+            )
+            if fecha_ingreso is None and oportunidad.estado != _PROSPECT:
+                fecha_ingreso = fecha_creacion
+            # Descendente conservando el orden original entre logs del mismo instante
+            same_instant = [list(group) for _, group in groupby(logs, _log_sort_key)]
+            logs_desc = [log for group in reversed(same_instant) for log in group]
+            fecha_estado = _parse_date(oportunidad.fecha_estado) or fecha_creacion
+
+            self.oportunidades.append(oportunidad)
+            self.creacion.append(fecha_creacion.toordinal())
+            self.ingreso.append(fecha_ingreso.toordinal() if fecha_ingreso else _NUNCA)
+            self.cierre.append(fecha_cierre.toordinal() if fecha_cierre else _NUNCA)
+            self.estado_cierre.append(estado_cierre)
+            self.timelines.append(_EstadoTimeline(oportunidad, logs_desc))
+            self._fechas.append((fecha_creacion, fecha_estado, fecha_ingreso, fecha_cierre))
+            self._montos.append(_monto_estimado(oportunidad))
+            self._buckets.append(
+                (
+                    _month_bucket(fecha_creacion) or "Sin-fecha",
+                    _month_bucket(fecha_ingreso),
+                    _month_bucket(fecha_estado) or "Sin-fecha",
+                    _month_bucket(fecha_cierre),
+                )
+            )
+
+    def _flags(self, index: int, start: int, end: int, trailing_start: int) -> Optional[tuple]:
+        """Reglas de `_calculate_oportunidades_for_period` para una fila; None si no entra al periodo."""
+        creacion = self.creacion[index]
+        if creacion > end:
+            return None
+        cierre = self.cierre[index]
+        if cierre < start and cierre < trailing_start:
+            return None
+        es_pendiente = cierre > end
+        if not es_pendiente and cierre < start:
+            return None
+
+        ingreso = self.ingreso[index]
+        estado_cierre = self.estado_cierre[index]
+        timeline = self.timelines[index]
+        estado_al_corte = timeline.at(end)
+        cerrada_en_periodo = start <= cierre <= end
+        es_ganada = cerrada_en_periodo and estado_cierre == _GANADA
+        es_perdida = cerrada_en_periodo and estado_cierre == _PERDIDA
+        return (
+            estado_al_corte,
+            es_pendiente,
+            ingreso < start and cierre >= start and timeline.at(start - 1) in OPEN_PIPELINE_STATES,
+            es_pendiente and estado_al_corte == _PROSPECT,
+            es_pendiente and estado_al_corte in _PROCESO_STATES,
+            es_pendiente and estado_al_corte == _RESERVA,
+            es_ganada,
+            es_perdida,
+            es_ganada or es_perdida,
+            trailing_start <= cierre <= end and estado_cierre in (_GANADA, _PERDIDA),
+            start <= ingreso <= end,
         )
 
-        bucket_creacion = _month_bucket(fecha_creacion) or "Sin-fecha"
-        bucket_pipeline = _month_bucket(fecha_ingreso_pipeline)
-        bucket_estado = _month_bucket(fecha_estado) or "Sin-fecha"
-        bucket_cierre = _month_bucket(fecha_cierre)
+    def _materialize(self, index: int, end: date, flags: tuple) -> CalculatedOportunidad:
+        fecha_creacion, fecha_estado, fecha_ingreso, fecha_cierre = self._fechas[index]
+        monto_estimado, monto_propiedad = self._montos[index]
+        bucket_creacion, bucket_pipeline, bucket_estado, bucket_cierre = self._buckets[index]
+        (
+            estado_al_corte,
+            es_pendiente,
+            es_pendiente_inicio,
+            es_prospect,
+            es_proceso,
+            es_reserva,
+            es_ganada_periodo,
+            es_perdida_periodo,
+            es_cerrada_periodo,
+            es_cerrada_30d,
+            es_nueva_periodo,
+        ) = flags
         fin_para_duracion = fecha_cierre if fecha_cierre and fecha_cierre <= end else end
-        dias_pipeline = _diff_days(fin_para_duracion, fecha_creacion)
-
-        calculated.append(
-            CalculatedOportunidad(
-                oportunidad=oportunidad,
-                fecha_creacion=fecha_creacion,
-                fecha_estado=fecha_estado,
-                fecha_ingreso_pipeline=fecha_ingreso_pipeline,
-                fecha_cierre=fecha_cierre,
-                estado_al_corte=estado_al_corte,
-                estado_cierre=estado_cierre,
-                monto_estimado=monto_estimado,
-                monto_propiedad=monto_propiedad,
-                es_pendiente=es_pendiente,
-                es_pendiente_inicio=es_pendiente_inicio,
-                es_prospect=es_prospect,
-                es_proceso=es_proceso,
-                es_reserva=es_reserva,
-                es_ganada_periodo=es_ganada_periodo,
-                es_perdida_periodo=es_perdida_periodo,
-                es_cerrada_periodo=es_cerrada_periodo,
-                es_cerrada_30d=es_cerrada_30d,
-                es_nueva_periodo=es_nueva_periodo,
-                bucket_creacion=bucket_creacion,
-                bucket_pipeline=bucket_pipeline,
-                bucket_estado=bucket_estado,
-                bucket_cierre=bucket_cierre,
-                dias_pipeline=dias_pipeline,
-            )
+        return CalculatedOportunidad(
+            oportunidad=self.oportunidades[index],
+            fecha_creacion=fecha_creacion,
+            fecha_estado=fecha_estado,
+            fecha_ingreso_pipeline=fecha_ingreso,
+            fecha_cierre=fecha_cierre,
+            estado_al_corte=estado_al_corte,
+            estado_cierre=self.estado_cierre[index],
+            monto_estimado=monto_estimado,
+            monto_propiedad=monto_propiedad,
+            es_pendiente=es_pendiente,
+            es_pendiente_inicio=es_pendiente_inicio,
+            es_prospect=es_prospect,
+            es_proceso=es_proceso,
+            es_reserva=es_reserva,
+            es_ganada_periodo=es_ganada_periodo,
+            es_perdida_periodo=es_perdida_periodo,
+            es_cerrada_periodo=es_cerrada_periodo,
+            es_cerrada_30d=es_cerrada_30d,
+            es_nueva_periodo=es_nueva_periodo,
+            bucket_creacion=bucket_creacion,
+            bucket_pipeline=bucket_pipeline,
+            bucket_estado=bucket_estado,
+            bucket_cierre=bucket_cierre,
+            dias_pipeline=_diff_days(fin_para_duracion, fecha_creacion),
+            estado_timeline=self.timelines[index],
         )
-    return calculated
+
+    def evaluate(
+        self,
+        periods: Sequence[Tuple[str, str]],
+        count_periods: Sequence[Tuple[str, str]] = (),
+    ) -> Tuple[List[List[CalculatedOportunidad]], List[Dict[str, int]]]:
+        """
+        Evalúa todos los periodos en una sola pasada sobre las filas.
+
+        `periods` devuelve los items completos (payload); `count_periods` solo los
+        contadores de tendencia (nuevas, ganadas, pendientes_fin) sin materializar items.
+        """
+        def _bounds(start_date: str, end_date: str) -> Tuple[date, int, int, int]:
+            start = _to_date(start_date)
+            end = _to_date(end_date)
+            return end, start.toordinal(), end.toordinal(), (end - timedelta(days=29)).toordinal()
+
+        full = [_bounds(s, e) for s, e in periods]
+        counted = [_bounds(s, e) for s, e in count_periods]
+        items: List[List[CalculatedOportunidad]] = [[] for _ in full]
+        counts = [{"nuevas": 0, "ganadas": 0, "pendientes_fin": 0} for _ in counted]
+
+        for index in range(len(self.oportunidades)):
+            for slot, (end, start_ord, end_ord, trailing_ord) in enumerate(full):
+                flags = self._flags(index, start_ord, end_ord, trailing_ord)
+                if flags is not None:
+                    items[slot].append(self._materialize(index, end, flags))
+            for slot, (_, start_ord, end_ord, trailing_ord) in enumerate(counted):
+                flags = self._flags(index, start_ord, end_ord, trailing_ord)
+                if flags is None:
+                    continue
+                counter = counts[slot]
+                counter["nuevas"] += flags[10]
+                counter["ganadas"] += flags[6]
+                counter["pendientes_fin"] += flags[4] or flags[5]
+        return items, counts
+
+
+def _calculate_oportunidades_for_period(
+    raw: List[CRMOportunidad],
+    start_date: str,
+    end_date: str,
+) -> List[CalculatedOportunidad]:
+    """Pure Python calculation for a given period — no DB access."""
+    items, _ = _DashboardColumns(raw).evaluate([(start_date, end_date)])
+    return items[0]
 
 
 def fetch_oportunidades_for_dashboard(
@@ -897,15 +1073,6 @@ def fetch_oportunidades_for_dashboard(
     return _calculate_oportunidades_for_period(raw, start_date, end_date)
 
 
-def _kpi_summary(items: List[CalculatedOportunidad]) -> Dict[str, float | int]:
-    count = len(items)
-    amount = _sum_amount(item.monto_estimado for item in items)
-    return {
-        "count": count,
-        "amount": float(amount.quantize(Decimal("0.01"))) if amount else 0.0,
-    }
-
-
 def _conversion(part: int, total: int) -> float:
     if total == 0:
         return 0.0
@@ -918,6 +1085,88 @@ def _variation(current: int, base: int) -> float:
     return round(((current - base) / base) * 100, 1)
 
 
+def _ranking_propiedades_disponibles(
+    session: Optional[Session],
+    items: Sequence[CalculatedOportunidad] = (),
+) -> List[dict]:
+    """Propiedades disponibles ordenadas por oportunidades perdidas (historial completo si hay sesión)."""
+    propiedades_disponibles: Dict[int, dict] = {}
+
+    def _is_propiedad_disponible(prop: Propiedad) -> bool:
+        if not prop or not prop.propiedad_status:
+            return False
+        nombre = (prop.propiedad_status.nombre or "").lower()
+        return "disponible" in nombre
+
+    # Si hay sesión disponible, consultar TODAS las propiedades disponibles
+    if session:
+        all_props_disponibles = session.exec(
+            select(Propiedad)
+            .join(PropiedadesStatus, Propiedad.propiedad_status_id == PropiedadesStatus.id, isouter=True)
+            .where(func.lower(PropiedadesStatus.nombre).contains("disponible"))
+            .where(Propiedad.deleted_at.is_(None))
+        ).all()
+        
+        # Inicializar con todas las propiedades disponibles
+        for prop in all_props_disponibles:
+            propiedades_disponibles[prop.id] = {
+                "propiedad": prop,
+                "perdidas": 0,
+                "fecha_disponible": prop.estado_fecha.isoformat() if prop.estado_fecha else None,
+            }
+        
+        # Consultar TODAS las oportunidades perdidas históricamente para propiedades disponibles
+        # No filtrar por período - queremos el historial completo
+        query_perdidas = (
+            select(CRMOportunidad)
+            .where(CRMOportunidad.deleted_at.is_(None))
+            .where(CRMOportunidad.estado == EstadoOportunidad.PERDIDA.value)
+            .where(CRMOportunidad.propiedad_id.in_([p.id for p in all_props_disponibles]))
+        )
+        
+        oportunidades_perdidas = session.exec(query_perdidas).all()
+        
+        # Contar oportunidades perdidas por propiedad
+        for opp in oportunidades_perdidas:
+            if opp.propiedad_id in propiedades_disponibles:
+                propiedades_disponibles[opp.propiedad_id]["perdidas"] += 1
+    else:
+        # Fallback: usar solo las oportunidades del período (comportamiento anterior)
+        for item in items:
+            prop = item.oportunidad.propiedad
+            if not prop or not _is_propiedad_disponible(prop):
+                continue
+            
+            if prop.id not in propiedades_disponibles:
+                propiedades_disponibles[prop.id] = {
+                    "propiedad": prop,
+                    "perdidas": 0,
+                    "fecha_disponible": prop.estado_fecha.isoformat() if getattr(prop, "estado_fecha", None) else None,
+                }
+            
+            if item.estado_cierre == EstadoOportunidad.PERDIDA.value:
+                propiedades_disponibles[prop.id]["perdidas"] += 1
+
+    return sorted(
+        propiedades_disponibles.values(),
+        key=lambda value: value["perdidas"],
+        reverse=True,
+    )
+
+
+def _evolucion_months(end: date) -> List[Tuple[date, date]]:
+    """Rangos (inicio, fin) de los 12 meses que terminan en `end` (el último recortado a `end`)."""
+    base_month = _month_start(end)
+    months: List[Tuple[date, date]] = []
+    for offset in range(11, -1, -1):
+        month_start = _shift_month(base_month, -offset)
+        month_end = _month_end(month_start)
+        if month_end > end:
+            month_end = end
+        months.append((month_start, month_end))
+    return months
+
+
 def build_crm_dashboard_payload(
     items: List[CalculatedOportunidad],
     start_date: str,
@@ -928,99 +1177,106 @@ def build_crm_dashboard_payload(
     current_oportunidades: Optional[Sequence[CRMOportunidad]] = None,
 ) -> dict:
     end = _to_date(end_date)
+    months = _evolucion_months(end)
+    first_month = months[0][0]
+    month_cuts = [month_end.toordinal() for _, month_end in months]
+    # Pendientes del mes: abiertas el día anterior al inicio del mes
+    carry_cuts = [month_start.toordinal() - 1 for month_start, _ in months]
+
+    def _month_index(value: Optional[date]) -> Optional[int]:
+        if value is None or value < first_month or value > end:
+            return None
+        return (value.year - first_month.year) * 12 + value.month - first_month.month
+
+    # Una sola pasada: grupos de KPI, montos, resumen del periodo, evolución y stats
+    groups: Dict[str, List[CalculatedOportunidad]] = {key: [] for key in ("prospect", "proceso", "reserva", "cerrada")}
+    amounts = {key: Decimal("0") for key in groups}
+    ganadas = perdidas = nuevas = pendientes_anteriores = 0
+    sin_monto = sin_propiedad = 0
+    evol = {key: [0] * len(months) for key in ("totales", "nuevas", "ganadas", "perdidas", "pendientes")}
 
-    pendientes_anteriores = [item for item in items if item.es_pendiente_inicio]
-    en_proceso = [item for item in items if item.es_proceso]
-    cerradas = [item for item in items if item.es_cerrada_periodo]
-    ganadas = [item for item in items if item.es_ganada_periodo]
-    perdidas = [item for item in items if item.es_perdida_periodo]
-    nuevas = [item for item in items if item.es_nueva_periodo]
-    prospect = [item for item in items if item.es_prospect]
-    proceso = [item for item in items if item.es_proceso]
-    reserva = [item for item in items if item.es_reserva]
-    pendientes_fin = len(proceso) + len(reserva)
-
+    for item in items:
+        if item.es_prospect:
+            key = "prospect"
+        elif item.es_proceso:
+            key = "proceso"
+        elif item.es_reserva:
+            key = "reserva"
+        else:
+            key = "cerrada" if item.es_cerrada_periodo else None
+        if key is not None:
+            groups[key].append(item)
+            if item.monto_estimado is not None:
+                amounts[key] += item.monto_estimado
+        ganadas += item.es_ganada_periodo
+        perdidas += item.es_perdida_periodo
+        nuevas += item.es_nueva_periodo
+        pendientes_anteriores += item.es_pendiente_inicio
+        sin_monto += item.monto_estimado is None
+        sin_propiedad += item.oportunidad.propiedad is None
+
+        index = _month_index(item.fecha_ingreso_pipeline)
+        if index is not None:
+            evol["nuevas"][index] += 1
+        if item.estado_cierre in (EstadoOportunidad.GANADA.value, EstadoOportunidad.PERDIDA.value):
+            index = _month_index(item.fecha_cierre)
+            if index is not None:
+                evol["ganadas" if item.estado_cierre == EstadoOportunidad.GANADA.value else "perdidas"][index] += 1
+
+        # `_is_open_pipeline_at` por mes: ingreso <= corte < cierre y estado abierto al corte
+        if item.fecha_ingreso_pipeline is None:
+            continue
+        ingreso = item.fecha_ingreso_pipeline.toordinal()
+        cierre = item.fecha_cierre.toordinal() if item.fecha_cierre else _NUNCA
+        timeline = item.estado_timeline or _EstadoTimeline(item.oportunidad)
+        for index, cut in enumerate(month_cuts):
+            if ingreso <= cut < cierre and timeline.at(cut) in OPEN_PIPELINE_STATES:
+                evol["totales"][index] += 1
+            carry = carry_cuts[index]
+            if ingreso <= carry < cierre and timeline.at(carry) in OPEN_PIPELINE_STATES:
+                evol["pendientes"][index] += 1
+
+    prospect, proceso, reserva, cerradas = (groups[key] for key in ("prospect", "proceso", "reserva", "cerrada"))
     total_count = max(len(prospect) + len(proceso) + len(reserva), 1)
 
-    kpis = {
-        "prospect": _kpi_summary(prospect),
-        "proceso": _kpi_summary(proceso),
-        "reserva": _kpi_summary(reserva),
-        "cerrada": _kpi_summary(cerradas),
-    }
+    kpis = {key: _amount_summary(len(groups[key]), amounts[key]) for key in groups}
     kpis["cerrada"]["ganadas"] = {
-        "count": len(ganadas),
-        "rate": _conversion(len(ganadas), total_count),
+        "count": ganadas,
+        "rate": _conversion(ganadas, total_count),
     }
     kpis["cerrada"]["perdidas"] = {
-        "count": len(perdidas),
-        "rate": _conversion(len(perdidas), total_count),
+        "count": perdidas,
+        "rate": _conversion(perdidas, total_count),
     }
     period_summary = {
-        "nuevas": len(nuevas),
-        "ganadas": len(ganadas),
-        "perdidas": len(perdidas),
+        "nuevas": nuevas,
+        "ganadas": ganadas,
+        "perdidas": perdidas,
         "cerradas": len(cerradas),
-        "pendientes_inicio": len(pendientes_anteriores),
-        "pendientes_fin": pendientes_fin,
-        "total_periodo": len(pendientes_anteriores) + len(nuevas),
+        "pendientes_inicio": pendientes_anteriores,
+        "pendientes_fin": len(proceso) + len(reserva),
+        "total_periodo": pendientes_anteriores + nuevas,
     }
     current_items = list(current_oportunidades or [])
-    funnel = build_current_funnel(items)
-
-    # Evolución mensual - últimos 12 meses
-    base_month = _month_start(end)
-    months: list[tuple[date, date]] = []
-    for offset in range(11, -1, -1):
-        month_start = _shift_month(base_month, -offset)
-        month_end = _month_end(month_start)
-        if month_end > end:
-            month_end = end
-        months.append((month_start, month_end))
-
-    def _belongs_new(item: CalculatedOportunidad, start_m: date, end_m: date) -> bool:
-        return (
-            item.fecha_ingreso_pipeline is not None
-            and start_m <= item.fecha_ingreso_pipeline <= end_m
-        )
-
-    def _belongs_ganada(item: CalculatedOportunidad, start_m: date, end_m: date) -> bool:
-        return (
-            item.estado_cierre == EstadoOportunidad.GANADA.value
-            and item.fecha_cierre is not None
-            and start_m <= item.fecha_cierre <= end_m
-        )
-
-    def _belongs_perdida(item: CalculatedOportunidad, start_m: date, end_m: date) -> bool:
-        return (
-            item.estado_cierre == EstadoOportunidad.PERDIDA.value
-            and item.fecha_cierre is not None
-            and start_m <= item.fecha_cierre <= end_m
-        )
-
-    def _carryover_before(item: CalculatedOportunidad, cut: date) -> bool:
-        fecha_ingreso_pipeline = item.fecha_ingreso_pipeline
-        if fecha_ingreso_pipeline is None or fecha_ingreso_pipeline >= cut:
-            return False
-        return _is_open_pipeline_at(item, cut - timedelta(days=1))
-
-    evolucion: list[dict[str, object]] = []
-    for month_start, month_end in months:
-        total_count = sum(1 for item in items if _is_open_pipeline_at(item, month_end))
-        nuevas_count = sum(1 for item in items if _belongs_new(item, month_start, month_end))
-        ganadas_count = sum(1 for item in items if _belongs_ganada(item, month_start, month_end))
-        perdidas_count = sum(1 for item in items if _belongs_perdida(item, month_start, month_end))
-        pendientes_mes = sum(1 for item in items if _carryover_before(item, month_start))
-        evolucion.append(
-            {
-                "bucket": month_start.strftime("%Y-%m"),
-                "totales": total_count,
-                "nuevas": nuevas_count,
-                "ganadas": ganadas_count,
-                "perdidas": perdidas_count,
-                "pendientes": pendientes_mes,
-            }
-        )
+    funnel = _funnel_from_groups(
+        [
+            ("prospect", "Prospect", len(prospect), amounts["prospect"]),
+            ("proceso", "Proceso", len(proceso), amounts["proceso"]),
+            ("reserva", "Reserva", len(reserva), amounts["reserva"]),
+            ("cerrada", "Cierre", len(cerradas), amounts["cerrada"]),
+        ]
+    )
+    evolucion: list[dict[str, object]] = [
+        {
+            "bucket": month_start.strftime("%Y-%m"),
+            "totales": evol["totales"][index],
+            "nuevas": evol["nuevas"][index],
+            "ganadas": evol["ganadas"][index],
+            "perdidas": evol["perdidas"][index],
+            "pendientes": evol["pendientes"][index],
+        }
+        for index, (month_start, _) in enumerate(months)
+    ]
 
     def _ranking(data: List[CalculatedOportunidad], bucket_attr: str = "bucket_creacion") -> List[dict]:
         sorted_items = sorted(
@@ -1066,75 +1322,368 @@ def build_crm_dashboard_payload(
         ],
     }
 
-    stats = {
-        "sinMonto": sum(1 for item in items if item.monto_estimado is None),
-        "sinPropiedad": sum(1 for item in items if item.oportunidad.propiedad is None),
-    }
+    stats = {"sinMonto": sin_monto, "sinPropiedad": sin_propiedad}
     alerts = build_current_dashboard_alerts(current_items, session)
 
-    # Ranking de propiedades disponibles
-    propiedades_disponibles: Dict[int, dict] = {}
+    ranking_propiedades = _ranking_propiedades_disponibles(session, items)
 
-    def _is_propiedad_disponible(prop: Propiedad) -> bool:
-        if not prop or not prop.propiedad_status:
-            return False
-        nombre = (prop.propiedad_status.nombre or "").lower()
-        return "disponible" in nombre
+    return {
+        "range": {"startDate": start_date, "endDate": end_date},
+        "filters": filters or {},
+        "kpis": kpis,
+        "period_summary": period_summary,
+        "funnel": funnel,
+        "evolucion": evolucion,
+        "ranking": ranking,
+        "stats": stats,
+        "alerts": alerts,
+        "ranking_propiedades": ranking_propiedades,
+    }
 
-    # Si hay sesión disponible, consultar TODAS las propiedades disponibles
-    if session:
-        all_props_disponibles = session.exec(
-            select(Propiedad)
-            .join(PropiedadesStatus, Propiedad.propiedad_status_id == PropiedadesStatus.id, isouter=True)
-            .where(func.lower(PropiedadesStatus.nombre).contains("disponible"))
-            .where(Propiedad.deleted_at.is_(None))
-        ).all()
-        
-        # Inicializar con todas las propiedades disponibles
-        for prop in all_props_disponibles:
-            propiedades_disponibles[prop.id] = {
-                "propiedad": prop,
-                "perdidas": 0,
-                "fecha_disponible": prop.estado_fecha.isoformat() if prop.estado_fecha else None,
+
+# ---------------------------------------------------------------------------
+# Agregados sobre el snapshot materializado (crm_pipeline_snapshots)
+# ---------------------------------------------------------------------------
+
+_MONTO_PROPIEDAD = aliased(Propiedad, name="monto_propiedad")
+_MONTO_TIPO_OPERACION = aliased(CRMTipoOperacion, name="monto_tipo_operacion")
+
+
+def _first_truthy(value, fallback):
+    """SQL de `value or fallback` para montos: 0 y NULL pasan al fallback."""
+    return case((value != 0, value), else_=fallback)
+
+
+def _monto_estimado_expr():
+    """Equivalente SQL de `_monto_estimado(...)[0]`."""
+    prop = _MONTO_PROPIEDAD
+    base_alquiler = func.coalesce(_first_truthy(prop.valor_alquiler, prop.precio_venta_estimado), prop.costo_propiedad)
+    base_venta = func.coalesce(_first_truthy(prop.precio_venta_estimado, prop.valor_alquiler), prop.costo_propiedad)
+    return case(
+        (CRMOportunidad.monto.is_not(None), CRMOportunidad.monto),
+        (prop.id.is_(None), None),
+        (func.lower(_MONTO_TIPO_OPERACION.codigo) == "alquiler", base_alquiler),
+        else_=base_venta,
+    )
+
+
+def _covers(cut: date):
+    """El intervalo de estado contiene la fecha de corte (uno solo por oportunidad)."""
+    intervalo = CRMPipelineEstadoIntervalo
+    return and_(
+        or_(intervalo.desde.is_(None), intervalo.desde <= cut),
+        or_(intervalo.hasta.is_(None), intervalo.hasta > cut),
+    )
+
+
+def _snapshot_select(columns, filter_kwargs: dict):
+    """SELECT sobre snapshot + intervalos + oportunidad con los filtros del dashboard."""
+    snap = CRMPipelineSnapshot
+    query = (
+        select(*columns)
+        .select_from(snap)
+        .join(CRMOportunidad, CRMOportunidad.id == snap.oportunidad_id)
+        .join(CRMPipelineEstadoIntervalo, CRMPipelineEstadoIntervalo.oportunidad_id == snap.oportunidad_id)
+        .outerjoin(_MONTO_PROPIEDAD, _MONTO_PROPIEDAD.id == CRMOportunidad.propiedad_id)
+        .outerjoin(_MONTO_TIPO_OPERACION, _MONTO_TIPO_OPERACION.id == CRMOportunidad.tipo_operacion_id)
+        .where(CRMOportunidad.deleted_at.is_(None))
+    )
+    return _apply_oportunidad_filters(query, **filter_kwargs)
+
+
+class _SnapshotPeriod:
+    """Condiciones SQL de `_calculate_oportunidades_for_period` para un periodo [start, end]."""
+
+    def __init__(self, start_date: str, end_date: str):
+        snap = CRMPipelineSnapshot
+        estado = CRMPipelineEstadoIntervalo.estado
+        self.start = start = _to_date(start_date)
+        self.end = end = _to_date(end_date)
+        trailing_30_start = end - timedelta(days=29)
+
+        self.in_period = and_(
+            snap.fecha_creacion <= end,
+            or_(snap.fecha_cierre.is_(None), snap.fecha_cierre >= start),
+        )
+        # Una fila por oportunidad: la del intervalo vigente al fin del periodo
+        self.current = and_(self.in_period, _covers(end))
+        pendiente = or_(snap.fecha_cierre.is_(None), snap.fecha_cierre > end)
+        cierre_en_periodo = snap.fecha_cierre.between(start, end)
+
+        self.prospect = and_(self.current, pendiente, estado == EstadoOportunidad.PROSPECT.value)
+        self.proceso = and_(self.current, pendiente, estado.in_(OPEN_PIPELINE_STATES[:-1]))
+        self.reserva = and_(self.current, pendiente, estado == EstadoOportunidad.RESERVA.value)
+        self.ganada = and_(self.current, snap.estado_cierre == EstadoOportunidad.GANADA.value, cierre_en_periodo)
+        self.perdida = and_(self.current, snap.estado_cierre == EstadoOportunidad.PERDIDA.value, cierre_en_periodo)
+        self.cerrada = or_(self.ganada, self.perdida)
+        self.nueva = and_(self.current, snap.fecha_ingreso_pipeline.between(start, end))
+        self.vigente = and_(
+            self.current,
+            or_(
+                pendiente,
+                and_(
+                    snap.estado_cierre.in_((EstadoOportunidad.GANADA.value, EstadoOportunidad.PERDIDA.value)),
+                    snap.fecha_cierre.between(trailing_30_start, end),
+                ),
+            ),
+        )
+        self.pendiente_inicio = self.open_at(start - timedelta(days=1), ingreso_before=start)
+
+    def open_at(self, cut: date, ingreso_before: Optional[date] = None):
+        """`_is_open_pipeline_at(item, cut)` (con ingreso estrictamente anterior a `ingreso_before`)."""
+        snap = CRMPipelineSnapshot
+        ingreso = snap.fecha_ingreso_pipeline
+        return and_(
+            self.in_period,
+            _covers(cut),
+            ingreso.is_not(None),
+            ingreso < ingreso_before if ingreso_before is not None else ingreso <= cut,
+            or_(snap.fecha_cierre.is_(None), snap.fecha_cierre > cut),
+            CRMPipelineEstadoIntervalo.estado.in_(OPEN_PIPELINE_STATES),
+        )
+
+
+def _count(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _amount(condition, monto):
+    return func.sum(case((condition, monto), else_=None))
+
+
+def _as_amount(value) -> Decimal:
+    return _decimal(value) or Decimal("0")
+
+
+def _snapshot_period_aggregates(
+    session: Session,
+    period: _SnapshotPeriod,
+    filter_kwargs: dict,
+    with_months: bool = True,
+) -> dict:
+    """KPIs, resumen y evolución mensual del periodo en una sola query de agregación."""
+    snap = CRMPipelineSnapshot
+    monto = _monto_estimado_expr()
+    columns = {
+        "prospect": _count(period.prospect),
+        "proceso": _count(period.proceso),
+        "reserva": _count(period.reserva),
+        "ganadas": _count(period.ganada),
+        "perdidas": _count(period.perdida),
+        "nuevas": _count(period.nueva),
+    }
+    if with_months:
+        columns.update(
+            {
+                "prospect_amount": _amount(period.prospect, monto),
+                "proceso_amount": _amount(period.proceso, monto),
+                "reserva_amount": _amount(period.reserva, monto),
+                "cerrada_amount": _amount(period.cerrada, monto),
+                "pendientes_inicio": _count(period.pendiente_inicio),
+                "sin_monto": _count(and_(period.current, monto.is_(None))),
+                "sin_propiedad": _count(and_(period.current, _MONTO_PROPIEDAD.id.is_(None))),
             }
-        
-        # Consultar TODAS las oportunidades perdidas históricamente para propiedades disponibles
-        # No filtrar por período - queremos el historial completo
-        query_perdidas = (
-            select(CRMOportunidad)
-            .where(CRMOportunidad.deleted_at.is_(None))
-            .where(CRMOportunidad.estado == EstadoOportunidad.PERDIDA.value)
-            .where(CRMOportunidad.propiedad_id.in_([p.id for p in all_props_disponibles]))
         )
-        
-        oportunidades_perdidas = session.exec(query_perdidas).all()
-        
-        # Contar oportunidades perdidas por propiedad
-        for opp in oportunidades_perdidas:
-            if opp.propiedad_id in propiedades_disponibles:
-                propiedades_disponibles[opp.propiedad_id]["perdidas"] += 1
-    else:
-        # Fallback: usar solo las oportunidades del período (comportamiento anterior)
-        for item in items:
-            prop = item.oportunidad.propiedad
-            if not prop or not _is_propiedad_disponible(prop):
-                continue
-            
-            if prop.id not in propiedades_disponibles:
-                propiedades_disponibles[prop.id] = {
-                    "propiedad": prop,
-                    "perdidas": 0,
-                    "fecha_disponible": prop.estado_fecha.isoformat() if getattr(prop, "estado_fecha", None) else None,
-                }
-            
-            if item.estado_cierre == EstadoOportunidad.PERDIDA.value:
-                propiedades_disponibles[prop.id]["perdidas"] += 1
+        for index, (month_start, month_end) in enumerate(_evolucion_months(period.end)):
+            columns[f"m{index}_totales"] = _count(period.open_at(month_end))
+            columns[f"m{index}_nuevas"] = _count(
+                and_(period.current, snap.fecha_ingreso_pipeline.between(month_start, month_end))
+            )
+            columns[f"m{index}_ganadas"] = _count(
+                and_(
+                    period.current,
+                    snap.estado_cierre == EstadoOportunidad.GANADA.value,
+                    snap.fecha_cierre.between(month_start, month_end),
+                )
+            )
+            columns[f"m{index}_perdidas"] = _count(
+                and_(
+                    period.current,
+                    snap.estado_cierre == EstadoOportunidad.PERDIDA.value,
+                    snap.fecha_cierre.between(month_start, month_end),
+                )
+            )
+            columns[f"m{index}_pendientes"] = _count(
+                period.open_at(month_start - timedelta(days=1), ingreso_before=month_start)
+            )
 
-    ranking_propiedades = sorted(
-        propiedades_disponibles.values(),
-        key=lambda value: value["perdidas"],
-        reverse=True,
+    query = _snapshot_select([column.label(name) for name, column in columns.items()], filter_kwargs)
+    row = session.execute(query).mappings().one()
+    return dict(row)
+
+
+def _snapshot_ranking(
+    session: Session,
+    period: _SnapshotPeriod,
+    condition,
+    filter_kwargs: dict,
+    limit_top: int,
+    oportunidades_by_id: Dict[int, CRMOportunidad],
+) -> List[dict]:
+    snap = CRMPipelineSnapshot
+    monto = _monto_estimado_expr()
+    query = (
+        _snapshot_select(
+            [snap.oportunidad_id, CRMPipelineEstadoIntervalo.estado, snap.fecha_creacion, snap.fecha_cierre, monto.label("monto")],
+            filter_kwargs,
+        )
+        .where(condition)
+        .order_by(func.coalesce(monto, 0).desc(), snap.fecha_creacion.desc(), snap.oportunidad_id)
+        .limit(limit_top)
+    )
+    rows = session.execute(query).all()
+    missing = [row.oportunidad_id for row in rows if row.oportunidad_id not in oportunidades_by_id]
+    if missing:
+        for oportunidad in session.exec(
+            select(CRMOportunidad).where(CRMOportunidad.id.in_(missing)).options(*_dashboard_load_options())
+        ).all():
+            oportunidades_by_id[oportunidad.id] = oportunidad
+
+    ranking = []
+    for row in rows:
+        oportunidad = oportunidades_by_id[row.oportunidad_id]
+        fin_para_duracion = row.fecha_cierre if row.fecha_cierre and row.fecha_cierre <= period.end else period.end
+        monto_row = _decimal(row.monto)
+        ranking.append(
+            {
+                "oportunidad": oportunidad,
+                "estado": row.estado,
+                "fecha": row.fecha_creacion.isoformat(),
+                "monto": float(monto_row) if monto_row else 0.0,
+                "moneda": oportunidad.moneda.codigo if oportunidad.moneda else None,
+                "dias_pipeline": _diff_days(fin_para_duracion, row.fecha_creacion),
+                "bucket": _month_bucket(row.fecha_creacion) or "Sin-fecha",
+            }
+        )
+    return ranking
+
+
+def _snapshot_alerts(session: Session, period: _SnapshotPeriod, filter_kwargs: dict) -> Dict[str, int]:
+    """`build_current_dashboard_alerts` sobre las oportunidades vigentes del periodo, en SQL."""
+    vigentes = _snapshot_select([CRMPipelineSnapshot.oportunidad_id], filter_kwargs).where(period.vigente)
+    stale_cutoff = datetime.now(UTC) - timedelta(days=30)
+    today = datetime.now(UTC).date()
+
+    oportunidades = (
+        select(
+            _count(
+                and_(CRMOportunidad.estado == EstadoOportunidad.PROSPECT.value, CRMOportunidad.activo.is_(True))
+            ),
+            _count(
+                and_(
+                    CRMOportunidad.activo.is_(True),
+                    CRMOportunidad.estado.in_(OPEN_PIPELINE_STATES),
+                    CRMOportunidad.fecha_estado < stale_cutoff,
+                )
+            ),
+        )
+        .where(CRMOportunidad.id.in_(vigentes))
+    )
+    prospect_sin_resolver, sin_movimiento = session.execute(oportunidades).one()
+
+    query_mensajes = (
+        select(func.count(func.distinct(CRMMensaje.oportunidad_id)))
+        .select_from(CRMMensaje)
+        .where(CRMMensaje.deleted_at.is_(None))
+        .where(CRMMensaje.oportunidad_id.in_(vigentes))
+        .where(CRMMensaje.tipo == TipoMensaje.ENTRADA.value)
+        .where(CRMMensaje.estado == EstadoMensaje.NUEVO.value)
+    )
+    query_eventos = (
+        select(func.count(func.distinct(CRMEvento.oportunidad_id)))
+        .select_from(CRMEvento)
+        .where(CRMEvento.deleted_at.is_(None))
+        .where(CRMEvento.oportunidad_id.in_(vigentes))
+        .where(CRMEvento.estado_evento == EstadoEvento.PENDIENTE.value)
+        .where(CRMEvento.fecha_evento.is_not(None))
+        .where(func.date(CRMEvento.fecha_evento) < today)
     )
+    return {
+        "mensajesSinLeer": int(session.exec(query_mensajes).one() or 0),
+        "prospectSinResolver": int(prospect_sin_resolver or 0),
+        "tareasVencidas": int(session.exec(query_eventos).one() or 0),
+        "enProcesoSinMovimiento": int(sin_movimiento or 0),
+    }
+
+
+def _amount_summary(count: int, amount: Decimal) -> Dict[str, float | int]:
+    return {
+        "count": count,
+        "amount": float(amount.quantize(Decimal("0.01"))) if amount else 0.0,
+    }
+
+
+def build_crm_dashboard_payload_from_snapshot(
+    session: Session,
+    start_date: str,
+    end_date: str,
+    filter_kwargs: dict,
+    limit_top: int = 5,
+    filters: Optional[dict] = None,
+    oportunidades_by_id: Optional[Dict[int, CRMOportunidad]] = None,
+) -> dict:
+    """Mismo payload que `build_crm_dashboard_payload`, calculado con agregados SQL sobre el snapshot."""
+    period = _SnapshotPeriod(start_date, end_date)
+    agg = _snapshot_period_aggregates(session, period, filter_kwargs)
+    oportunidades_by_id = {} if oportunidades_by_id is None else oportunidades_by_id
+
+    prospect, proceso, reserva = int(agg["prospect"]), int(agg["proceso"]), int(agg["reserva"])
+    ganadas, perdidas, nuevas = int(agg["ganadas"]), int(agg["perdidas"]), int(agg["nuevas"])
+    cerradas = ganadas + perdidas
+    pendientes_inicio = int(agg["pendientes_inicio"])
+    amounts = {
+        key: _as_amount(agg[f"{key}_amount"]) for key in ("prospect", "proceso", "reserva", "cerrada")
+    }
+    total_count = max(prospect + proceso + reserva, 1)
+
+    kpis = {
+        "prospect": _amount_summary(prospect, amounts["prospect"]),
+        "proceso": _amount_summary(proceso, amounts["proceso"]),
+        "reserva": _amount_summary(reserva, amounts["reserva"]),
+        "cerrada": _amount_summary(cerradas, amounts["cerrada"]),
+    }
+    kpis["cerrada"]["ganadas"] = {"count": ganadas, "rate": _conversion(ganadas, total_count)}
+    kpis["cerrada"]["perdidas"] = {"count": perdidas, "rate": _conversion(perdidas, total_count)}
+    period_summary = {
+        "nuevas": nuevas,
+        "ganadas": ganadas,
+        "perdidas": perdidas,
+        "cerradas": cerradas,
+        "pendientes_inicio": pendientes_inicio,
+        "pendientes_fin": proceso + reserva,
+        "total_periodo": pendientes_inicio + nuevas,
+    }
+    funnel = _funnel_from_groups(
+        [
+            ("prospect", "Prospect", prospect, amounts["prospect"]),
+            ("proceso", "Proceso", proceso, amounts["proceso"]),
+            ("reserva", "Reserva", reserva, amounts["reserva"]),
+            ("cerrada", "Cierre", cerradas, amounts["cerrada"]),
+        ]
+    )
+    evolucion = [
+        {
+            "bucket": month_start.strftime("%Y-%m"),
+            "totales": int(agg[f"m{index}_totales"]),
+            "nuevas": int(agg[f"m{index}_nuevas"]),
+            "ganadas": int(agg[f"m{index}_ganadas"]),
+            "perdidas": int(agg[f"m{index}_perdidas"]),
+            "pendientes": int(agg[f"m{index}_pendientes"]),
+        }
+        for index, (month_start, _) in enumerate(_evolucion_months(period.end))
+    ]
+    ranking = {
+        key: [
+            {**entry, "kpiKey": key}
+            for entry in _snapshot_ranking(session, period, condition, filter_kwargs, limit_top, oportunidades_by_id)
+        ]
+        for key, condition in (
+            ("prospect", period.prospect),
+            ("proceso", period.proceso),
+            ("reserva", period.reserva),
+            ("cerrada", period.cerrada),
+        )
+    }
 
     return {
         "range": {"startDate": start_date, "endDate": end_date},
@@ -1144,9 +1693,18 @@ def build_crm_dashboard_payload(
         "funnel": funnel,
         "evolucion": evolucion,
         "ranking": ranking,
-        "stats": stats,
-        "alerts": alerts,
-        "ranking_propiedades": ranking_propiedades,
+        "stats": {"sinMonto": int(agg["sin_monto"]), "sinPropiedad": int(agg["sin_propiedad"])},
+        "alerts": _snapshot_alerts(session, period, filter_kwargs),
+        "ranking_propiedades": _ranking_propiedades_disponibles(session),
+    }
+
+
+def _snapshot_trend_point(session: Session, start_date: str, end_date: str, filter_kwargs: dict) -> dict:
+    agg = _snapshot_period_aggregates(session, _SnapshotPeriod(start_date, end_date), filter_kwargs, with_months=False)
+    return {
+        "total": int(agg["proceso"]) + int(agg["reserva"]),
+        "nuevas": int(agg["nuevas"]),
+        "ganadas": int(agg["ganadas"]),
     }
 
 
@@ -1154,6 +1712,56 @@ def build_crm_dashboard_payload(
 # SQL-paged detail fetch
 # ---------------------------------------------------------------------------
 
+def _alert_condition(alert_key: str):
+    """Condición SQL de `filter_current_oportunidades_by_alert` (EXISTS para mensajes y eventos)."""
+    if alert_key == "prospectSinResolver":
+        return and_(CRMOportunidad.estado == EstadoOportunidad.PROSPECT.value, CRMOportunidad.activo.is_(True))
+    if alert_key == "enProcesoSinMovimiento":
+        return and_(
+            CRMOportunidad.activo.is_(True),
+            CRMOportunidad.estado.in_(OPEN_PIPELINE_STATES),
+            CRMOportunidad.fecha_estado < datetime.now(UTC) - timedelta(days=30),
+        )
+    if alert_key == "mensajesSinLeer":
+        return (
+            select(CRMMensaje.id)
+            .where(CRMMensaje.oportunidad_id == CRMOportunidad.id)
+            .where(CRMMensaje.deleted_at.is_(None))
+            .where(CRMMensaje.tipo == TipoMensaje.ENTRADA.value)
+            .where(CRMMensaje.estado == EstadoMensaje.NUEVO.value)
+            .exists()
+        )
+    if alert_key == "tareasVencidas":
+        return (
+            select(CRMEvento.id)
+            .where(CRMEvento.oportunidad_id == CRMOportunidad.id)
+            .where(CRMEvento.deleted_at.is_(None))
+            .where(CRMEvento.estado_evento == EstadoEvento.PENDIENTE.value)
+            .where(CRMEvento.fecha_evento.is_not(None))
+            .where(func.date(CRMEvento.fecha_evento) < datetime.now(UTC).date())
+            .exists()
+        )
+    return None
+
+
+def _detail_fecha_cierre_expr():
+    """`fecha_cierre` de `build_dashboard_detail_entry_from_oportunidad`."""
+    return case(
+        (CRMOportunidad.estado.in_((_GANADA, _PERDIDA)), func.date(CRMOportunidad.fecha_estado)),
+        else_=None,
+    )
+
+
+def _bucket_condition(bucket: str):
+    """Bucket YYYY-MM del detalle (mes de cierre o de creación) como rango de fechas."""
+    try:
+        month_start = datetime.strptime(bucket, "%Y-%m").date()
+    except ValueError:
+        return false()
+    bucket_date = func.coalesce(_detail_fecha_cierre_expr(), func.date(CRMOportunidad.created_at))
+    return bucket_date.between(month_start, _month_end(month_start))
+
+
 def fetch_current_oportunidades_for_detail(
     session: Session,
     kpi_key: str,
@@ -1168,15 +1776,27 @@ def fetch_current_oportunidades_for_detail(
     order_dir: str = "asc",
     page: int = 1,
     per_page: int = 25,
+    alert_key: Optional[str] = None,
+    stage: Optional[str] = None,
+    bucket: Optional[str] = None,
 ) -> Tuple[List[CRMOportunidad], int]:
-    """Returns (paged_oportunidades, total_count) with estado filtering and pagination in SQL."""
+    """
+    Returns (paged_oportunidades, total_count) with estado filtering and pagination in SQL.
+
+    Con `alert_key`, `stage` o `bucket` el universo son las oportunidades vigentes del
+    periodo (snapshot del pipeline), igual que `fetch_current_oportunidades_for_dashboard`,
+    y el orden replica el de las entradas del detalle (monto estimado, fecha de cierre).
+    """
     proceso_states = [
         EstadoOportunidad.ABIERTA.value,
         EstadoOportunidad.VISITA.value,
         EstadoOportunidad.COTIZA.value,
     ]
+    secondary = bool(alert_key or stage or bucket)
 
     def _apply_kpi(q):
+        if alert_key:
+            return q.where(_alert_condition(alert_key))
         if kpi_key == "prospect":
             return q.where(CRMOportunidad.estado == EstadoOportunidad.PROSPECT.value)
         if kpi_key == "proceso":
@@ -1198,18 +1818,30 @@ def fetch_current_oportunidades_for_detail(
             return q
         return q
 
+    def _apply_filters(q):
+        q = _apply_kpi(q)
+        q = _apply_oportunidad_filters(
+            q,
+            tipo_operacion_ids=tipo_operacion_ids,
+            tipo_propiedad=tipo_propiedad,
+            responsable_ids=responsable_ids,
+            propietario=propietario,
+            emprendimiento_ids=emprendimiento_ids,
+        )
+        if not secondary:
+            return q
+        period = _SnapshotPeriod(start_date, end_date)
+        vigentes = _snapshot_select([CRMPipelineSnapshot.oportunidad_id], {}).where(period.vigente)
+        q = q.where(CRMOportunidad.id.in_(vigentes))
+        if stage:
+            q = q.where(CRMOportunidad.estado == stage)
+        if bucket:
+            q = q.where(_bucket_condition(bucket))
+        return q
+
     # COUNT query (no selectinload, just filters)
     count_q = select(func.count(CRMOportunidad.id)).where(CRMOportunidad.deleted_at.is_(None))
-    count_q = _apply_kpi(count_q)
-    count_q = _apply_oportunidad_filters(
-        count_q,
-        tipo_operacion_ids=tipo_operacion_ids,
-        tipo_propiedad=tipo_propiedad,
-        responsable_ids=responsable_ids,
-        propietario=propietario,
-        emprendimiento_ids=emprendimiento_ids,
-    )
-    total = int(session.exec(count_q).one() or 0)
+    total = int(session.exec(_apply_filters(count_q)).one() or 0)
 
     # DATA query with eager loads
     data_q = (
@@ -1223,25 +1855,35 @@ def fetch_current_oportunidades_for_detail(
             selectinload(CRMOportunidad.moneda),
         )
     )
-    data_q = _apply_kpi(data_q)
-    data_q = _apply_oportunidad_filters(
-        data_q,
-        tipo_operacion_ids=tipo_operacion_ids,
-        tipo_propiedad=tipo_propiedad,
-        responsable_ids=responsable_ids,
-        propietario=propietario,
-        emprendimiento_ids=emprendimiento_ids,
-    )
-
-    col_map = {
-        "estado": CRMOportunidad.estado,
-        "monto": CRMOportunidad.monto,
-        "created_at": CRMOportunidad.created_at,
-        "fecha_cierre": CRMOportunidad.fecha_estado,
-        "probabilidad": CRMOportunidad.probabilidad,
-    }
+    data_q = _apply_filters(data_q)
+
+    if secondary:
+        if order_by == "monto":
+            data_q = data_q.outerjoin(
+                _MONTO_PROPIEDAD, _MONTO_PROPIEDAD.id == CRMOportunidad.propiedad_id
+            ).outerjoin(_MONTO_TIPO_OPERACION, _MONTO_TIPO_OPERACION.id == CRMOportunidad.tipo_operacion_id)
+        col_map = {
+            "estado": CRMOportunidad.estado,
+            "monto": func.coalesce(_monto_estimado_expr(), 0),
+            "created_at": func.date(CRMOportunidad.created_at),
+            "fecha_cierre": _detail_fecha_cierre_expr(),
+            "probabilidad": func.coalesce(CRMOportunidad.probabilidad, 0),
+        }
+    else:
+        col_map = {
+            "estado": CRMOportunidad.estado,
+            "monto": CRMOportunidad.monto,
+            "created_at": CRMOportunidad.created_at,
+            "fecha_cierre": CRMOportunidad.fecha_estado,
+            "probabilidad": CRMOportunidad.probabilidad,
+        }
     col = col_map.get(order_by, CRMOportunidad.estado)
-    if order_dir == "desc":
+    if secondary:
+        # Mismo orden que el sort estable del detalle: empates por id ascendente salvo en "estado"
+        tiebreak = CRMOportunidad.id.desc() if order_dir == "desc" and order_by == "estado" else CRMOportunidad.id.asc()
+        ordered = col.desc().nulls_last() if order_dir == "desc" else col.asc().nulls_first()
+        data_q = data_q.order_by(ordered, tiebreak)
+    elif order_dir == "desc":
         data_q = data_q.order_by(col.desc(), CRMOportunidad.id.desc())
     else:
         data_q = data_q.order_by(col.asc(), CRMOportunidad.id.asc())
@@ -1362,6 +2004,25 @@ def build_crm_dashboard_bundle(
     filters_ctx: Optional[dict] = None,
 ) -> dict:
     """Returns {current, previous, trend} using a single SQL query."""
+    if CRM_DASHBOARD_SNAPSHOT:
+        return _build_crm_dashboard_bundle_from_snapshot(
+            session,
+            start_date,
+            end_date,
+            period_type,
+            trend_steps,
+            previous_step,
+            filter_kwargs={
+                "tipo_operacion_ids": tipo_operacion_ids,
+                "tipo_propiedad": tipo_propiedad,
+                "responsable_ids": responsable_ids,
+                "propietario": propietario,
+                "emprendimiento_ids": emprendimiento_ids,
+            },
+            limit_top=limit_top,
+            filters_ctx=filters_ctx,
+        )
+
     # ONE SQL query — all period calculations reuse this in-memory data
     raw = _query_raw_oportunidades_for_dashboard(
         session=session,
@@ -1372,8 +2033,15 @@ def build_crm_dashboard_bundle(
         emprendimiento_ids=emprendimiento_ids,
     )
 
-    def _build_from_raw(s: str, e: str) -> dict:
-        items = _calculate_oportunidades_for_period(raw, s, e)
+    prev_start, prev_end = _shift_dates(start_date, end_date, period_type, previous_step)
+    trend_periods = [_shift_dates(start_date, end_date, period_type, step) for step in trend_steps]
+    # Una pasada sobre las columnas evalúa actual, anterior y todos los puntos de tendencia
+    (current_items, previous_items), trend_counts = _DashboardColumns(raw).evaluate(
+        [(start_date, end_date), (prev_start, prev_end)],
+        trend_periods,
+    )
+
+    def _payload(items: List[CalculatedOportunidad], s: str, e: str) -> dict:
         current_ops = [item.oportunidad for item in items if item.es_pendiente or item.es_cerrada_30d]
         payload = build_crm_dashboard_payload(
             items,
@@ -1387,23 +2055,61 @@ def build_crm_dashboard_bundle(
         _apply_ranking_filtrar(payload)
         return payload
 
-    current_data = _build_from_raw(start_date, end_date)
+    current_data = _payload(current_items, start_date, end_date)
+    previous_data = _payload(previous_items, prev_start, prev_end)
+
+    trend: List[dict] = [
+        {
+            "label": _format_trend_label(t_start, period_type),
+            "total": counts["pendientes_fin"],
+            "nuevas": counts["nuevas"],
+            "ganadas": counts["ganadas"],
+        }
+        for (t_start, _), counts in zip(trend_periods, trend_counts)
+    ]
+
+    return {"current": current_data, "previous": previous_data, "trend": trend}
+
+
+def _build_crm_dashboard_bundle_from_snapshot(
+    session: Session,
+    start_date: str,
+    end_date: str,
+    period_type: str,
+    trend_steps: List[int],
+    previous_step: int,
+    filter_kwargs: dict,
+    limit_top: int,
+    filters_ctx: Optional[dict],
+) -> dict:
+    """Bundle con agregados SQL por periodo; solo se cargan las oportunidades de los rankings."""
+    oportunidades_by_id: Dict[int, CRMOportunidad] = {}
+
+    def _payload(s: str, e: str) -> dict:
+        payload = build_crm_dashboard_payload_from_snapshot(
+            session,
+            s,
+            e,
+            filter_kwargs,
+            limit_top=limit_top,
+            filters=filters_ctx,
+            oportunidades_by_id=oportunidades_by_id,
+        )
+        _apply_ranking_filtrar(payload)
+        return payload
 
+    current_data = _payload(start_date, end_date)
     prev_start, prev_end = _shift_dates(start_date, end_date, period_type, previous_step)
-    previous_data = _build_from_raw(prev_start, prev_end)
+    previous_data = _payload(prev_start, prev_end)
 
     trend: List[dict] = []
     for step in trend_steps:
         t_start, t_end = _shift_dates(start_date, end_date, period_type, step)
-        t_items = _calculate_oportunidades_for_period(raw, t_start, t_end)
-        ganadas = sum(1 for item in t_items if item.es_ganada_periodo)
-        nuevas = sum(1 for item in t_items if item.es_nueva_periodo)
-        pendientes_fin = sum(1 for item in t_items if item.es_proceso or item.es_reserva)
-        trend.append({
-            "label": _format_trend_label(t_start, period_type),
-            "total": pendientes_fin,
-            "nuevas": nuevas,
-            "ganadas": ganadas,
-        })
+        trend.append(
+            {
+                "label": _format_trend_label(t_start, period_type),
+                **_snapshot_trend_point(session, t_start, t_end, filter_kwargs),
+            }
+        )
 
     return {"current": current_data, "previous": previous_data, "trend": trend}
@@ -8,6 +8,7 @@ import json
 import httpx
 from sqlmodel import Session, select
 
+from app.db import DbSession, run_db
 from app.services.pdf_extraction_service import OPENAI_AVAILABLE
 from app.services.metaw_client import metaw_client
 from app.crud.crm_contacto_crud import crm_contacto_crud
@@ -477,9 +478,56 @@ class CRMMensajeService:
 
     async def enviar_mensaje(
         self,
-        session: Session,
+        session: DbSession,
         payload: Dict[str, Any],
     ) -> Dict[str, Any]:
+        # Con AsyncSession las fases de DB corren via run_db y no bloquean el event loop
+        envio = await run_db(session, self._preparar_envio, payload)
+        mensaje = envio["mensaje_salida"]
+        celular = envio.pop("celular")
+        contacto = envio.pop("contacto")
+        contacto_referencia = envio.pop("contacto_referencia")
+        contenido = payload.get("contenido")
+        try:
+            if not celular.meta_celular_id:
+                raise ValueError(f"Celular {celular.id} no tiene meta_celular_id configurado")
+
+            EMPRESA_ID = "692d787d-06c4-432e-a94e-cf0686e593eb"
+            telefono_limpio = str(contacto_referencia).replace("+", "")
+            nombre_contacto = contacto.nombre_completo if contacto else None
+
+            resultado_metaw = await metaw_client.enviar_mensaje(
+                empresa_id=EMPRESA_ID,
+                celular_id=celular.meta_celular_id,
+                telefono_destino=telefono_limpio,
+                texto=contenido.strip(),
+                nombre_contacto=nombre_contacto,
+                template_fallback_name=payload.get("template_fallback_name", "notificacion_general"),
+                template_fallback_language=payload.get("template_fallback_language", "es_AR"),
+            )
+
+            await run_db(session, self._registrar_envio, mensaje, resultado_metaw)
+            return {
+                **envio,
+                "status": mensaje.estado_meta,
+                "meta_message_id": mensaje.origen_externo_id,
+            }
+        except httpx.HTTPStatusError as exc:
+            error_msg = f"Error meta-w: {exc.response.status_code} - {exc.response.text}"
+            await run_db(
+                session,
+                self._registrar_error_envio,
+                mensaje,
+                {"error": error_msg, "error_code": exc.response.status_code},
+            )
+            return {**envio, "status": "failed", "error_message": error_msg}
+        except Exception as exc:
+            error_msg = f"Error al enviar mensaje: {str(exc)}"
+            await run_db(session, self._registrar_error_envio, mensaje, {"error": error_msg})
+            return {**envio, "status": "failed", "error_message": error_msg}
+
+    def _preparar_envio(self, session: Session, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Fase sync previa al envio: resuelve contacto/oportunidad/celular y crea el mensaje pendiente."""
         contenido = payload.get("contenido")
         if not contenido or not contenido.strip():
             raise ValueError("El contenido del mensaje es obligatorio")
@@ -626,72 +674,31 @@ class CRMMensajeService:
 
         session.commit()
         session.refresh(mensaje)
-        try:
-            if not celular.meta_celular_id:
-                raise ValueError(f"Celular {celular.id} no tiene meta_celular_id configurado")
-
-            EMPRESA_ID = "692d787d-06c4-432e-a94e-cf0686e593eb"
-            telefono_limpio = str(contacto_referencia).replace("+", "")
-            nombre_contacto = contacto.nombre_completo if contacto else None
-
-            resultado_metaw = await metaw_client.enviar_mensaje(
-                empresa_id=EMPRESA_ID,
-                celular_id=celular.meta_celular_id,
-                telefono_destino=telefono_limpio,
-                texto=contenido.strip(),
-                nombre_contacto=nombre_contacto,
-                template_fallback_name=payload.get("template_fallback_name", "notificacion_general"),
-                template_fallback_language=payload.get("template_fallback_language", "es_AR"),
-            )
+        return {
+            "mensaje_salida": mensaje,
+            "contacto_id": contacto_id,
+            "contacto_creado": contacto_creado,
+            "oportunidad_id": oportunidad_id,
+            "oportunidad_creada": oportunidad_creada,
+            "celular": celular,
+            "contacto": contacto,
+            "contacto_referencia": contacto_referencia,
+        }
 
-            mensaje.estado_meta = resultado_metaw.get("status", "sent")
-            mensaje.origen_externo_id = resultado_metaw.get("meta_message_id")
-            mensaje.estado = EstadoMensaje.ENVIADO.value
-            session.commit()
-            session.refresh(mensaje)
+    @staticmethod
+    def _registrar_envio(session: Session, mensaje: CRMMensaje, resultado_metaw: Dict[str, Any]) -> None:
+        mensaje.estado_meta = resultado_metaw.get("status", "sent")
+        mensaje.origen_externo_id = resultado_metaw.get("meta_message_id")
+        mensaje.estado = EstadoMensaje.ENVIADO.value
+        session.commit()
+        session.refresh(mensaje)
 
-            return {
-                "mensaje_salida": mensaje,
-                "contacto_id": contacto_id,
-                "contacto_creado": contacto_creado,
-                "oportunidad_id": oportunidad_id,
-                "oportunidad_creada": oportunidad_creada,
-                "status": mensaje.estado_meta,
-                "meta_message_id": mensaje.origen_externo_id,
-            }
-        except httpx.HTTPStatusError as exc:
-            error_msg = f"Error meta-w: {exc.response.status_code} - {exc.response.text}"
-            mensaje.estado = EstadoMensaje.ERROR_ENVIO.value
-            mensaje.estado_meta = "failed"
-            mensaje.metadata_json = {
-                "error": error_msg,
-                "error_code": exc.response.status_code,
-            }
-            session.commit()
-            return {
-                "mensaje_salida": mensaje,
-                "contacto_id": contacto_id,
-                "contacto_creado": contacto_creado,
-                "oportunidad_id": oportunidad_id,
-                "oportunidad_creada": oportunidad_creada,
-                "status": "failed",
-                "error_message": error_msg,
-            }
-        except Exception as exc:
-            error_msg = f"Error al enviar mensaje: {str(exc)}"
-            mensaje.estado = EstadoMensaje.ERROR_ENVIO.value
-            mensaje.estado_meta = "failed"
-            mensaje.metadata_json = {"error": error_msg}
-            session.commit()
-            return {
-                "mensaje_salida": mensaje,
-                "contacto_id": contacto_id,
-                "contacto_creado": contacto_creado,
-                "oportunidad_id": oportunidad_id,
-                "oportunidad_creada": oportunidad_creada,
-                "status": "failed",
-                "error_message": error_msg,
-            }
+    @staticmethod
+    def _registrar_error_envio(session: Session, mensaje: CRMMensaje, error: Dict[str, Any]) -> None:
+        mensaje.estado = EstadoMensaje.ERROR_ENVIO.value
+        mensaje.estado_meta = "failed"
+        mensaje.metadata_json = error
+        session.commit()
 
     def _normalize_datetime(self, value: Any) -> datetime:
         if isinstance(value, datetime):
@@ -9,6 +9,8 @@ from sqlalchemy import delete, func, update
 from app.models import (
     CRMOportunidad,
     CRMOportunidadLogEstado,
+    CRMPipelineEstadoIntervalo,
+    CRMPipelineSnapshot,
     CRMContacto,
     CRMCondicionPago,
     CRMMotivoPerdida,
@@ -21,6 +23,8 @@ from app.models import (
     PoOrderStatus,
 )
 from app.services.propiedad_status_service import sync_propiedad_status
+# Registra los listeners que mantienen crm_pipeline_snapshots en cada flush
+from app.services import crm_pipeline_snapshot  # noqa: F401
 from app.models.enums import (
     EstadoOportunidad,
     TRANSICIONES_ESTADO_OPORTUNIDAD,
@@ -247,6 +251,12 @@ class CRMOportunidadService:
                 CRMOportunidadLogEstado.oportunidad_id == oportunidad_id
             )
         )
+        session.exec(
+            delete(CRMPipelineEstadoIntervalo).where(
+                CRMPipelineEstadoIntervalo.oportunidad_id == oportunidad_id
+            )
+        )
+        session.exec(delete(CRMPipelineSnapshot).where(CRMPipelineSnapshot.oportunidad_id == oportunidad_id))
         session.exec(delete(CRMOportunidad).where(CRMOportunidad.id == oportunidad_id))
 
         session.commit()
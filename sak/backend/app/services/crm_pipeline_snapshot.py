@@ -0,0 +1,180 @@
+"""
+Snapshot materializado del pipeline CRM (tablas crm_pipeline_snapshots y
+crm_pipeline_estado_intervalos).
+
+Por oportunidad guarda las fechas que el dashboard derivaba de los logs en cada
+request (creación, ingreso al pipeline, cierre) y los intervalos de estado, de modo
+que "estado al corte" sea un join por rango en vez de re-jugar los logs en Python.
+
+Mantenimiento incremental: un listener de Session recalcula las filas de las
+oportunidades tocadas en cada flush (alta, cambio de estado/fechas, logs nuevos),
+dentro de la misma transacción. Cubre `CRMOportunidadService.cambiar_estado`, el
+CRUD genérico y el alta desde webhooks. Para backfill: `rebuild_pipeline_snapshot`.
+"""
+from __future__ import annotations
+
+from datetime import UTC, date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, event, insert, inspect, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.models.crm import (
+    CRMOportunidad,
+    CRMOportunidadLogEstado,
+    CRMPipelineEstadoIntervalo,
+    CRMPipelineSnapshot,
+)
+from app.models.enums import EstadoOportunidad
+
+_CLOSED_STATES = (EstadoOportunidad.GANADA.value, EstadoOportunidad.PERDIDA.value)
+# Campos de la oportunidad de los que depende el snapshot
+_TRACKED_FIELDS = ("estado", "created_at", "deleted_at")
+_DIRTY_KEY = "crm_pipeline_dirty_ids"
+_CHUNK = 500
+
+
+def build_pipeline_rows(
+    oportunidad_id: int,
+    created_at: Optional[datetime],
+    estado: Optional[str],
+    logs: Sequence[Tuple[Optional[datetime], Optional[str], Optional[str]]],
+) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Calcula la fila de snapshot y los intervalos de estado de una oportunidad.
+
+    `logs` son tuplas (fecha_registro, estado_anterior, estado_nuevo). Replica las
+    reglas de `_fecha_cierre`, `_fecha_ingreso_pipeline` y `_estado_al_corte` de
+    crm_dashboard para que ambos caminos den los mismos números.
+    """
+    if created_at is None:
+        return None, []
+
+    ordered = sorted(logs, key=lambda log: log[0] or datetime.min)
+    fecha_cierre: Optional[date] = None
+    estado_cierre: Optional[str] = None
+    for fecha, _, nuevo in ordered:
+        if nuevo in _CLOSED_STATES:
+            fecha_cierre = fecha.date() if fecha else None
+            estado_cierre = nuevo
+            break
+
+    fecha_ingreso: Optional[date] = None
+    for fecha, _, nuevo in ordered:
+        if nuevo != EstadoOportunidad.PROSPECT.value and fecha:
+            fecha_ingreso = fecha.date()
+            break
+    if fecha_ingreso is None and estado != EstadoOportunidad.PROSPECT.value:
+        fecha_ingreso = created_at.date()
+
+    # Intervalos: se recorren los logs del más nuevo al más viejo revirtiendo estados,
+    # con el mismo orden (sort estable) que `_estado_al_corte` para logs del mismo instante
+    intervals: List[Dict[str, Any]] = []
+    running = estado
+    hasta: Optional[date] = None
+    for fecha, anterior, _ in sorted(logs, key=lambda log: log[0] or datetime.min, reverse=True):
+        if fecha is None:
+            break
+        desde = fecha.date()
+        if hasta is None or desde < hasta:
+            intervals.append({"oportunidad_id": oportunidad_id, "estado": running, "desde": desde, "hasta": hasta})
+        hasta = desde
+        running = anterior or running
+    intervals.append({"oportunidad_id": oportunidad_id, "estado": running, "desde": None, "hasta": hasta})
+
+    snapshot = {
+        "oportunidad_id": oportunidad_id,
+        "fecha_creacion": created_at.date(),
+        "fecha_ingreso_pipeline": fecha_ingreso,
+        "fecha_cierre": fecha_cierre,
+        "estado_cierre": estado_cierre,
+        "actualizado_at": datetime.now(UTC),
+    }
+    for interval in intervals:
+        interval["estado"] = interval["estado"] or ""
+    return snapshot, intervals
+
+
+def _chunks(ids: Sequence[int]) -> Iterable[List[int]]:
+    for start in range(0, len(ids), _CHUNK):
+        yield list(ids[start:start + _CHUNK])
+
+
+def refresh_pipeline_snapshot(connection: Connection, oportunidad_ids: Iterable[int]) -> None:
+    """Recalcula (borra e inserta) las filas de snapshot de las oportunidades dadas."""
+    ids = sorted({int(oid) for oid in oportunidad_ids if oid is not None})
+    opp = CRMOportunidad.__table__
+    log = CRMOportunidadLogEstado.__table__
+    snap = CRMPipelineSnapshot.__table__
+    interval = CRMPipelineEstadoIntervalo.__table__
+
+    for chunk in _chunks(ids):
+        rows = connection.execute(
+            select(opp.c.id, opp.c.created_at, opp.c.estado).where(opp.c.id.in_(chunk))
+        ).all()
+        logs_by_opp: Dict[int, list] = {}
+        for oid, fecha, anterior, nuevo in connection.execute(
+            select(log.c.oportunidad_id, log.c.fecha_registro, log.c.estado_anterior, log.c.estado_nuevo)
+            .where(log.c.oportunidad_id.in_(chunk))
+            .order_by(log.c.oportunidad_id, log.c.id)
+        ):
+            logs_by_opp.setdefault(oid, []).append((fecha, anterior, nuevo))
+
+        snapshots: List[Dict[str, Any]] = []
+        intervals: List[Dict[str, Any]] = []
+        for oid, created_at, estado in rows:
+            snapshot, opp_intervals = build_pipeline_rows(oid, created_at, estado, logs_by_opp.get(oid, []))
+            if snapshot is not None:
+                snapshots.append(snapshot)
+                intervals.extend(opp_intervals)
+
+        connection.execute(delete(interval).where(interval.c.oportunidad_id.in_(chunk)))
+        connection.execute(delete(snap).where(snap.c.oportunidad_id.in_(chunk)))
+        if snapshots:
+            connection.execute(insert(snap), snapshots)
+        if intervals:
+            connection.execute(insert(interval), intervals)
+
+
+def rebuild_pipeline_snapshot(connection: Connection) -> int:
+    """Backfill completo (migraciones / scripts). Devuelve la cantidad de oportunidades."""
+    opp = CRMOportunidad.__table__
+    ids = [row[0] for row in connection.execute(select(opp.c.id).order_by(opp.c.id))]
+    refresh_pipeline_snapshot(connection, ids)
+    return len(ids)
+
+
+def _tracked_change(obj: CRMOportunidad) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in _TRACKED_FIELDS)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_dirty_oportunidades(session: Session, flush_context) -> None:
+    dirty = set()
+    for obj in session.new:
+        if isinstance(obj, CRMOportunidad):
+            dirty.add(obj.id)
+        elif isinstance(obj, CRMOportunidadLogEstado):
+            dirty.add(obj.oportunidad_id)
+    for obj in session.dirty:
+        if isinstance(obj, CRMOportunidad) and _tracked_change(obj):
+            dirty.add(obj.id)
+        elif isinstance(obj, CRMOportunidadLogEstado):
+            dirty.add(obj.oportunidad_id)
+    for obj in session.deleted:
+        if isinstance(obj, CRMOportunidad):
+            dirty.add(obj.id)
+        elif isinstance(obj, CRMOportunidadLogEstado):
+            dirty.add(obj.oportunidad_id)
+    dirty.discard(None)
+    if dirty:
+        session.info.setdefault(_DIRTY_KEY, set()).update(dirty)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _refresh_dirty_oportunidades(session: Session, flush_context) -> None:
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if dirty:
+        refresh_pipeline_snapshot(session.connection(), dirty)
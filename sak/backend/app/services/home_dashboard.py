@@ -1,15 +1,23 @@
 from __future__ import annotations
 
+import contextvars
 import json
+import logging
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from urllib.parse import quote
 from datetime import date, datetime, timedelta
-from typing import Any
+from typing import Any, Callable
 
 from sqlalchemy import and_, false, func, or_
-from sqlmodel import Session, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool, SingletonThreadPool, StaticPool
+from sqlmodel import Session, create_engine, select
 
-from app.db import ENV
+from app.core.instrumentation import instrument_pool
+from app.db import ENV, POOL_PRE_PING, POOL_RECYCLE, POOL_SIZE, POOL_TIMEOUT, _connect_args
 from app.models.base import current_utc_time, serialize_datetime
 from app.models.compras import PoOrder, PoOrderStatus
 from app.models.crm import CRMEvento, CRMMensaje, CRMOportunidad
@@ -30,6 +38,19 @@ MY_PURCHASE_STATUS_NAMES = ("solicitada", "emitida", "aprobada")
 
 HOME_PARTIAL_KEYS = {"miDia", "radar"}
 HOME_DOMAIN_KEYS = {"personal", "poorders", "oportunidades", "contratos", "propiedades"}
+# Secciones del bundle en paralelo, cada una con su propia sesión y un presupuesto de
+# tiempo: si una sección no termina a tiempo se devuelve su último valor conocido
+# marcado como `stale` (o vacía) y el bundle no espera a la más lenta.
+# Las secciones toman conexiones de un pool propio (tantas como workers, acotado por
+# DB_POOL_SIZE) con pool_timeout = presupuesto: no le quitan conexiones a los requests
+# y un checkout nunca espera más que el presupuesto.
+HOME_DASHBOARD_PARALLEL = os.getenv("HOME_DASHBOARD_PARALLEL", "1") == "1"
+HOME_DASHBOARD_SECTION_BUDGET_SECONDS = float(os.getenv("HOME_DASHBOARD_SECTION_BUDGET_SECONDS", "2.5"))
+HOME_DASHBOARD_WORKERS = int(os.getenv("HOME_DASHBOARD_WORKERS", "8"))
+_LAST_SECTIONS_MAX = 512
+
+logger = logging.getLogger(__name__)
+
 RADAR_PRIORITY_GROUPS = (
     ("aprobaciones_pendientes",),
     ("solicitudes_pendientes",),
@@ -107,37 +128,48 @@ def _build_mi_dia_payload(
     personal: dict[str, Any],
     compras: dict[str, Any],
 ) -> dict[str, Any]:
+    """
+    Resumen "Mi dia" con las secciones que tengan items; una sección stale sin
+    valor previo no aporta items (en vez de forzar un total 0 engañoso) y los
+    items que vienen de una sección stale se marcan `stale`.
+    """
     personal_items = {item["key"]: item for item in personal["items"]}
     compras_items = {item["key"]: item for item in compras["items"]}
 
-    agenda_pendiente = personal_items["agenda_pendiente"]
-    agenda_vencida = personal_items["agenda_vencida"]
-    agenda_count = agenda_pendiente["count"] + agenda_vencida["count"]
-    agenda_severity = "urgent" if agenda_vencida["count"] > 0 else "high"
-    agenda_item = _item(
-        "agenda",
-        "Agenda",
-        agenda_count,
-        agenda_severity,
-        "personal",
-        agenda_vencida["href"] or agenda_pendiente["href"],
-        "Ver agenda",
-        meta={
-            "pendientes": agenda_pendiente["count"],
-            "vencidos": agenda_vencida["count"],
-        },
-    )
-    items = [
-        personal_items["chats_nuevos"],
-        agenda_item,
-        compras_items["mis_compras"],
-    ]
+    items: list[dict[str, Any]] = []
+    if personal_items:
+        agenda_pendiente = personal_items["agenda_pendiente"]
+        agenda_vencida = personal_items["agenda_vencida"]
+        agenda_count = agenda_pendiente["count"] + agenda_vencida["count"]
+        agenda_severity = "urgent" if agenda_vencida["count"] > 0 else "high"
+        agenda_item = _item(
+            "agenda",
+            "Agenda",
+            agenda_count,
+            agenda_severity,
+            "personal",
+            agenda_vencida["href"] or agenda_pendiente["href"],
+            "Ver agenda",
+            meta={
+                "pendientes": agenda_pendiente["count"],
+                "vencidos": agenda_vencida["count"],
+            },
+        )
+        items.extend(_mark_stale([personal_items["chats_nuevos"], agenda_item], personal))
+    if compras_items:
+        items.extend(_mark_stale([compras_items["mis_compras"]], compras))
     return {
         "total": sum(item["count"] for item in items),
         "items": items,
     }
 
 
+def _mark_stale(items: list[dict[str, Any]], section: dict[str, Any]) -> list[dict[str, Any]]:
+    if not section.get("stale"):
+        return items
+    return [{**item, "stale": True} for item in items]
+
+
 def _build_radar_payload(sections: list[dict[str, Any]]) -> dict[str, Any]:
     excluded_radar_keys = {
         "chats_nuevos",
@@ -616,23 +648,157 @@ def _build_section_response(
     }
 
 
+_section_executor: ThreadPoolExecutor | None = None
+_section_executor_lock = threading.Lock()
+_section_engines: dict[str, Engine] = {}
+_last_sections: "OrderedDict[tuple[int | None, str], dict[str, Any]]" = OrderedDict()
+_last_sections_lock = threading.Lock()
+
+SectionTask = tuple[int | None, str, Callable[[Session], dict[str, Any]]]
+
+
+def _section_workers() -> int:
+    return max(1, min(HOME_DASHBOARD_WORKERS, POOL_SIZE))
+
+
+def _get_section_executor() -> ThreadPoolExecutor:
+    global _section_executor
+    with _section_executor_lock:
+        if _section_executor is None:
+            _section_executor = ThreadPoolExecutor(
+                max_workers=_section_workers(),
+                thread_name_prefix="home-dashboard",
+            )
+        return _section_executor
+
+
+def _get_section_engine(bind: Engine) -> Engine:
+    """Engine con pool propio para las secciones, contra la misma DB que `bind`."""
+    if isinstance(bind.pool, NullPool):
+        # Detrás de PgBouncer (NullPool) no hay pool que agotar
+        return bind
+    url = bind.url.render_as_string(hide_password=False)
+    with _section_executor_lock:
+        section_engine = _section_engines.get(url)
+        if section_engine is None:
+            budget = HOME_DASHBOARD_SECTION_BUDGET_SECONDS
+            section_engine = create_engine(
+                bind.url,
+                pool_size=_section_workers(),
+                max_overflow=0,
+                pool_timeout=budget if budget > 0 else POOL_TIMEOUT,
+                pool_recycle=POOL_RECYCLE,
+                pool_pre_ping=POOL_PRE_PING,
+                connect_args=_connect_args(url),
+            )
+            instrument_pool(section_engine, f"home-dashboard-{len(_section_engines)}")
+            _section_engines[url] = section_engine
+        return section_engine
+
+
+def _remember_section(cache_key: tuple[int | None, str], section: dict[str, Any]) -> None:
+    with _last_sections_lock:
+        _last_sections[cache_key] = section
+        _last_sections.move_to_end(cache_key)
+        while len(_last_sections) > _LAST_SECTIONS_MAX:
+            _last_sections.popitem(last=False)
+
+
+def _stale_section(cache_key: tuple[int | None, str], key: str, label: str) -> dict[str, Any]:
+    with _last_sections_lock:
+        last = _last_sections.get(cache_key)
+    if last is not None:
+        return {**last, "stale": True}
+    return {**_section(key, label, "", []), "stale": True}
+
+
+def _can_run_parallel(session: Session) -> bool:
+    # Con StaticPool/SingletonThreadPool (SQLite en tests/dev) hay una sola conexión compartida
+    bind = session.get_bind()
+    return HOME_DASHBOARD_PARALLEL and not isinstance(getattr(bind, "pool", None), (StaticPool, SingletonThreadPool))
+
+
+def _run_with_own_session(bind, builder: Callable[[Session], dict[str, Any]]) -> dict[str, Any]:
+    with Session(bind) as section_session:
+        return builder(section_session)
+
+
+def _evaluate_sections(
+    session: Session,
+    tasks: dict[str, SectionTask],
+) -> tuple[dict[str, dict[str, Any]], list[str]]:
+    """Evalúa las secciones; devuelve (secciones por key, keys que quedaron stale)."""
+    if not _can_run_parallel(session):
+        results = {key: builder(session) for key, (_, _, builder) in tasks.items()}
+        for key, (user_id, _, _) in tasks.items():
+            _remember_section((user_id, key), results[key])
+        return results, []
+
+    bind = _get_section_engine(session.get_bind())
+    # Devuelve la conexión del request antes del fan-out: no queda retenida mientras se espera
+    session.close()
+    executor = _get_section_executor()
+    futures: dict[str, Future] = {}
+    for key, (user_id, _, builder) in tasks.items():
+        context = contextvars.copy_context()
+        future = executor.submit(context.run, _run_with_own_session, bind, builder)
+
+        # También las secciones que terminan fuera de presupuesto refrescan el último valor
+        def _on_done(done: Future, cache_key=(user_id, key)) -> None:
+            if not done.cancelled() and done.exception() is None:
+                _remember_section(cache_key, done.result())
+
+        future.add_done_callback(_on_done)
+        futures[key] = future
+
+    budget = HOME_DASHBOARD_SECTION_BUDGET_SECONDS
+    wait(futures.values(), timeout=budget if budget > 0 else None)
+
+    results: dict[str, dict[str, Any]] = {}
+    stale: list[str] = []
+    for key, future in futures.items():
+        user_id, label, _ = tasks[key]
+        # Una sección que todavía espera worker ya no sirve para este request
+        cancelled = future.cancel()
+        if future.done() and not cancelled and future.exception() is None:
+            results[key] = future.result()
+            continue
+        if future.done() and not cancelled:
+            logger.error("Home dashboard: la sección %s falló", key, exc_info=future.exception())
+        else:
+            logger.warning("Home dashboard: la sección %s superó el presupuesto de %.1fs", key, budget)
+        results[key] = _stale_section((user_id, key), key, label)
+        stale.append(key)
+    return results, stale
+
+
 def build_home_dashboard_bundle(
     session: Session,
     current_user: User,
 ) -> dict[str, Any]:
     today = date.today()
     now_utc = current_utc_time()
+    user_id = current_user.id
+    alert_context = _build_inmobiliaria_alert_context(session, today)
 
-    personal = _build_personal_section(session, current_user, today)
-    crm = _build_crm_section(session, current_user, now_utc)
-    compras = _build_compras_section(session, current_user)
-    contratos, propiedades, _alert_days = _build_inmobiliaria_sections(session, today)
-    sections = [personal, compras, contratos, propiedades, crm]
+    sections, stale = _evaluate_sections(
+        session,
+        {
+            "personal": (user_id, "Mi dia", lambda s: _build_personal_section(s, current_user, today)),
+            "crm": (user_id, "CRM", lambda s: _build_crm_section(s, current_user, now_utc)),
+            "compras": (user_id, "Compras", lambda s: _build_compras_section(s, current_user)),
+            "contratos": (None, "Inmobiliaria", lambda s: _build_contratos_section(s, alert_context)),
+            "propiedades": (None, "Inmobiliaria", lambda s: _build_propiedades_section(s, alert_context)),
+        },
+    )
+    personal, compras = sections["personal"], sections["compras"]
+    ordered = [personal, compras, sections["contratos"], sections["propiedades"], sections["crm"]]
 
     return {
         **_build_home_context_payload(current_user, now_utc),
         "miDia": _build_mi_dia_payload(personal, compras),
-        "radar": _build_radar_payload(sections),
+        "radar": _build_radar_payload(ordered),
+        "staleSections": stale,
     }
 
 
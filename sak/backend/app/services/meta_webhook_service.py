@@ -4,37 +4,66 @@ Servicio para procesar webhooks de Meta WhatsApp
 from __future__ import annotations
 
 import logging
+from itertools import chain
 from typing import Any, Optional
 
-from sqlalchemy import func
-from sqlmodel import Session, select
+from pydantic import ValidationError
+from sqlalchemy import bindparam, cast, func, or_, update
+from sqlalchemy.dialects.postgresql import JSONB, array
+from sqlmodel import select
 
 from agente.v2.core.orchestrator import AgentTurnOrchestrator
-from agente.v2.core.delivery import TurnDeliveryService
+from agente.v2.core.delivery import SendResult, TurnDeliveryService
 from agente.v2.core.runtime import should_auto_process
 from agente.v2.processes.solicitud_materiales.handler import build_v2_dependencies
+from app.core.lookup_cache import LookupCache, attribute_values
 from app.crud.crm_contacto_crud import crm_contacto_crud
+from app.db import DbSession, run_db, sync_session_of
 from app.crud.crm_mensaje_crud import crm_mensaje_crud
 from app.models import CRMCelular, CRMContacto, CRMMensaje, CRMOportunidad, WebhookLog
 from app.models.base import current_utc_time
+from app.models.crm.catalogos import CRMTipoContacto
 from app.models.enums import CanalMensaje, EstadoMensaje, TipoMensaje
+from app.models.user import User
 from app.schemas.metaw_webhook import MetaWWebhookPayload
+from app.services import webhook_queue
 
 logger = logging.getLogger(__name__)
 
+# Resoluciones estables del webhook (ver app/core/lookup_cache.py)
+celular_cache = LookupCache(
+    "celular_por_meta_id", CRMCelular, lambda celular: attribute_values(celular, "meta_celular_id")
+)
+contacto_cache = LookupCache(
+    "contacto_por_telefono",
+    CRMContacto,
+    lambda contacto: chain.from_iterable(attribute_values(contacto, "telefonos")),
+)
+oportunidad_cache = LookupCache(
+    "oportunidad_activa_por_contacto",
+    CRMOportunidad,
+    lambda oportunidad: attribute_values(oportunidad, "contacto_id"),
+)
+usuario_default_cache = LookupCache("usuario_default", User, lambda usuario: ["default"])
+tipo_contacto_cache = LookupCache(
+    "tipo_contacto_por_nombre", CRMTipoContacto, lambda tipo: attribute_values(tipo, "nombre")
+)
+
 
 class MetaWebhookService:
     """Servicio para procesar eventos de webhooks de Meta WhatsApp."""
 
     def __init__(
         self,
-        session: Session,
+        session: DbSession,
         *,
         orchestrator: AgentTurnOrchestrator | None = None,
     ) -> None:
-        self.session = session
+        # Con AsyncSession, self.session es su Session sync: solo se usa dentro de _db()
+        self._db_session = session
+        self.session = sync_session_of(session)
         if orchestrator is None:
-            state_store, agent = build_v2_dependencies(session=session)
+            state_store, agent = build_v2_dependencies(session=self.session)
             orchestrator = AgentTurnOrchestrator(
                 processes=[agent],
                 state_store=state_store,
@@ -42,6 +71,10 @@ class MetaWebhookService:
         self._orchestrator = orchestrator
         self._delivery_service = TurnDeliveryService()
 
+    async def _db(self, fn, *args: Any) -> Any:
+        """Ejecuta una fase sync del servicio (que usa self.session) vía run_db."""
+        return await run_db(self._db_session, lambda _session: fn(*args))
+
     def _determinar_tipo_operacion_contacto(self, contacto_id: int) -> Optional[int]:
         """
         Determina el tipo de operación basado en propiedades activas del contacto.
@@ -51,38 +84,44 @@ class MetaWebhookService:
               en estados operativos (3-disponible o 4-alquilada)
             - None en caso contrario
         """
+        return self._tipos_operacion_por_contacto([contacto_id]).get(contacto_id)
+
+    def _tipos_operacion_por_contacto(self, contacto_ids: list[int]) -> dict[int, int]:
+        """Version por conjunto de `_determinar_tipo_operacion_contacto`: contacto_id -> tipo_operacion_id."""
         from app.models.propiedad import Propiedad, PropiedadesStatus
 
-        stmt = (
-            select(Propiedad)
+        rows = self.session.exec(
+            select(Propiedad.contacto_id, func.min(Propiedad.id))
             .join(PropiedadesStatus, Propiedad.propiedad_status_id == PropiedadesStatus.id, isouter=True)
             .where(
-                Propiedad.contacto_id == contacto_id,
+                Propiedad.contacto_id.in_(contacto_ids),
                 Propiedad.tipo_operacion_id == 1,
-                func.lower(PropiedadesStatus.nombre).op("~")("disponible|realizada|alquilada"),
+                func.lower(PropiedadesStatus.nombre).regexp_match("disponible|realizada|alquilada"),
             )
-        )
-        propiedad_alquiler = self.session.exec(stmt).first()
-
-        if propiedad_alquiler:
+            .group_by(Propiedad.contacto_id)
+        ).all()
+        for contacto_id, propiedad_id in rows:
             logger.info(
                 "Contacto %s tiene propiedad en alquiler (ID: %s) -> tipo_operacion=3 (mantenimiento)",
                 contacto_id,
-                propiedad_alquiler.id,
+                propiedad_id,
             )
-            return 3
-
-        return None
+        return {contacto_id: 3 for contacto_id, _ in rows}
 
     def _ensure_crm_celular(self, meta_celular_id: str, numero_celular: str) -> CRMCelular:
         """
         Asegura que exista el CRMCelular.
         Busca por meta_celular_id primero, luego por numero_celular para evitar duplicados.
         """
+        celular = celular_cache.get(self.session, meta_celular_id)
+        if celular:
+            return celular
+
         celular = self.session.exec(
             select(CRMCelular).where(CRMCelular.meta_celular_id == meta_celular_id)
         ).first()
         if celular:
+            celular_cache.put(meta_celular_id, celular)
             return celular
 
         celular_existente = self.session.exec(
@@ -98,6 +137,7 @@ class MetaWebhookService:
                 celular_existente.id,
                 meta_celular_id,
             )
+            celular_cache.put(meta_celular_id, celular_existente)
             return celular_existente
 
         celular = CRMCelular(
@@ -110,6 +150,7 @@ class MetaWebhookService:
         self.session.commit()
         self.session.refresh(celular)
         logger.info("CRMCelular auto-creado: %s - %s", celular.id, numero_celular)
+        celular_cache.put(meta_celular_id, celular)
         return celular
 
     def _find_or_create_contacto(
@@ -118,31 +159,33 @@ class MetaWebhookService:
         nombre_from_meta: Optional[str] = None,
     ) -> CRMContacto:
         """
-        Busca o crea un contacto por número de teléfono.
-        Busca en el array telefonos del contacto usando operador @> de PostgreSQL.
+        Busca o crea un contacto por número de teléfono (en el array telefonos,
+        con la misma búsqueda que la ingesta en lote).
         """
-        from sqlalchemy import cast
-        from sqlalchemy.dialects.postgresql import JSONB
-        from app.models.user import User
+        contacto = contacto_cache.get(self.session, numero_telefono)
+        if contacto:
+            return contacto
 
-        stmt = select(CRMContacto).where(
-            cast(CRMContacto.telefonos, JSONB).op("@>")(cast([numero_telefono], JSONB))
-        )
-        contacto = self.session.exec(stmt).first()
+        contacto = self._find_contactos_por_telefono({numero_telefono}).get(numero_telefono)
         if contacto:
+            contacto_cache.put(numero_telefono, contacto)
             return contacto
 
-        usuario_default = self.session.exec(select(User).limit(1)).first()
-        if not usuario_default:
-            raise ValueError("No hay usuarios activos para asignar como responsable")
+        contacto = self._create_contacto(numero_telefono, nombre_from_meta)
+        contacto_cache.put(numero_telefono, contacto)
+        return contacto
 
+    def _create_contacto(
+        self,
+        numero_telefono: str,
+        nombre_from_meta: Optional[str] = None,
+        *,
+        auto_commit: bool = True,
+    ) -> CRMContacto:
+        """Alta de un contacto desconocido: responsable default y tipo "Inmobiliaria"."""
+        usuario_default = self._default_user()
         nombre_contacto = nombre_from_meta or f"Contacto {numero_telefono}"
-
-        from sqlmodel import select as sqlmodel_select
-        from app.models.crm.catalogos import CRMTipoContacto
-        tipo_inmobiliaria = self.session.exec(
-            sqlmodel_select(CRMTipoContacto).where(CRMTipoContacto.nombre == "Inmobiliaria")
-        ).first()
+        tipo_inmobiliaria = self._tipo_contacto("Inmobiliaria")
 
         contacto = crm_contacto_crud.create(
             self.session,
@@ -152,6 +195,7 @@ class MetaWebhookService:
                 "responsable_id": usuario_default.id,
                 "tipo_id": tipo_inmobiliaria.id if tipo_inmobiliaria else None,
             },
+            auto_commit=auto_commit,
         )
         logger.info(
             "Contacto auto-creado: %s - %s (%s), responsable: %s",
@@ -193,40 +237,53 @@ class MetaWebhookService:
         return contenido, adjuntos
 
     def _resolve_or_create_oportunidad(self, contacto: CRMContacto) -> CRMOportunidad:
+        # Solo se cachea contacto -> id: la fila se relee y se revalida (activo / borrado)
+        oportunidad_id = oportunidad_cache.get_id(contacto.id)
+        if oportunidad_id is not None:
+            oportunidad = self.session.get(CRMOportunidad, oportunidad_id)
+            if (
+                oportunidad is not None
+                and oportunidad.activo
+                and oportunidad.deleted_at is None
+                and oportunidad.contacto_id == contacto.id
+            ):
+                return oportunidad
+
         oportunidad = self.session.exec(
             select(CRMOportunidad).where(
                 CRMOportunidad.contacto_id == contacto.id,
                 CRMOportunidad.activo == True,  # noqa: E712
+                CRMOportunidad.deleted_at.is_(None),
             )
         ).first()
         if oportunidad:
+            oportunidad_cache.put_id(contacto.id, oportunidad.id)
             return oportunidad
 
-        from app.models.enums import EstadoOportunidad
-        from app.models.user import User
+        oportunidad = self._new_oportunidad(contacto.id, self._determinar_tipo_operacion_contacto(contacto.id))
+        self.session.flush()
+        logger.info(
+            "Oportunidad auto-creada: %s para contacto %s en estado %s con tipo_operacion_id=%s",
+            oportunidad.id,
+            contacto.id,
+            oportunidad.estado,
+            oportunidad.tipo_operacion_id,
+        )
+        return oportunidad
 
-        usuario_default = self.session.exec(select(User).limit(1)).first()
-        if not usuario_default:
-            raise ValueError("No hay usuarios activos para asignar como responsable")
+    def _new_oportunidad(self, contacto_id: int, tipo_operacion_id: Optional[int]) -> CRMOportunidad:
+        """Oportunidad prospect de un contacto que escribe por WhatsApp (sin flush)."""
+        from app.models.enums import EstadoOportunidad
 
-        tipo_operacion_id = self._determinar_tipo_operacion_contacto(contacto.id)
         oportunidad = CRMOportunidad(
             titulo="Nueva oportunidad desde WhatsApp",
-            contacto_id=contacto.id,
+            contacto_id=contacto_id,
             tipo_operacion_id=tipo_operacion_id,
             estado=EstadoOportunidad.PROSPECT.value,
-            responsable_id=usuario_default.id,
+            responsable_id=self._default_user().id,
             activo=True,
         )
         self.session.add(oportunidad)
-        self.session.flush()
-        logger.info(
-            "Oportunidad auto-creada: %s para contacto %s en estado %s con tipo_operacion_id=%s",
-            oportunidad.id,
-            contacto.id,
-            oportunidad.estado,
-            tipo_operacion_id,
-        )
         return oportunidad
 
     @staticmethod
@@ -242,6 +299,46 @@ class MetaWebhookService:
         return timestamp_utc
 
     async def _handle_inbound_message(self, msg: Any, celular: CRMCelular) -> dict[str, Any]:
+        crm_mensaje = await self._db(self._store_inbound_message, msg, celular)
+
+        auto_process_result = None
+        if await self._db(lambda: should_auto_process(session=self.session)):
+            auto_process_result = await self._run_agent_turn(crm_mensaje)
+
+        payload = {
+            "status": "ok",
+            "message": "Webhook procesado exitosamente",
+            "mensaje_id": crm_mensaje.id,
+            "oportunidad_id": crm_mensaje.oportunidad_id,
+            "agent_result": auto_process_result,
+        }
+        return payload
+
+    async def _run_agent_turn(self, crm_mensaje: CRMMensaje) -> dict[str, Any]:
+        result = await self._orchestrator.process_turn(
+            self._db_session,
+            crm_mensaje.id,
+            "webhook",
+        )
+        if result.get("cached"):
+            # Job reintentado (o reclamado tras el lock timeout): si la respuesta ya
+            # salio no se vuelve a enviar por WhatsApp
+            previous = await self._db(self._previous_delivery, crm_mensaje)
+            if previous is not None:
+                return {**result, "delivery": previous.to_dict()}
+
+        delivery = await self._delivery_service.deliver_result(
+            session=self._db_session,
+            message=crm_mensaje,
+            result=result,
+        )
+        await self._db(self._record_delivery, crm_mensaje, delivery)
+        return {
+            **result,
+            "delivery": delivery.to_dict(),
+        }
+
+    def _store_inbound_message(self, msg: Any, celular: CRMCelular) -> CRMMensaje:
         crm_mensaje = self._find_existing_inbound_message(msg.meta_message_id)
         if crm_mensaje:
             logger.info(
@@ -283,43 +380,30 @@ class MetaWebhookService:
                 contacto.id,
                 oportunidad.id,
             )
-
-        auto_process_result = None
-        if should_auto_process(session=self.session):
-            auto_process_result = await self._orchestrator.process_turn(
-                self.session,
-                crm_mensaje.id,
-                "webhook",
-            )
-            delivery = await self._delivery_service.deliver_result(
-                session=self.session,
-                message=crm_mensaje,
-                result=auto_process_result,
-            )
-            self._delivery_service.mark_inbound_as_processed(self.session, crm_mensaje)
-            auto_process_result = {
-                **auto_process_result,
-                "delivery": delivery.to_dict(),
-            }
-            metadata = dict(crm_mensaje.metadata_json or {})
-            agent_meta = dict(metadata.get("agent_v2") or {})
-            agent_meta["delivery"] = delivery.to_dict()
-            if delivery.outbound_message_id is not None:
-                agent_meta["outbound_message_id"] = delivery.outbound_message_id
-            metadata["agent_v2"] = agent_meta
-            crm_mensaje.metadata_json = metadata
-            self.session.add(crm_mensaje)
-            self.session.commit()
-            self.session.refresh(crm_mensaje)
-
-        payload = {
-            "status": "ok",
-            "message": "Webhook procesado exitosamente",
-            "mensaje_id": crm_mensaje.id,
-            "oportunidad_id": crm_mensaje.oportunidad_id,
-            "agent_result": auto_process_result,
-        }
-        return payload
+        return crm_mensaje
+
+    def _previous_delivery(self, crm_mensaje: CRMMensaje) -> Optional[SendResult]:
+        self.session.refresh(crm_mensaje)
+        agent_meta = (crm_mensaje.metadata_json or {}).get("agent_v2") or {}
+        delivery = SendResult.from_dict(agent_meta.get("delivery"))
+        if delivery.outbound_message_id is None:
+            delivery.outbound_message_id = agent_meta.get("outbound_message_id")
+        if not delivery.sent and delivery.outbound_message_id is None:
+            return None
+        return delivery
+
+    def _record_delivery(self, crm_mensaje: CRMMensaje, delivery: Any) -> None:
+        self._delivery_service.mark_inbound_as_processed(self.session, crm_mensaje)
+        metadata = dict(crm_mensaje.metadata_json or {})
+        agent_meta = dict(metadata.get("agent_v2") or {})
+        agent_meta["delivery"] = delivery.to_dict()
+        if delivery.outbound_message_id is not None:
+            agent_meta["outbound_message_id"] = delivery.outbound_message_id
+        metadata["agent_v2"] = agent_meta
+        crm_mensaje.metadata_json = metadata
+        self.session.add(crm_mensaje)
+        self.session.commit()
+        self.session.refresh(crm_mensaje)
 
     def _handle_outbound_status(self, msg: Any) -> None:
         mensaje = self.session.exec(
@@ -356,31 +440,357 @@ class MetaWebhookService:
             procesado=False,
             fecha_recepcion=current_utc_time(),
         )
-        self.session.add(log_entry)
 
         try:
-            celular = self._ensure_crm_celular(
-                str(msg.celular.id),
-                msg.celular.phone_number,
-            )
+            celular = await self._db(self._register_log_entry, log_entry, msg)
 
             if msg.direccion == "in":
                 result = await self._handle_inbound_message(msg, celular)
             else:
-                self._handle_outbound_status(msg)
+                await self._db(self._handle_outbound_status, msg)
                 result = {"status": "ok", "message": "Webhook procesado exitosamente"}
 
-            log_entry.procesado = True
-            log_entry.response_status = 200
-            self.session.add(log_entry)
-            self.session.commit()
+            await self._db(self._close_log_entry, log_entry, 200, None)
             return result
 
         except Exception as exc:
             logger.error("Error procesando webhook: %s", str(exc), exc_info=True)
-            log_entry.procesado = False
-            log_entry.error_message = str(exc)
-            log_entry.response_status = 500
-            self.session.add(log_entry)
-            self.session.commit()
+            await self._db(self._close_log_entry, log_entry, 500, str(exc))
             raise
+
+    def _register_log_entry(self, log_entry: WebhookLog, msg: Any) -> CRMCelular:
+        self.session.add(log_entry)
+        return self._ensure_crm_celular(
+            str(msg.celular.id),
+            msg.celular.phone_number,
+        )
+
+    def _close_log_entry(self, log_entry: WebhookLog, status: int, error: Optional[str]) -> None:
+        log_entry.procesado = status == 200
+        log_entry.response_status = status
+        if error is not None:
+            log_entry.error_message = error
+        self.session.add(log_entry)
+        self.session.commit()
+
+    # ------------------------------------------------------------------
+    # Ingesta en lote (replay de meta-w despues de una caida)
+    # ------------------------------------------------------------------
+
+    async def process_webhook_batch(self, payloads: list[dict[str, Any]]) -> dict[str, Any]:
+        """
+        Procesa un lote de eventos de meta-w en una sola transaccion.
+
+        Deduplica por origen_externo_id con una query, resuelve celulares, contactos y
+        oportunidades de todo el lote por conjunto, inserta mensajes y WebhookLog en
+        bloque y hace un unico commit. Los eventos invalidos quedan en el log con 422
+        sin frenar al resto. Con el agente en automatico, en ese mismo commit se
+        encola un job "agent.turn" por oportunidad (sobre su ultimo mensaje entrante
+        del lote) y se responde sin esperar al agente: los turnos los corren los
+        workers de app/services/webhook_queue.py.
+        """
+        try:
+            result = await self._db(self._ingest_batch, payloads)
+        except Exception as exc:
+            logger.error("Error procesando lote de webhooks: %s", str(exc), exc_info=True)
+            await self._db(self._log_failed_batch, payloads, str(exc))
+            raise
+
+        if result["turnos_encolados"]:
+            webhook_queue.webhook_worker.notify()
+        return result
+
+    async def process_agent_turn(self, mensaje_id: int) -> dict[str, Any]:
+        """Turno del agente (y envio) para un mensaje entrante ya persistido (job "agent.turn")."""
+        crm_mensaje = await self._db(self.session.get, CRMMensaje, mensaje_id)
+        if crm_mensaje is None or crm_mensaje.deleted_at is not None:
+            logger.warning("Turno del agente descartado: mensaje %s no encontrado", mensaje_id)
+            return {"status": "skipped", "mensaje_id": mensaje_id}
+        return {"mensaje_id": mensaje_id, **await self._run_agent_turn(crm_mensaje)}
+
+    def _ingest_batch(self, payloads: list[dict[str, Any]]) -> dict[str, Any]:
+        now = current_utc_time()
+        logs: list[WebhookLog] = []
+        eventos: list[tuple[dict[str, Any], MetaWWebhookPayload]] = []
+        invalidos: list[dict[str, Any]] = []
+        for index, payload in enumerate(payloads):
+            try:
+                eventos.append((payload, MetaWWebhookPayload(**payload)))
+            except ValidationError as exc:
+                invalidos.append({"index": index, "error": str(exc)})
+                logs.append(
+                    WebhookLog(
+                        evento=str(payload.get("event_type") or "desconocido")[:100],
+                        payload=payload,
+                        procesado=False,
+                        response_status=422,
+                        error_message=str(exc),
+                        fecha_recepcion=now,
+                    )
+                )
+
+        celulares = self._ensure_crm_celulares_batch([evento.mensaje.celular for _, evento in eventos])
+        entrantes = [evento.mensaje for _, evento in eventos if evento.mensaje.direccion == "in"]
+        salientes = [evento.mensaje for _, evento in eventos if evento.mensaje.direccion != "in"]
+
+        # Deduplicacion: una query contra la DB + repetidos dentro del mismo lote
+        vistos: set[str] = set()
+        externos = {msg.meta_message_id for msg in entrantes}
+        if externos:
+            vistos.update(
+                self.session.exec(
+                    select(CRMMensaje.origen_externo_id)
+                    .where(CRMMensaje.deleted_at.is_(None))
+                    .where(CRMMensaje.tipo == TipoMensaje.ENTRADA.value)
+                    .where(CRMMensaje.origen_externo_id.in_(externos))
+                ).all()
+            )
+        nuevos_msgs = []
+        for msg in entrantes:
+            if msg.meta_message_id not in vistos:
+                vistos.add(msg.meta_message_id)
+                nuevos_msgs.append(msg)
+
+        mensajes: list[CRMMensaje] = []
+        if nuevos_msgs:
+            nombres: dict[str, Optional[str]] = {}
+            for msg in nuevos_msgs:
+                nombres.setdefault(msg.from_phone, msg.from_name)
+            contactos = self._find_or_create_contactos_batch(nombres)
+            oportunidades = self._resolve_or_create_oportunidades_batch(
+                list(dict.fromkeys(contacto.id for contacto in contactos.values()))
+            )
+            for msg in nuevos_msgs:
+                contacto = contactos[msg.from_phone]
+                contenido, adjuntos = self._normalize_message_content(msg)
+                mensajes.append(
+                    CRMMensaje(
+                        tipo=TipoMensaje.ENTRADA.value,
+                        canal=CanalMensaje.WHATSAPP.value,
+                        contacto_id=contacto.id,
+                        contacto_referencia=msg.from_phone,
+                        estado=EstadoMensaje.NUEVO.value,
+                        contenido=contenido,
+                        origen_externo_id=msg.meta_message_id,
+                        adjuntos=adjuntos,
+                        celular_id=celulares[str(msg.celular.id)].id,
+                        fecha_mensaje=self._normalize_timestamp_to_utc(msg.meta_timestamp),
+                        estado_meta=msg.status,
+                        oportunidad_id=oportunidades[contacto.id].id,
+                        metadata_json={"from_name": msg.from_name, "metaw_id": str(msg.id)},
+                    )
+                )
+            mensajes.sort(key=lambda mensaje: mensaje.fecha_mensaje)
+            self.session.add_all(mensajes)
+            self.session.flush()
+            self._update_ultimo_mensaje_batch(mensajes)
+
+        estados_actualizados = self._apply_outbound_statuses_batch(salientes)
+
+        logs.extend(
+            WebhookLog(
+                evento=evento.event_type,
+                payload=payload,
+                procesado=True,
+                response_status=200,
+                fecha_recepcion=now,
+            )
+            for payload, evento in eventos
+        )
+        self.session.add_all(logs)
+
+        # Turno del agente: uno por oportunidad, sobre su ultimo mensaje del lote
+        turnos: dict[int, CRMMensaje] = {}
+        if mensajes and should_auto_process(session=self.session):
+            for mensaje in mensajes:
+                turnos[mensaje.oportunidad_id] = mensaje
+            self.session.add_all(
+                webhook_queue.agent_turn_job(mensaje.id, mensaje.origen_externo_id) for mensaje in turnos.values()
+            )
+        mensaje_ids = [mensaje.id for mensaje in mensajes]
+        self.session.commit()
+
+        logger.info(
+            "Lote de webhooks procesado: %s eventos, %s mensajes nuevos, %s duplicados, %s invalidos",
+            len(payloads),
+            len(mensajes),
+            len(entrantes) - len(nuevos_msgs),
+            len(invalidos),
+        )
+        return {
+            "status": "ok",
+            "message": "Lote procesado exitosamente",
+            "recibidos": len(payloads),
+            "creados": len(mensajes),
+            "duplicados": len(entrantes) - len(nuevos_msgs),
+            "estados_actualizados": estados_actualizados,
+            "invalidos": invalidos,
+            "mensaje_ids": mensaje_ids,
+            "turnos_encolados": len(turnos),
+        }
+
+    def _log_failed_batch(self, payloads: list[dict[str, Any]], error: str) -> None:
+        self.session.rollback()
+        now = current_utc_time()
+        self.session.add_all(
+            WebhookLog(
+                evento=str(payload.get("event_type") or "desconocido")[:100],
+                payload=payload,
+                procesado=False,
+                response_status=500,
+                error_message=error,
+                fecha_recepcion=now,
+            )
+            for payload in payloads
+        )
+        self.session.commit()
+
+    def _ensure_crm_celulares_batch(self, celulares: list[Any]) -> dict[str, CRMCelular]:
+        """Version por conjunto de `_ensure_crm_celular`: meta_celular_id -> CRMCelular."""
+        pedidos = {str(celular.id): celular.phone_number for celular in celulares}
+        if not pedidos:
+            return {}
+        resueltos = {
+            celular.meta_celular_id: celular
+            for celular in self.session.exec(
+                select(CRMCelular).where(CRMCelular.meta_celular_id.in_(pedidos))
+            ).all()
+        }
+        faltantes = {meta_id: numero for meta_id, numero in pedidos.items() if meta_id not in resueltos}
+        if faltantes:
+            por_numero: dict[str, CRMCelular] = {}
+            for celular in self.session.exec(
+                select(CRMCelular)
+                .where(CRMCelular.numero_celular.in_(set(faltantes.values())))
+                .order_by(CRMCelular.id)
+            ).all():
+                por_numero.setdefault(celular.numero_celular, celular)
+            for meta_id, numero in faltantes.items():
+                celular = por_numero.get(numero)
+                if celular is None:
+                    celular = CRMCelular(
+                        meta_celular_id=meta_id,
+                        numero_celular=numero,
+                        alias=f"Canal {numero}",
+                        activo=True,
+                    )
+                    por_numero[numero] = celular
+                    logger.info("CRMCelular auto-creado: %s", numero)
+                else:
+                    celular.meta_celular_id = meta_id
+                self.session.add(celular)
+                resueltos[meta_id] = celular
+            self.session.flush()
+        return resueltos
+
+    def _find_contactos_por_telefono(self, telefonos: set[str]) -> dict[str, CRMContacto]:
+        if self.session.get_bind().dialect.name == "postgresql":
+            condicion = cast(CRMContacto.telefonos, JSONB).has_any(array(sorted(telefonos)))
+        else:
+            valores = func.json_each(CRMContacto.telefonos).table_valued("value")
+            condicion = select(valores.c.value).where(valores.c.value.in_(telefonos)).exists()
+        encontrados: dict[str, CRMContacto] = {}
+        for contacto in self.session.exec(select(CRMContacto).where(condicion).order_by(CRMContacto.id)).all():
+            for telefono in contacto.telefonos or []:
+                if telefono in telefonos:
+                    encontrados.setdefault(telefono, contacto)
+        return encontrados
+
+    def _find_or_create_contactos_batch(self, nombres: dict[str, Optional[str]]) -> dict[str, CRMContacto]:
+        """Version por conjunto de `_find_or_create_contacto`: telefono -> CRMContacto."""
+        contactos = self._find_contactos_por_telefono(set(nombres))
+        faltantes = [telefono for telefono in nombres if telefono not in contactos]
+        if not faltantes:
+            return contactos
+
+        for telefono in faltantes:
+            contactos[telefono] = self._create_contacto(telefono, nombres[telefono], auto_commit=False)
+        logger.info("Contactos auto-creados en lote: %s", len(faltantes))
+        return contactos
+
+    def _resolve_or_create_oportunidades_batch(self, contacto_ids: list[int]) -> dict[int, CRMOportunidad]:
+        """Version por conjunto de `_resolve_or_create_oportunidad`: contacto_id -> oportunidad activa."""
+        oportunidades: dict[int, CRMOportunidad] = {}
+        for oportunidad in self.session.exec(
+            select(CRMOportunidad)
+            .where(CRMOportunidad.contacto_id.in_(contacto_ids))
+            .where(CRMOportunidad.activo == True)  # noqa: E712
+            .where(CRMOportunidad.deleted_at.is_(None))
+            .order_by(CRMOportunidad.id)
+        ).all():
+            oportunidades.setdefault(oportunidad.contacto_id, oportunidad)
+        sin_oportunidad = [contacto_id for contacto_id in contacto_ids if contacto_id not in oportunidades]
+        if not sin_oportunidad:
+            return oportunidades
+
+        tipos_operacion = self._tipos_operacion_por_contacto(sin_oportunidad)
+        for contacto_id in sin_oportunidad:
+            oportunidades[contacto_id] = self._new_oportunidad(contacto_id, tipos_operacion.get(contacto_id))
+        self.session.flush()
+        logger.info("Oportunidades auto-creadas en lote: %s", len(sin_oportunidad))
+        return oportunidades
+
+    def _default_user(self) -> User:
+        usuario_default = usuario_default_cache.get(self.session, "default")
+        if usuario_default:
+            return usuario_default
+        usuario_default = self.session.exec(select(User).limit(1)).first()
+        if not usuario_default:
+            raise ValueError("No hay usuarios activos para asignar como responsable")
+        usuario_default_cache.put("default", usuario_default)
+        return usuario_default
+
+    def _tipo_contacto(self, nombre: str) -> Optional[CRMTipoContacto]:
+        tipo = tipo_contacto_cache.get(self.session, nombre)
+        if tipo:
+            return tipo
+        tipo = self.session.exec(select(CRMTipoContacto).where(CRMTipoContacto.nombre == nombre)).first()
+        tipo_contacto_cache.put(nombre, tipo)
+        return tipo
+
+    def _update_ultimo_mensaje_batch(self, mensajes: list[CRMMensaje]) -> None:
+        """Igual que CRMMensajeCRUD.create: ultimo_mensaje de cada oportunidad, en un executemany."""
+        ultimos: dict[int, CRMMensaje] = {}
+        for mensaje in mensajes:
+            ultimos[mensaje.oportunidad_id] = mensaje  # mensajes ya ordenados por fecha
+        tabla = CRMOportunidad.__table__
+        self.session.execute(
+            update(tabla)
+            .where(tabla.c.id == bindparam("b_oportunidad_id"))
+            .where(or_(tabla.c.ultimo_mensaje_at.is_(None), tabla.c.ultimo_mensaje_at <= bindparam("b_fecha")))
+            .values(
+                ultimo_mensaje_id=bindparam("b_mensaje_id"),
+                ultimo_mensaje_at=bindparam("b_fecha"),
+                updated_at=func.now(),
+            ),
+            [
+                {"b_oportunidad_id": oportunidad_id, "b_mensaje_id": mensaje.id, "b_fecha": mensaje.fecha_mensaje}
+                for oportunidad_id, mensaje in ultimos.items()
+            ],
+        )
+
+    def _apply_outbound_statuses_batch(self, salientes: list[Any]) -> int:
+        """Version por conjunto de `_handle_outbound_status`; gana el estado mas reciente."""
+        ultimo_estado: dict[str, Any] = {}
+        for msg in salientes:
+            previo = ultimo_estado.get(msg.meta_message_id)
+            if previo is None or msg.meta_timestamp >= previo.meta_timestamp:
+                ultimo_estado[msg.meta_message_id] = msg
+        if not ultimo_estado:
+            return 0
+        actualizados = 0
+        for mensaje in self.session.exec(
+            select(CRMMensaje).where(CRMMensaje.origen_externo_id.in_(ultimo_estado))
+        ).all():
+            msg = ultimo_estado[mensaje.origen_externo_id]
+            mensaje.estado_meta = msg.status
+            fecha_estado_utc = self._normalize_timestamp_to_utc(msg.meta_timestamp)
+            if fecha_estado_utc:
+                mensaje.fecha_estado = fecha_estado_utc
+            self.session.add(mensaje)
+            actualizados += 1
+        if actualizados < len(ultimo_estado):
+            logger.warning(
+                "Lote de webhooks: %s estados sin mensaje saliente", len(ultimo_estado) - actualizados
+            )
+        return actualizados
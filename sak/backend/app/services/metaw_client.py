@@ -1,22 +1,136 @@
 """
 Cliente para comunicarse con meta-w API
+
+Usa un único `httpx.AsyncClient` de larga vida (keep-alive, límites de pool y HTTP/2
+si el paquete `h2` está instalado) creado en el startup de la app y cerrado en el
+shutdown; así las respuestas del agente y los envíos masivos no pagan un handshake
+TCP/TLS por mensaje. Todos los envíos pasan por un rate limiter (token bucket) con el
+límite de meta-w, y `enviar_mensajes` envía N mensajes en paralelo devolviendo el
+resultado de cada uno.
+
+Configuración (variables de entorno):
+    METAW_HTTP_MAX_CONNECTIONS     conexiones máximas del pool (default 20).
+    METAW_HTTP_MAX_KEEPALIVE       conexiones ociosas que se mantienen (default 10).
+    METAW_HTTP_KEEPALIVE_SECONDS   vida de una conexión ociosa (default 30).
+    METAW_HTTP2                    "0" fuerza HTTP/1.1 (default "1", requiere `h2`).
+    METAW_SEND_RATE_PER_SECOND     envíos por segundo hacia meta-w (default 20).
+    METAW_SEND_CONCURRENCY         envíos simultáneos en `enviar_mensajes` (default 10).
+    METAW_SEND_MAX_RETRIES         reintentos ante 429 de meta-w (default 2).
 """
+import asyncio
 import httpx
 import logging
-from typing import Dict, Any, Optional
+import os
+import time
+from typing import Dict, Any, List, Optional
+
+try:
+    import h2  # noqa: F401
+except ImportError:  # pragma: no cover - h2 es opcional
+    HTTP2_AVAILABLE = False
+else:
+    HTTP2_AVAILABLE = True
 
 logger = logging.getLogger(__name__)
 
 METAW_BASE_URL = "https://meta-w-webhook-653893994930.southamerica-east1.run.app/api/v1"
 
+METAW_HTTP_MAX_CONNECTIONS = int(os.getenv("METAW_HTTP_MAX_CONNECTIONS", "20"))
+METAW_HTTP_MAX_KEEPALIVE = int(os.getenv("METAW_HTTP_MAX_KEEPALIVE", "10"))
+METAW_HTTP_KEEPALIVE_SECONDS = float(os.getenv("METAW_HTTP_KEEPALIVE_SECONDS", "30"))
+METAW_HTTP2 = os.getenv("METAW_HTTP2", "1") == "1" and HTTP2_AVAILABLE
+METAW_SEND_RATE_PER_SECOND = float(os.getenv("METAW_SEND_RATE_PER_SECOND", "20"))
+METAW_SEND_CONCURRENCY = int(os.getenv("METAW_SEND_CONCURRENCY", "10"))
+METAW_SEND_MAX_RETRIES = int(os.getenv("METAW_SEND_MAX_RETRIES", "2"))
+
+
+class AsyncRateLimiter:
+    """Token bucket: `rate` permisos por segundo con ráfagas de hasta `burst`."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = max(rate, 0.001)
+        self.burst = max(1, burst or int(self.rate))
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
 
 class MetaWClient:
     """Cliente para enviar mensajes a través de meta-w"""
-    
-    def __init__(self):
-        self.base_url = METAW_BASE_URL
-        self.timeout = 30.0
-    
+
+    def __init__(
+        self,
+        base_url: str = METAW_BASE_URL,
+        timeout: float = 30.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        rate_per_second: Optional[float] = None,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self._transport = transport
+        self._rate_per_second = rate_per_second or METAW_SEND_RATE_PER_SECOND
+        self._client: Optional[httpx.AsyncClient] = None
+        self._limiter: Optional[AsyncRateLimiter] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self) -> None:
+        """Crea el cliente compartido (startup de la app)."""
+        self._get_client()
+
+    async def aclose(self) -> None:
+        """Cierra el cliente compartido y sus conexiones (shutdown de la app)."""
+        client, self._client = self._client, None
+        self._limiter = None
+        self._loop = None
+        if client is not None:
+            await client.aclose()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            # Un cliente creado en otro event loop (scripts, tests) no puede reusar sus conexiones
+            if self._client is not None and not self._client.is_closed:
+                self._discard_client(self._client, self._loop)
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                http2=METAW_HTTP2,
+                limits=httpx.Limits(
+                    max_connections=METAW_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=METAW_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=METAW_HTTP_KEEPALIVE_SECONDS,
+                ),
+                transport=self._transport,
+            )
+            self._limiter = AsyncRateLimiter(self._rate_per_second)
+            self._loop = loop
+            logger.info("Cliente HTTP de meta-w creado (http2=%s)", METAW_HTTP2)
+        return self._client
+
+    @staticmethod
+    def _discard_client(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        """
+        Cierra el cliente de un event loop anterior: si ese loop sigue corriendo (en otro
+        thread) el cierre se agenda ahí; si ya terminó no se puede esperar nada en él y
+        el cliente solo se descarta (sus sockets se liberan al recolectarlo).
+        """
+        if loop is not None and loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            logger.info("Cliente HTTP de meta-w de otro event loop: cierre agendado en su loop")
+        else:
+            logger.info("Cliente HTTP de meta-w de un event loop terminado: descartado")
+
     async def enviar_mensaje(
         self,
         empresa_id: str,
@@ -29,7 +143,7 @@ class MetaWClient:
     ) -> Dict[str, Any]:
         """
         Envía un mensaje a través de meta-w.
-        
+
         Args:
             empresa_id: UUID de la empresa en meta-w
             celular_id: UUID del celular (canal) en meta-w
@@ -38,34 +152,81 @@ class MetaWClient:
             nombre_contacto: Nombre del contacto (opcional)
             template_fallback_name: Template a usar si está fuera de ventana 24h
             template_fallback_language: Idioma del template
-            
+
         Returns:
             Dict con respuesta de meta-w
-            
+
         Raises:
             httpx.HTTPStatusError: Si meta-w retorna error
         """
-        url = f"{self.base_url}/mensajes/send"
-        
         payload = {
             "empresa_id": empresa_id,
             "celular_id": celular_id,
             "telefono_destino": telefono_destino,
             "texto": texto
         }
-        
+
         if nombre_contacto:
             payload["nombre_contacto"] = nombre_contacto
-        
+
         logger.info(f"Enviando mensaje a {telefono_destino} vía meta-w")
-        
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.post(url, json=payload)
-            response.raise_for_status()
-            
-            result = response.json()
-            logger.info(f"Mensaje enviado exitosamente. Meta message ID: {result.get('meta_message_id')}")
-            return result
+
+        client = self._get_client()
+        for intento in range(METAW_SEND_MAX_RETRIES + 1):
+            await self._limiter.acquire()
+            response = await client.post("/mensajes/send", json=payload)
+            if response.status_code != 429 or intento == METAW_SEND_MAX_RETRIES:
+                break
+            espera = self._retry_after_seconds(response)
+            logger.warning(f"meta-w respondió 429; reintento en {espera}s")
+            await asyncio.sleep(espera)
+        response.raise_for_status()
+
+        result = response.json()
+        logger.info(f"Mensaje enviado exitosamente. Meta message ID: {result.get('meta_message_id')}")
+        return result
+
+    async def enviar_mensajes(
+        self,
+        mensajes: List[Dict[str, Any]],
+        concurrency: int = METAW_SEND_CONCURRENCY,
+    ) -> List[Dict[str, Any]]:
+        """
+        Envía N mensajes en paralelo (hasta `concurrency` a la vez, bajo el rate limiter).
+
+        Cada item de `mensajes` lleva los argumentos de `enviar_mensaje`. Devuelve un
+        resultado por mensaje, en el mismo orden: `{"ok": True, "result": {...}}` o
+        `{"ok": False, "error": "...", "status_code": int | None}`. Un error en un
+        mensaje no frena al resto.
+        """
+        semaforo = asyncio.Semaphore(max(1, concurrency))
+
+        async def _enviar(index: int, mensaje: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaforo:
+                try:
+                    result = await self.enviar_mensaje(**mensaje)
+                except httpx.HTTPStatusError as exc:
+                    return {
+                        "index": index,
+                        "ok": False,
+                        "status_code": exc.response.status_code,
+                        "error": f"Error meta-w: {exc.response.status_code} - {exc.response.text}",
+                    }
+                except Exception as exc:
+                    return {"index": index, "ok": False, "status_code": None, "error": str(exc)}
+                return {"index": index, "ok": True, "result": result}
+
+        resultados = await asyncio.gather(*(_enviar(index, mensaje) for index, mensaje in enumerate(mensajes)))
+        enviados = sum(1 for resultado in resultados if resultado["ok"])
+        logger.info(f"Envío masivo meta-w: {enviados}/{len(mensajes)} enviados")
+        return list(resultados)
+
+    @staticmethod
+    def _retry_after_seconds(response: httpx.Response) -> float:
+        try:
+            return min(max(float(response.headers.get("Retry-After", "1")), 0.0), 30.0)
+        except ValueError:
+            return 1.0
 
 
 metaw_client = MetaWClient()
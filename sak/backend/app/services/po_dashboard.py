@@ -352,9 +352,12 @@ def filter_po_dashboard_items_by_alert(
     return list(items)
 
 
-def check_po_alert(
-    order_id: int,
-    alert_key: str,
+PO_ALERT_KEYS = ("rechazadas", "solicitudes_vencidas", "emitidas_vencidas")
+
+
+def check_po_alerts(
+    order_ids: Sequence[int],
+    alert_keys: Sequence[str],
     start_date: str,
     end_date: str,
     session: Session,
@@ -363,39 +366,75 @@ def check_po_alert(
     tipo_solicitud_ids: Optional[Sequence[int]] = None,
     departamento_ids: Optional[Sequence[int]] = None,
     tipo_compra_values: Optional[Sequence[str]] = None,
-) -> bool:
-    """Devuelve True si la orden sigue teniendo la alerta indicada."""
-    order = session.get(PoOrder, order_id)
-    if order is None or order.deleted_at is not None:
-        return False
-    if solicitante_ids and order.solicitante_id not in solicitante_ids:
-        return False
-    if proveedor_ids and order.proveedor_id not in proveedor_ids:
-        return False
-    if tipo_solicitud_ids and order.tipo_solicitud_id not in tipo_solicitud_ids:
-        return False
-    if departamento_ids and order.departamento_id not in departamento_ids:
-        return False
-    if tipo_compra_values and str(order.tipo_compra) not in tipo_compra_values:
-        return False
+) -> dict[int, dict[str, bool]]:
+    """Flags de alerta para varias órdenes ({id: {alert_key: bool}}) con una sola consulta."""
+    ids = sorted({int(order_id) for order_id in order_ids})
+    keys = [key for key in PO_ALERT_KEYS if key in set(alert_keys)]
+    result = {order_id: dict.fromkeys(keys, False) for order_id in ids}
+    if not ids or not keys:
+        return result
+
+    query = (
+        select(PoOrder, PoOrderStatus.nombre)
+        .outerjoin(PoOrderStatus, PoOrder.order_status_id == PoOrderStatus.id)
+        .where(PoOrder.id.in_(ids))
+        .where(PoOrder.deleted_at.is_(None))
+    )
+    if solicitante_ids:
+        query = query.where(PoOrder.solicitante_id.in_(solicitante_ids))
+    if proveedor_ids:
+        query = query.where(PoOrder.proveedor_id.in_(proveedor_ids))
+    if tipo_solicitud_ids:
+        query = query.where(PoOrder.tipo_solicitud_id.in_(tipo_solicitud_ids))
+    if departamento_ids:
+        query = query.where(PoOrder.departamento_id.in_(departamento_ids))
+    if tipo_compra_values:
+        query = query.where(PoOrder.tipo_compra.in_(tipo_compra_values))
 
     start = _to_date(start_date)
     end = _to_date(end_date)
-    fecha_creacion = _parse_date(order.created_at)
-    if not fecha_creacion or fecha_creacion > end:
-        return False
+    for order, status_nombre in session.exec(query).all():
+        fecha_creacion = _parse_date(order.created_at)
+        if not fecha_creacion or fecha_creacion > end:
+            continue
+        fecha_estado = _parse_date(order.updated_at) or fecha_creacion
+        estado = _normalize_status(status_nombre)
+        dias_abierta = max(0, (end - fecha_creacion).days)
+        flags = {
+            "rechazadas": estado in REJECTED_STATUS_KEYS and start <= fecha_estado <= end,
+            "solicitudes_vencidas": estado == "solicitada" and dias_abierta > 10,
+            "emitidas_vencidas": estado == "emitida" and dias_abierta > 10,
+        }
+        result[order.id] = {key: flags[key] for key in keys}
+    return result
 
-    fecha_estado = _parse_date(order.updated_at) or fecha_creacion
-    estado = _normalize_status(order.order_status.nombre if order.order_status else None)
-    dias_abierta = max(0, (end - fecha_creacion).days)
 
-    if alert_key == "rechazadas":
-        return estado in REJECTED_STATUS_KEYS and start <= fecha_estado <= end
-    if alert_key == "solicitudes_vencidas":
-        return estado == "solicitada" and dias_abierta > 10
-    if alert_key == "emitidas_vencidas":
-        return estado == "emitida" and dias_abierta > 10
-    return False
+def check_po_alert(
+    order_id: int,
+    alert_key: str,
+    start_date: str,
+    end_date: str,
+    session: Session,
+    solicitante_ids: Optional[Sequence[int]] = None,
+    proveedor_ids: Optional[Sequence[int]] = None,
+    tipo_solicitud_ids: Optional[Sequence[int]] = None,
+    departamento_ids: Optional[Sequence[int]] = None,
+    tipo_compra_values: Optional[Sequence[str]] = None,
+) -> bool:
+    """Devuelve True si la orden sigue teniendo la alerta indicada."""
+    flags = check_po_alerts(
+        [order_id],
+        [alert_key],
+        start_date,
+        end_date,
+        session,
+        solicitante_ids=solicitante_ids,
+        proveedor_ids=proveedor_ids,
+        tipo_solicitud_ids=tipo_solicitud_ids,
+        departamento_ids=departamento_ids,
+        tipo_compra_values=tipo_compra_values,
+    )
+    return flags[order_id].get(alert_key, False)
 
 
 # ---------------------------------------------------------------------------
@@ -6,6 +6,8 @@ from typing import Optional
 from sqlmodel import Session, select
 
 from app.models.propiedad import Propiedad, PropiedadesLogStatus, PropiedadesStatus
+# Registra el listener que mantiene propiedades_vacancia_intervalos en cada flush
+from app.services import propiedad_vacancia_service  # noqa: F401
 
 
 def sync_propiedad_status(
@@ -0,0 +1,237 @@
+"""
+Intervalos de vacancia persistidos (tabla propiedades_vacancia_intervalos).
+
+El dashboard de propiedades necesita, por periodo, los días de vacancia por estado y
+los ciclos que empiezan/terminan en el rango. Antes se re-jugaba todo el historial de
+PropiedadesLogStatus en cada request; ahora los sub-intervalos se guardan al cambiar
+de estado y el dashboard resuelve solapamientos con SQL sobre índices de rango.
+
+Mantenimiento incremental: un listener de Session detecta en cada flush las propiedades
+tocadas (logs de estado nuevos, editados o borrados; cambios de `propiedad_status_id` o
+`vacancia_fecha`) y recalcula sus intervalos dentro de la misma transacción. Cubre
+`sync_propiedad_status`, `PropiedadCRUD`, el CRUD genérico de logs y los contratos.
+Escrituras fuera del ORM marcan la propiedad con `mark_vacancia_dirty`. Para backfill:
+`rebuild_vacancia_intervalos`.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Date, Integer, case, delete, event, insert, inspect, literal, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+from app.models.propiedad import (
+    Propiedad,
+    PropiedadesLogStatus,
+    PropiedadesStatus,
+    PropiedadVacanciaIntervalo,
+)
+
+VACANT_ORDERS = frozenset({1, 2, 3})
+TERMINAL_ORDERS = frozenset({4, 5})
+_SIN_ORDEN = 999
+_DIRTY_KEY = "propiedad_vacancia_dirty_ids"
+_TRACKED_FIELDS = ("propiedad_status_id", "vacancia_fecha")
+_CHUNK = 500
+
+
+class days_between(FunctionElement):
+    """Días enteros entre dos fechas (`fin - inicio`), portable entre PostgreSQL y SQLite."""
+
+    type = Integer()
+    inherit_cache = True
+    name = "days_between"
+
+
+@compiles(days_between)
+def _days_between_default(element, compiler, **kw):
+    fin, inicio = list(element.clauses)
+    return f"({compiler.process(fin, **kw)} - {compiler.process(inicio, **kw)})"
+
+
+@compiles(days_between, "sqlite")
+def _days_between_sqlite(element, compiler, **kw):
+    fin, inicio = list(element.clauses)
+    return (
+        f"CAST(julianday({compiler.process(fin, **kw)}) - "
+        f"julianday({compiler.process(inicio, **kw)}) AS INTEGER)"
+    )
+
+
+def build_vacancia_intervalos(
+    propiedad_id: int,
+    current_order: int,
+    vacancia_fecha: Optional[date],
+    logs: Sequence[Tuple[date, int]],
+) -> List[Dict[str, Any]]:
+    """
+    Sub-intervalos de vacancia a partir de los logs (fecha, orden_nuevo) ordenados por fecha.
+
+    La vacancia comienza al entrar a un estado vacante (1, 2, 3) desde uno no vacante y
+    termina al pasar a Realizada (4) o Retirada (5). Las transiciones internas 1→2→3
+    cierran un sub-intervalo y abren otro sin cortar el ciclo.
+    """
+    intervals: List[Dict[str, Any]] = []
+    current_start: Optional[date] = None
+    current_state: Optional[int] = None
+    is_cycle_start = False
+
+    def _append(hasta: Optional[date], es_fin_ciclo: bool) -> None:
+        intervals.append(
+            {
+                "propiedad_id": propiedad_id,
+                "estado_orden": current_state,
+                "desde": current_start,
+                "hasta": hasta,
+                "es_inicio_ciclo": is_cycle_start,
+                "es_fin_ciclo": es_fin_ciclo,
+            }
+        )
+
+    for fecha, new_order in logs:
+        if new_order in VACANT_ORDERS:
+            if current_start is not None:
+                _append(fecha, False)
+                is_cycle_start = False
+            else:
+                is_cycle_start = True
+            current_start = fecha
+            current_state = new_order
+        elif new_order in TERMINAL_ORDERS and current_start is not None:
+            _append(fecha, True)
+            current_start = None
+            current_state = None
+            is_cycle_start = False
+
+    if current_start is not None:
+        _append(None, False)
+    elif current_order in VACANT_ORDERS and vacancia_fecha:
+        # Fallback: la propiedad está vacante pero no hay log de entrada
+        current_start, current_state, is_cycle_start = vacancia_fecha, current_order, True
+        _append(None, False)
+
+    return intervals
+
+
+def _as_date(value: date | datetime | None) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _chunks(ids: Sequence[int]) -> Iterable[List[int]]:
+    for start in range(0, len(ids), _CHUNK):
+        yield list(ids[start:start + _CHUNK])
+
+
+def refresh_vacancia_intervalos(connection: Connection, propiedad_ids: Iterable[int]) -> None:
+    """Recalcula (borra e inserta) los intervalos de vacancia de las propiedades dadas."""
+    ids = sorted({int(pid) for pid in propiedad_ids if pid is not None})
+    if not ids:
+        return
+    prop = Propiedad.__table__
+    status = PropiedadesStatus.__table__
+    log = PropiedadesLogStatus.__table__
+    intervalo = PropiedadVacanciaIntervalo.__table__
+    order_by_status = {sid: orden for sid, orden in connection.execute(select(status.c.id, status.c.orden))}
+
+    for chunk in _chunks(ids):
+        rows = connection.execute(
+            select(prop.c.id, prop.c.propiedad_status_id, prop.c.vacancia_fecha).where(prop.c.id.in_(chunk))
+        ).all()
+        logs_by_prop: Dict[int, List[Tuple[date, int]]] = {}
+        for pid, fecha_cambio, estado_nuevo_id in connection.execute(
+            select(log.c.propiedad_id, log.c.fecha_cambio, log.c.estado_nuevo_id)
+            .where(log.c.propiedad_id.in_(chunk))
+            .order_by(log.c.propiedad_id, log.c.fecha_cambio, log.c.id)
+        ):
+            logs_by_prop.setdefault(pid, []).append(
+                (_as_date(fecha_cambio), order_by_status.get(estado_nuevo_id, _SIN_ORDEN))
+            )
+
+        intervals: List[Dict[str, Any]] = []
+        for pid, status_id, vacancia_fecha in rows:
+            intervals.extend(
+                build_vacancia_intervalos(
+                    pid,
+                    order_by_status.get(status_id, _SIN_ORDEN),
+                    _as_date(vacancia_fecha),
+                    logs_by_prop.get(pid, []),
+                )
+            )
+
+        connection.execute(delete(intervalo).where(intervalo.c.propiedad_id.in_(chunk)))
+        if intervals:
+            connection.execute(insert(intervalo), intervals)
+
+
+def rebuild_vacancia_intervalos(connection: Connection) -> int:
+    """Backfill completo (migraciones / scripts). Devuelve la cantidad de propiedades."""
+    prop = Propiedad.__table__
+    ids = [row[0] for row in connection.execute(select(prop.c.id).order_by(prop.c.id))]
+    refresh_vacancia_intervalos(connection, ids)
+    return len(ids)
+
+
+def mark_vacancia_dirty(session: Session, propiedad_id: Optional[int]) -> None:
+    """Agenda el recálculo de los intervalos de la propiedad (escrituras fuera del ORM)."""
+    if propiedad_id is not None:
+        session.info.setdefault(_DIRTY_KEY, set()).add(propiedad_id)
+
+
+def _tracked_change(obj: Propiedad) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in _TRACKED_FIELDS)
+
+
+def _log_propiedad_ids(obj: PropiedadesLogStatus) -> set:
+    # Un log movido a otra propiedad deja desactualizada también la anterior
+    history = inspect(obj).attrs.propiedad_id.history
+    return {obj.propiedad_id, *history.deleted}
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_dirty_propiedades(session: Session, flush_context) -> None:
+    dirty = set()
+    for obj in session.new:
+        if isinstance(obj, Propiedad):
+            dirty.add(obj.id)
+        elif isinstance(obj, PropiedadesLogStatus):
+            dirty.add(obj.propiedad_id)
+    for obj in session.dirty:
+        if isinstance(obj, Propiedad) and _tracked_change(obj):
+            dirty.add(obj.id)
+        elif isinstance(obj, PropiedadesLogStatus):
+            dirty.update(_log_propiedad_ids(obj))
+    for obj in session.deleted:
+        if isinstance(obj, Propiedad):
+            dirty.add(obj.id)
+        elif isinstance(obj, PropiedadesLogStatus):
+            dirty.update(_log_propiedad_ids(obj))
+    dirty.discard(None)
+    if dirty:
+        session.info.setdefault(_DIRTY_KEY, set()).update(dirty)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _refresh_dirty_propiedades(session: Session, flush_context) -> None:
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if dirty:
+        refresh_vacancia_intervalos(session.connection(), dirty)
+
+
+def vacancia_dias_expr(p_start: date, p_end: date):
+    """Días de solapamiento entre el intervalo y el periodo [p_start, p_end] (puede ser <= 0)."""
+    intervalo = PropiedadVacanciaIntervalo
+    p_start_lit = literal(p_start, Date)
+    p_end_lit = literal(p_end, Date)
+    cap = case(
+        (intervalo.hasta.is_(None) | (intervalo.hasta > p_end_lit), p_end_lit),
+        else_=intervalo.hasta,
+    )
+    inicio = case((intervalo.desde < p_start_lit, p_start_lit), else_=intervalo.desde)
+    return days_between(cap, inicio)
@@ -6,10 +6,16 @@ from datetime import date, datetime, timedelta
 from typing import Any, Optional
 
 from sqlmodel import Session, select
-from sqlalchemy import func
+from sqlalchemy import case, func
 
 from app.models.setting import Setting
-from app.models.propiedad import Propiedad, PropiedadesLogStatus, PropiedadesStatus
+from app.models.propiedad import (
+    Propiedad,
+    PropiedadesLogStatus,
+    PropiedadesStatus,
+    PropiedadVacanciaIntervalo,
+)
+from app.services.propiedad_vacancia_service import vacancia_dias_expr
 from app.models.crm.catalogos import CRMTipoOperacion
 
 # ---------------------------------------------------------------------------
@@ -596,279 +602,208 @@ def _build_trend_point(
     }
 
 
-def build_prop_dashboard_bundle(
+def _prop_snapshot_selectors(
     session: Session,
-    start_date: str,
-    end_date: str,
-    tipo_operacion_id: Optional[int] = None,
-    emprendimiento_id: Optional[int] = None,
-    period_type: str = "trimestre",
-    trend_steps: str = "-3,-2,-1,0",
-    previous_step: str = "-1",
+    end: date,
+    tipo_operacion_id: Optional[int],
+    emprendimiento_id: Optional[int],
 ) -> dict[str, Any]:
     """
-    Retorna {current, previous, trend}.
-
-    Estrategia:
-      - 3 queries a DB: propiedades+status, tabla de estados, todos los logs.
-      - En Python se reconstruyen intervalos de vacancia (start, end_o_None)
-        por propiedad usando el historial completo de logs.
-      - Cada período calcula días de vacancia como solapamiento del intervalo
-        con el rango [start, end], lo que da datos históricos correctos incluso
-        para propiedades que hoy están en Realizada/Retirada.
+    Conteos de estado actual al corte de `end` (una query agregada).
+    No depende del período — siempre refleja el estado actual de la BD.
     """
-    steps_list = _parse_int_list(trend_steps) or [-3, -2, -1, 0]
-    prev_step = int(previous_step.strip()) if previous_step.strip() else -1
-    prev_start, prev_end = _shift_dates(start_date, end_date, period_type, prev_step)
+    es_retirada = func.lower(func.coalesce(PropiedadesStatus.nombre, "")).contains("retirada")
+    no_retirada = ~es_retirada
+    retirada_reciente = Propiedad.estado_fecha >= end - timedelta(days=30)
 
-    # ── DB Query 1: propiedades + status (snapshot actual) ───────────────
-    all_rows = session.exec(
-        _base_propiedad_query(session, tipo_operacion_id, emprendimiento_id)
-    ).all()
+    def _count(condition) -> Any:
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
 
-    # ── DB Query 2: tabla completa de estados para lookup orden ──────────
-    all_statuses = session.exec(select(PropiedadesStatus)).all()
-    status_by_id: dict[int, int] = {st.id: st.orden for st in all_statuses}
-
-    # ── DB Query 3: TODOS los logs de las propiedades filtradas ──────────
-    # Sin filtro de fecha ni de estado: necesitamos el historial completo
-    # para reconstruir correctamente los intervalos de vacancia históricos.
-    log_q = (
+    q = (
         select(
-            PropiedadesLogStatus.propiedad_id,
-            PropiedadesLogStatus.fecha_cambio,
-            PropiedadesLogStatus.estado_nuevo_id,
+            _count(es_retirada),
+            _count(es_retirada & Propiedad.estado_fecha.is_not(None) & retirada_reciente),
+            _count(es_retirada & Propiedad.estado_fecha.is_not(None) & ~retirada_reciente),
+            _count(no_retirada & (PropiedadesStatus.orden == 1)),
+            _count(no_retirada & (PropiedadesStatus.orden == 2)),
+            _count(no_retirada & (PropiedadesStatus.orden == 3)),
+            _count(no_retirada & (PropiedadesStatus.orden == 4)),
         )
-        .join(Propiedad, PropiedadesLogStatus.propiedad_id == Propiedad.id)
+        .select_from(Propiedad)
+        .join(PropiedadesStatus, Propiedad.propiedad_status_id == PropiedadesStatus.id)
         .where(Propiedad.deleted_at.is_(None))
-        .order_by(PropiedadesLogStatus.propiedad_id, PropiedadesLogStatus.fecha_cambio)
     )
     if tipo_operacion_id is not None:
-        log_q = log_q.where(Propiedad.tipo_operacion_id == tipo_operacion_id)
+        q = q.where(Propiedad.tipo_operacion_id == tipo_operacion_id)
     if emprendimiento_id is not None:
-        log_q = log_q.where(Propiedad.emprendimiento_id == emprendimiento_id)
-    all_log_rows = session.exec(log_q).all()
-
-    # Agrupar logs por propiedad (ya vienen ordenados por fecha)
-    logs_by_prop: dict[int, list[tuple[date, int]]] = {}
-    for pid, fchange, new_status_id in all_log_rows:
-        fc: date = fchange.date() if hasattr(fchange, "date") else fchange
-        new_order = status_by_id.get(new_status_id, 999)
-        logs_by_prop.setdefault(pid, []).append((fc, new_order))
-
-    # ── Reconstruir intervalos de vacancia por propiedad ─────────────────
-    # Un intervalo = (fecha_inicio_vacancia, fecha_fin_vacancia_o_None)
-    # La vacancia comienza al entrar a Recibida (orden=1) desde un estado
-    # no vacante, y termina al pasar a Realizada (4) o Retirada (5).
-    # Las transiciones internas 1→2→3 no abren ni cierran el intervalo.
-
-    _VACANT_ORDERS  = frozenset({1, 2, 3})
-    _TERMINAL_ORDERS = frozenset({4, 5})
-
-    def _build_intervals(
-        prop_id: int,
-        current_order: int,
-        vacancia_fecha: Optional[date],
-    ) -> list[tuple[date, Optional[date], int, bool, bool]]:
-        """
-        Retorna sub-intervalos de vacancia con estado:
-          (v_start, v_end_or_none, state_order, is_cycle_start, is_cycle_end)
-        - state_order    : orden del estado activo (1=Recibida, 2=EnRep, 3=Disponible)
-        - is_cycle_start : True si abre un nuevo ciclo de vacancia (venía de terminal)
-        - is_cycle_end   : True si el ciclo terminó al entrar a Realizada/Retirada
-        """
-        logs = logs_by_prop.get(prop_id, [])
-        intervals: list[tuple[date, Optional[date], int, bool, bool]] = []
-        current_start: Optional[date] = None
-        current_state: Optional[int] = None
-        is_cycle_start: bool = False
-
-        for fecha, new_order in logs:
-            if new_order in _VACANT_ORDERS:
-                if current_start is None:
-                    # Entra a vacancia desde estado no vacante
-                    current_start = fecha
-                    current_state = new_order
-                    is_cycle_start = True
-                else:
-                    # Transición interna (1→2, 2→3, etc.) — cierra sub-intervalo y abre otro
-                    intervals.append((current_start, fecha, current_state, is_cycle_start, False))
-                    current_start = fecha
-                    current_state = new_order
-                    is_cycle_start = False
-            elif new_order in _TERMINAL_ORDERS:
-                if current_start is not None:
-                    intervals.append((current_start, fecha, current_state, is_cycle_start, True))
-                    current_start = None
-                    current_state = None
-                    is_cycle_start = False
-
-        if current_start is not None:
-            intervals.append((current_start, None, current_state, is_cycle_start, False))
-        elif current_order in _VACANT_ORDERS and vacancia_fecha:
-            # Fallback: la propiedad está vacante pero no hay log de entrada
-            intervals.append((vacancia_fecha, None, current_order, True, False))
-
-        return intervals
-
-    vacancy_intervals: dict[int, list[tuple[date, Optional[date], int, bool, bool]]] = {}
-    for prop, status in all_rows:
-        current_order = status.orden if status else 999
-        vf = prop.vacancia_fecha
-        if isinstance(vf, datetime):
-            vf = vf.date()
-        vacancy_intervals[prop.id] = _build_intervals(prop.id, current_order, vf)
-
-    # ── Helpers de cálculo (sin DB) ───────────────────────────────────────
-
-    def _overlap_days(
-        v_start: date,
-        v_end: Optional[date],
-        p_start: date,
-        p_end: date,
-    ) -> int:
-        """Días de solapamiento entre el intervalo de vacancia y el período."""
-        cap = v_end if v_end is not None else p_end
-        return max(0, (min(cap, p_end) - max(v_start, p_start)).days)
-
-    def _vacancy_stats_for_period(
-        start: date,
-        end: date,
-    ) -> tuple[dict[int, int], int, set[int], set[int]]:
-        """
-        Calcula días de vacancia en [start, end] desglosados por estado.
-        Retorna:
-          days_by_state  – {order_id: total_dias}  (1=Recibida, 2=EnRep, 3=Disponible)
-          count_vacantes – cantidad de propiedades distintas con al menos 1 día de vacancia
-          nuevas_ids     – props cuyo ciclo de vacancia EMPEZÓ dentro del período
-          resueltas_ids  – props cuyo ciclo de vacancia TERMINÓ dentro del período
-        """
-        days_by_state: dict[int, int] = {1: 0, 2: 0, 3: 0}
-        props_con_dias: set[int] = set()
-        nuevas_ids: set[int] = set()
-        resueltas_ids: set[int] = set()
-
-        for prop, _ in all_rows:
-            for v_start, v_end, v_order, is_cycle_start, is_cycle_end in vacancy_intervals[prop.id]:
-                days = _overlap_days(v_start, v_end, start, end)
-                if days > 0:
-                    days_by_state[v_order] += days
-                    props_con_dias.add(prop.id)
-                if is_cycle_start and start <= v_start <= end:
-                    nuevas_ids.add(prop.id)
-                if is_cycle_end and v_end is not None and start <= v_end <= end:
-                    resueltas_ids.add(prop.id)
-
-        return days_by_state, len(props_con_dias), nuevas_ids, resueltas_ids
-
-    def _snapshot_selectors(end: date) -> dict[str, Any]:
-        """
-        Conteos de estado actual al corte de `end`.
-        No depende del período — siempre refleja el estado actual de la BD.
-        """
-        selectors: dict[str, Any] = {
-            "recibida":      {"count": 0},
-            "en_reparacion": {"count": 0},
-            "disponible":    {"count": 0},
-            "realizada":     {"count": 0},
-            "retirada":      {"count": 0, "lt_30": 0, "gt_30": 0},
-        }
-
-        for prop, status in all_rows:
-            if not status:
-                continue
-            orden = status.orden
-            nombre = (status.nombre or "").strip().lower()
-
-            if "retirada" in nombre:
-                selectors["retirada"]["count"] += 1
-                if prop.estado_fecha:
-                    days_since = (end - prop.estado_fecha).days
-                    if days_since <= 30:
-                        selectors["retirada"]["lt_30"] += 1
-                    else:
-                        selectors["retirada"]["gt_30"] += 1
-            elif orden == 1:
-                selectors["recibida"]["count"] += 1
-            elif orden == 2:
-                selectors["en_reparacion"]["count"] += 1
-            elif orden == 3:
-                selectors["disponible"]["count"] += 1
-            elif orden == 4:
-                selectors["realizada"]["count"] += 1
-
-        return selectors
+        q = q.where(Propiedad.emprendimiento_id == emprendimiento_id)
+    retirada, lt_30, gt_30, recibida, en_reparacion, disponible, realizada = (
+        int(value) for value in session.exec(q).one()
+    )
+    return {
+        "recibida":      {"count": recibida},
+        "en_reparacion": {"count": en_reparacion},
+        "disponible":    {"count": disponible},
+        "realizada":     {"count": realizada},
+        "retirada":      {"count": retirada, "lt_30": lt_30, "gt_30": gt_30},
+    }
 
-    def _compute_period(s_date: str, e_date: str) -> dict[str, Any]:
-        start = _to_date_str(s_date)
-        end   = _to_date_str(e_date)
 
-        days_by_state, _, nuevas_ids, resueltas_ids = _vacancy_stats_for_period(start, end)
-        selectors = _snapshot_selectors(end)
+def _vacancy_stats_for_periods(
+    session: Session,
+    periods: list[tuple[date, date]],
+    tipo_operacion_id: Optional[int],
+    emprendimiento_id: Optional[int],
+) -> list[dict[str, Any]]:
+    """
+    Días de vacancia por estado, propiedades con vacancia y ciclos nuevos/resueltos
+    para cada período, en una sola query sobre propiedades_vacancia_intervalos.
 
-        total_dias = sum(days_by_state.values())
-        total_vacantes = (
-            selectors["recibida"]["count"]
-            + selectors["en_reparacion"]["count"]
-            + selectors["disponible"]["count"]
+    Solo se leen los intervalos que tocan la ventana total de los períodos (índice de
+    rango desde/hasta); los días son el solapamiento de cada intervalo con el período.
+    """
+    intervalo = PropiedadVacanciaIntervalo
+    window_start = min(start for start, _ in periods)
+    window_end = max(end for _, end in periods)
+
+    columns = []
+    for start, end in periods:
+        dias = vacancia_dias_expr(start, end)
+        con_dias = dias > 0
+        for orden in (1, 2, 3):
+            columns.append(
+                func.coalesce(func.sum(case((con_dias & (intervalo.estado_orden == orden), dias), else_=0)), 0)
+            )
+        columns.append(func.count(func.distinct(case((con_dias, intervalo.propiedad_id)))))
+        columns.append(
+            func.count(
+                func.distinct(
+                    case((intervalo.es_inicio_ciclo & intervalo.desde.between(start, end), intervalo.propiedad_id))
+                )
+            )
+        )
+        columns.append(
+            func.count(
+                func.distinct(
+                    case((intervalo.es_fin_ciclo & intervalo.hasta.between(start, end), intervalo.propiedad_id))
+                )
+            )
         )
-        activas_inicio = max(0, total_vacantes + len(resueltas_ids) - len(nuevas_ids))
-
-        return {
-            "range":   {"startDate": s_date, "endDate": e_date},
-            "filters": {"tipoOperacionId": tipo_operacion_id, "emprendimientoId": emprendimiento_id},
-            "kpis": {
-                # Días de vacancia acumulados dentro del período (basado en intervalos)
-                "dias_vacancia_periodo": {
-                    "total": total_dias,
-                    "por_estado": {
-                        "recibida":      days_by_state[1],
-                        "en_reparacion": days_by_state[2],
-                        "disponible":    days_by_state[3],
-                    },
-                },
-            },
-            "period_summary": {
-                "activas_inicio":      activas_inicio,
-                "activas_fin":         total_vacantes,
-                "netas":               total_vacantes - activas_inicio,
-                "nuevas_vacancias":    len(nuevas_ids),
-                "vacancias_resueltas": len(resueltas_ids),
-            },
-        }
 
-    def _compute_trend_point(s_date: str, e_date: str) -> dict[str, Any]:
-        start = _to_date_str(s_date)
-        end   = _to_date_str(e_date)
+    q = (
+        select(*columns)
+        .select_from(intervalo)
+        .join(Propiedad, Propiedad.id == intervalo.propiedad_id)
+        .where(Propiedad.deleted_at.is_(None))
+        .where(intervalo.desde <= window_end)
+        .where(intervalo.hasta.is_(None) | (intervalo.hasta >= window_start))
+    )
+    if tipo_operacion_id is not None:
+        q = q.where(Propiedad.tipo_operacion_id == tipo_operacion_id)
+    if emprendimiento_id is not None:
+        q = q.where(Propiedad.emprendimiento_id == emprendimiento_id)
+    row = [int(value or 0) for value in session.exec(q).one()]
 
-        days_by_state, count_vacantes, _, _ = _vacancy_stats_for_period(start, end)
-        total_dias = sum(days_by_state.values())
+    stats = []
+    for index in range(len(periods)):
+        d1, d2, d3, count_vacantes, nuevas, resueltas = row[index * 6:(index + 1) * 6]
+        stats.append(
+            {
+                "days_by_state": {1: d1, 2: d2, 3: d3},
+                "count_vacantes": count_vacantes,
+                "nuevas": nuevas,
+                "resueltas": resueltas,
+            }
+        )
+    return stats
 
-        return {
-            "bucket":          _format_trend_label(s_date, period_type),
-            "count_vacantes":  count_vacantes,
-            "dias_total":      total_dias,
-        }
 
-    # ── Construir resultado ───────────────────────────────────────────────
-    current = _compute_period(start_date, end_date)
+def build_prop_dashboard_bundle(
+    session: Session,
+    start_date: str,
+    end_date: str,
+    tipo_operacion_id: Optional[int] = None,
+    emprendimiento_id: Optional[int] = None,
+    period_type: str = "trimestre",
+    trend_steps: str = "-3,-2,-1,0",
+    previous_step: str = "-1",
+) -> dict[str, Any]:
+    """
+    Retorna {current, previous, trend}.
 
-    # Solo necesitamos el total de días del período anterior para la variación
-    prev_days_by_state, *_ = _vacancy_stats_for_period(
-        _to_date_str(prev_start), _to_date_str(prev_end)
+    Estrategia:
+      - Los intervalos de vacancia (start, end_o_None) por propiedad están
+        persistidos en propiedades_vacancia_intervalos y se mantienen en cada
+        cambio de estado (ver app/services/propiedad_vacancia_service.py).
+      - 1 query agregada calcula, para el período actual, el anterior y los
+        puntos de tendencia, los días de vacancia como solapamiento del
+        intervalo con [start, end]; da datos históricos correctos incluso para
+        propiedades que hoy están en Realizada/Retirada.
+      - 1 query agregada cuenta el estado actual (selectors).
+    """
+    steps_list = _parse_int_list(trend_steps) or [-3, -2, -1, 0]
+    prev_step = int(previous_step.strip()) if previous_step.strip() else -1
+    prev_start, prev_end = _shift_dates(start_date, end_date, period_type, prev_step)
+    trend_ranges = [_shift_dates(start_date, end_date, period_type, s) for s in steps_list]
+
+    ranges = [(start_date, end_date), (prev_start, prev_end), *trend_ranges]
+    stats = _vacancy_stats_for_periods(
+        session,
+        [(_to_date_str(s), _to_date_str(e)) for s, e in ranges],
+        tipo_operacion_id,
+        emprendimiento_id,
     )
-    prev_total = sum(prev_days_by_state.values())
+    current_stats, prev_stats, trend_stats = stats[0], stats[1], stats[2:]
 
-    cur_dias = current["kpis"]["dias_vacancia_periodo"]
-    cur_dias["variacion_vs_anterior"] = (
-        round((cur_dias["total"] - prev_total) / prev_total * 100, 1)
-        if prev_total > 0 else None
+    # ── Período actual ────────────────────────────────────────────────────
+    days_by_state = current_stats["days_by_state"]
+    selectors = _prop_snapshot_selectors(session, _to_date_str(end_date), tipo_operacion_id, emprendimiento_id)
+    total_dias = sum(days_by_state.values())
+    total_vacantes = (
+        selectors["recibida"]["count"]
+        + selectors["en_reparacion"]["count"]
+        + selectors["disponible"]["count"]
     )
+    activas_inicio = max(0, total_vacantes + current_stats["resueltas"] - current_stats["nuevas"])
 
-    trend = []
-    for s in steps_list:
-        s_start, s_end = _shift_dates(start_date, end_date, period_type, s)
-        trend.append(_compute_trend_point(s_start, s_end))
+    # Solo necesitamos el total de días del período anterior para la variación
+    prev_total = sum(prev_stats["days_by_state"].values())
+
+    current = {
+        "range":   {"startDate": start_date, "endDate": end_date},
+        "filters": {"tipoOperacionId": tipo_operacion_id, "emprendimientoId": emprendimiento_id},
+        "kpis": {
+            # Días de vacancia acumulados dentro del período (basado en intervalos)
+            "dias_vacancia_periodo": {
+                "total": total_dias,
+                "por_estado": {
+                    "recibida":      days_by_state[1],
+                    "en_reparacion": days_by_state[2],
+                    "disponible":    days_by_state[3],
+                },
+                "variacion_vs_anterior": (
+                    round((total_dias - prev_total) / prev_total * 100, 1)
+                    if prev_total > 0 else None
+                ),
+            },
+        },
+        "period_summary": {
+            "activas_inicio":      activas_inicio,
+            "activas_fin":         total_vacantes,
+            "netas":               total_vacantes - activas_inicio,
+            "nuevas_vacancias":    current_stats["nuevas"],
+            "vacancias_resueltas": current_stats["resueltas"],
+        },
+    }
+
+    trend = [
+        {
+            "bucket":          _format_trend_label(s_start, period_type),
+            "count_vacantes":  point["count_vacantes"],
+            "dias_total":      sum(point["days_by_state"].values()),
+        }
+        for (s_start, _), point in zip(trend_ranges, trend_stats)
+    ]
 
     return {"current": current, "trend": trend}
 
@@ -1104,57 +1104,81 @@ def filter_proyectos_by_alert(
     return list(proyectos)
 
 
-def check_proyecto_alert(
-    proyecto_id: int,
-    alert_key: str,
+PROYECTO_ALERT_KEYS = ("mensajes", "eventos", "ordenes_rechazadas")
+
+
+def check_proyectos_alerts(
+    proyecto_ids: Sequence[int],
+    alert_keys: Sequence[str],
     session: Session,
-) -> bool:
-    """Devuelve True si el proyecto sigue teniendo la alerta indicada."""
-    
-    proyecto = session.get(Proyecto, proyecto_id)
-    if proyecto is None or proyecto.deleted_at is not None:
-        return False
-    
-    oportunidad_id = proyecto.oportunidad_id
-    if oportunidad_id is None:
-        return False
-    
-    today = datetime.now(UTC).date()
-    
-    if alert_key == "mensajes":
-        count = session.exec(
-            select(func.count(CRMMensaje.id))
+) -> Dict[int, Dict[str, bool]]:
+    """
+    Flags de alerta para varios proyectos: {id: {alert_key: bool}}.
+
+    Las alertas se evalúan sobre la oportunidad del proyecto: una consulta para
+    resolver proyecto -> oportunidad y una agrupada por oportunidad_id por alerta.
+    """
+    ids = sorted({int(proyecto_id) for proyecto_id in proyecto_ids})
+    keys = [key for key in PROYECTO_ALERT_KEYS if key in set(alert_keys)]
+    result: Dict[int, Dict[str, bool]] = {proyecto_id: dict.fromkeys(keys, False) for proyecto_id in ids}
+    if not ids or not keys:
+        return result
+
+    proyectos_por_oportunidad: Dict[int, List[int]] = {}
+    for proyecto_id, oportunidad_id in session.exec(
+        select(Proyecto.id, Proyecto.oportunidad_id)
+        .where(Proyecto.id.in_(ids))
+        .where(Proyecto.deleted_at.is_(None))
+        .where(Proyecto.oportunidad_id.is_not(None))
+    ).all():
+        proyectos_por_oportunidad.setdefault(oportunidad_id, []).append(proyecto_id)
+    if not proyectos_por_oportunidad:
+        return result
+    oportunidad_ids = list(proyectos_por_oportunidad)
+
+    queries = {
+        "mensajes": (
+            select(CRMMensaje.oportunidad_id)
             .where(CRMMensaje.deleted_at.is_(None))
-            .where(CRMMensaje.oportunidad_id == oportunidad_id)
+            .where(CRMMensaje.oportunidad_id.in_(oportunidad_ids))
             .where(CRMMensaje.tipo == TipoMensaje.ENTRADA.value)
             .where(CRMMensaje.estado == EstadoMensaje.NUEVO.value)
-        ).one()
-        return int(count or 0) > 0
-    
-    if alert_key == "eventos":
-        count = session.exec(
-            select(func.count(CRMEvento.id))
+            .group_by(CRMMensaje.oportunidad_id)
+        ),
+        "eventos": (
+            select(CRMEvento.oportunidad_id)
             .where(CRMEvento.deleted_at.is_(None))
-            .where(CRMEvento.oportunidad_id == oportunidad_id)
+            .where(CRMEvento.oportunidad_id.in_(oportunidad_ids))
             .where(CRMEvento.estado_evento == EstadoEvento.PENDIENTE.value)
             .where(CRMEvento.fecha_evento.is_not(None))
-            .where(func.date(CRMEvento.fecha_evento) < today)
-        ).one()
-        return int(count or 0) > 0
-    
-    if alert_key == "ordenes_rechazadas":
-        REJECTED_STATUS_KEYS = {"rechazada", "cancelada", "anulada"}
-        count = session.exec(
-            select(func.count(PoOrder.id))
-            .select_from(PoOrder)
+            .where(func.date(CRMEvento.fecha_evento) < datetime.now(UTC).date())
+            .group_by(CRMEvento.oportunidad_id)
+        ),
+        "ordenes_rechazadas": (
+            select(PoOrder.oportunidad_id)
             .join(PoOrderStatus, PoOrder.order_status_id == PoOrderStatus.id)
             .where(PoOrder.deleted_at.is_(None))
-            .where(PoOrder.oportunidad_id == oportunidad_id)
-            .where(func.lower(PoOrderStatus.nombre).in_(REJECTED_STATUS_KEYS))
-        ).one()
-        return int(count or 0) > 0
-    
-    return False
+            .where(PoOrder.oportunidad_id.in_(oportunidad_ids))
+            .where(func.lower(PoOrderStatus.nombre).in_({"rechazada", "cancelada", "anulada"}))
+            .group_by(PoOrder.oportunidad_id)
+        ),
+    }
+    for key in keys:
+        for oportunidad_id in session.exec(queries[key]).all():
+            for proyecto_id in proyectos_por_oportunidad.get(oportunidad_id, ()):
+                result[proyecto_id][key] = True
+
+    return result
+
+
+def check_proyecto_alert(
+    proyecto_id: int,
+    alert_key: str,
+    session: Session,
+) -> bool:
+    """Devuelve True si el proyecto sigue teniendo la alerta indicada."""
+    flags = check_proyectos_alerts([proyecto_id], [alert_key], session)
+    return flags[proyecto_id].get(alert_key, False)
 
 
 def fetch_current_proyectos_for_dashboard(
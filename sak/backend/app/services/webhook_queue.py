@@ -0,0 +1,281 @@
+"""
+Cola durable de webhooks entrantes de meta-w (tabla webhook_jobs).
+
+El endpoint del webhook valida el payload, lo persiste como job y responde 200 en
+milisegundos. Los workers toman jobs con `SELECT ... FOR UPDATE SKIP LOCKED` (varios
+workers / procesos consumen sin pisarse; en SQLite FOR UPDATE se ignora y la cola
+funciona igual con un solo escritor), ejecutan `MetaWebhookService.process_webhook`
+(resolución de celular/contacto/oportunidad, turno del agente y envío) y:
+
+    - si termina bien, el job queda "completado";
+    - si falla, vuelve a "pendiente" con backoff exponencial;
+    - tras WEBHOOK_JOB_MAX_ATTEMPTS intentos queda "fallido" (dead-letter), para
+      revisar y reencolar con `requeue_failed_webhook_jobs`.
+
+Un job "procesando" cuyo worker murió se reclama pasado WEBHOOK_JOB_LOCK_TIMEOUT_SECONDS.
+
+La ingesta en lote (`MetaWebhookService.process_webhook_batch`) encola además jobs
+"agent.turn" (payload `{"event_type": "agent.turn", "mensaje_id": N}`) con el turno
+del agente de cada mensaje ya persistido; los toman los mismos workers.
+
+Configuración (variables de entorno):
+    META_WEBHOOK_QUEUE                "0" procesa el webhook inline como antes (default "1");
+                                      los workers siguen corriendo para los jobs "agent.turn".
+    WEBHOOK_QUEUE_WORKERS             workers async por proceso (default 2; 0 = este proceso
+                                      solo encola y consume otro).
+    WEBHOOK_QUEUE_POLL_SECONDS        espera entre polls sin trabajo (default 1).
+    WEBHOOK_JOB_MAX_ATTEMPTS          intentos antes del dead-letter (default 5).
+    WEBHOOK_JOB_BACKOFF_SECONDS       base del backoff exponencial (default 5, tope 15 min).
+    WEBHOOK_JOB_LOCK_TIMEOUT_SECONDS  (default 300).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, func, or_
+from sqlmodel import Session, select
+
+from app.db import AsyncSessionLocal, DbSession, run_db
+from app.models.base import current_utc_time
+from app.models.enums import EstadoWebhookJob
+from app.models.webhook_job import WebhookJob
+
+logger = logging.getLogger(__name__)
+
+META_WEBHOOK_QUEUE = os.getenv("META_WEBHOOK_QUEUE", "1") == "1"
+WEBHOOK_QUEUE_WORKERS = int(os.getenv("WEBHOOK_QUEUE_WORKERS", "2"))
+WEBHOOK_QUEUE_POLL_SECONDS = float(os.getenv("WEBHOOK_QUEUE_POLL_SECONDS", "1"))
+WEBHOOK_JOB_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_JOB_MAX_ATTEMPTS", "5"))
+WEBHOOK_JOB_BACKOFF_SECONDS = float(os.getenv("WEBHOOK_JOB_BACKOFF_SECONDS", "5"))
+WEBHOOK_JOB_LOCK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_JOB_LOCK_TIMEOUT_SECONDS", "300"))
+_MAX_BACKOFF_SECONDS = 900
+
+AGENT_TURN_EVENT = "agent.turn"
+
+JobHandler = Callable[[DbSession, Dict[str, Any]], Awaitable[Any]]
+
+
+def enqueue_webhook_job(
+    session: Session,
+    payload: Dict[str, Any],
+    evento: str,
+    origen_externo_id: Optional[str] = None,
+) -> WebhookJob:
+    job = WebhookJob(evento=evento, payload=payload, origen_externo_id=origen_externo_id)
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def agent_turn_job(mensaje_id: int, origen_externo_id: Optional[str] = None) -> WebhookJob:
+    """Job (sin persistir) con el turno del agente para un mensaje entrante ya guardado."""
+    return WebhookJob(
+        evento=AGENT_TURN_EVENT,
+        payload={"event_type": AGENT_TURN_EVENT, "mensaje_id": mensaje_id},
+        origen_externo_id=origen_externo_id,
+    )
+
+
+def claim_webhook_jobs(session: Session, worker_id: str, limit: int = 1) -> List[WebhookJob]:
+    """Toma hasta `limit` jobs disponibles (pendientes vencidos o bloqueos abandonados)."""
+    now = current_utc_time()
+    abandonado = now - timedelta(seconds=WEBHOOK_JOB_LOCK_TIMEOUT_SECONDS)
+    jobs = session.exec(
+        select(WebhookJob)
+        .where(
+            or_(
+                and_(
+                    WebhookJob.estado == EstadoWebhookJob.PENDIENTE.value,
+                    WebhookJob.disponible_en <= now,
+                ),
+                and_(
+                    WebhookJob.estado == EstadoWebhookJob.PROCESANDO.value,
+                    WebhookJob.bloqueado_en < abandonado,
+                ),
+            )
+        )
+        .order_by(WebhookJob.disponible_en, WebhookJob.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+
+    claimed: List[WebhookJob] = []
+    for job in jobs:
+        if job.intentos >= WEBHOOK_JOB_MAX_ATTEMPTS:
+            # Bloqueo abandonado de un job que ya agotó sus intentos
+            job.estado = EstadoWebhookJob.FALLIDO.value
+            job.bloqueado_en = None
+        else:
+            job.estado = EstadoWebhookJob.PROCESANDO.value
+            job.bloqueado_en = now
+            job.worker_id = worker_id
+            job.intentos += 1
+            claimed.append(job)
+        job.updated_at = now
+        session.add(job)
+    session.commit()
+    return claimed
+
+
+def complete_webhook_job(session: Session, job: WebhookJob) -> None:
+    job.estado = EstadoWebhookJob.COMPLETADO.value
+    job.bloqueado_en = None
+    job.ultimo_error = None
+    job.updated_at = current_utc_time()
+    session.add(job)
+    session.commit()
+
+
+def _backoff_seconds(intentos: int) -> float:
+    return min(WEBHOOK_JOB_BACKOFF_SECONDS * (2 ** max(0, intentos - 1)), _MAX_BACKOFF_SECONDS)
+
+
+def fail_webhook_job(session: Session, job: WebhookJob, error: str) -> None:
+    """Reprograma el job con backoff o lo manda al dead-letter si agotó los intentos."""
+    now = current_utc_time()
+    job.bloqueado_en = None
+    job.ultimo_error = error[:4000]
+    job.updated_at = now
+    if job.intentos >= WEBHOOK_JOB_MAX_ATTEMPTS:
+        job.estado = EstadoWebhookJob.FALLIDO.value
+        logger.error("Webhook job %s fallido tras %s intentos: %s", job.id, job.intentos, error)
+    else:
+        job.estado = EstadoWebhookJob.PENDIENTE.value
+        job.disponible_en = now + timedelta(seconds=_backoff_seconds(job.intentos))
+    session.add(job)
+    session.commit()
+
+
+def requeue_failed_webhook_jobs(session: Session, job_ids: Optional[Sequence[int]] = None) -> int:
+    """Vuelve a encolar jobs del dead-letter (todos o los indicados). Devuelve la cantidad."""
+    query = select(WebhookJob).where(WebhookJob.estado == EstadoWebhookJob.FALLIDO.value)
+    if job_ids:
+        query = query.where(WebhookJob.id.in_(job_ids))
+    jobs = session.exec(query).all()
+    now = current_utc_time()
+    for job in jobs:
+        job.estado = EstadoWebhookJob.PENDIENTE.value
+        job.intentos = 0
+        job.disponible_en = now
+        job.updated_at = now
+        session.add(job)
+    session.commit()
+    return len(jobs)
+
+
+def webhook_queue_stats(session: Session) -> Dict[str, Any]:
+    """Jobs por estado y antigüedad del pendiente más viejo (para /metrics/webhook-queue)."""
+    counts = {estado.value: 0 for estado in EstadoWebhookJob}
+    for estado, cantidad in session.exec(
+        select(WebhookJob.estado, func.count(WebhookJob.id)).group_by(WebhookJob.estado)
+    ).all():
+        counts[estado] = int(cantidad)
+    oldest = session.exec(
+        select(func.min(WebhookJob.created_at)).where(WebhookJob.estado == EstadoWebhookJob.PENDIENTE.value)
+    ).one()
+    oldest_age = None
+    if oldest is not None:
+        if oldest.tzinfo is None:
+            oldest = oldest.replace(tzinfo=current_utc_time().tzinfo)
+        oldest_age = round((current_utc_time() - oldest).total_seconds(), 1)
+    return {"jobs": counts, "oldest_pending_seconds": oldest_age}
+
+
+async def _process_with_meta_webhook_service(session: DbSession, payload: Dict[str, Any]) -> Any:
+    from app.services.meta_webhook_service import MetaWebhookService
+
+    service = MetaWebhookService(session)
+    if payload.get("event_type") == AGENT_TURN_EVENT:
+        return await service.process_agent_turn(int(payload["mensaje_id"]))
+    return await service.process_webhook(payload)
+
+
+async def process_next_webhook_jobs(
+    session: DbSession,
+    worker_id: str,
+    handler: Optional[JobHandler] = None,
+    limit: int = 1,
+) -> int:
+    """Toma y procesa hasta `limit` jobs. Devuelve cuántos tomó."""
+    handler = handler or _process_with_meta_webhook_service
+    jobs = await run_db(session, claim_webhook_jobs, worker_id, limit)
+    for job in jobs:
+        job_id, payload, intento = job.id, job.payload, job.intentos
+        try:
+            await handler(session, payload)
+        except Exception as exc:
+            logger.warning("Webhook job %s falló (intento %s): %s", job_id, intento, exc)
+            await run_db(session, lambda s: s.rollback())
+            await run_db(session, lambda s: fail_webhook_job(s, s.get(WebhookJob, job_id), str(exc)))
+        else:
+            await run_db(session, lambda s: complete_webhook_job(s, s.get(WebhookJob, job_id)))
+    return len(jobs)
+
+
+class WebhookJobWorker:
+    """Pool de workers async que consume la cola dentro del proceso de la API."""
+
+    def __init__(
+        self,
+        workers: int = WEBHOOK_QUEUE_WORKERS,
+        session_factory: Callable[[], Any] = AsyncSessionLocal,
+        handler: Optional[JobHandler] = None,
+    ) -> None:
+        self.workers = workers
+        self._session_factory = session_factory
+        self._handler = handler
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def start(self) -> None:
+        if self._tasks or self.workers <= 0:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = [
+            asyncio.create_task(self._run(f"{prefix}:{index}"), name=f"webhook-worker-{index}")
+            for index in range(self.workers)
+        ]
+        logger.info("Cola de webhooks: %s workers iniciados", self.workers)
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self.notify()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Despierta a los workers ociosos (llamado tras encolar en este proceso)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self, worker_id: str) -> None:
+        while not self._stopping:
+            try:
+                async with self._session_factory() as session:
+                    processed = await process_next_webhook_jobs(session, worker_id, self._handler)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Worker %s: error tomando jobs de webhook", worker_id)
+                processed = 0
+            if processed:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=WEBHOOK_QUEUE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+webhook_worker = WebhookJobWorker()
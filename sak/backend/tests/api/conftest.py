@@ -15,12 +15,14 @@ if str(BACKEND_ROOT) not in sys.path:
     sys.path.insert(0, str(BACKEND_ROOT))
 
 os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("DASHBOARD_CACHE_ENABLED", "0")
+os.environ.setdefault("LOOKUP_CACHE_ENABLED", "0")
 
 SQLiteTypeCompiler.visit_JSONB = lambda self, type_, **kw: "JSON"  # type: ignore[attr-defined]
 
 import_module("app.models")
 from app.main import app as fastapi_app
-from app.db import get_session
+from app.db import get_async_session, get_read_session, get_session
 from app.services.tipo_comprobante_service import seed_default_tipos
 from app.services.metodo_pago_service import seed_metodos_pago
 from app.services.propiedad_service import seed_propiedades
@@ -60,8 +62,13 @@ def client(test_engine) -> Iterator[TestClient]:
         with Session(test_engine) as session:
             yield session
 
+    # Los endpoints async aceptan Session sync (run_db la usa directo)
     APP_INSTANCE.dependency_overrides[get_session] = override_session
+    APP_INSTANCE.dependency_overrides[get_async_session] = override_session
+    APP_INSTANCE.dependency_overrides[get_read_session] = override_session
     try:
         yield TestClient(APP_INSTANCE)
     finally:
         APP_INSTANCE.dependency_overrides.pop(get_session, None)
+        APP_INSTANCE.dependency_overrides.pop(get_async_session, None)
+        APP_INSTANCE.dependency_overrides.pop(get_read_session, None)
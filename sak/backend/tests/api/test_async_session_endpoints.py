@@ -0,0 +1,199 @@
+"""Endpoints async (webhook, envío CRM, agente) sobre una AsyncSession real (aiosqlite)."""
+
+import asyncio
+from collections.abc import Iterator
+from datetime import UTC, datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import SQLModel, Session, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import app.routers.crm_mensaje_router as crm_mensaje_router_module
+from agente.v2.processes.solicitud_materiales.handler import build_v2_dependencies
+from agente.v2.processes.solicitud_materiales.models import NormalTurnDecision
+from app.crud.crm_mensaje_crud import crm_mensaje_crud
+from app.db import get_async_session, get_read_session, get_session
+from app.models import CRMCelular, CRMContacto, CRMMensaje, CRMOportunidad, Proyecto, User, WebhookJob, WebhookLog
+from app.main import app as fastapi_app
+from app.services import webhook_queue
+
+PAYLOAD = {
+    "event_type": "message.received",
+    "timestamp": "2026-10-17T12:00:00Z",
+    "mensaje": {
+        "id": "9a7f3c52-6f0e-4c1b-8d2e-5b4a3c2d1e0f",
+        "meta_message_id": "wamid.async.1",
+        "from_phone": "5491156384310",
+        "to_phone": "+15551676015",
+        "direccion": "in",
+        "tipo": "text",
+        "texto": "Hola",
+        "status": "received",
+        "meta_timestamp": "2026-10-17T12:00:00Z",
+        "created_at": "2026-10-17T12:00:00Z",
+        "celular": {"id": "3e2d1c0b-9a8f-4e7d-b6c5-a4b3c2d1e0f9", "alias": "Canal", "phone_number": "+15551676015"},
+    },
+}
+
+
+@pytest.fixture()
+def file_engine(tmp_path) -> Iterator:
+    # Archivo compartido: el engine sync siembra/verifica y el async atiende los endpoints
+    engine = create_engine(f"sqlite:///{tmp_path / 'async.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture()
+def db_session(file_engine) -> Iterator[Session]:
+    with Session(file_engine) as session:
+        yield session
+
+
+@pytest.fixture()
+def client(file_engine) -> Iterator[TestClient]:
+    # NullPool: cada request del TestClient corre en su propio event loop
+    async_engine = create_async_engine(
+        file_engine.url.set(drivername="sqlite+aiosqlite"),
+        poolclass=NullPool,
+    )
+    session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    used = []
+
+    def override_session() -> Iterator[Session]:
+        with Session(file_engine) as session:
+            yield session
+
+    async def override_async_session():
+        async with session_factory() as session:
+            used.append(session)
+            yield session
+
+    fastapi_app.dependency_overrides[get_session] = override_session
+    fastapi_app.dependency_overrides[get_read_session] = override_session
+    fastapi_app.dependency_overrides[get_async_session] = override_async_session
+    try:
+        test_client = TestClient(fastapi_app)
+        test_client.async_sessions = used
+        yield test_client
+    finally:
+        fastapi_app.dependency_overrides.pop(get_session, None)
+        fastapi_app.dependency_overrides.pop(get_read_session, None)
+        fastapi_app.dependency_overrides.pop(get_async_session, None)
+        async_engine.sync_engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def skip_pg_ultimo_mensaje(monkeypatch) -> None:
+    # _actualizar_ultimo_mensaje_oportunidad usa NOW() (SQL crudo de Postgres)
+    monkeypatch.setattr(crm_mensaje_crud, "_actualizar_ultimo_mensaje_oportunidad", lambda session, mensaje: None)
+
+
+def _seed_mensaje(db_session: Session, **mensaje) -> CRMMensaje:
+    user = User(nombre="Operador", email="operador@example.com")
+    celular = CRMCelular(meta_celular_id="meta-cell-1", numero_celular="+5491111111111", alias="Canal", activo=True)
+    db_session.add_all([user, celular])
+    db_session.flush()
+    contacto = CRMContacto(nombre_completo="Cliente", telefonos=["+5491122223333"], responsable_id=user.id)
+    db_session.add(contacto)
+    db_session.flush()
+    oportunidad = CRMOportunidad(
+        contacto_id=contacto.id,
+        responsable_id=user.id,
+        titulo="Oportunidad async",
+        fecha_estado=datetime.now(UTC),
+        activo=True,
+    )
+    db_session.add(oportunidad)
+    db_session.flush()
+    original = CRMMensaje(
+        tipo="entrada",
+        canal="whatsapp",
+        contacto_id=contacto.id,
+        contacto_referencia="+5491122223333",
+        oportunidad_id=oportunidad.id,
+        responsable_id=user.id,
+        estado="recibido",
+        fecha_mensaje=datetime(2026, 10, 17, 12, 0, tzinfo=UTC),
+        celular_id=celular.id,
+        **mensaje,
+    )
+    db_session.add(original)
+    db_session.commit()
+    return original
+
+
+def test_webhook_enqueues_and_processes_inline_on_async_session(client, db_session, monkeypatch) -> None:
+    monkeypatch.setattr(webhook_queue, "META_WEBHOOK_QUEUE", True)
+    response = client.post("/api/webhooks/meta-whatsapp/", json=PAYLOAD)
+    assert response.status_code == 200
+    assert db_session.exec(select(WebhookJob)).one().origen_externo_id == "wamid.async.1"
+
+    monkeypatch.setattr(webhook_queue, "META_WEBHOOK_QUEUE", False)
+    monkeypatch.setattr("app.services.meta_webhook_service.should_auto_process", lambda *args, **kwargs: False)
+    db_session.add(User(nombre="Vendedor", email="vendedor@example.com"))
+    db_session.commit()
+
+    response = client.post("/api/webhooks/meta-whatsapp/", json=PAYLOAD)
+    assert response.status_code == 200, response.text
+    mensaje = db_session.exec(select(CRMMensaje)).one()
+    assert mensaje.origen_externo_id == "wamid.async.1"
+    assert mensaje.oportunidad_id is not None
+    assert db_session.exec(select(WebhookLog)).one().procesado is True
+    assert client.async_sessions and all(isinstance(s, AsyncSession) for s in client.async_sessions)
+
+
+def test_responder_sends_through_async_session(client, db_session, monkeypatch) -> None:
+    enviados = []
+
+    async def fake_enviar_mensaje(**kwargs):
+        enviados.append(kwargs)
+        return {"status": "sent", "meta_message_id": "wamid.async.out"}
+
+    monkeypatch.setattr("app.routers.crm_mensaje_router.metaw_client.enviar_mensaje", fake_enviar_mensaje)
+
+    original = _seed_mensaje(db_session, contenido="Hola")
+
+    response = client.post(f"/crm/mensajes/{original.id}/responder", json={"texto": "Buenas"})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["meta_message_id"] == "wamid.async.out"
+    assert enviados[0]["telefono_destino"] == "5491122223333"
+
+    salida = db_session.get(CRMMensaje, body["mensaje_id"])
+    assert (salida.origen_externo_id, salida.metadata_json["source_message_id"]) == ("wamid.async.out", original.id)
+    assert isinstance(client.async_sessions[-1], AsyncSession)
+
+
+def test_agent_turn_runs_on_async_session(client, db_session, monkeypatch, tmp_path) -> None:
+    state_store, agent = build_v2_dependencies(requests_root=tmp_path)
+    monkeypatch.setattr(crm_mensaje_router_module, "V2_STATE_STORE", state_store)
+    monkeypatch.setattr(crm_mensaje_router_module, "V2_AGENT", agent)
+    loops = []
+
+    def fake_normal_turn(context, prompt_families):
+        try:
+            loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            loops.append(None)
+        return NormalTurnDecision(decision_type="smalltalk", reply_to_user="Hola, todo bien.")
+
+    monkeypatch.setattr(agent._llm_client, "interpret_normal_turn", fake_normal_turn)
+    original = _seed_mensaje(db_session, contenido="Hola, como estas?")
+    # solicitud_materiales solo aplica a oportunidades con proyecto
+    db_session.add(
+        Proyecto(nombre="Proyecto async", responsable_id=original.responsable_id, oportunidad_id=original.oportunidad_id)
+    )
+    db_session.commit()
+
+    response = client.post(f"/crm/mensajes/acciones/chat/{original.oportunidad_id}/ia-respuesta-v2")
+    assert response.status_code == 200, response.text
+    assert response.json()["respuesta"] == "Hola, todo bien."
+    assert loops == [None]  # el LLM corre en un thread, fuera del event loop
+    assert isinstance(client.async_sessions[-1], AsyncSession)
@@ -1,9 +1,15 @@
 """Core list endpoints smoke tests."""
 
+from collections.abc import Iterator
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine, select
 
+from app.core.generic_crud import BulkStatus, GenericCRUD
 from app.main import app
+from app.models.item import Item
 
 client = TestClient(app)
 
@@ -30,3 +36,341 @@ def test_list_endpoint_returns_array(client: TestClient, endpoint: str) -> None:
         assert isinstance(body["data"], list)
     else:
         assert isinstance(body, list)
+
+
+def _collect_cursor_pages(client: TestClient, url: str) -> list[list[str]]:
+    pages: list[list[str]] = []
+    cursor = ""
+    while True:
+        response = client.get(f"{url}&cursor={cursor}")
+        assert response.status_code == 200, response.text
+        body = response.json()
+        pages.append([item["description"] for item in body["data"]])
+        if not body["has_more"]:
+            assert body["next_cursor"] is None
+            return pages
+        cursor = body["next_cursor"]
+
+
+def test_list_keyset_cursor_pages_through_all_rows(client: TestClient) -> None:
+    for name, description in [("b", "1"), ("a", "2"), ("c", "3"), ("b", "4"), ("a", "5")]:
+        assert client.post("/items", json={"name": name, "description": description}).status_code == 201
+
+    asc_pages = _collect_cursor_pages(client, '/items?sort=["name","ASC"]&range=[0,1]')
+    assert asc_pages == [["2", "5"], ["1", "4"], ["3"]]
+
+    desc_pages = _collect_cursor_pages(client, '/items?sort=["name","DESC"]&range=[0,1]')
+    assert desc_pages == [["3", "4"], ["1", "5"], ["2"]]
+
+
+def test_list_keyset_nullable_sort_column_keeps_nulls_last(client: TestClient) -> None:
+    for name, description in [("x", "b"), ("y", None), ("z", "a")]:
+        assert client.post("/items", json={"name": name, "description": description}).status_code == 201
+
+    names: list[str] = []
+    cursor = ""
+    while cursor is not None:
+        body = client.get(f'/items?sort=["description","ASC"]&range=[0,0]&cursor={cursor}').json()
+        names.extend(item["name"] for item in body["data"])
+        cursor = body["next_cursor"]
+    assert names == ["z", "x", "y"]
+
+
+def test_list_keyset_rejects_cursor_for_other_sort(client: TestClient) -> None:
+    for name in ("a", "b"):
+        client.post("/items", json={"name": name})
+    first = client.get('/items?sort=["name","ASC"]&range=[0,0]&cursor=').json()
+    response = client.get(f'/items?sort=["id","ASC"]&range=[0,0]&cursor={first["next_cursor"]}')
+    assert response.status_code == 400
+
+
+def test_list_count_none_reports_has_more_instead_of_total(client: TestClient) -> None:
+    for name in ("a", "b", "c"):
+        client.post("/items", json={"name": name})
+
+    first = client.get("/items?count=none&page=1&perPage=2")
+    assert first.status_code == 200
+    assert len(first.json()) == 2
+    assert first.headers["X-Has-More"] == "true"
+    assert first.headers["Content-Range"] == "items 0-1/3"
+    assert "X-Total-Count" not in first.headers
+
+    last = client.get("/items?count=none&page=2&perPage=2")
+    assert len(last.json()) == 1
+    assert last.headers["X-Has-More"] == "false"
+    assert last.headers["Content-Range"] == "items 2-2/3"
+
+
+def test_list_count_estimate_falls_back_to_exact_outside_postgres(client: TestClient) -> None:
+    for name in ("a", "b", "c"):
+        client.post("/items", json={"name": name})
+
+    response = client.get("/items?count=estimate&perPage=2")
+    assert response.status_code == 200
+    assert response.headers["X-Total-Count"] == "3"
+    assert response.headers["X-Count-Mode"] == "estimate"
+
+
+def test_loader_plan_is_built_once_per_model_and_include() -> None:
+    from app.core.generic_crud import GenericCRUD, describe_loader_plans
+    from app.models.compras import PoOrder
+
+    plan = GenericCRUD(PoOrder).loader_plan()
+    assert GenericCRUD(PoOrder).loader_plan() is plan
+    assert list(plan.relations) == PoOrder.__auto_include_relations__
+
+    with_include = GenericCRUD(PoOrder).loader_plan(" detalles.articulo, detalles.articulo ")
+    assert with_include.relations[-1] == "detalles.articulo"
+    assert len(with_include.options) == len(plan.options) + 1
+    assert describe_loader_plans()["PoOrder"][""] == PoOrder.__auto_include_relations__
+
+
+def test_list_response_uses_cached_serializer_and_hides_stamp_fields(client: TestClient) -> None:
+    from app.models.base import get_serializer
+    from app.models.item import Item
+
+    client.post("/items", json={"name": "serializer", "description": "x"})
+    body = client.get("/items").json()
+
+    assert body[0]["name"] == "serializer"
+    assert body[0]["created_at"].endswith("Z")
+    assert "version" not in body[0] and "deleted_at" not in body[0]
+    assert get_serializer(Item) is get_serializer(Item)
+    assert "id" not in get_serializer(Item, "edit").fields
+
+
+def test_list_fields_projection_selects_only_requested_columns(client: TestClient) -> None:
+    client.post("/items", json={"name": "proj", "description": "hidden"})
+
+    response = client.get("/items?fields=name,version,unknown")
+    assert response.status_code == 200
+    body = response.json()
+    assert body == [{"id": body[0]["id"], "name": "proj"}]
+    assert response.headers["Content-Range"] == "items 0-0/1"
+
+
+def test_list_fields_with_relation_loads_only_that_relation(client: TestClient) -> None:
+    user = client.post("/users", json={"nombre": "Owner", "email": "owner-proj@example.com"}).json()
+    client.post("/items", json={"name": "with-user", "user_id": user["id"]})
+
+    body = client.get("/items?fields=name,user").json()
+    assert set(body[0].keys()) == {"id", "name", "user"}
+    assert body[0]["user"]["nombre"] == "Owner"
+
+
+def test_bulk_create_update_delete_in_one_transaction(client: TestClient) -> None:
+    response = client.post("/items/bulk", json=[{"name": "a"}, {"name": "b"}, {"name": "c"}])
+    assert response.status_code == 200, response.text
+    created = response.json()["data"]
+    assert [item["status"] for item in created] == ["created"] * 3
+    assert [item["data"]["name"] for item in created] == ["a", "b", "c"]
+    ids = [item["id"] for item in created]
+
+    response = client.patch(
+        "/items/bulk",
+        json=[{"id": ids[0], "version": 1, "description": "x"}, {"id": ids[1], "description": "y"}],
+    )
+    assert response.status_code == 200, response.text
+    assert [item["data"]["description"] for item in response.json()["data"]] == ["x", "y"]
+
+    response = client.patch("/items/bulk", json={"ids": ids, "data": {"description": "z"}})
+    assert response.status_code == 200, response.text
+    assert {item["data"]["description"] for item in response.json()["data"]} == {"z"}
+
+    response = client.request("DELETE", "/items/bulk", json={"ids": ids[:2]})
+    assert response.status_code == 200, response.text
+    assert [item["status"] for item in response.json()["data"]] == ["deleted", "deleted"]
+    remaining = [item["id"] for item in client.get("/items").json()]
+    assert remaining == [ids[2]]
+
+
+def test_bulk_update_version_conflict_rolls_back_whole_batch(client: TestClient) -> None:
+    ids = [item["id"] for item in client.post("/items/bulk", json=[{"name": "a"}, {"name": "b"}]).json()["data"]]
+
+    response = client.patch(
+        "/items/bulk",
+        json=[{"id": ids[0], "name": "a2"}, {"id": ids[1], "version": 7, "name": "b2"}],
+    )
+    assert response.status_code == 409
+    items = response.json()["detail"]["error"]["details"]["items"]
+    assert [item["status"] for item in items] == ["rolled_back", "error"]
+    assert items[1]["error"]["code"] == "CONFLICT"
+    assert client.get(f"/items/{ids[0]}").json()["name"] == "a"
+
+    response = client.request("DELETE", "/items/bulk", json={"ids": [ids[0], 999999]})
+    assert response.status_code == 404
+    assert client.get(f"/items/{ids[0]}").status_code == 200
+
+
+def test_bulk_flush_rejected_by_db_rolls_back_with_structured_error(client: TestClient) -> None:
+    # "Caja" ya existe (seed): el unique de metodos_pago.nombre falla recién al flush
+    response = client.post("/metodos-pago/bulk", json=[{"nombre": "Transferencia"}, {"nombre": "Caja"}])
+    assert response.status_code == 409, response.text
+    error = response.json()["detail"]["error"]
+    assert error["code"] == "CONFLICT"
+    assert error["details"]["error"]["code"] == "CONFLICT"
+    assert [item["status"] for item in error["details"]["items"]] == ["rolled_back", "rolled_back"]
+    assert client.get('/metodos-pago?filter={"nombre": "Transferencia"}').json() == []
+
+    ids = [item["id"] for item in client.post("/items/bulk", json=[{"name": "a"}, {"name": "b"}]).json()["data"]]
+    response = client.patch("/items/bulk", json=[{"id": ids[0], "name": "a2"}, {"id": ids[1], "name": None}])
+    assert response.status_code == 400, response.text
+    error = response.json()["detail"]["error"]
+    assert error["details"]["error"]["code"] == "VALIDATION_ERROR"
+    assert client.get(f"/items/{ids[0]}").json()["name"] == "a"
+
+
+def test_agg_calculated_merges_needs_per_source_table(db_session, monkeypatch) -> None:
+    from decimal import Decimal
+
+    from app.core import generic_crud
+    from app.core.instrumentation import RequestQueryStats, _current_stats, install_query_instrumentation
+    from app.models.compras import PoInvoiceDetail, PoOrderDetail
+
+    details = [PoOrderDetail(order_id=1, cantidad=Decimal("5")) for _ in range(3)]
+    db_session.add_all(details)
+    db_session.flush()
+    for detail, cantidades in zip(details, [("1", "2"), ("4",), ()]):
+        for cantidad in cantidades:
+            db_session.add(
+                PoInvoiceDetail(
+                    invoice_id=1,
+                    poOrderDetail_id=detail.id,
+                    cantidad=Decimal(cantidad),
+                    precio_unitario=Decimal("1"),
+                    importe=Decimal(cantidad),
+                )
+            )
+    db_session.commit()
+    for detail in details:
+        db_session.refresh(detail)
+
+    monkeypatch.setattr(
+        PoOrderDetail,
+        "__agg_calculated__",
+        {
+            **PoOrderDetail.__agg_calculated__,
+            "facturas_count": {"op": "count", "source": "PoInvoiceDetail", "fk": "poOrderDetail_id", "field": "id"},
+        },
+    )
+    generic_crud.clear_loader_plans()
+    install_query_instrumentation()
+    stats = RequestQueryStats()
+    token = _current_stats.set(stats)
+    try:
+        generic_crud.populate_agg_calculated(db_session, details)
+    finally:
+        _current_stats.reset(token)
+        generic_crud.clear_loader_plans()
+
+    assert stats.queries == 1
+    assert [detail.cantidad_facturada_calc for detail in details] == [Decimal("3"), Decimal("4"), Decimal("0")]
+    assert [getattr(detail, "facturas_count") for detail in details] == [2, 1, 0]
+
+
+def test_agg_calculated_sql_mode_sorts_and_filters_in_query(client: TestClient, db_session) -> None:
+    from decimal import Decimal
+
+    from app.models.compras import PoInvoiceDetail, PoOrderDetail
+
+    details = [PoOrderDetail(order_id=1, cantidad=Decimal("5"), descripcion=name) for name in ("a", "b", "c")]
+    db_session.add_all(details)
+    db_session.flush()
+    for detail, cantidad in zip(details, ("2", "7", None)):
+        if cantidad is not None:
+            db_session.add(
+                PoInvoiceDetail(
+                    invoice_id=1,
+                    poOrderDetail_id=detail.id,
+                    cantidad=Decimal(cantidad),
+                    precio_unitario=Decimal("1"),
+                    importe=Decimal(cantidad),
+                )
+            )
+    db_session.commit()
+
+    response = client.get('/po-order-details?sort=["cantidad_facturada_calc","DESC"]')
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [item["descripcion"] for item in body] == ["b", "a", "c"]
+    assert [float(item["cantidad_facturada_calc"]) for item in body] == [7, 2, 0]
+
+    response = client.get('/po-order-details?filter={"cantidad_facturada_calc__gte": 2}&sort=["id","ASC"]')
+    assert response.status_code == 200, response.text
+    assert [item["descripcion"] for item in response.json()] == ["a", "b"]
+    assert response.headers["X-Total-Count"] == "2"
+
+
+def test_text_search_q_filter_and_relevance_sort(client: TestClient) -> None:
+    from app.core.search import TextSearchMatch, TextSearchRank, search_index_ddl
+    from app.models import CRMContacto
+
+    for name, email in [("Ana Perez", "ana@x.com"), ("Juan", "juan@x.com"), ("Juana Juarez", "jj@x.com")]:
+        assert client.post("/crm/contactos", json={"nombre_completo": name, "email": email, "responsable_id": 1}).status_code in (200, 201)
+
+    response = client.get('/crm/contactos?filter={"q": "juan"}&sort=["relevance","DESC"]')
+    assert response.status_code == 200, response.text
+    assert [item["nombre_completo"] for item in response.json()] == ["Juan", "Juana Juarez"]
+
+    # El SQL compilado se cachea por modelo; el término viaja como parámetro
+    def search(term: str):
+        return select(CRMContacto.id).where(TextSearchMatch(CRMContacto, term)).order_by(TextSearchRank(CRMContacto, term))
+
+    cache_key = search("juan")._generate_cache_key()
+    assert cache_key is not None and cache_key == search("ana")._generate_cache_key()
+    response = client.get('/crm/contactos?filter={"q": "ana"}&sort=["relevance","DESC"]')
+    assert [item["nombre_completo"] for item in response.json()] == ["Ana Perez", "Juana Juarez"]
+
+    ddl = search_index_ddl(CRMContacto)
+    assert any("gin_trgm_ops" in statement and "nombre_completo" in statement for statement in ddl)
+
+
+class _CommittingItemCRUD(GenericCRUD[Item]):
+    """Override de create con commit propio: fuerza el camino por SAVEPOINT de `_bulk_session`."""
+
+    def create(self, session: Session, data: dict, auto_commit: bool = True) -> Item:
+        return super().create(session, data, auto_commit=True)
+
+
+@pytest.fixture()
+def savepoint_engine(tmp_path) -> Iterator:
+    # pysqlite no emite BEGIN y un RELEASE del SAVEPOINT externo commitea: receta de
+    # SQLAlchemy para que SQLite respete la transacción como Postgres. Archivo (no
+    # StaticPool) para que `_bulk_session` tenga su propia conexión, como en producción.
+    engine = create_engine(f"sqlite:///{tmp_path / 'bulk.db'}")
+
+    @event.listens_for(engine, "connect")
+    def _no_implicit_begin(dbapi_connection, connection_record) -> None:
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _emit_begin(connection) -> None:
+        connection.exec_driver_sql("BEGIN")
+
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_bulk_create_with_override_rolls_back_earlier_items(savepoint_engine) -> None:
+    crud = _CommittingItemCRUD(Item)
+
+    def bulk_create(items: list[dict]):
+        # Una sesión por request: en SQLite una lectura abierta bloquearía el commit del lote
+        with Session(savepoint_engine) as session:
+            return crud.bulk_create(session, items)
+
+    def names() -> list[str]:
+        with Session(savepoint_engine) as session:
+            return [item.name for item in session.exec(select(Item).order_by(Item.id)).all()]
+
+    # El tercer item viola NOT NULL en el INSERT, después de que los dos primeros liberaron su savepoint
+    result = bulk_create([{"name": "a"}, {"name": "b"}, {"name": None}])
+    assert not result.committed
+    assert [item.status for item in result.items] == [BulkStatus.ROLLED_BACK, BulkStatus.ROLLED_BACK, BulkStatus.ERROR]
+    assert names() == []
+
+    result = bulk_create([{"name": "a"}, {"name": "b"}])
+    assert result.committed
+    assert [item.obj.name for item in result.items] == ["a", "b"]
+    assert names() == ["a", "b"]
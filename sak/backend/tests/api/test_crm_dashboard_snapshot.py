@@ -0,0 +1,205 @@
+"""Snapshot materializado del pipeline CRM: mismo bundle que el cálculo en Python."""
+
+import json
+from datetime import UTC, datetime
+from decimal import Decimal
+
+from sqlmodel import Session, select
+
+from app.models.crm import (
+    CRMContacto,
+    CRMMensaje,
+    CRMOportunidad,
+    CRMOportunidadLogEstado,
+    CRMPipelineEstadoIntervalo,
+    CRMPipelineSnapshot,
+)
+from app.models.enums import EstadoOportunidad
+from app.models.propiedad import Propiedad
+from app.models.user import User
+from app.services import crm_dashboard
+from app.services.crm_oportunidad_service import crm_oportunidad_service
+
+E = EstadoOportunidad
+
+
+def _dt(value: str) -> datetime:
+    return datetime.fromisoformat(value).replace(tzinfo=UTC)
+
+
+def _seed_pipeline(db_session: Session) -> list[CRMOportunidad]:
+    user = User(nombre="Vendedor", email="vendedor@example.com")
+    db_session.add(user)
+    db_session.commit()
+    contacto = CRMContacto(nombre_completo="Cliente", responsable_id=user.id)
+    db_session.add(contacto)
+    db_session.commit()
+    propiedad_id = db_session.exec(select(Propiedad.id)).first()
+
+    # (creación, estado final, monto, propiedad, [(fecha, anterior, nuevo)])
+    specs = [
+        ("2026-01-10", E.GANADA, Decimal("1000"), None, [
+            ("2026-02-01", E.PROSPECT, E.ABIERTA),
+            ("2026-08-15", E.ABIERTA, E.RESERVA),
+            ("2026-09-10", E.RESERVA, E.GANADA),
+        ]),
+        ("2026-03-05", E.PERDIDA, None, propiedad_id, [
+            ("2026-03-10", E.PROSPECT, E.ABIERTA),
+            ("2026-05-20", E.ABIERTA, E.PERDIDA),
+        ]),
+        ("2026-06-01", E.COTIZA, Decimal("500"), None, [
+            ("2026-06-02", E.PROSPECT, E.ABIERTA),
+            ("2026-07-15", E.ABIERTA, E.VISITA),
+            ("2026-07-15", E.VISITA, E.COTIZA),
+        ]),
+        ("2026-08-20", E.PROSPECT, Decimal("200"), propiedad_id, []),
+    ]
+    oportunidades = []
+    for created, _, monto, prop_id, _ in specs:
+        oportunidad = CRMOportunidad(
+            contacto_id=contacto.id,
+            responsable_id=user.id,
+            propiedad_id=prop_id,
+            estado=E.PROSPECT.value,
+            monto=monto,
+            created_at=_dt(created),
+            fecha_estado=_dt(created),
+        )
+        db_session.add(oportunidad)
+        oportunidades.append(oportunidad)
+    db_session.commit()
+
+    for oportunidad, (_, estado, _, _, logs) in zip(oportunidades, specs):
+        for fecha, anterior, nuevo in logs:
+            db_session.add(
+                CRMOportunidadLogEstado(
+                    oportunidad_id=oportunidad.id,
+                    estado_anterior=anterior.value,
+                    estado_nuevo=nuevo.value,
+                    usuario_id=user.id,
+                    fecha_registro=_dt(fecha),
+                )
+            )
+        oportunidad.estado = estado.value
+        db_session.add(oportunidad)
+    # Alta fuera de prospect: el log inicial lo genera el listener del modelo
+    db_session.add(
+        CRMOportunidad(
+            contacto_id=contacto.id,
+            responsable_id=user.id,
+            estado=E.ABIERTA.value,
+            monto=Decimal("300"),
+            created_at=_dt("2026-09-25"),
+            fecha_estado=_dt("2026-09-26"),
+        )
+    )
+    db_session.commit()
+
+    # Cambio de estado posterior al periodo: al corte sigue en prospect
+    crm_oportunidad_service.cambiar_estado(
+        db_session, oportunidades[3].id, E.ABIERTA.value, "Contactado", user.id
+    )
+    return oportunidades
+
+
+def _bundle(db_session: Session, monkeypatch, use_snapshot: bool) -> str:
+    monkeypatch.setattr(crm_dashboard, "CRM_DASHBOARD_SNAPSHOT", use_snapshot)
+    payload = crm_dashboard.build_crm_dashboard_bundle(
+        db_session,
+        start_date="2026-07-01",
+        end_date="2026-09-30",
+        period_type="trimestre",
+        trend_steps=[-3, -2, -1, 0],
+    )
+    return json.dumps(payload, default=str, sort_keys=True)
+
+
+def test_snapshot_is_maintained_on_state_changes(db_session: Session) -> None:
+    oportunidades = _seed_pipeline(db_session)
+
+    ganada = db_session.get(CRMPipelineSnapshot, oportunidades[0].id)
+    assert ganada.fecha_cierre.isoformat() == "2026-09-10"
+    assert ganada.estado_cierre == E.GANADA.value
+    assert ganada.fecha_ingreso_pipeline.isoformat() == "2026-02-01"
+
+    intervalos = db_session.exec(
+        select(CRMPipelineEstadoIntervalo)
+        .where(CRMPipelineEstadoIntervalo.oportunidad_id == oportunidades[3].id)
+        .order_by(CRMPipelineEstadoIntervalo.hasta.is_(None), CRMPipelineEstadoIntervalo.hasta)
+    ).all()
+    assert [i.estado for i in intervalos] == [E.PROSPECT.value, E.ABIERTA.value]
+
+
+def test_snapshot_bundle_matches_python_bundle(db_session: Session, monkeypatch) -> None:
+    _seed_pipeline(db_session)
+
+    from_snapshot = _bundle(db_session, monkeypatch, True)
+    from_python = _bundle(db_session, monkeypatch, False)
+
+    assert from_snapshot == from_python
+    current = json.loads(from_snapshot)["current"]
+    assert current["period_summary"]["ganadas"] == 1
+    assert current["kpis"]["proceso"]["count"] == 2
+
+
+def test_detalle_secondary_filters_in_sql_match_python(client, db_session: Session, monkeypatch) -> None:
+    oportunidades = _seed_pipeline(db_session)
+    for oportunidad in oportunidades[2:4]:
+        db_session.add(CRMMensaje(contacto_id=oportunidad.contacto_id, oportunidad_id=oportunidad.id))
+    db_session.commit()
+
+    base = {"startDate": "2026-07-01", "endDate": "2026-09-30", "perPage": 2}
+    cases = [
+        {"kpiKey": "proceso", "stage": E.ABIERTA.value, "orderDir": "desc"},
+        {"kpiKey": "proceso", "stage": E.ABIERTA.value, "orderBy": "monto", "orderDir": "desc"},
+        {"kpiKey": "proceso", "bucket": "2026-06", "orderBy": "created_at"},
+        {"kpiKey": "proceso", "alertKey": "mensajesSinLeer", "orderBy": "fecha_cierre", "orderDir": "desc"},
+        {"kpiKey": "proceso", "alertKey": "prospectSinResolver"},
+        {"kpiKey": "proceso", "bucket": "sin-fecha"},
+    ]
+
+    def _pages(use_snapshot: bool, params: dict) -> tuple[int, list[int]]:
+        monkeypatch.setattr(crm_dashboard, "CRM_DASHBOARD_SNAPSHOT", use_snapshot)
+        ids, page, total = [], 1, None
+        while total is None or len(ids) < total:
+            response = client.get("/api/dashboard/crm/detalle", params={**base, **params, "page": page})
+            assert response.status_code == 200
+            body = response.json()
+            total = body["total"]
+            if not body["data"]:
+                break
+            ids.extend(item["oportunidad"]["id"] for item in body["data"])
+            page += 1
+        return total, ids
+
+    for params in cases:
+        assert _pages(True, params) == _pages(False, params), params
+
+
+def test_alerta_items_batch_matches_single_checks(client, db_session: Session) -> None:
+    oportunidades = _seed_pipeline(db_session)
+    db_session.add(CRMMensaje(contacto_id=oportunidades[2].contacto_id, oportunidad_id=oportunidades[2].id))
+    db_session.commit()
+    ids = [oportunidad.id for oportunidad in oportunidades] + [9999]
+    keys = ["mensajesSinLeer", "prospectSinResolver", "tareasVencidas", "enProcesoSinMovimiento"]
+
+    response = client.get(
+        "/api/dashboard/crm/alerta-items",
+        params={"ids": ",".join(map(str, ids)), "alertKeys": ",".join(keys)},
+    )
+    assert response.status_code == 200
+    batch = {item["id"]: item["alerts"] for item in response.json()["data"]}
+
+    for oportunidad_id in ids:
+        for key in keys:
+            single = client.get(
+                "/api/dashboard/crm/alerta-item", params={"id": oportunidad_id, "alertKey": key}
+            ).json()
+            assert batch[oportunidad_id][key] == single["hasAlert"] == crm_dashboard.check_oportunidad_alert(
+                oportunidad_id, key, db_session
+            )
+    assert batch[oportunidades[2].id]["mensajesSinLeer"] is True
+    assert batch[9999] == dict.fromkeys(keys, False)
+
+    invalid = client.get("/api/dashboard/crm/alerta-items", params={"ids": "1", "alertKeys": "otra"})
+    assert invalid.status_code == 422
@@ -0,0 +1,217 @@
+"""Flags de alertas en lote (/alerta-items) de los dashboards de PO, proyectos y CRM."""
+
+from datetime import UTC, date, datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.models.compras import PoOrder, PoOrderStatus
+from app.models.crm import CRMContacto, CRMEvento, CRMMensaje, CRMOportunidad, CRMTipoEvento
+from app.models.enums import EstadoEvento, EstadoMensaje, EstadoOportunidad, TipoMensaje
+from app.models.proyecto import Proyecto
+from app.models.tipo_solicitud import TipoSolicitud
+from app.models.user import User
+from app.services.po_dashboard import check_po_alerts
+from app.services.proyectos_dashboard import check_proyectos_alerts
+
+PO_KEYS = ["rechazadas", "solicitudes_vencidas", "emitidas_vencidas"]
+PROYECTO_KEYS = ["mensajes", "eventos", "ordenes_rechazadas"]
+CRM_KEYS = ["mensajesSinLeer", "prospectSinResolver", "tareasVencidas", "enProcesoSinMovimiento"]
+
+
+def _seed_statuses(db_session: Session) -> dict[str, PoOrderStatus]:
+    statuses = {
+        nombre: PoOrderStatus(nombre=nombre, descripcion=nombre.title(), orden=orden)
+        for orden, nombre in enumerate(["solicitada", "emitida", "rechazada"])
+    }
+    db_session.add_all(statuses.values())
+    db_session.commit()
+    return statuses
+
+
+def _order(user: User, tipo: TipoSolicitud, status: PoOrderStatus, creada: date, **kwargs) -> PoOrder:
+    created_at = datetime.combine(creada, datetime.min.time(), tzinfo=UTC)
+    return PoOrder(
+        titulo=f"Orden {status.nombre}",
+        tipo_solicitud_id=tipo.id,
+        order_status_id=status.id,
+        metodo_pago_id=1,
+        solicitante_id=user.id,
+        created_at=created_at,
+        updated_at=created_at,
+        **kwargs,
+    )
+
+
+def test_po_alerta_items_flags_per_order(client: TestClient, db_session: Session) -> None:
+    user = User(nombre="Comprador", email="comprador@example.com")
+    otro = User(nombre="Otro", email="otro@example.com")
+    tipo = TipoSolicitud(nombre="General")
+    db_session.add_all([user, otro, tipo])
+    db_session.commit()
+    statuses = _seed_statuses(db_session)
+
+    orders = [
+        _order(user, tipo, statuses["rechazada"], date(2026, 2, 1)),
+        _order(user, tipo, statuses["solicitada"], date(2026, 1, 5)),
+        _order(user, tipo, statuses["emitida"], date(2026, 1, 10)),
+        _order(user, tipo, statuses["emitida"], date(2026, 3, 28)),
+        _order(user, tipo, statuses["solicitada"], date(2026, 4, 15)),  # posterior al período
+    ]
+    db_session.add_all(orders)
+    db_session.commit()
+    ids = [order.id for order in orders] + [9999]
+    periodo = {"startDate": "2026-01-01", "endDate": "2026-03-31"}
+
+    response = client.get(
+        "/api/dashboard/po/alerta-items",
+        params={"ids": ",".join(map(str, ids)), "alertKeys": ",".join(PO_KEYS), **periodo},
+    )
+    assert response.status_code == 200
+    batch = {item["id"]: item["alerts"] for item in response.json()["data"]}
+
+    assert batch[orders[0].id] == {"rechazadas": True, "solicitudes_vencidas": False, "emitidas_vencidas": False}
+    assert batch[orders[1].id] == {"rechazadas": False, "solicitudes_vencidas": True, "emitidas_vencidas": False}
+    assert batch[orders[2].id] == {"rechazadas": False, "solicitudes_vencidas": False, "emitidas_vencidas": True}
+    assert batch[orders[3].id] == dict.fromkeys(PO_KEYS, False)
+    assert batch[orders[4].id] == dict.fromkeys(PO_KEYS, False)
+    assert batch[9999] == dict.fromkeys(PO_KEYS, False)
+
+    # Los filtros del dashboard se aplican igual que en el detalle
+    filtradas = check_po_alerts(ids, PO_KEYS, "2026-01-01", "2026-03-31", db_session, solicitante_ids=[otro.id])
+    assert all(not any(flags.values()) for flags in filtradas.values())
+
+    demasiados = client.get(
+        "/api/dashboard/po/alerta-items",
+        params={"ids": ",".join(map(str, range(1, 202))), "alertKeys": "rechazadas", **periodo},
+    )
+    assert demasiados.status_code == 400
+
+
+def test_proyectos_alerta_items_flags_per_proyecto(client: TestClient, db_session: Session) -> None:
+    user = User(nombre="Jefe de obra", email="obra@example.com")
+    tipo_evento = CRMTipoEvento(nombre="Visita", codigo="VIS")
+    tipo = TipoSolicitud(nombre="Materiales")
+    db_session.add_all([user, tipo_evento, tipo])
+    db_session.commit()
+    statuses = _seed_statuses(db_session)
+    contacto = CRMContacto(nombre_completo="Cliente obra", telefonos=["5491100000001"], responsable_id=user.id)
+    db_session.add(contacto)
+    db_session.commit()
+    con_actividad, con_rechazo = (
+        CRMOportunidad(titulo=titulo, contacto_id=contacto.id, responsable_id=user.id, activo=True)
+        for titulo in ("Con actividad", "Con rechazo")
+    )
+    db_session.add_all([con_actividad, con_rechazo])
+    db_session.commit()
+
+    proyectos = [
+        Proyecto(nombre="Obra A", responsable_id=user.id, oportunidad_id=con_actividad.id),
+        Proyecto(nombre="Obra B", responsable_id=user.id, oportunidad_id=con_rechazo.id),
+        Proyecto(nombre="Obra sin oportunidad", responsable_id=user.id),
+    ]
+    db_session.add_all(proyectos)
+    db_session.add(
+        CRMMensaje(
+            contacto_id=contacto.id,
+            oportunidad_id=con_actividad.id,
+            tipo=TipoMensaje.ENTRADA.value,
+            estado=EstadoMensaje.NUEVO.value,
+            contenido="Consulta",
+        )
+    )
+    db_session.add(
+        CRMEvento(
+            contacto_id=contacto.id,
+            oportunidad_id=con_actividad.id,
+            tipo_id=tipo_evento.id,
+            titulo="Visita vencida",
+            asignado_a_id=user.id,
+            estado_evento=EstadoEvento.PENDIENTE.value,
+            fecha_evento=datetime.now(UTC) - timedelta(days=3),
+        )
+    )
+    db_session.add(_order(user, tipo, statuses["rechazada"], date(2026, 2, 1), oportunidad_id=con_rechazo.id))
+    db_session.commit()
+    ids = [proyecto.id for proyecto in proyectos] + [9999]
+
+    response = client.get(
+        "/api/dashboard/proyectos/alerta-items",
+        params={"ids": ",".join(map(str, ids)), "alertKeys": ",".join(PROYECTO_KEYS)},
+    )
+    assert response.status_code == 200
+    batch = {item["id"]: item["alerts"] for item in response.json()["data"]}
+
+    assert batch[proyectos[0].id] == {"mensajes": True, "eventos": True, "ordenes_rechazadas": False}
+    assert batch[proyectos[1].id] == {"mensajes": False, "eventos": False, "ordenes_rechazadas": True}
+    assert batch[proyectos[2].id] == dict.fromkeys(PROYECTO_KEYS, False)
+    assert batch[9999] == dict.fromkeys(PROYECTO_KEYS, False)
+
+    assert check_proyectos_alerts(ids, ["mensajes"], db_session)[proyectos[0].id] == {"mensajes": True}
+    invalid = client.get("/api/dashboard/proyectos/alerta-items", params={"ids": "1", "alertKeys": "otra"})
+    assert invalid.status_code == 422
+
+
+def test_crm_alerta_items_flags_per_oportunidad(client: TestClient, db_session: Session) -> None:
+    user = User(nombre="Vendedor", email="vendedor@example.com")
+    tipo_evento = CRMTipoEvento(nombre="Llamada", codigo="LLA")
+    db_session.add_all([user, tipo_evento])
+    db_session.commit()
+    contacto = CRMContacto(nombre_completo="Cliente CRM", telefonos=["5491100000002"], responsable_id=user.id)
+    db_session.add(contacto)
+    db_session.commit()
+
+    now = datetime.now(UTC)
+    estancada, reciente, prospect, inactiva, ganada = (
+        CRMOportunidad(titulo=titulo, contacto_id=contacto.id, responsable_id=user.id, estado=estado, fecha_estado=fecha)
+        for titulo, estado, fecha in (
+            ("Abierta sin movimiento", EstadoOportunidad.ABIERTA.value, now - timedelta(days=45)),
+            ("Cotiza reciente", EstadoOportunidad.COTIZA.value, now - timedelta(days=5)),
+            ("Prospect viejo", EstadoOportunidad.PROSPECT.value, now - timedelta(days=60)),
+            ("Visita inactiva", EstadoOportunidad.VISITA.value, now - timedelta(days=60)),
+            ("Ganada vieja", EstadoOportunidad.GANADA.value, now - timedelta(days=60)),
+        )
+    )
+    oportunidades = [estancada, reciente, prospect, inactiva, ganada]
+    db_session.add_all(oportunidades)
+    db_session.commit()
+    prospect.activo = True
+    inactiva.activo = False  # el alta fuerza activo=True fuera de prospect
+    db_session.add_all([prospect, inactiva])
+    db_session.add(
+        CRMMensaje(
+            contacto_id=contacto.id,
+            oportunidad_id=reciente.id,
+            tipo=TipoMensaje.ENTRADA.value,
+            estado=EstadoMensaje.NUEVO.value,
+            contenido="Hola",
+        )
+    )
+    db_session.add(
+        CRMEvento(
+            contacto_id=contacto.id,
+            oportunidad_id=reciente.id,
+            tipo_id=tipo_evento.id,
+            titulo="Llamada vencida",
+            asignado_a_id=user.id,
+            estado_evento=EstadoEvento.PENDIENTE.value,
+            fecha_evento=now - timedelta(days=2),
+        )
+    )
+    db_session.commit()
+    ids = [oportunidad.id for oportunidad in oportunidades] + [9999]
+
+    response = client.get(
+        "/api/dashboard/crm/alerta-items",
+        params={"ids": ",".join(map(str, ids)), "alertKeys": ",".join(CRM_KEYS)},
+    )
+    assert response.status_code == 200
+    batch = {item["id"]: item["alerts"] for item in response.json()["data"]}
+
+    ninguna = dict.fromkeys(CRM_KEYS, False)
+    assert batch[estancada.id] == {**ninguna, "enProcesoSinMovimiento": True}
+    assert batch[reciente.id] == {**ninguna, "mensajesSinLeer": True, "tareasVencidas": True}
+    assert batch[prospect.id] == {**ninguna, "prospectSinResolver": True}
+    assert batch[inactiva.id] == ninguna
+    assert batch[ganada.id] == ninguna
+    assert batch[9999] == ninguna
@@ -0,0 +1,118 @@
+"""Cache de respuestas de dashboards: HIT/MISS, ETag/304 e invalidación por commit."""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text, update
+from sqlmodel import Session, create_engine
+
+from app import db
+from app.core import dashboard_cache, db_routing
+from app.models.propiedad import Propiedad
+
+URL = "/api/dashboard/propiedades/selectors"
+
+
+@pytest.fixture()
+def cache(monkeypatch):
+    monkeypatch.setattr(dashboard_cache, "CACHE_ENABLED", True)
+    backend = dashboard_cache.InMemoryLRUBackend(max_entries=16)
+    previous = dashboard_cache.get_backend()
+    dashboard_cache.set_backend(backend)
+    dashboard_cache.metrics.reset()
+    try:
+        yield backend
+    finally:
+        dashboard_cache.set_backend(previous)
+
+
+def test_dashboard_response_is_cached_and_revalidated(client: TestClient, cache) -> None:
+    first = client.get(URL)
+    assert first.status_code == 200
+    assert first.headers["x-dashboard-cache"] == "MISS"
+
+    second = client.get(URL)
+    assert second.headers["x-dashboard-cache"] == "HIT"
+    assert second.json() == first.json()
+    assert second.headers["etag"] == first.headers["etag"]
+
+    not_modified = client.get(URL, headers={"If-None-Match": first.headers["etag"]})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    bypass = client.get(URL, headers={"Cache-Control": "no-cache"})
+    assert bypass.headers["x-dashboard-cache"] == "MISS"
+
+    stats = client.get("/metrics/dashboard-cache").json()["namespaces"]["propiedades"]
+    assert (stats["hits"], stats["misses"], stats["not_modified"]) == (2, 2, 1)
+
+
+def test_commit_on_dependency_table_invalidates(client: TestClient, db_session: Session, cache) -> None:
+    client.get(URL)
+    assert client.get(URL).headers["x-dashboard-cache"] == "HIT"
+
+    # Un commit sobre otra tabla no invalida los dashboards de propiedades
+    db_session.commit()
+    assert client.get(URL).headers["x-dashboard-cache"] == "HIT"
+
+    propiedad = db_session.get(Propiedad, 1)
+    propiedad.nombre = "Renombrada"
+    db_session.add(propiedad)
+    db_session.commit()
+
+    assert client.get(URL).headers["x-dashboard-cache"] == "MISS"
+
+
+def test_bulk_and_text_writes_invalidate(client: TestClient, db_session: Session, cache) -> None:
+    client.get(URL)
+    assert client.get(URL).headers["x-dashboard-cache"] == "HIT"
+
+    db_session.exec(update(Propiedad).where(Propiedad.id == 1).values(nombre="En bloque"))
+    db_session.commit()
+    assert client.get(URL).headers["x-dashboard-cache"] == "MISS"
+    assert client.get(URL).headers["x-dashboard-cache"] == "HIT"
+
+    db_session.execute(text("UPDATE propiedades SET nombre = 'Texto' WHERE id = 1"))
+    db_session.commit()
+    assert client.get(URL).headers["x-dashboard-cache"] == "MISS"
+
+
+def test_replica_responses_are_not_stored(client: TestClient, cache, monkeypatch) -> None:
+    monkeypatch.setattr(db, "replica_engine", create_engine("sqlite://"))
+
+    assert client.get(URL).headers["x-dashboard-cache"] == "MISS"
+    assert client.get(URL).headers["x-dashboard-cache"] == "MISS"
+
+    # Un cliente sticky (escribió hace poco) lee del primario: esa respuesta sí se guarda
+    sticky = {"Authorization": "Bearer sticky"}
+    db_routing.mark_write(db_routing._client_key({"headers": [(b"authorization", b"Bearer sticky")]}))
+    try:
+        assert client.get(URL, headers=sticky).headers["x-dashboard-cache"] == "MISS"
+    finally:
+        db_routing.reset_stickiness()
+    assert client.get(URL).headers["x-dashboard-cache"] == "HIT"
+
+
+def test_params_are_normalized() -> None:
+    assert dashboard_cache.normalize_params("b=2&tipoOperacion=3, 1&a=&trendSteps=0,-1") == (
+        "b=2&tipoOperacion=1%2C3&trendSteps=0%2C-1"
+    )
+
+
+def test_no_store_responses_are_not_cached(cache) -> None:
+    async def partial_bundle(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), (b"cache-control", b"no-store")],
+        })
+        await send({"type": "http.response.body", "body": b'{"staleSections":["crm"]}'})
+
+    middleware = dashboard_cache.DashboardCacheMiddleware(partial_bundle)
+    client = TestClient(middleware)
+
+    for _ in range(2):
+        response = client.get("/api/dashboard/home/bundle", headers={"Authorization": "Bearer x"})
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "no-store"
+        assert "x-dashboard-cache" not in response.headers
+    assert dashboard_cache.metrics.snapshot()["home"]["stores"] == 0
@@ -0,0 +1,65 @@
+"""Instrumentación de queries: headers X-DB-* y endpoint /metrics/db."""
+
+from fastapi.testclient import TestClient
+
+
+def test_list_request_reports_db_headers_and_endpoint_metrics(client: TestClient) -> None:
+    client.delete("/metrics/db")
+    client.post("/items", json={"name": "metrics"})
+
+    response = client.get("/items")
+    assert response.status_code == 200
+    assert int(response.headers["X-DB-Queries"]) >= 2  # count + page
+    assert float(response.headers["X-DB-Time"]) >= 0
+
+    metrics = client.get("/metrics/db").json()
+    endpoint = metrics["endpoints"]["GET /items"]
+    assert endpoint["requests"] == 1
+    assert endpoint["queries"] >= 2
+    assert endpoint["n_plus_one"] == 0
+
+
+def test_repeated_statement_is_flagged_as_n_plus_one(monkeypatch) -> None:
+    from app.core import instrumentation
+
+    monkeypatch.setattr(instrumentation, "N_PLUS_ONE_THRESHOLD", 3)
+    instrumentation.reset_metrics()
+    stats = instrumentation.RequestQueryStats()
+    for _ in range(3):
+        stats.statements["SELECT * FROM item WHERE id = ?"] += 1
+    stats.queries = 3
+
+    instrumentation._record("GET /fake", stats)
+
+    endpoint = instrumentation.snapshot_metrics()["endpoints"]["GET /fake"]
+    assert endpoint["n_plus_one"] == 1
+    assert endpoint["last_n_plus_one"].startswith("SELECT * FROM item")
+
+
+def test_pool_metrics_count_checkouts_and_overflow() -> None:
+    from sqlalchemy import create_engine, text
+
+    from app.core import instrumentation
+
+    engine = create_engine(
+        "sqlite:///file:poolmetrics?mode=memory&uri=true",
+        poolclass=instrumentation.InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=1,
+    )
+    instrumentation.instrument_pool(engine, "test")
+    instrumentation.reset_pool_metrics()
+
+    with engine.connect() as first, engine.connect() as second:
+        first.execute(text("SELECT 1"))
+        second.execute(text("SELECT 1"))
+        pool = instrumentation.snapshot_pool_metrics()["pools"]["test"]
+        assert pool["checked_out"] == 2
+        assert pool["overflow_in_use"] == 1
+
+    pool = instrumentation.snapshot_pool_metrics()["pools"]["test"]
+    assert pool["checkouts"] == 2
+    assert pool["overflow_checkouts"] == 1
+    assert pool["max_overflow_used"] == 1
+    assert pool["wait_time_ms"] >= 0
+    engine.dispose()
@@ -0,0 +1,47 @@
+"""Ruteo de lecturas a la réplica con stickiness después de escrituras."""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import create_engine
+
+from app import db
+from app.core import db_routing
+
+
+def _routing_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(db_routing.ReadReplicaRoutingMiddleware)
+
+    @app.get("/read")
+    def read():
+        return {"replica": db.read_engine() is db.replica_engine}
+
+    @app.post("/write")
+    def write():
+        return {"ok": True}
+
+    return app
+
+
+def test_reads_go_to_replica_until_client_writes(monkeypatch) -> None:
+    monkeypatch.setattr(db, "replica_engine", create_engine("sqlite://"))
+    db_routing.reset_stickiness()
+    client = TestClient(_routing_app())
+    headers = {"Authorization": "Bearer a"}
+
+    assert client.get("/read", headers=headers).json() == {"replica": True}
+
+    client.post("/write", headers=headers)
+    assert client.get("/read", headers=headers).json() == {"replica": False}
+    # Otro cliente sigue leyendo de la réplica
+    assert client.get("/read", headers={"Authorization": "Bearer b"}).json() == {"replica": True}
+
+    monkeypatch.setattr(db_routing, "STICKY_SECONDS", 0)
+    client.post("/write", headers=headers)
+    assert client.get("/read", headers=headers).json() == {"replica": True}
+    db_routing.reset_stickiness()
+
+
+def test_without_replica_reads_use_primary() -> None:
+    assert db.replica_engine is None
+    assert db.read_engine() is db.engine
@@ -1,10 +1,12 @@
 import json
+import threading
+import time
 from datetime import UTC, date, datetime, timedelta
 from decimal import Decimal
 from urllib.parse import parse_qs, unquote, urlparse
 
 from fastapi.testclient import TestClient
-from sqlmodel import Session, select
+from sqlmodel import Session, SQLModel, create_engine, select
 
 from app.api.auth import create_token
 from app.models.compras import PoInvoice, PoInvoiceStatus, PoOrder, PoOrderStatus
@@ -16,6 +18,7 @@ from app.models.propiedad import Propiedad, PropiedadesStatus
 from app.models.proveedor import Proveedor
 from app.models.tipo_solicitud import TipoSolicitud
 from app.models.user import User
+from app.services import home_dashboard
 from app.services.propiedades_dashboard import _get_inmobiliaria_alert_days, build_prop_selectors
 
 
@@ -818,3 +821,109 @@ def test_home_dashboard_partial_returns_only_requested_blocks(
     assert set(body.keys()) == {"generatedAt", "miDia"}
     assert body["miDia"]["total"] == 6
     assert "radar" not in body
+
+
+def test_home_dashboard_bundle_sections_run_in_parallel_with_budget(tmp_path, monkeypatch) -> None:
+    # Engine con pool real (no StaticPool): cada sección usa su propia conexión
+    engine = create_engine(f"sqlite:///{tmp_path / 'home.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        me = _seed_home_dashboard_data(session)
+
+        monkeypatch.setattr(home_dashboard, "HOME_DASHBOARD_PARALLEL", False)
+        sequential = home_dashboard.build_home_dashboard_bundle(session, me)
+        monkeypatch.setattr(home_dashboard, "HOME_DASHBOARD_PARALLEL", True)
+        parallel = home_dashboard.build_home_dashboard_bundle(session, me)
+        assert {**parallel, "generatedAt": None} == {**sequential, "generatedAt": None}
+        assert parallel["staleSections"] == []
+
+        released = threading.Event()
+        build_crm_section = home_dashboard._build_crm_section
+
+        def _slow_crm_section(*args, **kwargs):
+            released.wait(5)
+            return build_crm_section(*args, **kwargs)
+
+        monkeypatch.setattr(home_dashboard, "_build_crm_section", _slow_crm_section)
+        monkeypatch.setattr(home_dashboard, "HOME_DASHBOARD_SECTION_BUDGET_SECONDS", 0.2)
+        home_dashboard._last_sections.clear()
+
+        partial = home_dashboard.build_home_dashboard_bundle(session, me)
+        released.set()
+        assert partial["staleSections"] == ["crm"]
+        assert partial["miDia"] == sequential["miDia"]
+        radar_keys = {item["key"] for item in partial["radar"]["items"]}
+        assert "oportunidades_prospect" not in radar_keys
+
+        # La sección lenta termina en segundo plano y queda como último valor conocido
+        for _ in range(50):
+            if (me.id, "crm") in home_dashboard._last_sections:
+                break
+            time.sleep(0.05)
+        released.clear()
+        stale = home_dashboard.build_home_dashboard_bundle(session, me)
+        released.set()
+        assert stale["staleSections"] == ["crm"]
+        assert stale["radar"] == sequential["radar"]
+    engine.dispose()
+
+
+def test_home_dashboard_mi_dia_keeps_available_sections_when_one_is_stale(tmp_path, monkeypatch) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'home-stale.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        me = _seed_home_dashboard_data(session)
+        monkeypatch.setattr(home_dashboard, "HOME_DASHBOARD_PARALLEL", False)
+        fresh = _item_map(home_dashboard.build_home_dashboard_bundle(session, me)["miDia"]["items"])
+
+        released = threading.Event()
+        build_compras_section = home_dashboard._build_compras_section
+
+        def _slow_compras_section(*args, **kwargs):
+            released.wait(5)
+            return build_compras_section(*args, **kwargs)
+
+        monkeypatch.setattr(home_dashboard, "_build_compras_section", _slow_compras_section)
+        monkeypatch.setattr(home_dashboard, "HOME_DASHBOARD_PARALLEL", True)
+        monkeypatch.setattr(home_dashboard, "HOME_DASHBOARD_SECTION_BUDGET_SECONDS", 0.2)
+        home_dashboard._last_sections.clear()
+
+        # Compras sin valor previo: "Mi dia" muestra lo personal, no un 0 engañoso
+        bundle = home_dashboard.build_home_dashboard_bundle(session, me)
+        released.set()
+        assert bundle["staleSections"] == ["compras"]
+        mi_dia = _item_map(bundle["miDia"]["items"])
+        assert set(mi_dia) == {"chats_nuevos", "agenda"}
+        assert bundle["miDia"]["total"] == fresh["chats_nuevos"]["count"] + fresh["agenda"]["count"]
+        assert not any(item.get("stale") for item in mi_dia.values())
+
+        for _ in range(50):
+            if (me.id, "compras") in home_dashboard._last_sections:
+                break
+            time.sleep(0.05)
+        released.clear()
+        bundle = home_dashboard.build_home_dashboard_bundle(session, me)
+        released.set()
+        mi_dia = _item_map(bundle["miDia"]["items"])
+        assert mi_dia["mis_compras"] == {**fresh["mis_compras"], "stale": True}
+        assert "stale" not in mi_dia["agenda"]
+    engine.dispose()
+
+
+def test_home_dashboard_sections_use_bounded_pool_and_release_request_connection(tmp_path, monkeypatch) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'home-pool.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(home_dashboard, "HOME_DASHBOARD_PARALLEL", True)
+    monkeypatch.setattr(home_dashboard, "HOME_DASHBOARD_SECTION_BUDGET_SECONDS", 2.0)
+    with Session(engine) as session:
+        me = _seed_home_dashboard_data(session)
+        bundle = home_dashboard.build_home_dashboard_bundle(session, me)
+        assert bundle["staleSections"] == []
+        # La conexión del request se devolvió antes del fan-out
+        assert engine.pool.checkedout() == 0
+
+    section_engine = home_dashboard._get_section_engine(engine)
+    assert section_engine is not engine
+    assert section_engine.pool.size() == home_dashboard._section_workers()
+    assert section_engine.pool.timeout() == 2.0
+    engine.dispose()
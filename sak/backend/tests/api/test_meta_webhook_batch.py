@@ -0,0 +1,192 @@
+"""Ingesta en lote de webhooks de meta-w: dedupe, resolución por conjunto y un solo commit."""
+
+import asyncio
+from uuid import uuid4
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.models import CRMCelular, CRMContacto, CRMMensaje, CRMOportunidad, WebhookJob, WebhookLog
+from app.models.enums import EstadoWebhookJob
+from app.models.user import User
+from app.services import webhook_queue
+from app.services.meta_webhook_service import MetaWebhookService
+
+URL = "/api/webhooks/meta-whatsapp/batch"
+CELULAR = {"id": str(uuid4()), "alias": "Canal", "phone_number": "+15551676015"}
+
+
+def _evento(meta_message_id: str, from_phone: str, *, direccion: str = "in", status: str = "received", minuto: int = 0):
+    timestamp = f"2026-10-17T12:{minuto:02d}:00Z"
+    return {
+        "event_type": "message.received" if direccion == "in" else "message.status",
+        "timestamp": timestamp,
+        "mensaje": {
+            "id": str(uuid4()),
+            "meta_message_id": meta_message_id,
+            "from_phone": from_phone,
+            "from_name": f"Cliente {from_phone[-2:]}",
+            "to_phone": CELULAR["phone_number"],
+            "direccion": direccion,
+            "tipo": "text",
+            "texto": f"Hola {meta_message_id}",
+            "status": status,
+            "meta_timestamp": timestamp,
+            "created_at": timestamp,
+            "celular": CELULAR,
+        },
+    }
+
+
+def test_batch_ingests_dedupes_and_commits_once(client, db_session: Session, monkeypatch) -> None:
+    monkeypatch.setattr("app.services.meta_webhook_service.should_auto_process", lambda *args, **kwargs: False)
+    user = User(nombre="Vendedor", email="vendedor@example.com")
+    db_session.add(user)
+    db_session.flush()
+    conocido = CRMContacto(nombre_completo="Conocido", telefonos=["5491100000001"], responsable_id=user.id)
+    db_session.add(conocido)
+    db_session.flush()
+    oportunidad = CRMOportunidad(titulo="Existente", contacto_id=conocido.id, responsable_id=user.id, activo=True)
+    db_session.add(oportunidad)
+    db_session.flush()
+    saliente = CRMMensaje(
+        tipo="salida",
+        canal="whatsapp",
+        contacto_id=conocido.id,
+        oportunidad_id=oportunidad.id,
+        contenido="Respuesta",
+        origen_externo_id="wamid.out.1",
+        estado_meta="sent",
+    )
+    ya_recibido = CRMMensaje(
+        tipo="entrada",
+        canal="whatsapp",
+        contacto_id=conocido.id,
+        oportunidad_id=oportunidad.id,
+        contenido="Viejo",
+        origen_externo_id="wamid.in.0",
+    )
+    db_session.add_all([saliente, ya_recibido])
+    db_session.commit()
+
+    payloads = [
+        _evento("wamid.in.0", "5491100000001"),  # ya en DB
+        _evento("wamid.in.1", "5491100000001", minuto=1),
+        _evento("wamid.in.2", "5491100000002", minuto=2),
+        _evento("wamid.in.2", "5491100000002", minuto=2),  # repetido en el lote
+        _evento("wamid.in.3", "5491100000002", minuto=3),
+        _evento("wamid.out.1", "5491100000001", direccion="out", status="delivered", minuto=1),
+        _evento("wamid.out.1", "5491100000001", direccion="out", status="read", minuto=4),
+        {"event_type": "message.received", "mensaje": {}},
+    ]
+
+    commits = []
+
+    def contar_commit(session) -> None:
+        commits.append(session)
+
+    event.listen(Session, "after_commit", contar_commit)
+    try:
+        response = client.post(URL, json=payloads)
+    finally:
+        event.remove(Session, "after_commit", contar_commit)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["recibidos"], body["creados"], body["duplicados"], body["estados_actualizados"]) == (8, 3, 2, 1)
+    assert [item["index"] for item in body["invalidos"]] == [7]
+    assert len(commits) == 1
+
+    db_session.expire_all()
+    nuevos = db_session.exec(
+        select(CRMMensaje).where(CRMMensaje.id.in_(body["mensaje_ids"])).order_by(CRMMensaje.fecha_mensaje)
+    ).all()
+    assert [m.origen_externo_id for m in nuevos] == ["wamid.in.1", "wamid.in.2", "wamid.in.3"]
+    assert nuevos[0].oportunidad_id == oportunidad.id
+    assert nuevos[1].oportunidad_id == nuevos[2].oportunidad_id != oportunidad.id
+
+    nuevo_contacto = db_session.get(CRMContacto, nuevos[1].contacto_id)
+    assert nuevo_contacto.telefonos == ["5491100000002"]
+    assert nuevo_contacto.nombre_completo == "Cliente 02"
+    assert db_session.get(CRMOportunidad, nuevos[2].oportunidad_id).ultimo_mensaje_id == nuevos[2].id
+    assert db_session.get(CRMOportunidad, oportunidad.id).ultimo_mensaje_id == nuevos[0].id
+
+    assert db_session.get(CRMMensaje, saliente.id).estado_meta == "read"
+    assert len(db_session.exec(select(CRMCelular)).all()) == 1
+    logs = db_session.exec(select(WebhookLog)).all()
+    assert len(logs) == 8
+    assert sorted(log.response_status for log in logs) == [200] * 7 + [422]
+
+    # Replay del mismo lote: todo duplicado
+    replay = client.post(URL, json=payloads[:5]).json()
+    assert (replay["creados"], replay["duplicados"]) == (0, 5)
+
+
+def test_batch_rejects_oversized_payload(client, monkeypatch) -> None:
+    monkeypatch.setattr("app.routers.meta_webhook_router.META_WEBHOOK_BATCH_MAX", 1)
+    response = client.post(URL, json=[_evento("a", "1"), _evento("b", "2")])
+    assert response.status_code == 413
+
+
+def test_batch_enqueues_agent_turns_instead_of_running_them(client, db_session: Session, monkeypatch) -> None:
+    monkeypatch.setattr("app.services.meta_webhook_service.should_auto_process", lambda *args, **kwargs: True)
+    db_session.add(User(nombre="Vendedor", email="vendedor@example.com"))
+    db_session.commit()
+
+    async def no_inline_turn(self, crm_mensaje):
+        raise AssertionError("el lote no debe correr el turno del agente inline")
+
+    monkeypatch.setattr(MetaWebhookService, "_run_agent_turn", no_inline_turn)
+    payloads = [
+        _evento("wamid.t.1", "5491100000011", minuto=1),
+        _evento("wamid.t.2", "5491100000011", minuto=2),
+        _evento("wamid.t.3", "5491100000012", minuto=3),
+    ]
+    body = client.post(URL, json=payloads).json()
+    assert (body["creados"], body["turnos_encolados"]) == (3, 2)
+
+    jobs = db_session.exec(select(WebhookJob).order_by(WebhookJob.id)).all()
+    assert [job.evento for job in jobs] == [webhook_queue.AGENT_TURN_EVENT] * 2
+    assert sorted(job.payload["mensaje_id"] for job in jobs) == sorted(body["mensaje_ids"][1:])
+
+    turnos = []
+
+    async def process_agent_turn(self, mensaje_id):
+        turnos.append(mensaje_id)
+        return {"mensaje_id": mensaje_id}
+
+    monkeypatch.setattr(MetaWebhookService, "process_agent_turn", process_agent_turn)
+    monkeypatch.setattr(MetaWebhookService, "__init__", lambda self, session: None)
+    assert asyncio.run(webhook_queue.process_next_webhook_jobs(db_session, "test-worker", limit=10)) == 2
+    assert sorted(turnos) == sorted(body["mensaje_ids"][1:])
+    db_session.expire_all()
+    assert {job.estado for job in db_session.exec(select(WebhookJob)).all()} == {EstadoWebhookJob.COMPLETADO.value}
+
+
+def test_batch_and_single_share_tipo_operacion_rule(client, db_session: Session, monkeypatch) -> None:
+    from app.models.propiedad import Propiedad, PropiedadesStatus
+
+    monkeypatch.setattr("app.services.meta_webhook_service.should_auto_process", lambda *args, **kwargs: False)
+    user = User(nombre="Vendedor", email="vendedor@example.com")
+    status = PropiedadesStatus(nombre="Disponible", orden=3)
+    db_session.add_all([user, status])
+    db_session.flush()
+    propietario = CRMContacto(nombre_completo="Propietario", telefonos=["5491100000021"], responsable_id=user.id)
+    db_session.add(propietario)
+    db_session.flush()
+    propiedad = db_session.get(Propiedad, 1)
+    propiedad.contacto_id = propietario.id
+    propiedad.tipo_operacion_id = 1
+    propiedad.propiedad_status_id = status.id
+    db_session.add(propiedad)
+    db_session.commit()
+
+    body = client.post(URL, json=[_evento("wamid.p.1", "5491100000021"), _evento("wamid.p.2", "5491100000022")]).json()
+    mensajes = [db_session.get(CRMMensaje, mensaje_id) for mensaje_id in body["mensaje_ids"]]
+    tipos = {m.contacto_referencia: db_session.get(CRMOportunidad, m.oportunidad_id).tipo_operacion_id for m in mensajes}
+    assert tipos == {"5491100000021": 3, "5491100000022": None}
+
+    service = MetaWebhookService(db_session)
+    assert service._determinar_tipo_operacion_contacto(propietario.id) == 3
+    nuevo = db_session.get(CRMContacto, mensajes[1].contacto_id)
+    assert service._determinar_tipo_operacion_contacto(nuevo.id) is None
@@ -0,0 +1,156 @@
+"""Cola durable del webhook de meta-w: ack inmediato, reintentos con backoff y dead-letter."""
+
+import asyncio
+from datetime import UTC, datetime
+
+from sqlmodel import Session, select
+
+from agente.v2.core.delivery import SendResult
+from agente.v2.infrastructure.channels.crm_channel_adapter import CRMOutboundChannelAdapter
+from agente.v2.processes.solicitud_materiales.llm_client import OpenAIConversationAgentClientV2
+from agente.v2.processes.solicitud_materiales.models import NormalTurnDecision
+from app.models import CRMContacto, CRMMensaje, CRMOportunidad, Proyecto, User, WebhookJob
+from app.models.enums import EstadoWebhookJob
+from app.services import webhook_queue
+
+PAYLOAD = {
+    "event_type": "message.received",
+    "timestamp": "2026-10-17T12:00:00Z",
+    "mensaje": {
+        "id": "6f1c1f53-4d4b-4a0c-9d61-0a3a4e1f2b11",
+        "meta_message_id": "wamid.queue.1",
+        "from_phone": "5491156384310",
+        "to_phone": "+15551676015",
+        "direccion": "in",
+        "tipo": "text",
+        "texto": "Hola",
+        "status": "received",
+        "meta_timestamp": "2026-10-17T12:00:00Z",
+        "created_at": "2026-10-17T12:00:00Z",
+        "celular": {"id": "0b7c6c1e-7a43-4f0a-8f3e-3c0f7b2d9e55", "alias": "Canal", "phone_number": "+15551676015"},
+    },
+}
+
+
+def _process(db_session: Session, handler) -> int:
+    return asyncio.run(webhook_queue.process_next_webhook_jobs(db_session, "test-worker", handler))
+
+
+def test_webhook_is_acked_and_enqueued(client, db_session: Session, monkeypatch) -> None:
+    monkeypatch.setattr(webhook_queue, "META_WEBHOOK_QUEUE", True)
+
+    response = client.post("/api/webhooks/meta-whatsapp/", json=PAYLOAD)
+    assert response.status_code == 200
+    assert response.json()["message"].startswith("Webhook encolado")
+
+    job = db_session.exec(select(WebhookJob)).one()
+    assert job.estado == EstadoWebhookJob.PENDIENTE.value
+    assert job.origen_externo_id == "wamid.queue.1"
+    assert job.payload == PAYLOAD
+
+    invalid = client.post("/api/webhooks/meta-whatsapp/", json={"event_type": "message.received"})
+    assert invalid.status_code == 422
+
+    processed = []
+
+    async def handler(session, payload):
+        processed.append(payload["mensaje"]["meta_message_id"])
+
+    assert _process(db_session, handler) == 1
+    assert processed == ["wamid.queue.1"]
+    db_session.refresh(job)
+    assert job.estado == EstadoWebhookJob.COMPLETADO.value
+    assert _process(db_session, handler) == 0
+
+
+def test_failed_jobs_are_retried_with_backoff_then_dead_lettered(db_session: Session, monkeypatch) -> None:
+    monkeypatch.setattr(webhook_queue, "WEBHOOK_JOB_MAX_ATTEMPTS", 2)
+    job = webhook_queue.enqueue_webhook_job(db_session, PAYLOAD, "message.received", "wamid.queue.1")
+
+    async def failing(session, payload):
+        raise RuntimeError("meta-w caído")
+
+    assert _process(db_session, failing) == 1
+    db_session.refresh(job)
+    assert job.estado == EstadoWebhookJob.PENDIENTE.value
+    assert job.intentos == 1
+    assert job.ultimo_error == "meta-w caído"
+    assert job.disponible_en.replace(tzinfo=UTC) > datetime.now(UTC)
+
+    # En backoff: no se vuelve a tomar hasta `disponible_en`
+    assert _process(db_session, failing) == 0
+    job.disponible_en = datetime.now(UTC)
+    db_session.add(job)
+    db_session.commit()
+
+    assert _process(db_session, failing) == 1
+    db_session.refresh(job)
+    assert job.estado == EstadoWebhookJob.FALLIDO.value
+    assert webhook_queue.webhook_queue_stats(db_session)["jobs"][EstadoWebhookJob.FALLIDO.value] == 1
+
+    assert webhook_queue.requeue_failed_webhook_jobs(db_session) == 1
+    db_session.refresh(job)
+    assert (job.estado, job.intentos) == (EstadoWebhookJob.PENDIENTE.value, 0)
+
+
+def test_retried_agent_turn_job_does_not_resend_reply(db_session: Session, monkeypatch) -> None:
+    user = User(nombre="Vendedor", email="vendedor-cola@example.com")
+    db_session.add(user)
+    db_session.flush()
+    contacto = CRMContacto(nombre_completo="Cliente", telefonos=["+5491122223333"], responsable_id=user.id)
+    db_session.add(contacto)
+    db_session.flush()
+    oportunidad = CRMOportunidad(contacto_id=contacto.id, responsable_id=user.id, titulo="Obra", activo=True)
+    db_session.add(oportunidad)
+    db_session.flush()
+    db_session.add(Proyecto(nombre="Obra", responsable_id=user.id, oportunidad_id=oportunidad.id))
+    mensaje = CRMMensaje(
+        tipo="entrada",
+        canal="whatsapp",
+        contacto_id=contacto.id,
+        oportunidad_id=oportunidad.id,
+        responsable_id=user.id,
+        estado="nuevo",
+        contenido="Hola",
+        fecha_mensaje=datetime(2026, 10, 17, 12, 0, tzinfo=UTC),
+    )
+    db_session.add(mensaje)
+    db_session.commit()
+
+    monkeypatch.setattr(
+        OpenAIConversationAgentClientV2,
+        "interpret_normal_turn",
+        lambda self, context, prompt_families: NormalTurnDecision(decision_type="smalltalk", reply_to_user="Hola!"),
+    )
+    enviados = []
+
+    async def fake_send_text(self, session, command):
+        enviados.append(command.contenido)
+        return SendResult(sent=True, status="sent", outbound_message_id=500 + len(enviados))
+
+    monkeypatch.setattr(CRMOutboundChannelAdapter, "send_text", fake_send_text)
+    job = webhook_queue.agent_turn_job(mensaje.id)
+    db_session.add(job)
+    db_session.commit()
+
+    intentos = []
+
+    async def falla_tras_enviar(session, payload):
+        intentos.append(payload["mensaje_id"])
+        await webhook_queue._process_with_meta_webhook_service(session, payload)
+        if len(intentos) == 1:
+            raise RuntimeError("worker caido despues del envio")
+
+    assert _process(db_session, falla_tras_enviar) == 1
+    db_session.refresh(job)
+    assert (job.estado, job.intentos) == (EstadoWebhookJob.PENDIENTE.value, 1)
+
+    job.disponible_en = datetime.now(UTC)
+    db_session.add(job)
+    db_session.commit()
+    assert _process(db_session, falla_tras_enviar) == 1
+    db_session.refresh(job)
+    assert job.estado == EstadoWebhookJob.COMPLETADO.value
+    assert enviados == ["Hola!"]
+    db_session.refresh(mensaje)
+    assert mensaje.metadata_json["agent_v2"]["outbound_message_id"] == 501
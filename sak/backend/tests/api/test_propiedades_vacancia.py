@@ -0,0 +1,104 @@
+"""Intervalos de vacancia persistidos y dashboard de propiedades calculado en SQL."""
+
+from datetime import date
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.crud.propiedad_crud import propiedad_crud
+from app.models.propiedad import PropiedadesLogStatus, PropiedadesStatus, PropiedadVacanciaIntervalo
+from app.models.user import User
+from app.services.propiedad_status_service import sync_propiedad_status
+from app.services.propiedades_dashboard import build_prop_dashboard_bundle
+
+
+def _seed_statuses(db_session: Session) -> dict[int, PropiedadesStatus]:
+    statuses = {
+        1: PropiedadesStatus(nombre="Recibida", orden=1, es_inicial=True),
+        2: PropiedadesStatus(nombre="En reparacion", orden=2),
+        3: PropiedadesStatus(nombre="Disponible", orden=3),
+        4: PropiedadesStatus(nombre="Realizada", orden=4),
+        5: PropiedadesStatus(nombre="Retirada", orden=5),
+    }
+    db_session.add_all(statuses.values())
+    db_session.add(User(id=1, nombre="Admin", email="admin@example.com"))
+    db_session.commit()
+    return statuses
+
+
+def _intervalos(db_session: Session, propiedad_id: int) -> list[tuple]:
+    # Los intervalos se reescriben por SQL (y SQLite reusa ids): no confiar en el identity map
+    db_session.expire_all()
+    rows = db_session.exec(
+        select(PropiedadVacanciaIntervalo)
+        .where(PropiedadVacanciaIntervalo.propiedad_id == propiedad_id)
+        .order_by(PropiedadVacanciaIntervalo.desde)
+    ).all()
+    return [(row.estado_orden, row.desde, row.hasta, row.es_inicio_ciclo, row.es_fin_ciclo) for row in rows]
+
+
+def test_status_changes_maintain_vacancy_intervals(db_session: Session) -> None:
+    statuses = _seed_statuses(db_session)
+
+    propiedad = propiedad_crud.create(
+        db_session,
+        {"nombre": "Depto 1", "propietario": "Ana", "propiedad_status_id": statuses[1].id, "estado_fecha": date(2026, 1, 1)},
+    )
+    assert _intervalos(db_session, propiedad.id) == [(1, date(2026, 1, 1), None, True, False)]
+
+    propiedad_crud.update(
+        db_session,
+        propiedad.id,
+        {"propiedad_status_id": statuses[3].id, "estado_fecha": date(2026, 1, 11)},
+        check_version=False,
+    )
+    sync_propiedad_status(db_session, propiedad=propiedad, estado_orden=4, fecha_cambio=date(2026, 2, 10))
+    db_session.commit()
+
+    assert _intervalos(db_session, propiedad.id) == [
+        (1, date(2026, 1, 1), date(2026, 1, 11), True, False),
+        (3, date(2026, 1, 11), date(2026, 2, 10), False, True),
+    ]
+
+    bundle = build_prop_dashboard_bundle(db_session, "2026-01-01", "2026-03-31", period_type="trimestre")
+    dias = bundle["current"]["kpis"]["dias_vacancia_periodo"]
+    assert dias["total"] == 40
+    assert dias["por_estado"] == {"recibida": 10, "en_reparacion": 0, "disponible": 30}
+    assert dias["variacion_vs_anterior"] is None
+    assert bundle["current"]["period_summary"]["nuevas_vacancias"] == 1
+    assert bundle["current"]["period_summary"]["vacancias_resueltas"] == 1
+    assert (bundle["trend"][-1]["count_vacantes"], bundle["trend"][-1]["dias_total"]) == (1, 40)
+
+
+def test_log_edits_through_generic_router_refresh_intervals(client: TestClient, db_session: Session) -> None:
+    statuses = _seed_statuses(db_session)
+    propiedad = propiedad_crud.create(
+        db_session,
+        {"nombre": "Depto 2", "propietario": "Ana", "propiedad_status_id": statuses[1].id, "estado_fecha": date(2026, 1, 1)},
+    )
+    sync_propiedad_status(db_session, propiedad=propiedad, estado_orden=3, fecha_cambio=date(2026, 1, 11))
+    db_session.commit()
+    log = db_session.exec(
+        select(PropiedadesLogStatus).where(PropiedadesLogStatus.estado_nuevo_id == statuses[3].id)
+    ).one()
+
+    response = client.patch(f"/propiedades-log-status/{log.id}", json={"fecha_cambio": "2026-01-21T00:00:00Z"})
+    assert response.status_code == 200, response.text
+    assert _intervalos(db_session, propiedad.id) == [
+        (1, date(2026, 1, 1), date(2026, 1, 21), True, False),
+        (3, date(2026, 1, 21), None, False, False),
+    ]
+
+    response = client.patch(
+        "/propiedades-log-status/bulk",
+        json={"ids": [log.id], "data": {"estado_nuevo_id": statuses[2].id}},
+    )
+    assert response.status_code == 200, response.text
+    assert _intervalos(db_session, propiedad.id) == [
+        (1, date(2026, 1, 1), date(2026, 1, 21), True, False),
+        (2, date(2026, 1, 21), None, False, False),
+    ]
+
+    response = client.delete(f"/propiedades-log-status/{log.id}", params={"hard": True})
+    assert response.status_code == 200, response.text
+    assert _intervalos(db_session, propiedad.id) == [(1, date(2026, 1, 1), None, True, False)]
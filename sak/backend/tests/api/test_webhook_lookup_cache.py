@@ -0,0 +1,121 @@
+"""Caches de resolución del webhook: hits sin queries e invalidación por escrituras ORM."""
+
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import delete, event, text
+from sqlmodel import Session
+
+from app.core import lookup_cache
+from app.models import CRMCelular, CRMContacto, CRMOportunidad
+from app.models.user import User
+from app.services import meta_webhook_service
+from app.services.meta_webhook_service import MetaWebhookService
+
+
+class _NoopOrchestrator:
+    async def process_turn(self, session, message_id, trigger):  # pragma: no cover - no se usa
+        return {}
+
+
+@pytest.fixture()
+def caches(monkeypatch):
+    monkeypatch.setattr(lookup_cache, "LOOKUP_CACHE_ENABLED", True)
+    lookup_cache.clear_lookup_caches()
+    yield
+    lookup_cache.clear_lookup_caches()
+
+
+def _count_queries(session: Session, fn):
+    statements = []
+
+    def _before(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", _before)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", _before)
+    return result, len(statements)
+
+
+def test_hot_lookups_are_served_from_cache_and_invalidated_on_writes(test_engine, caches) -> None:
+    meta_id = str(uuid4())
+    with Session(test_engine) as session:
+        user = User(nombre="Vendedor", email="vendedor@example.com")
+        session.add(user)
+        session.flush()
+        contacto = CRMContacto(nombre_completo="Cliente", telefonos=["5491100000001"], responsable_id=user.id)
+        session.add_all([contacto, CRMCelular(meta_celular_id=meta_id, numero_celular="+1555", alias="Canal")])
+        session.flush()
+        session.add(CRMOportunidad(titulo="Activa", contacto_id=contacto.id, responsable_id=user.id, activo=True))
+        session.commit()
+        contacto_id = contacto.id
+
+        service = MetaWebhookService(session, orchestrator=_NoopOrchestrator())
+        service._ensure_crm_celular(meta_id, "+1555")
+        service._resolve_or_create_oportunidad(contacto)
+        service._default_user()
+        meta_webhook_service.contacto_cache.put("5491100000001", contacto)
+
+    # Otra Session (otro request): todo sale del cache; solo la oportunidad se relee por PK
+    with Session(test_engine) as session:
+        service = MetaWebhookService(session, orchestrator=_NoopOrchestrator())
+
+        def resolve():
+            celular = service._ensure_crm_celular(meta_id, "+1555")
+            contacto = service._find_or_create_contacto("5491100000001")
+            oportunidad = service._resolve_or_create_oportunidad(contacto)
+            return celular, contacto, oportunidad, service._default_user()
+
+        (celular, contacto, oportunidad, usuario), queries = _count_queries(session, resolve)
+        assert queries == 1
+        assert (celular.meta_celular_id, contacto.id, oportunidad.contacto_id) == (meta_id, contacto_id, contacto_id)
+        assert session.get(CRMOportunidad, oportunidad.id) is oportunidad
+        assert usuario.email == "vendedor@example.com"
+
+        # Escrituras ORM invalidan solo las claves afectadas, al commitear
+        oportunidad.activo = False
+        contacto.telefonos = ["5491100000009"]
+        session.add_all([oportunidad, contacto])
+        session.flush()
+        assert meta_webhook_service.oportunidad_cache.get_id(contacto_id) == oportunidad.id
+        session.commit()
+        assert meta_webhook_service.oportunidad_cache.get_id(contacto_id) is None
+        assert meta_webhook_service.contacto_cache.get(session, "5491100000001") is None
+        assert meta_webhook_service.celular_cache.get(session, meta_id) is not None
+
+        # Un DELETE en bloque vacía el cache del modelo
+        session.exec(delete(CRMCelular).where(CRMCelular.meta_celular_id == meta_id))
+        session.commit()
+        assert meta_webhook_service.celular_cache.get(session, meta_id) is None
+
+    stats = lookup_cache.snapshot_lookup_caches()["caches"]
+    assert stats["celular_por_meta_id"]["hits"] >= 1
+    assert stats["oportunidad_activa_por_contacto"]["invalidations"] == 1
+
+
+def test_cached_oportunidad_is_revalidated(test_engine, caches) -> None:
+    with Session(test_engine) as session:
+        user = User(nombre="Vendedor", email="vendedor@example.com")
+        session.add(user)
+        session.flush()
+        contacto = CRMContacto(nombre_completo="Cliente", telefonos=["5491100000003"], responsable_id=user.id)
+        session.add(contacto)
+        session.flush()
+        activa = CRMOportunidad(titulo="Activa", contacto_id=contacto.id, responsable_id=user.id, activo=True)
+        session.add(activa)
+        session.commit()
+
+        service = MetaWebhookService(session, orchestrator=_NoopOrchestrator())
+        assert service._resolve_or_create_oportunidad(contacto).id == activa.id
+
+        # Cerrada por SQL crudo: no invalida el cache, pero la fila se revalida al leerla
+        session.execute(text("UPDATE crm_oportunidades SET activo = 0 WHERE id = :id"), {"id": activa.id})
+        session.commit()
+        session.expire_all()
+        nueva = service._resolve_or_create_oportunidad(contacto)
+        assert nueva.id != activa.id
+        assert nueva.activo
@@ -0,0 +1,95 @@
+"""Cliente de meta-w: cliente HTTP compartido, envío masivo y reintento ante 429."""
+
+import asyncio
+import json
+import threading
+
+import httpx
+
+from app.services import metaw_client as metaw_module
+from app.services.metaw_client import MetaWClient
+
+
+def _mensaje(telefono: str) -> dict:
+    return {"empresa_id": "empresa", "celular_id": "celular", "telefono_destino": telefono, "texto": "Hola"}
+
+
+def test_enviar_mensajes_reusa_el_cliente_y_devuelve_resultado_por_mensaje(monkeypatch) -> None:
+    monkeypatch.setattr(metaw_module, "METAW_SEND_MAX_RETRIES", 1)
+    intentos: dict[str, int] = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/api/v1/mensajes/send"
+        telefono = json.loads(request.content)["telefono_destino"]
+        intentos[telefono] = intentos.get(telefono, 0) + 1
+        if telefono == "549000" and intentos[telefono] == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        if telefono == "549999":
+            return httpx.Response(400, text="fuera de ventana")
+        return httpx.Response(200, json={"meta_message_id": f"wamid.{telefono}"})
+
+    client = MetaWClient(
+        base_url="https://meta-w.test/api/v1",
+        transport=httpx.MockTransport(handler),
+        rate_per_second=1000,
+    )
+
+    async def main():
+        await client.start()
+        http_client = client._get_client()
+        resultados = await client.enviar_mensajes([_mensaje("549111"), _mensaje("549000"), _mensaje("549999")])
+        assert client._get_client() is http_client
+        await client.aclose()
+        assert http_client.is_closed
+        return resultados
+
+    resultados = asyncio.run(main())
+
+    assert [r["ok"] for r in resultados] == [True, True, False]
+    assert resultados[0]["result"] == {"meta_message_id": "wamid.549111"}
+    assert intentos["549000"] == 2
+    assert resultados[2]["status_code"] == 400
+    assert "fuera de ventana" in resultados[2]["error"]
+
+
+def test_rate_limiter_espacia_envios() -> None:
+    limiter = metaw_module.AsyncRateLimiter(rate=50, burst=1)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        inicio = loop.time()
+        for _ in range(4):
+            await limiter.acquire()
+        return loop.time() - inicio
+
+    # 1 permiso inmediato + 3 a 50/s
+    assert asyncio.run(main()) >= 0.05
+
+
+def test_cambio_de_event_loop_cierra_el_cliente_anterior() -> None:
+    client = MetaWClient(
+        base_url="https://meta-w.test/api/v1",
+        transport=httpx.MockTransport(lambda request: httpx.Response(200)),
+    )
+
+    async def get_client():
+        return client._get_client()
+
+    # Loop vivo en otro thread: el cliente viejo se cierra en su propio loop
+    otro_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=otro_loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        viejo = asyncio.run_coroutine_threadsafe(get_client(), otro_loop).result(timeout=5)
+        nuevo = asyncio.run(get_client())
+        assert nuevo is not viejo
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.01), otro_loop).result(timeout=5)
+        assert viejo.is_closed
+    finally:
+        otro_loop.call_soon_threadsafe(otro_loop.stop)
+        thread.join(timeout=5)
+        otro_loop.close()
+
+    # Loop ya terminado: el cliente se descarta y se crea uno nuevo
+    assert asyncio.run(get_client()) is not nuevo
+    assert not client._client.is_closed
@@ -3,9 +3,11 @@ Tests unitarios de los modulos nuevos del core v2:
   - agente.v2.core.context   (MessageInfo, TurnContext)
   - agente.v2.core.process   (TurnResult, ProcessRegistry)
   - agente.v2.core.state     (ConversationState, JsonConversationStateStore)
+  - agente.v2.core.lanes     (TurnLaneScheduler)
 """
 from __future__ import annotations
 
+import asyncio
 import json
 import textwrap
 from pathlib import Path
@@ -14,6 +16,7 @@ from typing import Any
 import pytest
 
 from agente.v2.core.context import MessageInfo, TurnContext
+from agente.v2.core.lanes import TurnLaneFullError, TurnLaneScheduler
 from agente.v2.core.process import ProcessRegistry, TurnResult
 from agente.v2.core.state import ConversationState, JsonConversationStateStore
 
@@ -336,3 +339,57 @@ class TestJsonConversationStateStore:
         store.save(ConversationState(oportunidad_id=2, active_process="p2"))
         assert store.load(1).active_process == "p1"
         assert store.load(2).active_process == "p2"
+
+
+class TestTurnLaneScheduler:
+    def test_misma_oportunidad_en_orden_y_distintas_en_paralelo(self):
+        scheduler = TurnLaneScheduler(lanes=4, capacity=10)
+        otra = next(i for i in range(2, 100) if scheduler.lane_for(i) != scheduler.lane_for(1))
+        eventos: list[str] = []
+
+        def turno(nombre: str, espera: float):
+            async def _run():
+                eventos.append(f"inicio {nombre}")
+                await asyncio.sleep(espera)
+                eventos.append(f"fin {nombre}")
+                return nombre
+            return _run
+
+        async def main():
+            return await asyncio.gather(
+                scheduler.run(1, turno("a1", 0.02)),
+                scheduler.run(1, turno("a2", 0)),
+                scheduler.run(otra, turno("b1", 0)),
+            )
+
+        assert asyncio.run(main()) == ["a1", "a2", "b1"]
+        # a2 espera a a1; b1 corre en otro carril sin esperar a a1
+        assert eventos.index("fin a1") < eventos.index("inicio a2")
+        assert eventos.index("fin b1") < eventos.index("fin a1")
+        stats = scheduler.stats()
+        assert (stats["processed"], stats["depth"]) == (3, 0)
+        assert stats["per_lane"][scheduler.lane_for(1)]["max_depth"] == 2
+
+    def test_carril_lleno_rechaza_y_errores_se_propagan(self):
+        scheduler = TurnLaneScheduler(lanes=1, capacity=1)
+
+        async def lento():
+            await asyncio.sleep(0.01)
+
+        async def falla():
+            raise ValueError("boom")
+
+        async def main():
+            primero = asyncio.ensure_future(scheduler.run(1, lento))
+            await asyncio.sleep(0)  # el primero ya esta corriendo
+            segundo = asyncio.ensure_future(scheduler.run(2, falla))
+            await asyncio.sleep(0)
+            with pytest.raises(TurnLaneFullError):
+                await scheduler.run(3, lento)
+            await primero
+            with pytest.raises(ValueError, match="boom"):
+                await segundo
+
+        asyncio.run(main())
+        assert scheduler.stats()["rejected"] == 1
+        assert scheduler.stats()["per_lane"][0]["failed"] == 1
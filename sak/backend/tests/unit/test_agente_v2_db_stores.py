@@ -13,7 +13,7 @@ import pytest
 from sqlmodel import Session
 
 from agente.v2.core.state import ConversationState
-from agente.v2.db.stores import DbConversationStateStore, DbProcessRequestStore
+from agente.v2.db.stores import ConversationStateConflict, DbConversationStateStore, DbProcessRequestStore
 from agente.v2.processes.solicitud_materiales.models import MaterialItem, MaterialRequestState
 
 
@@ -47,6 +47,7 @@ class TestDbConversationStateStore:
         assert state.oportunidad_id == 99
         assert state.active_process is None
         assert state.process_state == {}
+        assert state.version == 0
 
     def test_save_y_load_roundtrip(self, db_session: Session):
         store = DbConversationStateStore(db_session)
@@ -124,6 +125,61 @@ class TestDbConversationStateStore:
         loaded = store.load(1)
         assert loaded.last_outbound_message_id == 100
 
+    def test_save_if_unchanged_detecta_estado_pisado(self, db_session: Session):
+        store = DbConversationStateStore(db_session)
+        store.save(ConversationState(oportunidad_id=1, active_process="proc_a"))
+        db_session.commit()
+
+        primero = store.load(1)
+        segundo = store.load(1)
+        primero.active_process = "proc_b"
+        store.save_if_unchanged(primero)
+        db_session.commit()
+
+        with pytest.raises(ConversationStateConflict):
+            store.save_if_unchanged(segundo)
+        assert store.load(1).active_process == "proc_b"
+
+    def test_save_if_unchanged_incrementa_version_en_la_db(self, db_session: Session):
+        store = DbConversationStateStore(db_session)
+        store.save(ConversationState(oportunidad_id=1, active_process="proc_a"))
+        db_session.commit()
+
+        state = store.load(1)
+        state.active_process = "proc_b"
+        store.save_if_unchanged(state)
+        store.save_if_unchanged(state)
+        db_session.commit()
+
+        loaded = DbConversationStateStore(db_session).load(1)
+        assert (loaded.active_process, loaded.version) == ("proc_b", 3)
+        assert state.version == 3
+
+    def test_save_if_unchanged_primer_guardado_concurrente(self, db_session: Session):
+        store = DbConversationStateStore(db_session)
+        primero = store.load(1)
+        segundo = store.load(1)
+
+        primero.active_process = "proc_a"
+        store.save_if_unchanged(primero)
+        db_session.commit()
+        assert primero.version == 1
+
+        segundo.active_process = "proc_b"
+        with pytest.raises(ConversationStateConflict):
+            store.save_if_unchanged(segundo)
+        assert store.load(1).active_process == "proc_a"
+
+    def test_save_if_unchanged_inserta_estado_cargado_por_otro_store(self, db_session: Session):
+        """El marcador de "sin fila" viaja con el estado (version 0), no con el store."""
+        state = DbConversationStateStore(db_session).load(1)
+        state.active_process = "proc_a"
+        DbConversationStateStore(db_session).save_if_unchanged(state)
+        db_session.commit()
+
+        assert state.version == 1
+        assert DbConversationStateStore(db_session).load(1).active_process == "proc_a"
+
 
 # ===========================================================================
 # DbProcessRequestStore
@@ -262,3 +318,30 @@ class TestDbProcessRequestStore:
         db_session.commit()
 
         assert state.created_at.replace("+00:00", "") == created_at_original
+
+    def test_stage_trabaja_en_memoria_hasta_flush(self, db_session: Session):
+        """Con la solicitud precargada, load/save no tocan la sesion hasta flush_staged."""
+        store = DbProcessRequestStore(db_session)
+        store.save(_make_request_state(oportunidad_id=1), ultimo_mensaje_id=1)
+        db_session.commit()
+
+        store.stage(1)
+        state = store.load(1)
+        state.estado_solicitud = "ready"
+        store.save(state, ultimo_mensaje_id=2)
+        store.save(store.load(1), ultimo_mensaje_id=3)
+        assert state.version == 2
+        assert DbProcessRequestStore(db_session).load(1).estado_solicitud == "draft"
+
+        store.flush_staged(1)
+        db_session.commit()
+        loaded = DbProcessRequestStore(db_session).load(1)
+        assert (loaded.estado_solicitud, loaded.version, loaded.ultimo_mensaje_id) == ("ready", 3, 3)
+
+    def test_discard_staged_descarta_los_guardados(self, db_session: Session):
+        store = DbProcessRequestStore(db_session)
+        store.stage(1)
+        store.save(_make_request_state(oportunidad_id=1), ultimo_mensaje_id=1)
+        store.discard_staged(1)
+        db_session.commit()
+        assert store.load(1) is None
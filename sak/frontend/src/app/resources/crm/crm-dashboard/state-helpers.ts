@@ -39,10 +39,11 @@ export type DashboardRefreshDecision = {
   refreshKpis: boolean;
 };
 
-export type DashboardAlertItemCheckResponse = {
-  id: number;
-  alertKey: AlertKey;
-  hasAlert: boolean;
+export type DashboardAlertItemsCheckResponse = {
+  data: Array<{
+    id: number;
+    alerts: Partial<Record<AlertKey, boolean>>;
+  }>;
 };
 
 export type CrmDashboardSnapshot = {
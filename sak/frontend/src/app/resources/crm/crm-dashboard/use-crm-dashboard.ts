@@ -26,7 +26,7 @@ import {
   loadDashboardReturnMarker,
 } from "./return-state";
 import {
-  type DashboardAlertItemCheckResponse,
+  type DashboardAlertItemsCheckResponse,
   type DashboardCatalogItem,
   type DashboardPatchedRecord,
   buildComparableRecordFromDetailItem,
@@ -225,11 +225,15 @@ export const useCrmDashboard = () => {
     [filters, selectedAlertKey],
   );
 
-  const fetchAlertItemStatus = useCallback(
-    async (oportunidadId: string | number, alertKey: AlertKey) =>
-      fetchJsonWithAuth<DashboardAlertItemCheckResponse>(
-        `${apiUrl}/api/dashboard/crm/alerta-item?id=${encodeURIComponent(String(oportunidadId))}&alertKey=${encodeURIComponent(alertKey)}`,
-      ),
+  const fetchAlertItemsStatus = useCallback(
+    async (oportunidadIds: Array<string | number>, alertKeys: AlertKey[]) => {
+      const params = new URLSearchParams();
+      params.set("ids", oportunidadIds.map(String).join(","));
+      params.set("alertKeys", alertKeys.join(","));
+      return fetchJsonWithAuth<DashboardAlertItemsCheckResponse>(
+        `${apiUrl}/api/dashboard/crm/alerta-items?${params.toString()}`,
+      );
+    },
     [],
   );
 
@@ -552,12 +556,15 @@ export const useCrmDashboard = () => {
         );
         let removedFromActiveAlert = false;
         if (selectedAlertKey) {
-          const alertStatus = await fetchAlertItemStatus(
-            pendingReturnMarker.oportunidadId,
-            selectedAlertKey,
+          const alertStatus = await fetchAlertItemsStatus(
+            [pendingReturnMarker.oportunidadId],
+            [selectedAlertKey],
           );
           if (cancelled) return;
-          if (!alertStatus.hasAlert) {
+          const hasAlert = alertStatus.data.some(
+            (item) => idsMatch(item.id, pendingReturnMarker.oportunidadId) && item.alerts[selectedAlertKey],
+          );
+          if (!hasAlert) {
             removedFromActiveAlert = removeDetailItemAndDecrementAlert(
               pendingReturnMarker.oportunidadId,
               selectedAlertKey,
@@ -654,7 +661,7 @@ export const useCrmDashboard = () => {
     };
   }, [
     fetchDashboardBundle,
-    fetchAlertItemStatus,
+    fetchAlertItemsStatus,
     fetchDetailPage,
     fetchSelectors,
     hasHydratedSnapshot,
@@ -89,6 +89,8 @@ type HomeDashboardItem = {
   href: string;
   ctaLabel: string;
   meta?: Record<string, unknown>;
+  // true si el item viene de una sección que superó el presupuesto (último valor conocido)
+  stale?: boolean;
 };
 
 type HomeDashboardRadarItem = HomeDashboardItem & {
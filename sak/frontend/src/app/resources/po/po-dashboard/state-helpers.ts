@@ -40,10 +40,11 @@ export type DashboardRefreshDecision = {
   refreshKpis: boolean;
 };
 
-export type DashboardAlertItemCheckResponse = {
-  id: number;
-  alertKey: PoDashboardAlertKey;
-  hasAlert: boolean;
+export type DashboardAlertItemsCheckResponse = {
+  data: Array<{
+    id: number;
+    alerts: Partial<Record<PoDashboardAlertKey, boolean>>;
+  }>;
 };
 
 export type PoDashboardSnapshot = {
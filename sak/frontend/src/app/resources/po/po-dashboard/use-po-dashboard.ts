@@ -27,7 +27,7 @@ import {
 } from "./return-state";
 import { TIPO_COMPRA_CHOICES } from "../po-orders/model";
 import {
-  type DashboardAlertItemCheckResponse,
+  type DashboardAlertItemsCheckResponse,
   type DashboardCatalogItem,
   type DashboardPatchedRecord,
   buildComparableRecordFromDetailItem,
@@ -237,13 +237,13 @@ export const usePoDashboard = () => {
     [filters, selectedAlertKey],
   );
 
-  const fetchAlertItemStatus = useCallback(
-    async (orderId: string | number, alertKey: PoDashboardAlertKey) => {
+  const fetchAlertItemsStatus = useCallback(
+    async (orderIds: Array<string | number>, alertKeys: PoDashboardAlertKey[]) => {
       const params = serializeFiltersToParams(filters);
-      params.set("id", String(orderId));
-      params.set("alertKey", alertKey);
-      return fetchJsonWithAuth<DashboardAlertItemCheckResponse>(
-        `${apiUrl}/api/dashboard/po/alerta-item?${params.toString()}`,
+      params.set("ids", orderIds.map(String).join(","));
+      params.set("alertKeys", alertKeys.join(","));
+      return fetchJsonWithAuth<DashboardAlertItemsCheckResponse>(
+        `${apiUrl}/api/dashboard/po/alerta-items?${params.toString()}`,
       );
     },
     [filters],
@@ -619,12 +619,15 @@ export const usePoDashboard = () => {
 
         let removedFromActiveAlert = false;
         if (selectedAlertKey) {
-          const alertStatus = await fetchAlertItemStatus(
-            pendingReturnMarker.orderId,
-            selectedAlertKey,
+          const alertStatus = await fetchAlertItemsStatus(
+            [pendingReturnMarker.orderId],
+            [selectedAlertKey],
           );
           if (cancelled) return;
-          if (!alertStatus.hasAlert) {
+          const hasAlert = alertStatus.data.some(
+            (item) => idsMatch(item.id, pendingReturnMarker.orderId) && item.alerts[selectedAlertKey],
+          );
+          if (!hasAlert) {
             removedFromActiveAlert = removeDetailItemAndDecrementAlert(
               pendingReturnMarker.orderId,
               selectedAlertKey,
@@ -733,7 +736,7 @@ export const usePoDashboard = () => {
       }
     };
   }, [
-    fetchAlertItemStatus,
+    fetchAlertItemsStatus,
     fetchDashboardBundle,
     fetchDetailPage,
     fetchSelectors,
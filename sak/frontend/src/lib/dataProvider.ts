@@ -114,6 +114,30 @@ const isNotFoundError = (error: unknown) => {
   return err?.status === 404 || err?.response?.status === 404;
 };
 
+// Recursos sin router genérico no exponen /bulk. Según cómo declaran sus rutas, FastAPI responde:
+// - 405: existe `/{resource}/{id}` pero sin ese método.
+// - 404 sin detail estructurado: no hay ruta.
+// - 422 sobre el path: `/{resource}/{id}` tipado como int recibió "bulk".
+// Cualquier otro status (400/404/409/413 del lote revertido, 401/403, 5xx) se propaga sin
+// fallback: reintentar fila por fila aplicaría en parte un lote que el backend rechazó entero.
+const isMissingBulkRoute = (error: unknown) => {
+  const err = error as { status?: number; body?: { detail?: unknown } };
+  if (err?.status === 405) return true;
+  if (err?.status === 404) return typeof err?.body?.detail !== "object";
+  if (err?.status === 422 && Array.isArray(err?.body?.detail)) {
+    return err.body.detail.some(
+      (item: { loc?: unknown }) => Array.isArray(item?.loc) && item.loc[0] === "path",
+    );
+  }
+  return false;
+};
+
+const bulkRequest = (resource: string, method: "PATCH" | "DELETE", body: unknown) =>
+  httpClient(`${apiUrl}/${resource}/bulk`, {
+    method,
+    body: JSON.stringify(body),
+  });
+
 type DataProviderOperation =
   | "getList"
   | "getOne"
@@ -211,31 +235,40 @@ export const dataProvider: DataProvider = {
     }
     return response;
   }),
-  updateMany: withErrorHandling((resource, params) =>
-    baseProvider.updateMany(resolveResource(resource, "updateMany"), params)
-  ),
+  updateMany: withErrorHandling(async (resource, params) => {
+    const resolved = resolveResource(resource, "updateMany");
+    const data = sanitizeIdsInData(params.data);
+    try {
+      await bulkRequest(resolved, "PATCH", { ids: params.ids, data });
+      return { data: params.ids };
+    } catch (error) {
+      if (!isMissingBulkRoute(error)) throw error;
+      return baseProvider.updateMany(resolved, { ...params, data: data as any });
+    }
+  }),
   delete: withErrorHandling((resource, params) =>
     baseProvider.delete(resolveResource(resource, "delete"), params)
   ),
-  deleteMany: async (resource, params) => {
+  deleteMany: withErrorHandling(async (resource, params) => {
     const resolved = resolveResource(resource, "deleteMany");
     const { ids } = params;
     try {
-      const results = await Promise.allSettled(
-        ids.map((id) =>
-          baseProvider.delete(resolved, { id }),
-        ),
-      );
-      const rejected = results.find((result) => result.status === "rejected");
-      if (rejected && rejected.status === "rejected") {
-        throw rejected.reason;
-      }
+      await bulkRequest(resolved, "DELETE", { ids });
       return { data: ids };
     } catch (error) {
-      toast.error(extractErrorMessage(error));
-      throw error;
+      if (!isMissingBulkRoute(error)) throw error;
+    }
+    const results = await Promise.allSettled(
+      ids.map((id) =>
+        baseProvider.delete(resolved, { id }),
+      ),
+    );
+    const rejected = results.find((result) => result.status === "rejected");
+    if (rejected && rejected.status === "rejected") {
+      throw rejected.reason;
     }
-  },
+    return { data: ids };
+  }),
 };
 
 export default dataProvider;